@@ -0,0 +1,437 @@
+"""
+AI Circuit Breaker - Circuit breaker shared by every worker, adaptive AI call timeouts
+One breaker per AI service ('gemini'). Its state lives in
+AI_CIRCUIT_BREAKER_URL (same forms as GEMINI_RATE_LIMIT_URL: redis://,
+sqlite:/// or memory; defaults to the rate limiter's store), so a Gemini
+outage seen by one worker stops the others too:
+
+- closed: calls pass; AI_CIRCUIT_FAILURE_THRESHOLD failures in a row open it
+- open: calls fail at once (CircuitOpenError with the time left) for
+  AI_CIRCUIT_OPEN_SECONDS
+- half_open: one probe call at a time (across all workers) goes through;
+  success closes the breaker, failure opens it again. A probe that never
+  reports back frees the slot after AI_CIRCUIT_PROBE_TIMEOUT.
+
+Every AI endpoint ('generate', 'batch', 'content') keeps a latency histogram
+of the calls that completed in this process, over the last one to two
+AI_LATENCY_WINDOW_SECONDS. Once it has AI_TIMEOUT_MIN_SAMPLES, the call
+timeout is p95 x AI_TIMEOUT_P95_MULTIPLIER, between AI_TIMEOUT_MIN_SECONDS
+and the endpoint's configured timeout, so a degraded Gemini fails fast and
+trips the breaker instead of holding threads for the full timeout. A timed-out
+call is added as a censored sample at the time it waited (its latency was at
+least that), so when Gemini gets slower and more than 5% of calls time out,
+p95 climbs past the timeout and the next timeout is AI_TIMEOUT_P95_MULTIPLIER
+times longer, up to the configured one; half-open probes use the full
+configured timeout.
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import gemini_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+AI_CIRCUIT_BREAKER_URL = os.getenv('AI_CIRCUIT_BREAKER_URL') or gemini_rate_limiter.GEMINI_RATE_LIMIT_URL
+AI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5'))
+AI_CIRCUIT_OPEN_SECONDS = float(os.getenv('AI_CIRCUIT_OPEN_SECONDS', '60'))
+AI_CIRCUIT_PROBE_TIMEOUT = float(os.getenv('AI_CIRCUIT_PROBE_TIMEOUT', '30'))
+AI_TIMEOUT_P95_MULTIPLIER = float(os.getenv('AI_TIMEOUT_P95_MULTIPLIER', '1.5'))
+AI_TIMEOUT_MIN_SECONDS = float(os.getenv('AI_TIMEOUT_MIN_SECONDS', '3'))
+AI_TIMEOUT_MIN_SAMPLES = int(os.getenv('AI_TIMEOUT_MIN_SAMPLES', '20'))
+AI_LATENCY_WINDOW_SECONDS = float(os.getenv('AI_LATENCY_WINDOW_SECONDS', '300'))
+
+GEMINI = 'gemini'
+KEY_PREFIX = 'smart-quizzer:circuit:'
+STORE_RETRY_SECONDS = 30
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Histogram bucket upper bounds in seconds (the last bucket is open-ended)
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 60, math.inf)
+
+
+class CircuitOpenError(Exception):
+    """The breaker rejects calls for now"""
+
+    def __init__(self, name, retry_after, failures):
+        self.name = name
+        self.retry_after = retry_after
+        self.failures = failures
+        super().__init__(f"AI service '{name}' circuit breaker open ({failures} consecutive failures), "
+                         f"retry in {math.ceil(retry_after)}s")
+
+
+def closed_state():
+    return {'state': CLOSED, 'failures': 0, 'opened_at': 0.0, 'probe_until': 0.0, 'last_failure': None}
+
+
+def claim_call(state, now):
+    """
+    Breaker step before a call.
+
+    Returns:
+        tuple: (new state, (allowed, is_probe, retry_after))
+    """
+    if state['state'] == CLOSED:
+        return state, (True, False, 0.0)
+    if state['state'] == OPEN:
+        remaining = state['opened_at'] + AI_CIRCUIT_OPEN_SECONDS - now
+        if remaining > 0:
+            return state, (False, False, remaining)
+        return dict(state, state=HALF_OPEN, probe_until=now + AI_CIRCUIT_PROBE_TIMEOUT), (True, True, 0.0)
+    # Half open: one probe in flight at a time
+    if now < state['probe_until']:
+        return state, (False, False, state['probe_until'] - now)
+    return dict(state, probe_until=now + AI_CIRCUIT_PROBE_TIMEOUT), (True, True, 0.0)
+
+
+def record_outcome(state, success, now, reason=None):
+    """Breaker step after a call; returns (new state, new state)"""
+    if success:
+        state = closed_state()
+    else:
+        failures = state['failures'] + 1
+        if state['state'] == HALF_OPEN or failures >= AI_CIRCUIT_FAILURE_THRESHOLD:
+            if state['state'] != OPEN:
+                logger.warning(f"⚠️ AI circuit breaker opened after {failures} failures ({reason})")
+            state = dict(state, state=OPEN, failures=failures, opened_at=now, last_failure=reason)
+        else:
+            state = dict(state, failures=failures, last_failure=reason)
+    return state, state
+
+
+class MemoryStore:
+    name = 'memory'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+
+    def read(self, key):
+        return self.states.get(key)
+
+    def update(self, key, step):
+        with self.lock:
+            state, result = step(self.states.get(key) or closed_state())
+            self.states[key] = state
+        return result
+
+
+class SQLiteStore:
+    """Breaker rows in a SQLite file; BEGIN IMMEDIATE serializes the workers of one host"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS ai_circuit_breakers (key TEXT PRIMARY KEY, state TEXT)"
+        )
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def read(self, key):
+        row = self._connection().execute("SELECT state FROM ai_circuit_breakers WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, key, step):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT state FROM ai_circuit_breakers WHERE key = ?", (key,)).fetchone()
+            state, result = step(json.loads(row[0]) if row else closed_state())
+            connection.execute("INSERT OR REPLACE INTO ai_circuit_breakers (key, state) VALUES (?, ?)",
+                               (key, json.dumps(state)))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RedisStore:
+    """Breaker state as a JSON string, updated in a WATCH/MULTI transaction"""
+
+    name = 'redis'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def read(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw else None
+
+    def update(self, key, step):
+        def transaction(pipe):
+            raw = pipe.get(key)
+            state, result = step(json.loads(raw) if raw else closed_state())
+            pipe.multi()
+            pipe.set(key, json.dumps(state))
+            return result
+        return self.client.transaction(transaction, key, value_from_callable=True)
+
+
+def create_store(url):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    if url == 'memory':
+        return MemoryStore()
+    raise ValueError(f"Unsupported AI_CIRCUIT_BREAKER_URL '{url}' (expected redis://, sqlite:/// or memory)")
+
+
+class CircuitBreaker:
+    """Shared breaker for one AI service; falls back to per-worker state when the store is down"""
+
+    def __init__(self, name, url=AI_CIRCUIT_BREAKER_URL):
+        self.name = name
+        self.key = KEY_PREFIX + name
+        self.url = url
+        self.fallback = MemoryStore()
+        self.store = None
+        self.store_error = None
+        self.store_retry_at = 0.0
+        self._connect()
+
+    def _connect(self):
+        try:
+            self.store = create_store(self.url)
+            self.store_error = None
+        except Exception as e:
+            self._use_fallback(e)
+
+    def _use_fallback(self, error):
+        if self.store_error is None:
+            logger.warning(f"⚠️ AI circuit breaker store unavailable ({error}) - using per-worker state")
+        self.store = None
+        self.store_error = str(error)
+        self.store_retry_at = time.monotonic() + STORE_RETRY_SECONDS
+
+    def _call(self, method, *args):
+        if self.store is None and time.monotonic() >= self.store_retry_at:
+            self._connect()
+        if self.store is not None:
+            try:
+                return getattr(self.store, method)(self.key, *args)
+            except Exception as e:
+                self._use_fallback(e)
+        return getattr(self.fallback, method)(self.key, *args)
+
+    def state(self):
+        return self._call('read') or closed_state()
+
+    def before_call(self):
+        """
+        Claim a call. Returns True when the call is the half-open probe.
+
+        Raises:
+            CircuitOpenError: the breaker is open (or a probe is in flight)
+        """
+        state = self.state()
+        if state['state'] == CLOSED:
+            return False  # Hot path: no write while closed
+        allowed, probe, retry_after = self._call('update', lambda s: claim_call(s, time.time()))
+        if not allowed:
+            raise CircuitOpenError(self.name, retry_after, state['failures'])
+        if probe:
+            logger.info(f"🔎 AI circuit breaker '{self.name}' half-open: probing")
+        return probe
+
+    def record_success(self):
+        state = self.state()
+        if state['state'] != CLOSED or state['failures']:
+            self._call('update', lambda s: record_outcome(s, True, time.time()))
+
+    def record_failure(self, reason=None):
+        self._call('update', lambda s: record_outcome(s, False, time.time(), reason))
+
+    def reset(self):
+        self._call('update', lambda s: (closed_state(), None))
+
+    def is_open(self):
+        return self.state()['state'] != CLOSED
+
+    def get_status(self):
+        state = self.state()
+        status = {
+            'state': state['state'],
+            'consecutive_failures': state['failures'],
+            'last_failure': state['last_failure'],
+            'store': self.store.name if self.store is not None else 'memory (fallback)',
+            'store_error': self.store_error,
+        }
+        if state['state'] == OPEN:
+            status['retry_after'] = round(max(0.0, state['opened_at'] + AI_CIRCUIT_OPEN_SECONDS - time.time()), 1)
+        return status
+
+
+class LatencyHistogram:
+    """Bucketed latencies (timeouts as censored samples) over the current and previous window"""
+
+    def __init__(self, window_seconds=AI_LATENCY_WINDOW_SECONDS):
+        self.window = window_seconds
+        self.lock = threading.Lock()
+        self.current = [0] * len(LATENCY_BUCKETS)
+        self.previous = [0] * len(LATENCY_BUCKETS)
+        self.rotated_at = time.monotonic()
+        self.timeouts = 0
+
+    def _rotate(self):
+        elapsed = time.monotonic() - self.rotated_at
+        if elapsed >= self.window:
+            self.previous = self.current if elapsed < 2 * self.window else [0] * len(LATENCY_BUCKETS)
+            self.current = [0] * len(LATENCY_BUCKETS)
+            self.rotated_at = time.monotonic()
+
+    def observe(self, seconds):
+        with self.lock:
+            self._rotate()
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.current[index] += 1
+                    break
+
+    def observe_timeout(self, waited):
+        """A call that timed out after `waited` seconds: a sample of at least that latency"""
+        self.observe(waited)
+        with self.lock:
+            self.timeouts += 1
+
+    def counts(self):
+        with self.lock:
+            self._rotate()
+            return [a + b for a, b in zip(self.current, self.previous)]
+
+    def percentile(self, q, counts=None):
+        """Latency at quantile q, interpolated within its bucket (None without samples)"""
+        counts = counts or self.counts()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            if count and cumulative + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            if not math.isinf(bound):
+                lower = bound
+        return lower
+
+    def snapshot(self):
+        counts = self.counts()
+        p50, p95 = self.percentile(0.5, counts), self.percentile(0.95, counts)
+        return {
+            'samples': sum(counts),
+            'timeouts': self.timeouts,
+            'p50_ms': round(p50 * 1000) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000) if p95 is not None else None,
+            'buckets': {('+Inf' if math.isinf(bound) else f"{bound:g}s"): count
+                        for bound, count in zip(LATENCY_BUCKETS, counts)},
+        }
+
+
+_breakers = {}
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name=GEMINI):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def get_histogram(endpoint):
+    histogram = _histograms.get(endpoint)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(endpoint, LatencyHistogram())
+    return histogram
+
+
+def observe(endpoint, seconds):
+    get_histogram(endpoint).observe(seconds)
+
+
+def observe_timeout(endpoint, waited):
+    get_histogram(endpoint).observe_timeout(waited)
+
+
+def p95_timeout(endpoint):
+    """p95 x AI_TIMEOUT_P95_MULTIPLIER for `endpoint` (None until it has AI_TIMEOUT_MIN_SAMPLES)"""
+    histogram = get_histogram(endpoint)
+    counts = histogram.counts()
+    if sum(counts) < AI_TIMEOUT_MIN_SAMPLES:
+        return None
+    return max(AI_TIMEOUT_MIN_SECONDS, histogram.percentile(0.95, counts) * AI_TIMEOUT_P95_MULTIPLIER)
+
+
+def adaptive_timeout(endpoint, default_timeout, probe=False):
+    """Call timeout for `endpoint`: p95-based once there are enough samples, never above the default"""
+    timeout = None if probe else p95_timeout(endpoint)
+    if timeout is None:
+        return default_timeout
+    return round(min(default_timeout, timeout), 2)
+
+
+@contextmanager
+def guard(endpoint, default_timeout, timeout_errors=(), name=GEMINI):
+    """
+    Breaker check, adaptive timeout and outcome recording around one AI call.
+    Yields the timeout to use; keep only the call itself inside the block.
+
+    Raises:
+        CircuitOpenError: the breaker rejects the call
+    """
+    breaker = get_breaker(name)
+    probe = breaker.before_call()
+    started = time.perf_counter()
+    try:
+        yield adaptive_timeout(endpoint, default_timeout, probe)
+    except timeout_errors:
+        observe_timeout(endpoint, time.perf_counter() - started)
+        breaker.record_failure(f"{endpoint} timeout")
+        raise
+    except Exception as e:
+        breaker.record_failure(f"{endpoint} {type(e).__name__}")
+        raise
+    observe(endpoint, time.perf_counter() - started)
+    breaker.record_success()
+
+
+def get_status():
+    return {
+        'breakers': {name: breaker.get_status() for name, breaker in list(_breakers.items())},
+        'latency': {endpoint: histogram.snapshot() for endpoint, histogram in list(_histograms.items())},
+        'p95_timeouts_s': {endpoint: (round(timeout, 2) if timeout is not None else None)
+                           for endpoint, timeout in ((e, p95_timeout(e)) for e in list(_histograms))},
+    }
@@ -0,0 +1,527 @@
+"""
+Analytics Export Service - Columnar export and query engine for reports
+Incrementally exports quiz data to partitioned Parquet files and answers
+analytics queries with vectorized DuckDB scans instead of ORM loops
+
+An export run writes its part files to a staging directory, commits the new
+watermarks (recording the batch as pending), then moves the parts into the
+datasets. A run interrupted before the commit leaves only staged files, which
+the next run discards and exports again; one interrupted after it is
+published by the next run, so no range is exported twice. Runs are
+serialized across worker processes by an exclusive lock on a file in the
+export directory, so a run only ever discards staging left by a dead one.
+"""
+
+from models import db, QuizSession, Question, QuizLeaderboard
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+import importlib.util
+import json
+import os
+import shutil
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are only serialized within one process
+    fcntl = None
+
+# Optional columnar dependencies (imported on first export/query, they are slow to import)
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+DUCKDB_AVAILABLE = importlib.util.find_spec('duckdb') is not None
+
+logger = logging.getLogger(__name__)
+
+# Export configuration
+EXPORT_DIR = os.getenv(
+    'ANALYTICS_EXPORT_DIR',
+    os.path.join(os.path.dirname(__file__), 'instance', 'analytics')
+)
+COLUMNAR_ENABLED = os.getenv('ANALYTICS_COLUMNAR_ENABLED', 'true').lower() == 'true'
+EXPORT_BATCH_SIZE = int(os.getenv('ANALYTICS_EXPORT_BATCH_SIZE', '50000'))
+# Sessions completed in the last few seconds may still be mid-transaction; leave them for the next run
+EXPORT_LAG_SECONDS = int(os.getenv('ANALYTICS_EXPORT_LAG_SECONDS', '60'))
+
+WATERMARK_FILE = '_watermarks.json'
+LOCK_FILE = '_export.lock'
+STAGING_DIR = '_staging'
+EXPORTED_TABLES = ('quiz_sessions', 'questions', 'quiz_leaderboard')
+
+_export_lock = threading.Lock()
+
+
+def is_columnar_available():
+    """Check whether the columnar engine can serve queries"""
+    if not (COLUMNAR_ENABLED and PYARROW_AVAILABLE and DUCKDB_AVAILABLE):
+        return False
+    return _load_watermarks().get('sessions_completed_at') is not None
+
+
+def _watermark_path():
+    return os.path.join(EXPORT_DIR, WATERMARK_FILE)
+
+
+def _load_watermarks():
+    """Load export high-water marks (empty dict if nothing exported yet)"""
+    try:
+        with open(_watermark_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_watermarks(watermarks):
+    """Atomically persist export high-water marks"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tmp_path = _watermark_path() + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f)
+    os.replace(tmp_path, _watermark_path())
+
+
+def _sessions_watermark():
+    """Return the completed_at high-water mark as a datetime (or None)"""
+    value = _load_watermarks().get('sessions_completed_at')
+    return datetime.fromisoformat(value) if value else None
+
+
+def _acquire_export_lock():
+    """
+    Take the export lock without waiting.
+
+    Returns:
+        file, False or None: the open lock file (False without fcntl), to pass
+        to _release_export_lock; None if another thread or process is exporting
+    """
+    if not _export_lock.acquire(blocking=False):
+        return None
+    if fcntl is None:
+        return False
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        lock_file = open(os.path.join(EXPORT_DIR, LOCK_FILE), 'a')
+    except OSError:
+        _export_lock.release()
+        raise
+    try:
+        # Released by the kernel if the process dies, so a crashed run never blocks the next
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        _export_lock.release()
+        return None
+    return lock_file
+
+
+def _release_export_lock(lock_file):
+    if lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+    _export_lock.release()
+
+
+def _staging_path(batch_id):
+    return os.path.join(EXPORT_DIR, STAGING_DIR, batch_id)
+
+
+def _publish_staged(batch_id):
+    """Move a committed batch's part files into the datasets (safe to repeat after a crash)"""
+    staging = _staging_path(batch_id)
+    for root, _dirs, files in os.walk(staging):
+        target_dir = os.path.join(EXPORT_DIR, os.path.relpath(root, staging))
+        for name in files:
+            os.makedirs(target_dir, exist_ok=True)
+            os.replace(os.path.join(root, name), os.path.join(target_dir, name))
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _recover_staging(watermarks):
+    """
+    Publish a batch whose watermarks were committed but whose parts were not
+    all moved, and drop batches that never reached the commit. Called with
+    the export lock held, so no other run is writing to the staging directory.
+    """
+    pending = watermarks.pop('pending_batch', None)
+    if pending:
+        _publish_staged(pending)
+        _save_watermarks(watermarks)
+        logger.info(f"📦 Published interrupted export batch {pending}")
+    shutil.rmtree(os.path.join(EXPORT_DIR, STAGING_DIR), ignore_errors=True)
+
+
+def _write_partitioned(table_name, columns, batch_id):
+    """Write one batch of column lists to the batch's staged, dt-partitioned Parquet dataset"""
+    if not columns or not columns.get('dt'):
+        return 0
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.table(columns)
+    pq.write_to_dataset(
+        table,
+        root_path=os.path.join(_staging_path(batch_id), table_name),
+        partition_cols=['dt'],
+        basename_template=f"part-{batch_id}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore'
+    )
+    return table.num_rows
+
+
+def _flush_rows(table_name, rows, fields, batch_id):
+    """Pivot a list of row tuples into columns and write them"""
+    if not rows:
+        return 0
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(fields)}
+    return _write_partitioned(table_name, columns, batch_id)
+
+
+def export_incremental(batch_size=None):
+    """
+    Export newly completed quiz data to Parquet.
+
+    quiz_sessions and questions are exported once their session is completed
+    (completed_at watermark), leaderboard entries by id watermark. Rows are
+    streamed from the database in batches and never held in memory all at once.
+    Parts become visible only after the watermarks that cover them are saved.
+
+    Returns:
+        dict: Rows exported per table and the new watermarks
+    """
+    if not (PYARROW_AVAILABLE and DUCKDB_AVAILABLE):
+        return {'success': False, 'error': 'pyarrow and duckdb are required for columnar export'}
+
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+
+    lock_file = _acquire_export_lock()
+    if lock_file is None:
+        return {'success': False, 'error': 'Export already running'}
+
+    try:
+        watermarks = _load_watermarks()
+        _recover_staging(watermarks)
+        started = datetime.now()
+        batch_id = started.strftime('%Y%m%d%H%M%S%f')
+        exported = {name: 0 for name in EXPORTED_TABLES}
+
+        lower = watermarks.get('sessions_completed_at')
+        lower = datetime.fromisoformat(lower) if lower else datetime.min
+        upper_limit = started - timedelta(seconds=EXPORT_LAG_SECONDS)
+        upper = db.session.query(func.max(QuizSession.completed_at)).filter(
+            QuizSession.status == 'completed',
+            QuizSession.completed_at > lower,
+            QuizSession.completed_at <= upper_limit
+        ).scalar()
+
+        if upper:
+            window = (
+                QuizSession.status == 'completed',
+                QuizSession.completed_at > lower,
+                QuizSession.completed_at <= upper
+            )
+
+            # Sessions
+            session_fields = (
+                'id', 'user_id', 'topic', 'skill_level', 'total_questions',
+                'correct_answers', 'score_percentage', 'total_time_seconds',
+                'started_at', 'completed_at', 'dt'
+            )
+            session_query = db.session.query(
+                QuizSession.id, QuizSession.user_id, QuizSession.topic,
+                QuizSession.skill_level, QuizSession.total_questions,
+                QuizSession.correct_answers, QuizSession.score_percentage,
+                QuizSession.total_time_seconds, QuizSession.started_at,
+                QuizSession.completed_at
+            ).filter(*window).order_by(QuizSession.completed_at).yield_per(batch_size)
+
+            rows = []
+            for row in session_query:
+                rows.append(tuple(row) + (row.completed_at.date().isoformat(),))
+                if len(rows) >= batch_size:
+                    exported['quiz_sessions'] += _flush_rows('quiz_sessions', rows, session_fields, batch_id)
+                    rows = []
+            exported['quiz_sessions'] += _flush_rows('quiz_sessions', rows, session_fields, batch_id)
+
+            # Questions, denormalized with the owning session's user/topic
+            question_fields = (
+                'id', 'quiz_session_id', 'user_id', 'topic', 'question_type',
+                'difficulty_level', 'difficulty_weight', 'is_correct', 'answered',
+                'time_taken', 'dt'
+            )
+            question_query = db.session.query(
+                Question.id, Question.quiz_session_id, QuizSession.user_id,
+                QuizSession.topic, Question.question_type, Question.difficulty_level,
+                Question.difficulty_weight, Question.is_correct,
+                Question.user_answer.isnot(None), Question.time_taken,
+                QuizSession.completed_at
+            ).join(QuizSession).filter(*window).order_by(Question.id).yield_per(batch_size)
+
+            rows = []
+            for row in question_query:
+                values = tuple(row)
+                rows.append(values[:-1] + (values[-1].date().isoformat(),))
+                if len(rows) >= batch_size:
+                    exported['questions'] += _flush_rows('questions', rows, question_fields, batch_id)
+                    rows = []
+            exported['questions'] += _flush_rows('questions', rows, question_fields, batch_id)
+
+            watermarks['sessions_completed_at'] = upper.isoformat()
+
+        # Leaderboard entries (rank is recomputed on every completion, so it is not exported)
+        leaderboard_fields = (
+            'id', 'user_id', 'quiz_session_id', 'topic', 'score', 'correct_count',
+            'total_questions', 'time_taken', 'avg_difficulty_weight', 'timestamp', 'dt'
+        )
+        last_leaderboard_id = watermarks.get('leaderboard_id', 0)
+        leaderboard_query = db.session.query(
+            QuizLeaderboard.id, QuizLeaderboard.user_id, QuizLeaderboard.quiz_session_id,
+            QuizLeaderboard.topic, QuizLeaderboard.score, QuizLeaderboard.correct_count,
+            QuizLeaderboard.total_questions, QuizLeaderboard.time_taken,
+            QuizLeaderboard.avg_difficulty_weight, QuizLeaderboard.timestamp
+        ).filter(
+            QuizLeaderboard.id > last_leaderboard_id,
+            QuizLeaderboard.timestamp <= upper_limit
+        ).order_by(QuizLeaderboard.id).yield_per(batch_size)
+
+        rows = []
+        for row in leaderboard_query:
+            rows.append(tuple(row) + ((row.timestamp or started).date().isoformat(),))
+            last_leaderboard_id = row.id
+            if len(rows) >= batch_size:
+                exported['quiz_leaderboard'] += _flush_rows('quiz_leaderboard', rows, leaderboard_fields, batch_id)
+                rows = []
+        exported['quiz_leaderboard'] += _flush_rows('quiz_leaderboard', rows, leaderboard_fields, batch_id)
+        watermarks['leaderboard_id'] = last_leaderboard_id
+
+        watermarks['last_export_at'] = datetime.now().isoformat()
+        # Commit point: from here on the batch is published, by this run or the next
+        watermarks['pending_batch'] = batch_id
+        _save_watermarks(watermarks)
+        _publish_staged(batch_id)
+        del watermarks['pending_batch']
+        _save_watermarks(watermarks)
+
+        duration = (datetime.now() - started).total_seconds()
+        logger.info(f"📦 Columnar export finished in {duration:.2f}s: {exported}")
+
+        return {
+            'success': True,
+            'exported': exported,
+            'watermarks': watermarks,
+            'duration_seconds': round(duration, 3)
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Columnar export failed: {e}")
+        return {'success': False, 'error': str(e)}
+
+    finally:
+        _release_export_lock(lock_file)
+
+
+def _dataset_glob(table_name):
+    return os.path.join(EXPORT_DIR, table_name, '**', '*.parquet').replace('\\', '/')
+
+
+def _has_dataset(table_name):
+    path = os.path.join(EXPORT_DIR, table_name)
+    if not os.path.isdir(path):
+        return False
+    for _root, _dirs, files in os.walk(path):
+        if any(name.endswith('.parquet') for name in files):
+            return True
+    return False
+
+
+def _duckdb_fetch(sql, params=None):
+    """Run a query against the exported datasets with a short-lived connection"""
+    import duckdb
+    connection = duckdb.connect(database=':memory:')
+    try:
+        return connection.execute(sql, params or []).fetchall()
+    finally:
+        connection.close()
+
+
+def _scan(table_name):
+    return f"read_parquet('{_dataset_glob(table_name)}', hive_partitioning = true)"
+
+
+def _tail_filters():
+    """
+    SQL filters selecting the rows not yet covered by the columnar export.
+
+    Returns:
+        tuple: (use_columnar, filters) - without a usable export the SQL side
+        covers every completed session
+    """
+    if not is_columnar_available():
+        return False, []
+    return True, [QuizSession.completed_at > _sessions_watermark()]
+
+
+def get_completed_score_totals():
+    """
+    Sum and count of scores over all completed quizzes.
+
+    Exported history is aggregated in DuckDB; sessions completed after the
+    watermark are aggregated in SQL and merged, so results are never stale.
+
+    Returns:
+        tuple: (sum_of_scores, completed_count)
+    """
+    use_columnar, tail_filters = _tail_filters()
+    total, count = 0.0, 0
+
+    if use_columnar and _has_dataset('quiz_sessions'):
+        try:
+            exported_total, exported_count = _duckdb_fetch(
+                f"SELECT COALESCE(SUM(score_percentage), 0), COUNT(*) FROM {_scan('quiz_sessions')}"
+            )[0]
+            total += float(exported_total)
+            count += int(exported_count)
+        except Exception as e:
+            logger.error(f"❌ Columnar score query failed, falling back to SQL: {e}")
+            tail_filters = []
+
+    tail_total, tail_count = db.session.query(
+        func.coalesce(func.sum(QuizSession.score_percentage), 0),
+        func.count(QuizSession.id)
+    ).filter(QuizSession.status == 'completed', *tail_filters).one()
+
+    return total + float(tail_total or 0), count + int(tail_count or 0)
+
+
+def get_topic_aggregates(user_id):
+    """
+    Per-topic completed-quiz aggregates for a user.
+
+    Returns:
+        list: (topic, quiz_count, avg_score, total_correct, total_questions) rows
+    """
+    use_columnar, tail_filters = _tail_filters()
+    totals = {}
+
+    if use_columnar and _has_dataset('quiz_sessions'):
+        try:
+            exported = _duckdb_fetch(
+                f"""
+                SELECT topic, COUNT(*), SUM(score_percentage),
+                       SUM(correct_answers), SUM(total_questions)
+                FROM {_scan('quiz_sessions')}
+                WHERE user_id = ?
+                GROUP BY topic
+                """,
+                [user_id]
+            )
+            for topic, quiz_count, score_sum, correct, questions in exported:
+                totals[topic] = [int(quiz_count), float(score_sum or 0), int(correct or 0), int(questions or 0)]
+        except Exception as e:
+            logger.error(f"❌ Columnar topic aggregates failed for user {user_id}, falling back to SQL: {e}")
+            totals, tail_filters = {}, []
+
+    tail = db.session.query(
+        QuizSession.topic,
+        func.count(QuizSession.id),
+        func.sum(QuizSession.score_percentage),
+        func.sum(QuizSession.correct_answers),
+        func.sum(QuizSession.total_questions)
+    ).filter(
+        QuizSession.user_id == user_id,
+        QuizSession.status == 'completed',
+        *tail_filters
+    ).group_by(QuizSession.topic).all()
+
+    for topic, quiz_count, score_sum, correct, questions in tail:
+        bucket = totals.setdefault(topic, [0, 0.0, 0, 0])
+        bucket[0] += int(quiz_count or 0)
+        bucket[1] += float(score_sum or 0)
+        bucket[2] += int(correct or 0)
+        bucket[3] += int(questions or 0)
+
+    return [
+        (topic, quiz_count, score_sum / quiz_count if quiz_count else 0.0, correct, questions)
+        for topic, (quiz_count, score_sum, correct, questions) in totals.items()
+    ]
+
+
+def get_question_aggregates(user_id, group_by):
+    """
+    Answered-question counts for a user, grouped by question_type or difficulty_level.
+
+    Exported questions are aggregated in DuckDB. Questions of sessions not
+    covered by the export (in progress, or completed after the watermark)
+    are aggregated in SQL and merged.
+
+    Returns:
+        list: (key, total, correct) rows
+    """
+    if group_by not in ('question_type', 'difficulty_level'):
+        raise ValueError(f"Unsupported question grouping: {group_by}")
+
+    totals = {}
+    tail_filters = []
+
+    if is_columnar_available() and _has_dataset('questions'):
+        try:
+            exported = _duckdb_fetch(
+                f"""
+                SELECT {group_by}, COUNT(*), SUM(CAST(is_correct AS INTEGER))
+                FROM {_scan('questions')}
+                WHERE user_id = ? AND is_correct IS NOT NULL
+                GROUP BY {group_by}
+                """,
+                [user_id]
+            )
+            for key, total, correct in exported:
+                totals[key] = [int(total), int(correct or 0)]
+            tail_filters = [or_(
+                QuizSession.status != 'completed',
+                QuizSession.completed_at.is_(None),
+                QuizSession.completed_at > _sessions_watermark()
+            )]
+        except Exception as e:
+            logger.error(f"❌ Columnar question aggregates failed for user {user_id}, falling back to SQL: {e}")
+            totals = {}
+
+    column = getattr(Question, group_by)
+    tail = db.session.query(
+        column,
+        func.count(Question.id),
+        func.sum(func.cast(Question.is_correct, db.Integer))
+    ).join(QuizSession).filter(
+        QuizSession.user_id == user_id,
+        Question.is_correct.isnot(None),
+        *tail_filters
+    ).group_by(column).all()
+
+    for key, total, correct in tail:
+        bucket = totals.setdefault(key, [0, 0])
+        bucket[0] += int(total or 0)
+        bucket[1] += int(correct or 0)
+
+    return [(key, total, correct) for key, (total, correct) in totals.items()]
+
+
+def get_export_status():
+    """Describe the current export state for the admin dashboard"""
+    watermarks = _load_watermarks()
+    return {
+        'enabled': COLUMNAR_ENABLED,
+        'pyarrow_available': PYARROW_AVAILABLE,
+        'duckdb_available': DUCKDB_AVAILABLE,
+        'export_dir': EXPORT_DIR,
+        'sessions_watermark': watermarks.get('sessions_completed_at'),
+        'leaderboard_watermark': watermarks.get('leaderboard_id'),
+        'last_export_at': watermarks.get('last_export_at'),
+        'datasets': {name: _has_dataset(name) for name in EXPORTED_TABLES}
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.insert(0, os.path.dirname(__file__))
+    from app import app
+
+    with app.app_context():
+        result = export_incremental()
+        print(json.dumps(result, indent=2, default=str))
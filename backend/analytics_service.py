@@ -3,9 +3,12 @@ Analytics Service - Performance trends, insights, and recommendations
 Provides comprehensive learning analytics and progress tracking
 """
 
-from models import db, User, QuizSession, Question, PerformanceTrend, QuizLeaderboard
+from models import db, User, QuizSession, Question, PerformanceTrend, QuizLeaderboard, UserQuestionStat
+import analytics_export_service
+import db_dialect
 from datetime import datetime, timedelta, date
 from sqlalchemy import func, and_
+from sqlalchemy.exc import IntegrityError
 import json
 import logging
 
@@ -53,6 +56,11 @@ def update_performance_trend(user_id, quiz_session_id):
         )
         db.session.add(topic_trend)
     
+    # Difficulty counts for this quiz (same for both trends)
+    difficulty_counts = dict(db.session.query(
+        func.lower(Question.difficulty_level), func.count(Question.id)
+    ).filter(Question.quiz_session_id == quiz_session_id).group_by(func.lower(Question.difficulty_level)).all())
+    
     # Update metrics for both trends
     for trend in [overall_trend, topic_trend]:
         trend.quizzes_completed += 1
@@ -72,16 +80,12 @@ def update_performance_trend(user_id, quiz_session_id):
                     (trend.avg_time_per_question * (total_quizzes - 1) + avg_time) / total_quizzes
                 )
         
-        # Update difficulty distribution
-        questions = Question.query.filter_by(quiz_session_id=quiz_session_id).all()
-        difficulty_dist = json.loads(trend.difficulty_distribution) if trend.difficulty_distribution else {'easy': 0, 'medium': 0, 'hard': 0}
-        
-        for q in questions:
-            diff_key = q.difficulty_level.lower()
-            if diff_key in difficulty_dist:
-                difficulty_dist[diff_key] += 1
-        
-        trend.difficulty_distribution = json.dumps(difficulty_dist)
+        # Update difficulty distribution (folds any legacy JSON counts into the typed columns)
+        distribution = trend.get_difficulty_distribution()
+        trend.easy_questions = distribution['easy'] + difficulty_counts.get('easy', 0)
+        trend.medium_questions = distribution['medium'] + difficulty_counts.get('medium', 0)
+        trend.hard_questions = distribution['hard'] + difficulty_counts.get('hard', 0)
+        trend.difficulty_distribution = None
         trend.updated_at = datetime.utcnow()
     
     # Update streak
@@ -128,7 +132,7 @@ def get_performance_trends(user_id, days=30, topic=None):
     query = QuizSession.query.filter(
         QuizSession.user_id == user_id,
         QuizSession.status == 'completed',
-        func.date(QuizSession.completed_at) >= start_date
+        db_dialect.since_day(QuizSession.completed_at, start_date)
     )
     
     if topic:
@@ -205,17 +209,8 @@ def get_topic_mastery_analysis(user_id):
     Analyze user's mastery across different topics
     Returns heatmap data for topic performance
     """
-    # Get all topics user has attempted
-    topic_sessions = db.session.query(
-        QuizSession.topic,
-        func.count(QuizSession.id).label('quiz_count'),
-        func.avg(QuizSession.score_percentage).label('avg_score'),
-        func.sum(QuizSession.correct_answers).label('total_correct'),
-        func.sum(QuizSession.total_questions).label('total_questions')
-    ).filter_by(
-        user_id=user_id,
-        status='completed'
-    ).group_by(QuizSession.topic).all()
+    # Get all topics user has attempted (columnar engine for exported history)
+    topic_sessions = analytics_export_service.get_topic_aggregates(user_id)
     
     mastery_data = []
     
@@ -427,16 +422,8 @@ def get_strength_weakness_analysis(user_id):
     # Get topic mastery
     topic_mastery = get_topic_mastery_analysis(user_id)
     
-    # Analyze question types
-    from models import Question
-    question_stats = db.session.query(
-        Question.question_type,
-        func.count(Question.id).label('total'),
-        func.sum(func.cast(Question.is_correct, db.Integer)).label('correct')
-    ).join(QuizSession).filter(
-        QuizSession.user_id == user_id,
-        Question.is_correct.isnot(None)
-    ).group_by(Question.question_type).all()
+    # Analyze question types (exported history from the columnar datasets)
+    question_stats = analytics_export_service.get_question_aggregates(user_id, 'question_type')
     
     question_type_performance = []
     for q_type, total, correct in question_stats:
@@ -449,14 +436,7 @@ def get_strength_weakness_analysis(user_id):
         })
     
     # Analyze difficulty levels
-    difficulty_stats = db.session.query(
-        Question.difficulty_level,
-        func.count(Question.id).label('total'),
-        func.sum(func.cast(Question.is_correct, db.Integer)).label('correct')
-    ).join(QuizSession).filter(
-        QuizSession.user_id == user_id,
-        Question.is_correct.isnot(None)
-    ).group_by(Question.difficulty_level).all()
+    difficulty_stats = analytics_export_service.get_question_aggregates(user_id, 'difficulty_level')
     
     difficulty_performance = []
     for diff, total, correct in difficulty_stats:
@@ -512,3 +492,249 @@ def get_strength_weakness_analysis(user_id):
         'difficulty_performance': difficulty_performance,
         'recommendations': recommendations
     }
+
+
+# ==================== QUESTION ANALYTICS CUBE ====================
+
+# Normalization happens once when a cell is written, never at read time
+QUESTION_TYPE_KEYS = {
+    'mcq': 'mcq',
+    'multiple_choice': 'mcq',
+    'multiple choice': 'mcq',
+    'true/false': 'true_false',
+    'true_false': 'true_false',
+    'short answer': 'short_answer',
+    'short_answer': 'short_answer'
+}
+
+DIFFICULTY_KEYS = {
+    'beginner': 'easy',
+    'easy': 'easy',
+    'intermediate': 'medium',
+    'medium': 'medium',
+    'advanced': 'hard',
+    'hard': 'hard'
+}
+
+
+def normalize_question_type(question_type):
+    """Map raw question_type strings onto cube keys"""
+    return QUESTION_TYPE_KEYS.get((question_type or '').strip().lower(), 'other')
+
+
+def normalize_difficulty(difficulty_level):
+    """Map raw difficulty strings onto cube keys (unknown -> medium)"""
+    return DIFFICULTY_KEYS.get((difficulty_level or '').strip().lower(), 'medium')
+
+
+def record_session_in_cube(quiz_session):
+    """
+    Add a just-completed quiz's answered questions to the user's analytics cube.
+
+    The cube covers completed quizzes only, dated by their completion day, so
+    it slices the same questions as get_quiz_analytics' total_questions. Must
+    run inside the completing transaction (before commit) so the cube never
+    drifts from the answers table.
+    """
+    answered = db.session.query(
+        Question.question_type,
+        Question.difficulty_level,
+        func.count(Question.id),
+        func.sum(func.cast(Question.is_correct, db.Integer))
+    ).filter(
+        Question.quiz_session_id == quiz_session.id,
+        Question.user_answer.isnot(None)
+    ).group_by(Question.question_type, Question.difficulty_level).all()
+
+    counts = {}
+    for question_type, difficulty_level, total, correct in answered:
+        key = (normalize_question_type(question_type), normalize_difficulty(difficulty_level))
+        bucket = counts.setdefault(key, [0, 0])
+        bucket[0] += int(total or 0)
+        bucket[1] += int(correct or 0)
+
+    day = (quiz_session.completed_at or datetime.now()).date()
+    for (question_type, difficulty), (total, correct) in counts.items():
+        _add_to_cube_cell({
+            'user_id': quiz_session.user_id,
+            'question_type': question_type,
+            'difficulty': difficulty,
+            'topic': quiz_session.topic,
+            'day': day
+        }, total, correct)
+
+
+def _add_to_cube_cell(cell, total, correct):
+    def _increment():
+        return UserQuestionStat.query.filter_by(**cell).update({
+            UserQuestionStat.total: UserQuestionStat.total + total,
+            UserQuestionStat.correct: UserQuestionStat.correct + correct
+        }, synchronize_session=False)
+
+    if _increment():
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserQuestionStat(total=total, correct=correct, **cell))
+    except IntegrityError:
+        # Another request created the cell concurrently - increment it instead
+        _increment()
+
+
+def build_question_cube(user_id=None, chunk_size=100000):
+    """
+    Rebuild the analytics cube from the questions table.
+
+    Answered questions of completed quizzes (by completion day) are streamed in chunks and grouped with NumPy:
+    raw strings are normalized once per distinct value, then every
+    (user, type, difficulty, topic, day) cell is counted with bincount.
+
+    Args:
+        user_id: Rebuild a single user's cube (None = everyone)
+        chunk_size: Rows fetched per round trip
+
+    Returns:
+        int: Number of cube cells written
+    """
+    query = db.session.query(
+        QuizSession.user_id,
+        Question.question_type,
+        Question.difficulty_level,
+        QuizSession.topic,
+        QuizSession.completed_at,
+        Question.is_correct
+    ).join(QuizSession).filter(
+        QuizSession.status == 'completed',
+        Question.user_answer.isnot(None)
+    )
+
+    if user_id is not None:
+        query = query.filter(QuizSession.user_id == user_id)
+
+    user_ids, types, difficulties, topics, days, correct = [], [], [], [], [], []
+    for row in query.yield_per(chunk_size):
+        user_ids.append(row[0])
+        types.append(row[1] or '')
+        difficulties.append(row[2] or '')
+        topics.append(row[3] or '')
+        days.append((row[4] or datetime.now()).date().toordinal())
+        correct.append(1 if row[5] else 0)
+
+    cells = []
+    if user_ids:
+        import numpy as np  # only the cube build needs numpy; keep it off the import path
+        user_arr = np.asarray(user_ids, dtype=np.int64)
+        day_arr = np.asarray(days, dtype=np.int64)
+        correct_arr = np.asarray(correct, dtype=np.int64)
+
+        # Normalize each distinct raw value once, then broadcast via inverse indices
+        type_raw, type_inv = np.unique(np.asarray(types, dtype=object).astype(str), return_inverse=True)
+        type_keys, type_codes = np.unique(
+            [normalize_question_type(t) for t in type_raw], return_inverse=True
+        )
+        type_arr = type_codes[type_inv]
+
+        diff_raw, diff_inv = np.unique(np.asarray(difficulties, dtype=object).astype(str), return_inverse=True)
+        diff_keys, diff_codes = np.unique(
+            [normalize_difficulty(d) for d in diff_raw], return_inverse=True
+        )
+        diff_arr = diff_codes[diff_inv]
+
+        topic_keys, topic_arr = np.unique(np.asarray(topics, dtype=object).astype(str), return_inverse=True)
+
+        # Group by the composite key and aggregate with bincount
+        keys = np.stack([user_arr, type_arr, diff_arr, topic_arr, day_arr], axis=1)
+        unique_keys, group_index = np.unique(keys, axis=0, return_inverse=True)
+        group_index = group_index.reshape(-1)
+        totals = np.bincount(group_index)
+        corrects = np.bincount(group_index, weights=correct_arr).astype(np.int64)
+
+        for (uid, t_code, d_code, topic_code, day), total, right in zip(unique_keys, totals, corrects):
+            cells.append({
+                'user_id': int(uid),
+                'question_type': str(type_keys[t_code]),
+                'difficulty': str(diff_keys[d_code]),
+                'topic': str(topic_keys[topic_code]),
+                'day': date.fromordinal(int(day)),
+                'total': int(total),
+                'correct': int(right)
+            })
+
+    try:
+        delete_query = UserQuestionStat.query
+        if user_id is not None:
+            delete_query = delete_query.filter_by(user_id=user_id)
+        delete_query.delete(synchronize_session=False)
+
+        if cells:
+            db.session.bulk_insert_mappings(UserQuestionStat, cells)
+        db.session.commit()
+        logger.info(f"✅ Built question analytics cube: {len(cells)} cells" +
+                    (f" (user {user_id})" if user_id is not None else ""))
+        return len(cells)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Failed to build question analytics cube: {e}")
+        raise
+
+
+def get_question_cube_slice(user_id, topic=None, days=None):
+    """
+    Slice the user's cube into question-type and difficulty performance.
+    The cube covers answered questions of completed quizzes.
+
+    Args:
+        user_id: User ID
+        topic: Optional topic filter
+        days: Optional lookback window in days (by quiz completion day)
+
+    Returns:
+        dict: question_type_performance, difficulty_analysis and totals
+    """
+
+    query = db.session.query(
+        UserQuestionStat.question_type,
+        UserQuestionStat.difficulty,
+        func.sum(UserQuestionStat.total),
+        func.sum(UserQuestionStat.correct)
+    ).filter(UserQuestionStat.user_id == user_id)
+
+    if topic:
+        query = query.filter(UserQuestionStat.topic == topic)
+    if days:
+        query = query.filter(UserQuestionStat.day >= date.today() - timedelta(days=days))
+
+    cells = query.group_by(UserQuestionStat.question_type, UserQuestionStat.difficulty).all()
+
+    question_type_stats = {
+        key: {'total': 0, 'correct': 0, 'accuracy': 0}
+        for key in ('mcq', 'true_false', 'short_answer')
+    }
+    difficulty_stats = {
+        key: {'total': 0, 'correct': 0, 'accuracy': 0}
+        for key in ('easy', 'medium', 'hard')
+    }
+
+    total_answered = 0
+    total_correct = 0
+    for question_type, difficulty, total, correct in cells:
+        total, correct = int(total or 0), int(correct or 0)
+        total_answered += total
+        total_correct += correct
+        if question_type in question_type_stats:
+            question_type_stats[question_type]['total'] += total
+            question_type_stats[question_type]['correct'] += correct
+        difficulty_stats[difficulty]['total'] += total
+        difficulty_stats[difficulty]['correct'] += correct
+
+    for stats in list(question_type_stats.values()) + list(difficulty_stats.values()):
+        if stats['total'] > 0:
+            stats['accuracy'] = float(stats['correct'] / stats['total'] * 100)
+
+    return {
+        'question_type_performance': question_type_stats,
+        'difficulty_analysis': difficulty_stats,
+        'total_answered': total_answered,
+        'total_correct': total_correct
+    }
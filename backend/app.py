@@ -1,7 +1,12 @@
-from flask import Flask, request, jsonify, send_file
+# eventlet/gevent Socket.IO modes must patch the stdlib before anything else is imported
+import socketio_config
+socketio_config.monkey_patch()
+
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_jwt_extended import decode_token
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from datetime import datetime, timedelta
 import os
@@ -53,12 +58,11 @@ print("✅ All required environment variables validated")
 from models import (
     db, User, QuizSession, Question, Topic, QuizLeaderboard,
     Badge, UserBadge, PerformanceTrend, LearningPath, LearningMilestone,
-    MultiplayerRoom, MultiplayerParticipant, PasswordResetToken, EmailVerificationToken
+    MultiplayerRoom, MultiplayerParticipant, PasswordResetToken, EmailVerificationToken,
+    UserQuestionStat
 )
 from auth import init_jwt, generate_tokens, auth_required
-from question_gen import question_generator
-from content_processor import ContentProcessor
-from email_service import email_service, test_email_service
+from content_processor import get_content_processor, MAX_UPLOAD_BYTES
 
 # Import error handling system
 from error_handler import (
@@ -68,12 +72,29 @@ from error_handler import (
 
 # Import leaderboard service
 import leaderboard_service
+import leaderboard_broadcast
 
 # Import badge and analytics services
 import badge_service
 import analytics_service
 import learning_path_service
 import multiplayer_service
+import multiplayer_engine
+import multiplayer_lobby
+import maintenance_scheduler
+import extraction_cache
+import analytics_export_service
+import quiz_history_service
+import serialization
+import db_config
+import db_dialect
+import db_routing
+import startup
+
+# question_gen (and the generator) load on first use or in the startup warm-up (startup.py)
+question_generator = startup.lazy_import('question_gen', 'question_generator', 'question generator')
+# email_service (smtplib, email.mime) likewise
+email_service = startup.lazy_import('email_service', 'email_service', 'email service')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -228,12 +249,19 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Pool sizing + SQLite production profile (WAL, busy timeout, mmap, ...)
+    db_config.configure_app(app, database_uri)
+    
+    # Optional read replica for @read_only routes (DATABASE_REPLICA_URL)
+    db_routing.configure_app(app)
+    
     logger.info(f"🗄️  Database URI: {database_uri}")
     logger.info(f"📍 Database file location: {db_path}")
     logger.info(f"📂 Database exists: {os.path.exists(db_path)}")
     
     # File upload configuration
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Same limit as ContentProcessor's file validation, plus room for the other form fields
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
     
     # Ensure upload directory exists
@@ -241,6 +269,11 @@ def create_app():
     
     # Initialize extensions
     db.init_app(app)
+    db_config.init_engine(app, db)
+    db_routing.init_app(app, db)
+    
+    # Fast JSON (orjson when installed) + gzip/brotli for large responses
+    serialization.init_app(app)
     
     # Configure CORS - Allow frontend to communicate with backend
     # In production, replace with your actual frontend URL
@@ -264,9 +297,10 @@ def create_app():
     app.config['WTF_CSRF_SSL_STRICT'] = False  # Allow for development
     
     # Initialize SocketIO with CORS support and error handling
+    # Async mode + optional message queue for multi-worker deployments (socketio_config.py)
     socketio = SocketIO(app, 
                        cors_allowed_origins=cors_origins,
-                       async_mode='threading',
+                       **socketio_config.get_socketio_options(),
                        logger=False,
                        engineio_logger=False,
                        ping_interval=25,
@@ -275,6 +309,18 @@ def create_app():
                        transports=['websocket', 'polling'],
                        allow_upgrades=True)
     
+    # Coalesced leaderboard rank-delta broadcasts
+    leaderboard_broadcast.init_app(app, socketio)
+    
+    # Server-authoritative multiplayer rooms (in-memory state, DB checkpoints)
+    multiplayer_engine.init_app(app, socketio)
+    
+    # Open-room registry and lobby listings pushed to subscribers
+    multiplayer_lobby.init_app(app, socketio)
+    
+    # Off-peak cleanup jobs (one worker per job via a database lease)
+    maintenance_scheduler.init_app(app, socketio)
+    
     init_jwt(app)
     
     # CSRF Token endpoint
@@ -285,11 +331,12 @@ def create_app():
         return jsonify({'csrf_token': token}), 200
     
     # Create tables and initialize database
-    with app.app_context():
-        initialize_database()
-        
-        # Initialize adaptive quiz engine
-        setattr(app, 'adaptive_engine', question_generator.adaptive_engine)
+    # FAST_START workers skip this; run `python startup.py init-db` once before they start
+    if startup.FAST_START:
+        logger.info("⚡ FAST_START: skipping database initialization")
+    else:
+        with app.app_context():
+            initialize_database()
     
     return app, socketio
 
@@ -349,6 +396,39 @@ def initialize_database():
             import traceback
             traceback.print_exc()
         
+        # Indexes added to existing tables are not created by create_all()
+        try:
+            for index in list(QuizSession.__table__.indexes) + list(Question.__table__.indexes):
+                index.create(db.engine, checkfirst=True)
+        except Exception as index_error:
+            logger.warning(f"Could not verify indexes: {index_error}")
+        
+        # Typed columns replacing legacy JSON (data is moved by migrate_typed_columns.py)
+        try:
+            import migrate_typed_columns
+            added_columns = migrate_typed_columns.add_trend_columns()
+            if added_columns:
+                logger.info(f"✅ Added performance_trends columns: {', '.join(added_columns)}")
+        except Exception as column_error:
+            logger.warning(f"Could not add typed columns: {column_error}")
+        
+        # Multiplayer game-state columns (migrate_multiplayer.py)
+        try:
+            import migrate_multiplayer
+            added_columns = migrate_multiplayer.add_multiplayer_columns()
+            if added_columns:
+                logger.info(f"✅ Added multiplayer columns: {', '.join(added_columns)}")
+        except Exception as column_error:
+            logger.warning(f"Could not add multiplayer columns: {column_error}")
+        
+        # Backfill the question analytics cube for databases that predate it
+        try:
+            if UserQuestionStat.query.count() == 0 and Question.query.filter(Question.user_answer.isnot(None)).count() > 0:
+                logger.info("🧊 Building question analytics cube from existing answers...")
+                analytics_service.build_question_cube()
+        except Exception as cube_init_error:
+            logger.warning(f"Could not build question analytics cube: {cube_init_error}")
+        
         logger.info("✅ Database initialization complete")
         
     except Exception as e:
@@ -460,9 +540,16 @@ app, socketio = create_app()
 
 # WebSocket Event Handlers
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle client connection"""
     try:
+        # Multiplayer events act as the user from the handshake token, never a user_id in the payload
+        token = (auth or {}).get('token')
+        if token:
+            try:
+                multiplayer_engine.register_connection(request.sid, int(decode_token(token)['sub']))  # type: ignore
+            except Exception as token_error:
+                logger.warning(f"WebSocket token rejected: {token_error}")  # type: ignore
         logger.info(f"WebSocket client connected")  # type: ignore
         emit('connection_established', {
             'status': 'connected',
@@ -477,6 +564,7 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection"""
     try:
+        multiplayer_engine.unregister_connection(request.sid)  # type: ignore
         logger.info(f"WebSocket client disconnected")  # type: ignore
     except Exception as e:
         logger.error(f"WebSocket disconnect error: {e}")  # type: ignore
@@ -528,6 +616,10 @@ def handle_multiplayer_join(data):
             'room_code': room_code,
             'timestamp': datetime.now().isoformat()
         })
+        
+        # Late joiners and reconnects get the sealed bundle and the open round's tick
+        for event, payload in multiplayer_engine.sync_payloads(room_code):
+            emit(event, payload)
 
 
 @socketio.on('multiplayer:leave_room')
@@ -544,91 +636,76 @@ def handle_multiplayer_leave(data):
         })
 
 
+@socketio.on('multiplayer:subscribe_lobby')
+def handle_multiplayer_subscribe_lobby(data):
+    """Receive lobby listings for a topic (or all topics) as rooms change"""
+    topic = (data or {}).get('topic')
+    join_room(multiplayer_lobby.lobby_channel(topic))
+    rooms = multiplayer_lobby.list_rooms(topic)
+    emit('multiplayer:lobby_update', {
+        'topic': topic,
+        'rooms': rooms,
+        'total': len(rooms),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@socketio.on('multiplayer:unsubscribe_lobby')
+def handle_multiplayer_unsubscribe_lobby(data):
+    """Stop receiving lobby listings"""
+    leave_room(multiplayer_lobby.lobby_channel((data or {}).get('topic')))
+
+
 @socketio.on('multiplayer:answer_submit')
 def handle_multiplayer_answer(data):
-    """Handle answer submission in multiplayer game"""
+    """Grade an answer on the server; scores and rank deltas are broadcast by the engine"""
     try:
-        room_code = data.get('room_code')
-        user_id = data.get('user_id')
-        question_index = data.get('question_index')
-        user_answer = data.get('user_answer')
-        time_taken = data.get('time_taken', 0)
-        is_correct = data.get('is_correct', False)
-        points_earned = data.get('points_earned', 0)
-        
-        # Update participant score
-        from models import MultiplayerRoom
-        room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+        user_id = multiplayer_engine.user_for(request.sid)  # type: ignore
+        if user_id is None:
+            emit('error', {'message': 'Authentication required'})
+            return
+        
+        result, message = multiplayer_engine.submit_answer(
+            data.get('room_code'),
+            user_id,
+            data.get('question_index'),
+            data.get('user_answer')
+        )
         
-        if room:
-            participant = multiplayer_service.update_participant_score(
-                room.id,
-                user_id,
-                points_earned,
-                is_correct
-            )
-            
-            if participant:
-                # Broadcast updated scores to all players
-                emit('multiplayer:score_update', {
-                    'room_code': room_code,
-                    'user_id': user_id,
-                    'score': participant.score,
-                    'rank': participant.rank,
-                    'correct_answers': participant.correct_answers,
-                    'timestamp': datetime.now().isoformat()
-                }, to=f'multiplayer_{room_code}')
-                
-                logger.info(f"Updated score for user {user_id} in room {room_code}: {points_earned} points")
+        if result:
+            emit('multiplayer:answer_result', result)
+        else:
+            emit('error', {'message': message})
         
     except Exception as e:
         logger.error(f"Error handling multiplayer answer: {e}")
-        emit('error', {'message': 'Failed to update score'})
+        emit('error', {'message': 'Failed to submit answer'})
 
 
-@socketio.on('multiplayer:next_question')
-def handle_multiplayer_next_question(data):
-    """Broadcast next question to all players"""
-    try:
-        room_code = data.get('room_code')
-        question_index = data.get('question_index')
-        question_data = data.get('question')
-        
-        # Emit to all players in room
-        emit('multiplayer:question_sync', {
-            'room_code': room_code,
-            'question_index': question_index,
-            'question': question_data,
-            'timestamp': datetime.now().isoformat()
-        }, to=f'multiplayer_{room_code}')
-        
-        logger.info(f"Broadcasting question {question_index} to room {room_code}")
-        
-    except Exception as e:
-        logger.error(f"Error broadcasting next question: {e}")
+@socketio.on('multiplayer:clock_sync')
+def handle_multiplayer_clock_sync(data):
+    """Clock-offset probe (acknowledged with the server time) for round reveal scheduling"""
+    return multiplayer_engine.clock_sample(
+        multiplayer_engine.user_for(request.sid),  # type: ignore
+        data or {}
+    )
 
 
 @socketio.on('multiplayer:game_end')
 def handle_multiplayer_game_end(data):
-    """Handle game completion"""
+    """End the game early (host only); games also end after their last round"""
     try:
         room_code = data.get('room_code')
         
-        # Move to next question which will mark as completed if last question
-        room = multiplayer_service.next_question(room_code)
+        results, message = multiplayer_engine.end_game(
+            room_code,
+            multiplayer_engine.user_for(request.sid)  # type: ignore
+        )
         
-        if room and room.status == 'completed':
-            # Get final results
-            results = multiplayer_service.get_game_results(room_code)
-            
-            # Broadcast final results to all players
-            emit('multiplayer:game_ended', {
-                'room_code': room_code,
-                'results': results,
-                'timestamp': datetime.now().isoformat()
-            }, to=f'multiplayer_{room_code}')
-            
+        if results:
             logger.info(f"Game ended in room {room_code}")
+        else:
+            emit('error', {'message': message})
         
     except Exception as e:
         logger.error(f"Error ending multiplayer game: {e}")
@@ -722,8 +799,10 @@ def detailed_health_check():
             'message': 'Smart Quizzer detailed health check',
             'timestamp': datetime.now().isoformat(),
             'services': service_health,
+            'startup': startup.get_status(),
             'database': {
-                'status': 'connected' if db.engine.connect() else 'disconnected'
+                'status': 'connected' if db.engine.connect() else 'disconnected',
+                'replica': db_routing.get_status()
             }
         }), 200
         
@@ -1012,7 +1091,7 @@ def login():
             total_score = sum([qs.score_percentage for qs in user.quiz_sessions if qs.status == 'completed'])
             avg_score = total_score / completed_quizzes
         
-        user_dict = user.to_dict()
+        user_dict = user.to_dict(quiz_count=total_quizzes)
         user_dict.update({
             'total_quizzes': total_quizzes,
             'completed_quizzes': completed_quizzes,
@@ -1089,7 +1168,7 @@ def get_profile(current_user_id):
             total_score = sum([qs.score_percentage for qs in user.quiz_sessions if qs.status == 'completed'])
             avg_score = total_score / completed_quizzes
         
-        profile_data = user.to_dict()
+        profile_data = user.to_dict(quiz_count=total_quizzes)
         profile_data.update({
             'total_quizzes': total_quizzes,
             'completed_quizzes': completed_quizzes,
@@ -1386,9 +1465,6 @@ def forgot_password():
                 'user_exists': False
             }), 200
         
-        # Clean up expired tokens
-        PasswordResetToken.cleanup_expired()
-        
         # Generate secure reset token
         import secrets
         reset_token = secrets.token_urlsafe(32)
@@ -1485,9 +1561,6 @@ def verify_reset_token():
         
         token = data['token']
         
-        # Clean up expired tokens first
-        PasswordResetToken.cleanup_expired()
-        
         # Find valid token
         reset_token_record = PasswordResetToken.query.filter_by(
             token=token,
@@ -1540,9 +1613,6 @@ def reset_password():
             print(f"⚠️ Password reset failed: {password_message}")
             return jsonify({'error': password_message}), 400
         
-        # Clean up expired tokens
-        PasswordResetToken.cleanup_expired()
-        
         # Find valid token
         reset_token_record = PasswordResetToken.query.filter_by(
             token=token,
@@ -1672,6 +1742,7 @@ def get_email_status(current_user_id):
 
 # Topic Routes
 @app.route('/api/topics', methods=['GET'])
+@db_routing.read_only
 def get_topics():
     try:
         topics = Topic.query.filter_by(is_active=True).all()
@@ -1679,271 +1750,314 @@ def get_topics():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/quiz/start', methods=['POST'])# type: ignore
-@auth_required
-@handle_errors
-def start_quiz(current_user_id):
-    try:
-        print(f"🎯 Quiz start request received for user {current_user_id}")
-        data = request.get_json()
-        print(f"📥 Request data: {data}")
-        
-        # Rate limiting: Check quiz start attempts for this user
-        current_time = datetime.now().timestamp()
-        user_key = str(current_user_id)
-        print(f"🕐 Rate limiting check for user {user_key}")
-        
-        if user_key in quiz_start_attempts:
-            # Clean old attempts outside the window
-            quiz_start_attempts[user_key] = [
-                timestamp for timestamp in quiz_start_attempts[user_key]
-                if current_time - timestamp < QUIZ_START_WINDOW
-            ]
-            
-            # Check if too many attempts
-            if len(quiz_start_attempts[user_key]) >= MAX_QUIZ_START_ATTEMPTS:
-                return jsonify({
-                    'error': f'Too many quiz start requests. Please try again in {QUIZ_START_WINDOW // 60} minutes.',
-                    'retry_after': QUIZ_START_WINDOW,
-                    'rate_limited': True
-                }), 429
-        else:
-            quiz_start_attempts[user_key] = []
-        
-        # Record this attempt
-        quiz_start_attempts[user_key].append(current_time)
+def check_quiz_start_rate_limit(current_user_id):
+    """429 payload when the user started too many quizzes in the window, else None (records the attempt)"""
+    # Rate limiting: Check quiz start attempts for this user
+    current_time = datetime.now().timestamp()
+    user_key = str(current_user_id)
+    print(f"🕐 Rate limiting check for user {user_key}")
+    
+    if user_key in quiz_start_attempts:
+        # Clean old attempts outside the window
+        quiz_start_attempts[user_key] = [
+            timestamp for timestamp in quiz_start_attempts[user_key]
+            if current_time - timestamp < QUIZ_START_WINDOW
+        ]
         
-        # Auto-complete any existing active quiz sessions to allow starting new ones
-        active_quizzes = QuizSession.query.filter_by(
-            user_id=current_user_id,
-            status='active'
-        ).all()
+        # Check if too many attempts
+        if len(quiz_start_attempts[user_key]) >= MAX_QUIZ_START_ATTEMPTS:
+            return {
+                'error': f'Too many quiz start requests. Please try again in {QUIZ_START_WINDOW // 60} minutes.',
+                'retry_after': QUIZ_START_WINDOW,
+                'rate_limited': True
+            }
+    else:
+        quiz_start_attempts[user_key] = []
+    
+    # Record this attempt
+    quiz_start_attempts[user_key].append(current_time)
+    return None
+
+def open_quiz_session(current_user_id, data):
+    """
+    Validate a quiz start request, close the user's active quizzes and
+    create the new (empty) quiz session.
+    
+    Returns:
+        tuple: (quiz_session, topic, skill_level, num_questions, custom_topic)
+    """
+    # Auto-complete any existing active quiz sessions to allow starting new ones
+    active_quizzes = QuizSession.query.filter_by(
+        user_id=current_user_id,
+        status='active'
+    ).all()
+    
+    if active_quizzes:
+        print(f"🔄 Auto-completing {len(active_quizzes)} existing active quiz(es) for user {current_user_id}")
+        for active_quiz in active_quizzes:
+            active_quiz.status = 'completed'
+            active_quiz.completed_at = datetime.now()
+            analytics_service.record_session_in_cube(active_quiz)
+            print(f"   ✅ Completed quiz: {active_quiz.topic} (ID: {active_quiz.id})")
         
-        if active_quizzes:
-            print(f"🔄 Auto-completing {len(active_quizzes)} existing active quiz(es) for user {current_user_id}")
-            for active_quiz in active_quizzes:
-                active_quiz.status = 'completed'
-                active_quiz.completed_at = datetime.now()
-                print(f"   ✅ Completed quiz: {active_quiz.topic} (ID: {active_quiz.id})")
-            
-            try:
-                db.session.commit()
-                print(f"💾 Successfully auto-completed existing quizzes")
-            except Exception as e:
-                db.session.rollback()
-                print(f"❌ Error auto-completing quizzes: {e}")
-                # Continue anyway - don't block new quiz creation
-        
-        # Validate input parameters using comprehensive validation
-        validation_errors = InputValidator.validate_quiz_params(data)
-        if validation_errors:
-            error_messages = [error.message for error in validation_errors]
+        try:
+            db.session.commit()
+            print(f"💾 Successfully auto-completed existing quizzes")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error auto-completing quizzes: {e}")
+            # Continue anyway - don't block new quiz creation
+    
+    # Validate input parameters using comprehensive validation
+    validation_errors = InputValidator.validate_quiz_params(data)
+    if validation_errors:
+        error_messages = [error.message for error in validation_errors]
+        raise ValidationError(
+            message=f"Invalid request parameters: {'; '.join(error_messages)}",
+            field="request_data",
+            value=data,
+            validation_rule="comprehensive_validation"
+        )
+    
+    required_fields = ['topic', 'skill_level']
+    for field in required_fields:
+        if field not in data:
             raise ValidationError(
-                message=f"Invalid request parameters: {'; '.join(error_messages)}",
-                field="request_data",
-                value=data,
-                validation_rule="comprehensive_validation"
+                message=f"Required field '{field}' is missing",
+                field=field,
+                value=None,
+                validation_rule="required_field"
             )
-        
-        required_fields = ['topic', 'skill_level']
-        for field in required_fields:
-            if field not in data:
-                raise ValidationError(
-                    message=f"Required field '{field}' is missing",
-                    field=field,
-                    value=None,
-                    validation_rule="required_field"
-                )
-        
-        # Validate inputs
-        if data['skill_level'] not in ['Beginner', 'Intermediate', 'Advanced']:
-            raise ValidationError(
-                message="Invalid skill level",
-                field="skill_level",
-                value=data['skill_level'],
-                validation_rule="allowed_values=['Beginner', 'Intermediate', 'Advanced']"
+    
+    # Validate inputs
+    if data['skill_level'] not in ['Beginner', 'Intermediate', 'Advanced']:
+        raise ValidationError(
+            message="Invalid skill level",
+            field="skill_level",
+            value=data['skill_level'],
+            validation_rule="allowed_values=['Beginner', 'Intermediate', 'Advanced']"
+        )
+    
+    num_questions = data.get('num_questions', 5)
+    custom_topic = data.get('custom_topic')
+    topic = data['topic']
+    
+    # Enhanced validation for custom topics
+    if topic in ['Custom', 'Custom Topic'] and not custom_topic:
+        raise ValidationError(
+            message="Custom topic content is required when using custom topics",
+            field="custom_topic",
+            value=custom_topic,
+            validation_rule="required_when_topic_is_custom"
+        )
+    
+    if custom_topic and len(custom_topic.strip()) < 10:
+        raise ValidationError(
+            message="Custom topic content must be at least 10 characters long",
+            field="custom_topic",
+            value=custom_topic,
+            validation_rule="min_length=10"
+        )
+    
+    # Validate number of questions
+    if not isinstance(num_questions, int) or num_questions < 1 or num_questions > 20:
+        raise ValidationError(
+            message="Number of questions must be between 1 and 20",
+            field="num_questions",
+            value=num_questions,
+            validation_rule="range=1-20"
+        )
+    
+    print(f"🎯 Starting quiz for user {current_user_id}: {topic} ({data['skill_level']}) - {num_questions} questions")
+    if custom_topic:
+        print(f"📝 Custom topic content ({len(custom_topic)} chars): {custom_topic[:100]}...")
+        print(f"🔍 Is custom content detected: {len(custom_topic) > 100}")
+    else:
+        print(f"📚 Using predefined topic: {topic}")
+    
+    # Initialize adaptive profile for user
+    try:
+        adaptive_profile = question_generator.adaptive_engine.initialize_user_profile(
+            user_id=str(current_user_id), 
+            initial_skill_level=data['skill_level']
+        )
+    except Exception as e:
+        raise SmartQuizzerError(
+            message="Failed to initialize adaptive profile",
+            category=ErrorCategory.SYSTEM,
+            severity=ErrorSeverity.HIGH,
+            details={'user_id': current_user_id, 'original_error': str(e)},
+            user_message="Unable to set up personalized quiz system. Please try again."
+        )
+    
+    # Create quiz session
+    quiz_session = QuizSession(  # type: ignore
+        user_id=current_user_id,# type: ignore
+        topic=topic,# type: ignore
+        skill_level=data['skill_level'],# type: ignore
+        custom_topic=custom_topic,# type: ignore
+        total_questions=num_questions# type: ignore
+    )
+    
+    try:
+        db.session.add(quiz_session)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise SmartQuizzerError(
+            message="Failed to create quiz session",
+            category=ErrorCategory.DATABASE,
+            severity=ErrorSeverity.HIGH,
+            details={'original_error': str(e)},
+            user_message="Unable to start quiz session. Please try again."
+        )
+    
+    return quiz_session, topic, data['skill_level'], num_questions, custom_topic
+
+def quiz_generation_error(error, topic, skill_level):
+    """Error to raise when question generation for a new quiz failed or returned nothing"""
+    if error is None:
+        return SmartQuizzerError(
+            message="Question generation returned empty result",
+            category=ErrorCategory.AI_SERVICE,
+            severity=ErrorSeverity.HIGH,
+            details={'topic': topic, 'skill_level': skill_level},
+            user_message="Unable to generate quiz questions. Please try a different topic or try again later."
+        )
+    if isinstance(error, ValidationError):
+        return error  # Re-raise validation errors
+    if isinstance(error, AIServiceError):
+        print(f"❌ AI Service error: {error}")
+        retry_after = error.details.get('retry_after')
+        if retry_after is not None:
+            # Quota exhausted: tell the client how long to wait instead of "a few minutes"
+            return SmartQuizzerError(
+                message="AI question generation rate limited",
+                category=ErrorCategory.AI_SERVICE,
+                severity=ErrorSeverity.MEDIUM,
+                details={'ai_error': str(error), 'topic': topic, 'retry_after': retry_after},
+                user_message=f"Question generation is busy right now. Please try again in {retry_after} seconds."
             )
-        
-        num_questions = data.get('num_questions', 5)
-        custom_topic = data.get('custom_topic')
-        topic = data['topic']
-        
-        # Enhanced validation for custom topics
-        if topic in ['Custom', 'Custom Topic'] and not custom_topic:
-            raise ValidationError(
-                message="Custom topic content is required when using custom topics",
-                field="custom_topic",
-                value=custom_topic,
-                validation_rule="required_when_topic_is_custom"
+        return SmartQuizzerError(
+            message="AI question generation service failed",
+            category=ErrorCategory.AI_SERVICE,
+            severity=ErrorSeverity.HIGH,
+            details={'ai_error': str(error), 'topic': topic},
+            user_message="Question generation service is temporarily unavailable. Please try again in a few minutes."
+        )
+    print(f"❌ Unexpected question generation error: {error}")
+    return SmartQuizzerError(
+        message=f"Unexpected error during question generation: {str(error)}",
+        category=ErrorCategory.SYSTEM,
+        severity=ErrorSeverity.HIGH,
+        details={'original_error': str(error), 'topic': topic},
+        user_message="An unexpected error occurred while generating questions. Please try again."
+    )
+
+def save_quiz_questions(quiz_session_id, questions_data):
+    """Store generated questions for a new quiz and build the 201 response payload"""
+    quiz_session = db.session.get(QuizSession, quiz_session_id)
+    
+    # Save questions to database with error handling
+    try:
+        for q_data in questions_data:
+            question = Question(
+                quiz_session_id=quiz_session_id,
+                question_text=q_data['question_text'],
+                question_type=q_data['question_type'],
+                correct_answer=q_data['correct_answer'],
+                explanation=q_data['explanation'],
+                difficulty_level=q_data['difficulty_level']
             )
+            question.set_options(q_data.get('options', []))
+            db.session.add(question)
         
-        if custom_topic and len(custom_topic.strip()) < 10:
-            raise ValidationError(
-                message="Custom topic content must be at least 10 characters long",
-                field="custom_topic",
-                value=custom_topic,
-                validation_rule="min_length=10"
-            )
+        db.session.commit()
         
-        # Validate number of questions
-        if not isinstance(num_questions, int) or num_questions < 1 or num_questions > 20:
-            raise ValidationError(
-                message="Number of questions must be between 1 and 20",
-                field="num_questions",
-                value=num_questions,
-                validation_rule="range=1-20"
-            )
+    except Exception as db_error:
+        db.session.rollback()
+        print(f"❌ Database error saving questions: {db_error}")
+        raise SmartQuizzerError(
+            message="Failed to save generated questions",
+            category=ErrorCategory.DATABASE,
+            severity=ErrorSeverity.HIGH,
+            details={'original_error': str(db_error)},
+            user_message="Generated questions could not be saved. Please try again."
+        )
+    
+    # Return quiz session with questions (without correct answers)
+    try:
+        questions = Question.query.filter_by(quiz_session_id=quiz_session_id).all()
         
-        print(f"🎯 Starting quiz for user {current_user_id}: {topic} ({data['skill_level']}) - {num_questions} questions")
-        if custom_topic:
-            print(f"📝 Custom topic content ({len(custom_topic)} chars): {custom_topic[:100]}...")
-            print(f"🔍 Is custom content detected: {len(custom_topic) > 100}")
-        else:
-            print(f"📚 Using predefined topic: {topic}")
+        print(f"✅ Quiz started successfully with {len(questions)} questions")
         
-        # Initialize adaptive profile for user
-        try:
-            adaptive_profile = question_generator.adaptive_engine.initialize_user_profile(
-                user_id=str(current_user_id), 
-                initial_skill_level=data['skill_level']
-            )
-        except Exception as e:
-            raise SmartQuizzerError(
-                message="Failed to initialize adaptive profile",
-                category=ErrorCategory.SYSTEM,
-                severity=ErrorSeverity.HIGH,
-                details={'user_id': current_user_id, 'original_error': str(e)},
-                user_message="Unable to set up personalized quiz system. Please try again."
-            )
+        return {
+            'quiz_session': quiz_session.to_dict(),
+            'questions': [q.to_dict(include_correct_answer=False) for q in questions],
+            'success': True,
+            'message': f'Quiz started successfully with {len(questions)} questions'
+        }
         
-        # Create quiz session
-        quiz_session = QuizSession(  # type: ignore
-            user_id=current_user_id,# type: ignore
-            topic=topic,# type: ignore
-            skill_level=data['skill_level'],# type: ignore
-            custom_topic=custom_topic,# type: ignore
-            total_questions=num_questions# type: ignore
+    except Exception as response_error:
+        print(f"❌ Error preparing response: {response_error}")
+        raise SmartQuizzerError(
+            message="Failed to prepare quiz response",
+            category=ErrorCategory.SYSTEM,
+            severity=ErrorSeverity.MEDIUM,
+            details={'original_error': str(response_error)},
+            user_message="Quiz was created but there was an error loading it. Please refresh the page."
         )
+
+def unexpected_quiz_start_error(e):
+    print(f"❌ Unexpected quiz start error: {e}")
+    db.session.rollback()
+    return SmartQuizzerError(
+        message=f"Unexpected system error: {str(e)}",
+        category=ErrorCategory.SYSTEM,
+        severity=ErrorSeverity.CRITICAL,
+        details={'original_error': str(e), 'error_type': type(e).__name__},
+        user_message="An unexpected system error occurred. Please try again or contact support if the problem persists."
+    )
+
+@app.route('/api/quiz/start', methods=['POST'])# type: ignore
+@auth_required
+@handle_errors
+def start_quiz(current_user_id):
+    # Also served async by the ASGI sidecar (asgi_app.py) with the same helpers
+    try:
+        print(f"🎯 Quiz start request received for user {current_user_id}")
+        data = request.get_json()
+        print(f"📥 Request data: {data}")
         
-        try:
-            db.session.add(quiz_session)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            raise SmartQuizzerError(
-                message="Failed to create quiz session",
-                category=ErrorCategory.DATABASE,
-                severity=ErrorSeverity.HIGH,
-                details={'original_error': str(e)},
-                user_message="Unable to start quiz session. Please try again."
-            )
+        rate_limited = check_quiz_start_rate_limit(current_user_id)
+        if rate_limited:
+            return jsonify(rate_limited), 429
+        
+        quiz_session, topic, skill_level, num_questions, custom_topic = open_quiz_session(current_user_id, data)
         
         # Generate questions using AI with comprehensive error handling
         try:
             questions_data = question_generator.generate_quiz_questions(
                 topic=topic,
-                skill_level=data['skill_level'],
+                skill_level=skill_level,
                 num_questions=num_questions,
                 custom_topic=custom_topic,
                 user_id=current_user_id
             )
-            
-            if not questions_data or len(questions_data) == 0:
-                db.session.rollback()
-                raise SmartQuizzerError(
-                    message="Question generation returned empty result",
-                    category=ErrorCategory.AI_SERVICE,
-                    severity=ErrorSeverity.HIGH,
-                    details={'topic': topic, 'skill_level': data['skill_level']},
-                    user_message="Unable to generate quiz questions. Please try a different topic or try again later."
-                )
-                
-        except ValidationError:
-            db.session.rollback()
-            raise  # Re-raise validation errors
-        except AIServiceError as ai_error:
-            db.session.rollback()
-            print(f"❌ AI Service error: {ai_error}")
-            raise SmartQuizzerError(
-                message="AI question generation service failed",
-                category=ErrorCategory.AI_SERVICE,
-                severity=ErrorSeverity.HIGH,
-                details={'ai_error': str(ai_error), 'topic': topic},
-                user_message="Question generation service is temporarily unavailable. Please try again in a few minutes."
-            )
         except Exception as qgen_error:
             db.session.rollback()
-            print(f"❌ Unexpected question generation error: {qgen_error}")
-            raise SmartQuizzerError(
-                message=f"Unexpected error during question generation: {str(qgen_error)}",
-                category=ErrorCategory.SYSTEM,
-                severity=ErrorSeverity.HIGH,
-                details={'original_error': str(qgen_error), 'topic': topic},
-                user_message="An unexpected error occurred while generating questions. Please try again."
-            )
+            raise quiz_generation_error(qgen_error, topic, skill_level)
         
-        # Save questions to database with error handling
-        try:
-            for q_data in questions_data:
-                question = Question(
-                    quiz_session_id=quiz_session.id,
-                    question_text=q_data['question_text'],
-                    question_type=q_data['question_type'],
-                    correct_answer=q_data['correct_answer'],
-                    explanation=q_data['explanation'],
-                    difficulty_level=q_data['difficulty_level']
-                )
-                question.set_options(q_data.get('options', []))
-                db.session.add(question)
-            
-            db.session.commit()
-            
-        except Exception as db_error:
+        if not questions_data or len(questions_data) == 0:
             db.session.rollback()
-            print(f"❌ Database error saving questions: {db_error}")
-            raise SmartQuizzerError(
-                message="Failed to save generated questions",
-                category=ErrorCategory.DATABASE,
-                severity=ErrorSeverity.HIGH,
-                details={'original_error': str(db_error)},
-                user_message="Generated questions could not be saved. Please try again."
-            )
+            raise quiz_generation_error(None, topic, skill_level)
         
-        # Return quiz session with questions (without correct answers)
-        try:
-            questions = Question.query.filter_by(quiz_session_id=quiz_session.id).all()
-            
-            print(f"✅ Quiz started successfully with {len(questions)} questions")
-            
-            return jsonify({
-                'quiz_session': quiz_session.to_dict(),
-                'questions': [q.to_dict(include_correct_answer=False) for q in questions],
-                'success': True,
-                'message': f'Quiz started successfully with {len(questions)} questions'
-            }), 201
-            
-        except Exception as response_error:
-            print(f"❌ Error preparing response: {response_error}")
-            raise SmartQuizzerError(
-                message="Failed to prepare quiz response",
-                category=ErrorCategory.SYSTEM,
-                severity=ErrorSeverity.MEDIUM,
-                details={'original_error': str(response_error)},
-                user_message="Quiz was created but there was an error loading it. Please refresh the page."
-            )
+        return jsonify(save_quiz_questions(quiz_session.id, questions_data)), 201
         
     except (ValidationError, SmartQuizzerError, AIServiceError):
         raise  # Re-raise our custom errors to be handled by decorator
     except Exception as e:
-        print(f"❌ Unexpected quiz start error: {e}")
-        db.session.rollback()
-        raise SmartQuizzerError(
-            message=f"Unexpected system error: {str(e)}",
-            category=ErrorCategory.SYSTEM,
-            severity=ErrorSeverity.CRITICAL,
-            details={'original_error': str(e), 'error_type': type(e).__name__},
-            user_message="An unexpected system error occurred. Please try again or contact support if the problem persists."
-        )
+        raise unexpected_quiz_start_error(e)
 
 @app.route('/api/quiz/<int:quiz_id>/answer', methods=['POST'])
 @auth_required
@@ -2024,6 +2138,9 @@ def submit_answer(current_user_id, quiz_id):
             # Ensure minimum time if somehow it's 0
             if quiz_session.total_time_seconds == 0:
                 quiz_session.total_time_seconds = 1
+            
+            # Add the completed quiz to the analytics cube (same transaction)
+            analytics_service.record_session_in_cube(quiz_session)
         
         db.session.commit()
         
@@ -2035,12 +2152,7 @@ def submit_answer(current_user_id, quiz_id):
                 # Update leaderboard with WebSocket emit
                 leaderboard_entry = leaderboard_service.update_leaderboard_entry(
                     quiz_session_id=quiz_id,
-                    emit_event=lambda event, data, **kwargs: socketio.emit(
-                        event, 
-                        data,
-                        to=kwargs.pop('to', f"leaderboard_{quiz_session.topic}"),
-                        **kwargs
-                    )
+                    emit_event=socketio.emit
                 )
                 if leaderboard_entry:
                     logger.info(f"✅ Leaderboard updated for quiz {quiz_id}, rank: {leaderboard_entry.rank}")
@@ -2368,6 +2480,7 @@ def complete_quiz(current_user_id, quiz_id):
         # Calculate final statistics atomically
         quiz_session.status = 'completed'
         quiz_session.completed_at = datetime.now()
+        analytics_service.record_session_in_cube(quiz_session)
         
         # Calculate total time if not already set
         if quiz_session.total_time_seconds == 0:
@@ -2390,12 +2503,7 @@ def complete_quiz(current_user_id, quiz_id):
         try:
             leaderboard_entry = leaderboard_service.update_leaderboard_entry(
                 quiz_session_id=quiz_id,
-                emit_event=lambda event, data, **kwargs: socketio.emit(
-                    event,
-                    data,
-                    to=f"leaderboard_{quiz_session.topic}",  # type: ignore
-                    **kwargs
-                )
+                emit_event=socketio.emit
             )
             
             if leaderboard_entry:
@@ -2578,6 +2686,7 @@ def auto_submit_quiz(current_user_id, quiz_id):
         # Finalize quiz
         quiz_session.status = 'completed'
         quiz_session.completed_at = datetime.now()
+        analytics_service.record_session_in_cube(quiz_session)
         
         # Calculate final score
         quiz_session.calculate_score()
@@ -2596,12 +2705,7 @@ def auto_submit_quiz(current_user_id, quiz_id):
         try:
             leaderboard_entry = leaderboard_service.update_leaderboard_entry(
                 quiz_session_id=quiz_id,
-                emit_event=lambda event, data, **kwargs: socketio.emit(
-                    event,
-                    data,
-                    to=f"leaderboard_{quiz_session.topic}",  # type: ignore
-                    **kwargs
-                )
+                emit_event=socketio.emit
             )
         except Exception as lb_error:
             logger.error(f"❌ Leaderboard update error for auto-submitted quiz {quiz_id}: {lb_error}")
@@ -2715,107 +2819,73 @@ def api_next_question(current_user_id):
 
 @app.route('/api/quiz/history', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_quiz_history(current_user_id):
+    """
+    Quiz history, newest first.
+    
+    Query params:
+        after: Keyset cursor `<started_at>,<id>` (from next_cursor)
+        limit: Page size (max 200) - enables the paginated response shape
+        format: `ndjson` streams every session (one JSON object per line)
+    
+    Without any params the full history is returned as a JSON array.
+    """
     try:
-        quiz_sessions = QuizSession.query.filter_by(user_id=current_user_id).order_by(
-            QuizSession.started_at.desc()
-        ).all()
+        after = request.args.get('after')
+        limit = request.args.get('limit', type=int)
+        response_format = request.args.get('format', '').lower()
+        
+        try:
+            cursor = quiz_history_service.decode_cursor(after) if after else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if response_format == 'ndjson':
+            return Response(
+                stream_with_context(db_routing.read_only_stream(
+                    quiz_history_service.iter_history_ndjson(current_user_id, cursor)
+                )),
+                mimetype='application/x-ndjson'
+            )
         
-        return jsonify([qs.to_dict() for qs in quiz_sessions]), 200
+        if cursor is not None or limit is not None:
+            return jsonify(quiz_history_service.get_history_page(current_user_id, cursor, limit)), 200
+        
+        return jsonify(quiz_history_service.get_full_history(current_user_id)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/quiz/analytics', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_quiz_analytics(current_user_id):
     """Get detailed question analytics for the current user"""
     try:
-        # Get all quiz sessions for the user
-        quiz_sessions = QuizSession.query.filter_by(
-            user_id=current_user_id, 
-            status='completed'
-        ).all()
-        
-        # Get all questions from completed quizzes
-        all_questions = []
-        for session in quiz_sessions:
-            questions = Question.query.filter_by(quiz_session_id=session.id).all()
-            all_questions.extend(questions)
-        
-        # Calculate question type performance
-        question_type_stats = {
-            'mcq': {'total': 0, 'correct': 0, 'accuracy': 0},
-            'true_false': {'total': 0, 'correct': 0, 'accuracy': 0},
-            'short_answer': {'total': 0, 'correct': 0, 'accuracy': 0}
-        }
-        
-        # Calculate difficulty analysis
-        difficulty_stats = {
-            'easy': {'total': 0, 'correct': 0, 'accuracy': 0},
-            'medium': {'total': 0, 'correct': 0, 'accuracy': 0},
-            'hard': {'total': 0, 'correct': 0, 'accuracy': 0}
-        }
+        # Slice the precomputed analytics cube (no per-question work)
+        topic = request.args.get('topic')
+        days = request.args.get('days', type=int)
+        cube = analytics_service.get_question_cube_slice(current_user_id, topic=topic, days=days)
         
-        for question in all_questions:
-            if question.user_answer is not None:  # Only count answered questions
-                # Question type analysis
-                question_type = question.question_type.lower()
-                if question_type == 'mcq':
-                    question_type_stats['mcq']['total'] += 1
-                    if question.is_correct:
-                        question_type_stats['mcq']['correct'] += 1
-                elif question_type == 'true/false':
-                    question_type_stats['true_false']['total'] += 1
-                    if question.is_correct:
-                        question_type_stats['true_false']['correct'] += 1
-                elif question_type == 'short answer':
-                    question_type_stats['short_answer']['total'] += 1
-                    if question.is_correct:
-                        question_type_stats['short_answer']['correct'] += 1
-                
-                # Difficulty analysis - handle different difficulty formats
-                difficulty = question.difficulty_level.lower() if question.difficulty_level else 'medium'
-                
-                # Map different difficulty values to standard ones
-                difficulty_mapping = {
-                    'beginner': 'easy',
-                    'easy': 'easy',
-                    'intermediate': 'medium', 
-                    'medium': 'medium',
-                    'advanced': 'hard',
-                    'hard': 'hard'
-                }
-                
-                # Use mapping or default to medium
-                mapped_difficulty = difficulty_mapping.get(difficulty, 'medium')
-                
-                if mapped_difficulty in difficulty_stats:
-                    difficulty_stats[mapped_difficulty]['total'] += 1
-                    if question.is_correct:
-                        difficulty_stats[mapped_difficulty]['correct'] += 1
-        
-        print(f"Analytics Debug - Total questions: {len(all_questions)}")
-        print(f"Question type stats: {question_type_stats}")
-        print(f"Difficulty stats: {difficulty_stats}")
-        
-        # Calculate accuracy percentages
-        for question_type in question_type_stats:
-            stats = question_type_stats[question_type]
-            if stats['total'] > 0:
-                stats['accuracy'] = float((stats['correct'] / stats['total']) * 100)  # type: ignore
-        
-        for difficulty in difficulty_stats:
-            stats = difficulty_stats[difficulty]
-            if stats['total'] > 0:
-                stats['accuracy'] = float((stats['correct'] / stats['total']) * 100)  # type: ignore
+        # Questions generated across the same completed quizzes (answered or not)
+        total_questions_query = db.session.query(db.func.count(Question.id)).join(QuizSession).filter(
+            QuizSession.user_id == current_user_id,
+            QuizSession.status == 'completed'
+        )
+        if topic:
+            total_questions_query = total_questions_query.filter(QuizSession.topic == topic)
+        if days:
+            since = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+            total_questions_query = total_questions_query.filter(QuizSession.completed_at >= since)
+        total_questions = total_questions_query.scalar() or 0
         
         return jsonify({
-            'question_type_performance': question_type_stats,
-            'difficulty_analysis': difficulty_stats,
-            'total_questions': len(all_questions),
-            'total_answered': len([q for q in all_questions if q.user_answer is not None]),
-            'total_correct': len([q for q in all_questions if q.is_correct])
+            'question_type_performance': cube['question_type_performance'],
+            'difficulty_analysis': cube['difficulty_analysis'],
+            'total_questions': total_questions,
+            'total_answered': cube['total_answered'],
+            'total_correct': cube['total_correct']
         }), 200
         
     except Exception as e:
@@ -2825,6 +2895,7 @@ def get_quiz_analytics(current_user_id):
 # ==================== BADGE & GAMIFICATION ENDPOINTS ====================
 
 @app.route('/api/badges/available', methods=['GET'])
+@db_routing.read_only
 def get_available_badges():
     """Get all available badges in the system"""
     try:
@@ -2852,6 +2923,7 @@ def get_available_badges():
 
 @app.route('/api/user/badges', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_user_badges(current_user_id):
     """Get all badges earned by the current user"""
     try:
@@ -2871,6 +2943,7 @@ def get_user_badges(current_user_id):
 
 @app.route('/api/user/badges/progress', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_badge_progress(current_user_id):
     """Get user's progress towards unearned badges"""
     try:
@@ -2896,6 +2969,7 @@ def get_badge_progress(current_user_id):
 
 @app.route('/api/analytics/trends', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_performance_trends(current_user_id):
     """Get user's performance trends over time"""
     try:
@@ -2917,6 +2991,7 @@ def get_performance_trends(current_user_id):
 
 @app.route('/api/analytics/topic-mastery', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_topic_mastery(current_user_id):
     """Get topic mastery heatmap data"""
     try:
@@ -2931,6 +3006,7 @@ def get_topic_mastery(current_user_id):
 
 @app.route('/api/analytics/weekly-report', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_weekly_report(current_user_id):
     """Get weekly performance report"""
     try:
@@ -2945,6 +3021,7 @@ def get_weekly_report(current_user_id):
 
 @app.route('/api/analytics/monthly-report', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_monthly_report(current_user_id):
     """Get monthly performance report"""
     try:
@@ -2959,6 +3036,7 @@ def get_monthly_report(current_user_id):
 
 @app.route('/api/analytics/recommendations', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_learning_recommendations(current_user_id):
     """Get personalized learning recommendations based on performance"""
     try:
@@ -3169,6 +3247,8 @@ def get_multiplayer_rooms(current_user_id):
 @auth_required
 def create_multiplayer_room(current_user_id):
     """Create a new multiplayer room"""
+    if not socketio_config.MULTIPLAYER_AVAILABLE:
+        return jsonify({'error': socketio_config.MULTIPLAYER_UNAVAILABLE_MESSAGE}), 503
     try:
         data = request.json or {}  # type: ignore
         
@@ -3210,7 +3290,7 @@ def get_room_details(current_user_id, room_code):
         room_details = multiplayer_service.get_room_details(room_code, current_user_id)
         
         if room_details:
-            return jsonify(room_details), 200
+            return jsonify(multiplayer_engine.apply_live_state(room_details)), 200
         else:
             return jsonify({'error': 'Room not found'}), 404
         
@@ -3223,6 +3303,8 @@ def get_room_details(current_user_id, room_code):
 @auth_required
 def join_multiplayer_room(current_user_id, room_code):
     """Join a multiplayer room"""
+    if not socketio_config.MULTIPLAYER_AVAILABLE:
+        return jsonify({'error': socketio_config.MULTIPLAYER_UNAVAILABLE_MESSAGE}), 503
     try:
         room, message = multiplayer_service.join_room(room_code, current_user_id)
         
@@ -3257,6 +3339,8 @@ def leave_multiplayer_room(current_user_id, room_code):
         success, message = multiplayer_service.leave_room(room_code, current_user_id)
         
         if success:
+            multiplayer_engine.remove_player(room_code, current_user_id)
+            
             # Emit WebSocket event to notify other players
             socketio.emit('multiplayer:player_left', {
                 'room_code': room_code,
@@ -3305,6 +3389,8 @@ def toggle_ready(current_user_id, room_code):
 @auth_required
 def start_multiplayer_game(current_user_id, room_code):
     """Start a multiplayer game (host only)"""
+    if not socketio_config.MULTIPLAYER_AVAILABLE:
+        return jsonify({'error': socketio_config.MULTIPLAYER_UNAVAILABLE_MESSAGE}), 503
     try:
         room, message = multiplayer_service.start_game(room_code, current_user_id)
         
@@ -3319,6 +3405,9 @@ def start_multiplayer_game(current_user_id, room_code):
                 'timestamp': datetime.now().isoformat()
             }, to=f'multiplayer_{room_code}')  # type: ignore
             
+            # Sends the sealed question bundle and schedules round 0
+            multiplayer_engine.start(room)
+            
             return jsonify({
                 'message': message,
                 'room': room.to_dict()
@@ -3350,6 +3439,7 @@ def get_multiplayer_results(current_user_id, room_code):
 
 @app.route('/api/leaderboard', methods=['GET'])
 @auth_required
+@db_routing.read_only
 def get_leaderboard(current_user_id):
     """
     Get leaderboard rankings with aggregated user statistics.
@@ -3378,8 +3468,8 @@ def get_leaderboard(current_user_id):
         current_user_stats = None
         
         for user_stat in result.get('leaderboard', []):
-            if user_stat['user_id'] == current_user_id:
-                current_user_rank = user_stat['rank']
+            if user_stat.user_id == current_user_id:
+                current_user_rank = user_stat.rank
                 current_user_stats = user_stat
                 break
         
@@ -3394,8 +3484,8 @@ def get_leaderboard(current_user_id):
                     offset=0
                 )
                 for user_stat in all_users_result.get('leaderboard', []):
-                    if user_stat['user_id'] == current_user_id:
-                        current_user_rank = user_stat['rank']
+                    if user_stat.user_id == current_user_id:
+                        current_user_rank = user_stat.rank
                         current_user_stats = user_stat
                         break
         
@@ -3477,8 +3567,8 @@ def get_leaderboard(current_user_id):
 def upload_content_file(current_user_id):
     """Upload and process content files for custom quiz generation"""
     try:
-        # Initialize content processor
-        content_processor = ContentProcessor(app.config['UPLOAD_FOLDER'])
+        # Shared content processor
+        content_processor = get_content_processor(app.config['UPLOAD_FOLDER'])
         
         # Check if file is present
         if 'file' not in request.files:
@@ -3488,17 +3578,15 @@ def upload_content_file(current_user_id):
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Secure filename and save temporarily
         filename = secure_filename(file.filename or 'upload')  # type: ignore
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
         
         try:
-            # Save uploaded file
-            file.save(temp_path)
-            
-            # Process the content
-            processing_result = content_processor.process_content(temp_path, "file")
+            # Parse straight from the upload stream (no copy in UPLOAD_FOLDER);
+            # its hash keys the extraction cache
+            file_digest = extraction_cache.hash_stream(file.stream)
+            processing_result = content_processor.process_content_cached(
+                file.stream, "upload", file_digest, filename=filename
+            )
             
             if not processing_result['success']:
                 return jsonify({
@@ -3506,8 +3594,7 @@ def upload_content_file(current_user_id):
                     'details': processing_result['error']
                 }), 400
             
-            # Generate content summary
-            content_summary = content_processor.get_content_summary(processing_result['content'])
+            content_summary = processing_result['summary']
             
             # Return processed content and metadata
             response_data = {
@@ -3517,7 +3604,7 @@ def upload_content_file(current_user_id):
                 'summary': content_summary,
                 'file_info': {
                     'original_filename': filename,
-                    'processed_filename': unique_filename,
+                    'processed_filename': filename,
                     'upload_timestamp': datetime.now().isoformat()
                 }
             }
@@ -3528,10 +3615,6 @@ def upload_content_file(current_user_id):
         except Exception as e:
             print(f"❌ File upload error: {e}")
             return jsonify({'error': f'File upload failed: {str(e)}'}), 500
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
     
     except Exception as e:
         print(f"❌ File upload error (outer): {e}")
@@ -3550,11 +3633,11 @@ def process_url_content(current_user_id):
         if not url:
             return jsonify({'error': 'URL cannot be empty'}), 400
         
-        # Initialize content processor
-        content_processor = ContentProcessor()
+        # Shared content processor
+        content_processor = get_content_processor(app.config['UPLOAD_FOLDER'])
         
-        # Process URL content
-        processing_result = content_processor.process_content(url, "url")
+        # Process URL content (cached by URL, revalidated with ETag/Last-Modified)
+        processing_result = content_processor.process_content_cached(url, "url")
         
         if not processing_result['success']:
             return jsonify({
@@ -3562,8 +3645,7 @@ def process_url_content(current_user_id):
                 'details': processing_result['error']
             }), 400
         
-        # Generate content summary
-        content_summary = content_processor.get_content_summary(processing_result['content'])
+        content_summary = processing_result['summary']
         
         response_data = {
             'success': True,
@@ -3593,11 +3675,11 @@ def analyze_text_content(current_user_id):
         if len(content) < 10:
             return jsonify({'error': 'Content must be at least 10 characters long'}), 400
         
-        # Initialize content processor
-        content_processor = ContentProcessor()
+        # Shared content processor
+        content_processor = get_content_processor(app.config['UPLOAD_FOLDER'])
         
-        # Process text content
-        processing_result = content_processor.process_content(content, "text")
+        # Process text content (cached by text hash)
+        processing_result = content_processor.process_content_cached(content, "text")
         
         if not processing_result['success']:
             return jsonify({
@@ -3605,8 +3687,8 @@ def analyze_text_content(current_user_id):
                 'details': processing_result['error']
             }), 400
         
-        # Generate detailed content summary
-        content_summary = content_processor.get_content_summary(processing_result['content'])
+        # Detailed content summary
+        content_summary = processing_result['summary']
         
         # Additional analysis for quiz generation suitability
         analysis = {
@@ -3690,169 +3772,41 @@ def generate_questions_from_pdf(current_user_id):
         if num_questions < 1 or num_questions > 50:
             return jsonify({'error': 'Number of questions must be between 1 and 50'}), 400
         
-        # Save file temporarily
-        import uuid
-        temp_filename = f"{uuid.uuid4()}_{file.filename}"
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-        
-        try:
-            file.save(temp_path)
-            
-            # Initialize content processor
-            content_processor = ContentProcessor(app.config['UPLOAD_FOLDER'])
-            
-            # Process PDF and generate questions
-            logger.info(f"📄 Processing PDF: {file.filename} for user {current_user_id}")
-            result = content_processor.process_pdf_and_generate_questions(
-                pdf_path=temp_path,
-                topic=topic,
-                num_questions=num_questions,
-                difficulty=difficulty,
-                question_types=question_types
-            )
-            
-            if result['success']:
-                # Store generated questions in database
-                from models import Topic
-                
-                # Find or create topic
-                db_topic = Topic.query.filter_by(name=topic).first()
-                if not db_topic:
-                    db_topic = Topic(
-                        name=topic,# type: ignore
-                        description=f"Questions generated from PDF: {file.filename}",# type: ignore
-                        category='Custom'# type: ignore
-                    )  # type: ignore
-                    db.session.add(db_topic)
-                    db.session.flush()
-                
-                # Create quiz session for these questions
-                from models import QuizSession, Question
-                
-                quiz_session = QuizSession(
-                    user_id=current_user_id,# type: ignore
-                    topic=topic,# type: ignore
-                    skill_level=difficulty,# type: ignore
-                    total_questions=len(result['questions'])# type: ignore
-                )  # type: ignore
-                quiz_session.status = 'active'
-                db.session.add(quiz_session)
-                db.session.flush()
-                
-                # Add questions to database
-                stored_questions = []
-                for q_data in result['questions']:
-                    question = Question(
-                        quiz_session_id=quiz_session.id,
-                        question_text=q_data['question_text'],
-                        question_type=q_data['question_type'],
-                        correct_answer=q_data['correct_answer'],
-                        explanation=q_data['explanation'],
-                        difficulty_level=difficulty
-                    )  # type: ignore
-                    question.set_options(q_data.get('options', []))
-                    db.session.add(question)
-                    stored_questions.append(question)
-                
-                db.session.commit()
-                
-                logger.info(f"✅ Generated and stored {len(stored_questions)} questions from PDF")
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Successfully generated {len(stored_questions)} questions from PDF',
-                    'quiz_session_id': quiz_session.id,
-                    'questions': [q.to_dict() for q in stored_questions],
-                    'metadata': result['metadata'],
-                    'pdf_filename': file.filename
-                }), 201
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': result.get('error', 'Failed to generate questions')
-                }), 500
+        file_digest = extraction_cache.hash_stream(file.stream)
         
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                logger.info(f"🗑️ Cleaned up temporary file: {temp_filename}")
+        # Shared content processor
+        content_processor = get_content_processor(app.config['UPLOAD_FOLDER'])
         
-    except ValueError as e:
-        logger.error(f"❌ Validation error: {e}")
-        return jsonify({'error': str(e)}), 400
-    
-    except Exception as e:
-        logger.error(f"❌ PDF question generation error: {e}")
-        return jsonify({'error': f'Failed to generate questions from PDF: {str(e)}'}), 500
-
-
-@app.route('/api/questions/generate-from-text', methods=['POST'])
-@auth_required
-def generate_questions_from_text(current_user_id):
-    """
-    Generate quiz questions from text content using AI
-    
-    Expected JSON:
-    {
-        "content": "Text content here",
-        "topic": "Topic name",
-        "num_questions": 10,
-        "difficulty": "Medium",
-        "question_types": ["Multiple Choice", "True/False"]
-    }
-    """
-    try:
-        data = request.json
-        
-        if not data or 'content' not in data:
-            return jsonify({'error': 'No content provided'}), 400
-        
-        content = data['content']
-        topic = data.get('topic', 'General Knowledge')
-        num_questions = data.get('num_questions', 10)
-        difficulty = data.get('difficulty', 'Medium')
-        question_types = data.get('question_types', ['Multiple Choice', 'True/False', 'Short Answer'])
-        
-        # Validate inputs
-        if len(content.strip()) < 50:
-            return jsonify({'error': 'Content too short. Minimum 50 characters required.'}), 400
-        
-        if difficulty not in ['Easy', 'Medium', 'Hard']:
-            return jsonify({'error': 'Invalid difficulty'}), 400
-        
-        if num_questions < 1 or num_questions > 50:
-            return jsonify({'error': 'Number of questions must be between 1 and 50'}), 400
-        
-        # Initialize content processor
-        content_processor = ContentProcessor()
-        
-        # Generate questions
-        logger.info(f"🤖 Generating {num_questions} questions from text for user {current_user_id}")
-        result = content_processor.generate_questions_from_content(
-            content=content,
+        # Process PDF and generate questions (parsed from the upload stream)
+        logger.info(f"📄 Processing PDF: {file.filename} for user {current_user_id}")
+        result = content_processor.process_pdf_and_generate_questions(
+            pdf_path=file.stream,
             topic=topic,
             num_questions=num_questions,
             difficulty=difficulty,
-            question_types=question_types
+            question_types=question_types,
+            source_digest=file_digest,
+            filename=file.filename
         )
         
         if result['success']:
-            # Store questions in database
-            from models import Topic, QuizSession, Question
+            # Store generated questions in database
+            from models import Topic
             
             # Find or create topic
             db_topic = Topic.query.filter_by(name=topic).first()
             if not db_topic:
                 db_topic = Topic(
                     name=topic,# type: ignore
-                    description=f"Custom topic: {topic}",# type: ignore
+                    description=f"Questions generated from PDF: {file.filename}",# type: ignore
                     category='Custom'# type: ignore
                 )  # type: ignore
                 db.session.add(db_topic)
                 db.session.flush()
             
-            # Create quiz session
+            # Create quiz session for these questions
+            from models import QuizSession, Question
+            
             quiz_session = QuizSession(
                 user_id=current_user_id,# type: ignore
                 topic=topic,# type: ignore
@@ -3863,7 +3817,7 @@ def generate_questions_from_text(current_user_id):
             db.session.add(quiz_session)
             db.session.flush()
             
-            # Add questions
+            # Add questions to database
             stored_questions = []
             for q_data in result['questions']:
                 question = Question(
@@ -3880,20 +3834,146 @@ def generate_questions_from_text(current_user_id):
             
             db.session.commit()
             
-            logger.info(f"✅ Generated and stored {len(stored_questions)} questions from text")
+            logger.info(f"✅ Generated and stored {len(stored_questions)} questions from PDF")
             
             return jsonify({
                 'success': True,
-                'message': f'Successfully generated {len(stored_questions)} questions',
+                'message': f'Successfully generated {len(stored_questions)} questions from PDF',
                 'quiz_session_id': quiz_session.id,
                 'questions': [q.to_dict() for q in stored_questions],
-                'metadata': result['metadata']
+                'metadata': result['metadata'],
+                'pdf_filename': file.filename
             }), 201
         else:
             return jsonify({
                 'success': False,
                 'error': result.get('error', 'Failed to generate questions')
             }), 500
+        
+    except ValueError as e:
+        logger.error(f"❌ Validation error: {e}")
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        logger.error(f"❌ PDF question generation error: {e}")
+        return jsonify({'error': f'Failed to generate questions from PDF: {str(e)}'}), 500
+
+
+def text_generation_params(data):
+    """
+    Validated generate-from-text parameters.
+    
+    Returns:
+        tuple: (params dict, None) or (None, error message for a 400)
+    """
+    if not data or 'content' not in data:
+        return None, 'No content provided'
+    
+    params = {
+        'content': data['content'],
+        'topic': data.get('topic', 'General Knowledge'),
+        'num_questions': data.get('num_questions', 10),
+        'difficulty': data.get('difficulty', 'Medium'),
+        'question_types': data.get('question_types', ['Multiple Choice', 'True/False', 'Short Answer'])
+    }
+    
+    # Validate inputs
+    if len(params['content'].strip()) < 50:
+        return None, 'Content too short. Minimum 50 characters required.'
+    
+    if params['difficulty'] not in ['Easy', 'Medium', 'Hard']:
+        return None, 'Invalid difficulty'
+    
+    if params['num_questions'] < 1 or params['num_questions'] > 50:
+        return None, 'Number of questions must be between 1 and 50'
+    
+    return params, None
+
+def store_text_questions(current_user_id, topic, difficulty, result):
+    """Store questions generated from text as a new active quiz and build the 201 response payload"""
+    # Find or create topic
+    db_topic = Topic.query.filter_by(name=topic).first()
+    if not db_topic:
+        db_topic = Topic(
+            name=topic,# type: ignore
+            description=f"Custom topic: {topic}",# type: ignore
+            category='Custom'# type: ignore
+        )  # type: ignore
+        db.session.add(db_topic)
+        db.session.flush()
+    
+    # Create quiz session
+    quiz_session = QuizSession(
+        user_id=current_user_id,# type: ignore
+        topic=topic,# type: ignore
+        skill_level=difficulty,# type: ignore
+        total_questions=len(result['questions'])# type: ignore
+    )  # type: ignore
+    quiz_session.status = 'active'
+    db.session.add(quiz_session)
+    db.session.flush()
+    
+    # Add questions
+    stored_questions = []
+    for q_data in result['questions']:
+        question = Question(
+            quiz_session_id=quiz_session.id,
+            question_text=q_data['question_text'],
+            question_type=q_data['question_type'],
+            correct_answer=q_data['correct_answer'],
+            explanation=q_data['explanation'],
+            difficulty_level=difficulty
+        )  # type: ignore
+        question.set_options(q_data.get('options', []))
+        db.session.add(question)
+        stored_questions.append(question)
+    
+    db.session.commit()
+    
+    logger.info(f"✅ Generated and stored {len(stored_questions)} questions from text")
+    
+    return {
+        'success': True,
+        'message': f'Successfully generated {len(stored_questions)} questions',
+        'quiz_session_id': quiz_session.id,
+        'questions': [q.to_dict() for q in stored_questions],
+        'metadata': result['metadata']
+    }
+
+@app.route('/api/questions/generate-from-text', methods=['POST'])
+@auth_required
+def generate_questions_from_text(current_user_id):
+    """
+    Generate quiz questions from text content using AI
+    
+    Expected JSON:
+    {
+        "content": "Text content here",
+        "topic": "Topic name",
+        "num_questions": 10,
+        "difficulty": "Medium",
+        "question_types": ["Multiple Choice", "True/False"]
+    }
+    """
+    try:
+        params, error = text_generation_params(request.json)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Shared content processor
+        content_processor = get_content_processor(app.config['UPLOAD_FOLDER'])
+        
+        # Generate questions
+        logger.info(f"🤖 Generating {params['num_questions']} questions from text for user {current_user_id}")
+        result = content_processor.generate_questions_from_content(**params)
+        
+        if result['success']:
+            return jsonify(store_text_questions(current_user_id, params['topic'], params['difficulty'], result)), 201
+        else:
+            return jsonify({
+                'success': False,
+                'error': result.get('error', 'Failed to generate questions')
+            }), 500
     
     except Exception as e:
         logger.error(f"❌ Text question generation error: {e}")
@@ -4015,7 +4095,7 @@ def handle_file_too_large(error):
     """Handle file upload size errors"""
     return jsonify({
         'error': 'File Too Large',
-        'message': 'The uploaded file exceeds the maximum size limit (16MB)',
+        'message': f'The uploaded file exceeds the maximum size limit ({MAX_UPLOAD_BYTES // (1024 * 1024)}MB)',
         'error_code': 'FILE_TOO_LARGE',
         'timestamp': datetime.now().isoformat()
     }), 413
@@ -4048,15 +4128,15 @@ def get_admin_stats(current_user_id):
         # Get flagged questions count
         flagged_count = FlaggedQuestion.query.filter_by(status='pending').count()
         
-        # Active users today
+        # Active users today (distinct users, portable and index-friendly day range)
         today = datetime.now().date()
-        active_today = QuizSession.query.filter(
-            db.func.date(QuizSession.started_at) == today
-        ).distinct(QuizSession.user_id).count()
+        active_today = db.session.query(db_dialect.count_distinct(QuizSession.user_id)).filter(
+            db_dialect.day_range(QuizSession.started_at, today)
+        ).scalar() or 0
         
-        # Average quiz score
-        completed_quizzes = QuizSession.query.filter_by(status='completed').all()
-        avg_score = sum([q.score_percentage for q in completed_quizzes]) / len(completed_quizzes) if completed_quizzes else 0
+        # Average quiz score (aggregated without loading sessions into Python)
+        score_total, completed_count = analytics_export_service.get_completed_score_totals()
+        avg_score = score_total / completed_count if completed_count else 0
         
         return jsonify({
             'total_users': total_users,
@@ -4070,18 +4150,127 @@ def get_admin_stats(current_user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/analytics/export', methods=['GET'])
+@auth_required
+def get_analytics_export_status(current_user_id):
+    """Get columnar analytics export status"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        return jsonify(analytics_export_service.get_export_status()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/export', methods=['POST'])
+@auth_required
+def run_analytics_export(current_user_id):
+    """Incrementally export completed quiz data to Parquet for the analytics engine"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        result = analytics_export_service.export_incremental()
+        
+        if not result['success']:
+            return jsonify(result), 409 if result.get('error') == 'Export already running' else 500
+        
+        logger.info(f"📦 Analytics export triggered by admin {current_user_id}: {result['exported']}")
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/leaderboard/broadcast-metrics', methods=['GET'])
+@auth_required
+def get_leaderboard_broadcast_metrics(current_user_id):
+    """Coalesced leaderboard broadcast metrics (messages sent vs. saved)"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        return jsonify(leaderboard_broadcast.get_metrics()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/multiplayer/metrics', methods=['GET'])
+@auth_required
+def get_multiplayer_engine_metrics(current_user_id):
+    """In-memory multiplayer engine and lobby registry metrics"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        return jsonify({
+            **multiplayer_engine.get_metrics(),
+            'lobby': multiplayer_lobby.get_metrics()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/maintenance', methods=['GET'])
+@auth_required
+def get_maintenance_metrics(current_user_id):
+    """Maintenance job metrics (rows removed, duration, lock wait) and leases"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        return jsonify(maintenance_scheduler.get_metrics()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/maintenance/run', methods=['POST'])
+@auth_required
+def run_maintenance(current_user_id):
+    """Run all cleanup jobs now, outside the maintenance window"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        results = maintenance_scheduler.run_due(force=True)
+        return jsonify({
+            'jobs': results,
+            'skipped': [name for name, metrics in results.items() if metrics is None]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/content/cache', methods=['GET'])
+@auth_required
+def get_extraction_cache_metrics(current_user_id):
+    """Extraction cache hit rate and size"""
+    try:
+        admin_user = User.query.get(current_user_id)
+        if not admin_user or admin_user.role != 'admin':
+            return jsonify({'error': 'Unauthorized: Admin access required'}), 403
+        
+        return jsonify(extraction_cache.get_metrics()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/admin/users', methods=['GET'])
 @auth_required
 def get_admin_users(current_user_id):
     """Get all users for admin dashboard"""
     try:
         users = User.query.all()
-        users_data = []
         
-        for user in users:
-            user_dict = user.to_dict()
-            user_dict['quiz_count'] = len(user.quiz_sessions)
-            users_data.append(user_dict)
+        # One grouped COUNT for the whole listing instead of one per user
+        quiz_counts = QuizSession.count_by_user(user.id for user in users)
+        users_data = [user.to_dict(quiz_count=quiz_counts[user.id]) for user in users]
         
         return jsonify({'users': users_data}), 200
         
@@ -4690,6 +4879,9 @@ def update_quiz_leaderboard(current_user_id, quiz_id):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# Build the question generator (and adaptive engine) in the background, once the import is done
+startup.warm_up()
+
 if __name__ == '__main__':
     print("🚀 Starting Smart Quizzer API...")
     print("🔑 JWT Authentication ✅")
@@ -4754,7 +4946,7 @@ if __name__ == '__main__':
         socketio.run(app, 
                     debug=debug_mode, 
                     host='0.0.0.0', 
-                    port=5000, 
+                    port=int(os.getenv('PORT', '5000')), 
                     allow_unsafe_werkzeug=True, 
                     use_reloader=False,
                     log_output=False)
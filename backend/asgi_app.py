@@ -0,0 +1,251 @@
+"""
+ASGI Sidecar - Async handlers for the generation-heavy endpoints
+A Starlette app serving POST /api/quiz/start, /api/questions/generate,
+/api/questions/generate-from-text and /api/quiz/next as async handlers.
+Gemini calls are awaited on the shared async client (gemini_async.py), so a
+request waiting on Gemini holds a socket instead of a thread. Blocking work
+(SQLAlchemy queries, the local model) runs on Starlette's thread pool
+inside a Flask app context. Validation, persistence and response payloads
+are the Flask routes' own helpers (app.py), so both paths answer alike.
+Every other path falls through to the mounted Flask app (without Socket.IO).
+
+Run it next to the Flask/Socket.IO workers and route the four paths to it
+at the reverse proxy:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+
+The adaptive engine and the quiz start rate limit live in process memory,
+per sidecar process just as per gunicorn worker.
+"""
+
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from contextlib import asynccontextmanager
+import logging
+import os
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as flask_module
+from app import app as flask_app
+from models import db
+from question_gen import question_generator
+from content_processor import get_content_processor
+from error_handler import SmartQuizzerError, error_handler
+import gemini_async
+import serialization
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(payload, status_code=200):
+    return Response(serialization.dumps(payload), status_code=status_code, media_type='application/json')
+
+
+async def in_app_context(func, *args):
+    """Run a blocking call on the thread pool inside a Flask app context"""
+    def call():
+        with flask_app.app_context():
+            try:
+                return func(*args)
+            finally:
+                db.session.remove()
+    return await run_in_threadpool(call)
+
+
+def authenticate(request: Request):
+    """
+    User id from the Bearer token, checked like auth_required.
+
+    Returns:
+        tuple: (user id, None) or (None, 401 response)
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None, json_response({
+            'error': 'Token required',
+            'message': 'Please provide an access token'
+        }, 401)
+    try:
+        with flask_app.app_context():
+            decoded = decode_token(header[len('Bearer '):])
+            identity = decoded[flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+        if decoded.get('type') != 'access':
+            raise ValueError('Only access tokens are allowed')
+        return int(identity), None
+    except ExpiredSignatureError:
+        return None, json_response({
+            'error': 'Token has expired',
+            'message': 'Please login again'
+        }, 401)
+    except Exception as e:
+        logger.warning(f"Sidecar token rejected: {e}")
+        return None, json_response({
+            'error': 'Invalid token',
+            'message': 'Please provide a valid token'
+        }, 401)
+
+
+async def request_json(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def _open_quiz_session(current_user_id, data):
+    quiz_session, *params = flask_module.open_quiz_session(current_user_id, data)
+    return (quiz_session.id, *params)
+
+
+async def start_quiz(request: Request):
+    current_user_id, denied = authenticate(request)
+    if denied:
+        return denied
+    data = await request_json(request)
+
+    try:
+        rate_limited = flask_module.check_quiz_start_rate_limit(current_user_id)
+        if rate_limited:
+            return json_response(rate_limited, 429)
+
+        quiz_session_id, topic, skill_level, num_questions, custom_topic = await in_app_context(
+            _open_quiz_session, current_user_id, data
+        )
+
+        try:
+            questions_data = await question_generator.generate_quiz_questions_async(
+                topic=topic,
+                skill_level=skill_level,
+                num_questions=num_questions,
+                custom_topic=custom_topic,
+                user_id=current_user_id,
+                run_blocking=in_app_context
+            )
+        except Exception as qgen_error:
+            raise flask_module.quiz_generation_error(qgen_error, topic, skill_level)
+
+        if not questions_data:
+            raise flask_module.quiz_generation_error(None, topic, skill_level)
+
+        return json_response(await in_app_context(flask_module.save_quiz_questions, quiz_session_id, questions_data), 201)
+
+    except SmartQuizzerError as e:
+        # Same payload (and status) the Flask route returns through @handle_errors
+        return json_response(error_handler.handle_error(e))
+    except Exception as e:
+        error = await in_app_context(flask_module.unexpected_quiz_start_error, e)
+        return json_response(error_handler.handle_error(error))
+
+
+async def generate_questions(request: Request):
+    current_user_id, denied = authenticate(request)
+    if denied:
+        return denied
+
+    try:
+        data = await request_json(request) or {}
+        questions = await question_generator.generate_quiz_questions_async(
+            topic=data.get('topic', 'General'),
+            skill_level=data.get('skill_level', 'Intermediate'),
+            num_questions=int(data.get('num_questions', 5)),
+            custom_topic=data.get('custom_topic') or None,
+            user_id=current_user_id,
+            run_blocking=in_app_context
+        )
+        return json_response({'success': True, 'questions': questions})
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+async def generate_questions_from_text(request: Request):
+    current_user_id, denied = authenticate(request)
+    if denied:
+        return denied
+
+    try:
+        params, error = flask_module.text_generation_params(await request_json(request))
+        if error:
+            return json_response({'error': error}, 400)
+
+        content_processor = get_content_processor(flask_app.config['UPLOAD_FOLDER'])
+        logger.info(f"🤖 Generating {params['num_questions']} questions from text for user {current_user_id} (async)")
+        result = await content_processor.generate_questions_from_content_async(**params)
+
+        if result['success']:
+            return json_response(await in_app_context(
+                flask_module.store_text_questions, current_user_id, params['topic'], params['difficulty'], result
+            ), 201)
+        return json_response({
+            'success': False,
+            'error': result.get('error', 'Failed to generate questions')
+        }, 500)
+
+    except Exception as e:
+        logger.error(f"❌ Text question generation error: {e}")
+        return json_response({'error': f'Failed to generate questions: {str(e)}'}, 500)
+
+
+async def next_question(request: Request):
+    current_user_id, denied = authenticate(request)
+    if denied:
+        return denied
+
+    try:
+        data = await request_json(request) or {}
+        questions = await question_generator.generate_adaptive_question_async(
+            user_id=str(current_user_id),
+            topic=data.get('topic', 'General'),
+            question_type=data.get('question_type', 'MCQ'),
+            num_questions=1,
+            previous_answer_correct=data.get('previous_answer_correct') or False,
+            run_blocking=in_app_context
+        )
+
+        if questions:
+            return json_response({'success': True, 'question': questions[0]})
+        return json_response({'success': False, 'message': 'No question generated'}, 500)
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await gemini_async.close()
+
+
+# Same CORS policy as the Flask app (create_app)
+cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+
+app = Starlette(
+    routes=[
+        Route('/api/quiz/start', start_quiz, methods=['POST']),
+        Route('/api/questions/generate', generate_questions, methods=['POST']),
+        Route('/api/questions/generate-from-text', generate_questions_from_text, methods=['POST']),
+        Route('/api/quiz/next', next_question, methods=['POST']),
+        # Everything else is served by the Flask app (its own CORS handling applies there)
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=cors_origins,
+            allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            allow_headers=["Content-Type", "Authorization", "X-CSRF-Token"],
+            expose_headers=["Content-Type", "Authorization", "X-CSRF-Token"],
+            allow_credentials=True
+        )
+    ],
+    lifespan=lifespan,
+)
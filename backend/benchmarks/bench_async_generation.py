@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent quiz generation, threaded (Flask worker) vs async (ASGI sidecar).
+
+Starts a fake Gemini upstream that answers every generateContent call with a
+valid batch of questions after --latency-ms, points the question generator at
+it and fires --requests concurrent generate_quiz_questions calls:
+
+- threaded: a pool of --threads threads calling the sync method, the
+  concurrency of one gunicorn worker with that many threads
+- async: one event loop awaiting generate_quiz_questions_async for every
+  request, as one sidecar process does
+
+Usage:
+    python benchmarks/bench_async_generation.py --requests 200 --threads 8 --latency-ms 1500
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUESTION_BLOCK = """Question Type: MCQ
+Question: Which process lets plants convert light energy into chemical energy number {n}?
+Options: A) Photosynthesis, B) Respiration, C) Transpiration, D) Germination
+Answer: A) Photosynthesis
+Explanation: Photosynthesis stores light energy as glucose in the chloroplasts."""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=int, default=1500)
+    parser.add_argument('--questions', type=int, default=5)
+    return parser.parse_args()
+
+
+def start_fake_gemini(latency_ms, num_questions):
+    body = json.dumps({'candidates': [{'content': {'parts': [{
+        'text': '\n---\n'.join(QUESTION_BLOCK.format(n=n) for n in range(num_questions))
+    }]}}]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency_ms / 1000)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/fake:generateContent", server
+
+
+def run_threaded(generator, args):
+    def one():
+        start = time.perf_counter()
+        generator.generate_quiz_questions('Science', 'Intermediate', num_questions=args.questions)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        latencies = list(pool.map(lambda _: one(), range(args.requests)))
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(generator, args):
+    import gemini_async
+
+    async def one():
+        start = time.perf_counter()
+        await generator.generate_quiz_questions_async('Science', 'Intermediate', num_questions=args.questions)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await gemini_async.close()
+    return elapsed, latencies
+
+
+def report(label, elapsed, latencies):
+    latencies = sorted(latencies)
+    print(f"\n📊 {label}")
+    print(f"  requests:         {len(latencies):12,}")
+    print(f"  total:            {elapsed * 1000:12,.0f} ms")
+    print(f"  throughput:       {len(latencies) / elapsed:12,.1f} quizzes/s")
+    print(f"  p50 latency:      {statistics.median(latencies) * 1000:12,.0f} ms")
+    print(f"  p95 latency:      {latencies[int(len(latencies) * 0.95) - 1] * 1000:12,.0f} ms")
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DEFER_HEALTH_CHECKS', 'true')
+    # Measure the serving model, not the Gemini quota
+    os.environ.setdefault('GEMINI_RATE_LIMIT_URL', 'memory')
+    os.environ.setdefault('GEMINI_REQUESTS_PER_MINUTE', '1000000000')
+    os.environ.setdefault('GEMINI_RATE_LIMIT_BURST', '1000000000')
+    os.environ.setdefault('AI_CIRCUIT_BREAKER_URL', 'memory')
+    from question_gen import question_generator
+
+    url, server = start_fake_gemini(args.latency_ms, args.questions)
+    generator = question_generator.get()
+    generator.api_key = 'benchmark'
+    generator.base_url = url
+
+    print(f"⚙️  {args.requests} concurrent quizzes of {args.questions} questions, "
+          f"fake Gemini latency {args.latency_ms}ms")
+
+    elapsed, latencies = run_threaded(generator, args)
+    report(f'threaded ({args.threads} threads, sync generate_quiz_questions)', elapsed, latencies)
+
+    async_elapsed, latencies = asyncio.run(run_async(generator, args))
+    report('async (one event loop, generate_quiz_questions_async)', async_elapsed, latencies)
+
+    server.shutdown()
+    print(f"\n✅ async: {elapsed / async_elapsed:.1f}x the threaded throughput per process")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of a web worker (`import app`) under -X importtime.
+
+Compiles the backend to bytecode first, as the Docker image does, then
+starts --runs fresh interpreters that import app.py (which builds the app,
+as a gunicorn worker does) and reports the median time until the import
+returns, the whole process wall time, and the modules with the largest
+cumulative import time. FAST_START=true is set unless --no-fast-start, so
+the database initialization that `python startup.py init-db` does once is
+not billed to the worker.
+
+Regression check: --save writes the per-module cumulative times of the
+median run to a JSON file; --compare reads one back and fails when a module
+got slower by more than --tolerance-ms. The run also fails when the median
+readiness time exceeds --budget-ms (default 1,000 ms, measured under
+-X importtime).
+
+Usage:
+    python benchmarks/bench_cold_start.py --runs 5 --budget-ms 1000
+    python benchmarks/bench_cold_start.py --save cold_start.json
+    python benchmarks/bench_cold_start.py --compare cold_start.json --tolerance-ms 50
+"""
+
+import argparse
+import compileall
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+IMPORT_SNIPPET = (
+    "import sys, time; start = time.perf_counter(); import app; "
+    "sys.stdout.write('\\nREADY_MS %f\\n' % ((time.perf_counter() - start) * 1000))"
+)
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)')
+# Written in one call, but the warm-up thread may print around it
+READY_LINE = re.compile(r'READY_MS (\d+(?:\.\d+)?)')
+
+# app.py refuses to start without these; placeholders are enough to import it
+PLACEHOLDER_ENV = {
+    'SECRET_KEY': 'cold-start-benchmark',
+    'GEMINI_API_KEY': 'cold-start-benchmark',
+    'ADMIN_REGISTRATION_CODE': 'cold-start-benchmark',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--no-fast-start', action='store_true')
+    parser.add_argument('--save')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance-ms', type=float, default=50)
+    return parser.parse_args()
+
+
+def run_once(fast_start):
+    env = dict(os.environ)
+    for name, value in PLACEHOLDER_ENV.items():
+        env.setdefault(name, value)
+    env['FAST_START'] = 'true' if fast_start else 'false'
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_SNIPPET],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(f"❌ import app failed (exit {result.returncode})")
+
+    match = READY_LINE.search(result.stdout)
+    ready_ms = float(match.group(1)) if match else None
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules[name] = {'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000}
+    return {'ready_ms': ready_ms, 'wall_ms': wall_ms, 'modules': modules}
+
+
+def report(runs, top):
+    median_run = sorted(runs, key=lambda run: run['ready_ms'])[len(runs) // 2]
+    ready = [run['ready_ms'] for run in runs]
+    wall = [run['wall_ms'] for run in runs]
+
+    print(f"\n📊 import app ({len(runs)} runs)")
+    print(f"  ready (median):   {statistics.median(ready):12,.0f} ms")
+    print(f"  ready (max):      {max(ready):12,.0f} ms")
+    print(f"  process wall:     {statistics.median(wall):12,.0f} ms")
+    print(f"  modules imported: {len(median_run['modules']):12,}")
+
+    print(f"\n📊 slowest imports (cumulative, median run)")
+    ranked = sorted(median_run['modules'].items(), key=lambda item: -item[1]['cumulative_ms'])
+    for name, timing in ranked[:top]:
+        print(f"  {name:40s} {timing['cumulative_ms']:10,.1f} ms  (self {timing['self_ms']:,.1f} ms)")
+    return median_run
+
+
+def median_run_cumulative(median_run):
+    return {name: timing['cumulative_ms'] for name, timing in median_run['modules'].items()}
+
+
+def compare(median_run, baseline_path, tolerance_ms):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, cumulative_ms in median_run_cumulative(median_run).items():
+        before = baseline.get(name)
+        if before is None:
+            if cumulative_ms > tolerance_ms:
+                regressions.append((name, 0.0, cumulative_ms))
+        elif cumulative_ms - before > tolerance_ms:
+            regressions.append((name, before, cumulative_ms))
+
+    print(f"\n📊 compared with {baseline_path} (tolerance {tolerance_ms:.0f} ms)")
+    if not regressions:
+        print("  no module got slower")
+    for name, before, after in sorted(regressions, key=lambda r: r[1] - r[2]):
+        print(f"  {name:40s} {before:10,.1f} -> {after:,.1f} ms")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    fast_start = not args.no_fast_start
+    print(f"⚙️  {args.runs} cold imports of app.py, FAST_START={'true' if fast_start else 'false'}, "
+          f"budget {args.budget_ms:,.0f} ms")
+
+    # Workers load the image's bytecode; without it app.py/models.py compile on every start
+    compileall.compile_dir(BACKEND_DIR, quiet=1)
+    runs = [run_once(fast_start) for _ in range(args.runs)]
+    median_run = report(runs, args.top)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(median_run_cumulative(median_run), f, indent=2, sort_keys=True)
+        print(f"\n💾 saved import profile to {args.save}")
+
+    failed = False
+    if args.compare and compare(median_run, args.compare, args.tolerance_ms):
+        failed = True
+
+    ready_ms = statistics.median(run['ready_ms'] for run in runs)
+    if ready_ms > args.budget_ms:
+        print(f"\n❌ ready in {ready_ms:,.0f} ms, over the {args.budget_ms:,.0f} ms budget")
+        failed = True
+    elif not failed:
+        print(f"\n✅ ready in {ready_ms:,.0f} ms (budget {args.budget_ms:,.0f} ms)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
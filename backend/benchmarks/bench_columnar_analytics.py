@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ORM analytics loops vs. the analytics cube and the columnar (Parquet + DuckDB) engine.
+
+Builds a synthetic SQLite database (10M questions by default), then times
+ - the previous /api/quiz/analytics loop (sessions -> questions -> Python counters)
+   against a slice of the question analytics cube (analytics_service)
+ - the previous /api/admin/stats average (load every completed session)
+   against analytics_export_service after an incremental export.
+
+Usage:
+    python benchmarks/bench_columnar_analytics.py --questions 10000000 --users 20000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=10_000_000, help='Total questions to generate')
+    parser.add_argument('--users', type=int, default=20_000, help='Number of users')
+    parser.add_argument('--questions-per-quiz', type=int, default=10)
+    parser.add_argument('--sample-users', type=int, default=50, help='Users to run per-user analytics for')
+    parser.add_argument('--workdir', default=None, help='Directory for the database and Parquet export')
+    return parser.parse_args()
+
+
+def build_database(db_path, args):
+    """Populate quiz_sessions/questions with raw executemany for speed"""
+    topics = ['Mathematics', 'Science', 'History', 'Physics', 'Chemistry', 'Biology', 'Geography', 'Economics']
+    types = ['MCQ', 'True/False', 'Short Answer']
+    difficulties = ['Easy', 'Medium', 'Hard', 'Beginner', 'Intermediate', 'Advanced']
+    weights = {'Easy': 1.0, 'Medium': 1.5, 'Hard': 2.0}
+
+    num_sessions = args.questions // args.questions_per_quiz
+    base_time = datetime.now() - timedelta(days=365)
+    rng = random.Random(42)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, full_name, skill_level, role, email_verified, created_at) "
+        "VALUES (?, ?, ?, 'x', ?, 'Beginner', 'user', 1, ?)",
+        ((i, f'user{i}', f'user{i}@bench.local', f'User {i}', base_time) for i in range(1, args.users + 1))
+    )
+
+    chunk = 20_000
+    question_id = 1
+    for start in range(1, num_sessions + 1, chunk):
+        sessions, questions = [], []
+        for session_id in range(start, min(start + chunk, num_sessions + 1)):
+            user_id = rng.randint(1, args.users)
+            started = base_time + timedelta(seconds=session_id * 3)
+            correct = 0
+            for _ in range(args.questions_per_quiz):
+                difficulty = rng.choice(difficulties)
+                is_correct = rng.random() < 0.65
+                correct += is_correct
+                questions.append((
+                    question_id, session_id, 'Question text', rng.choice(types), 'A', 'A',
+                    difficulty, weights.get(difficulty, 1.0), is_correct, rng.randint(3, 60), started
+                ))
+                question_id += 1
+            score = correct / args.questions_per_quiz * 100
+            sessions.append((
+                session_id, user_id, rng.choice(topics), 'Intermediate', args.questions_per_quiz,
+                args.questions_per_quiz, correct, score, rng.randint(60, 600), 'completed',
+                started, started + timedelta(minutes=5)
+            ))
+        conn.executemany(
+            "INSERT INTO quiz_sessions (id, user_id, topic, skill_level, total_questions, completed_questions, "
+            "correct_answers, score_percentage, total_time_seconds, total_paused_seconds, status, started_at, completed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+            sessions
+        )
+        conn.executemany(
+            "INSERT INTO questions (id, quiz_session_id, question_text, question_type, correct_answer, user_answer, "
+            "difficulty_level, difficulty_weight, is_correct, time_taken, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            questions
+        )
+        conn.commit()
+        print(f"  ... {min(start + chunk - 1, num_sessions):,}/{num_sessions:,} sessions", end='\r')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_bench_questions_session ON questions (quiz_session_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_bench_sessions_user ON quiz_sessions (user_id)')
+    conn.commit()
+    conn.close()
+    print()
+
+
+def orm_quiz_analytics(user_id, QuizSession, Question):
+    """The previous per-question loop from get_quiz_analytics"""
+    sessions = QuizSession.query.filter_by(user_id=user_id, status='completed').all()
+    all_questions = []
+    for session in sessions:
+        all_questions.extend(Question.query.filter_by(quiz_session_id=session.id).all())
+
+    counts = {}
+    for question in all_questions:
+        if question.user_answer is not None:
+            difficulty_mapping = {
+                'beginner': 'easy', 'easy': 'easy', 'intermediate': 'medium',
+                'medium': 'medium', 'advanced': 'hard', 'hard': 'hard'
+            }
+            key = (question.question_type.lower(), difficulty_mapping.get(question.difficulty_level.lower(), 'medium'))
+            total, correct = counts.get(key, (0, 0))
+            counts[key] = (total + 1, correct + (1 if question.is_correct else 0))
+    return counts
+
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    result = None
+    for _ in range(repeat):
+        result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<48} {elapsed:10.3f}s")
+    return elapsed, result
+
+
+def main():
+    args = parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sq_bench_')
+    db_path = os.path.join(workdir, 'bench.db')
+
+    os.environ['ANALYTICS_EXPORT_DIR'] = os.path.join(workdir, 'analytics')
+    os.environ['ANALYTICS_EXPORT_LAG_SECONDS'] = '0'
+
+    from flask import Flask
+    from models import db, QuizSession, Question
+    import analytics_export_service
+    import analytics_service
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+            db.create_all()
+            print(f"🏗️  Generating {args.questions:,} questions in {db_path}")
+            build_database(db_path, args)
+        else:
+            db.create_all()
+
+        sample = random.Random(7).sample(range(1, args.users + 1), min(args.sample_users, args.users))
+
+        print("\n⏱️  ORM baseline")
+        orm_user, _ = timed(
+            f"quiz analytics x{len(sample)} users",
+            lambda: [orm_quiz_analytics(u, QuizSession, Question) for u in sample]
+        )
+        orm_admin, _ = timed(
+            "admin avg score (load all completed)",
+            lambda: (lambda rows: sum(q.score_percentage for q in rows) / len(rows))(
+                QuizSession.query.filter_by(status='completed').all()
+            )
+        )
+        db.session.remove()
+
+        print("\n⏱️  Analytics cube")
+        timed("cube build (all users)", analytics_service.build_question_cube)
+        cube_user, _ = timed(
+            f"quiz analytics x{len(sample)} users",
+            lambda: [analytics_service.get_question_cube_slice(u) for u in sample]
+        )
+        db.session.remove()
+
+        print("\n⏱️  Columnar engine")
+        export_time, export_result = timed("incremental export (first run)", analytics_export_service.export_incremental)
+        print(f"    exported: {export_result.get('exported')}")
+        col_admin, _ = timed("admin avg score", analytics_export_service.get_completed_score_totals)
+        timed("incremental export (no new data)", analytics_export_service.export_incremental)
+
+        print("\n📊 Speedup")
+        print(f"  per-user analytics: {orm_user / cube_user:8.1f}x")
+        print(f"  admin avg score:    {orm_admin / col_admin:8.1f}x")
+        print(f"\n📂 Work directory: {workdir}")
+
+
+if __name__ == '__main__':
+    main()
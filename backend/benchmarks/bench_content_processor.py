@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: content_processor import time and per-request constructor cost.
+
+Import time is measured in fresh interpreters (--runs each, median): the
+module as it is now (parsers and Gemini client imported on first use) vs
+the module plus the eager imports it used to do at import time (python-docx,
+BeautifulSoup, google.generativeai, PyPDF2, pdfplumber). The constructor
+comparison runs --requests iterations of what each content route used to do
+(ContentProcessor() with genai.configure + GenerativeModel) against
+get_content_processor(). Set GEMINI_API_KEY (any value) to include the
+Gemini client construction.
+
+Usage:
+    python benchmarks/bench_content_processor.py --runs 5 --requests 1000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+EAGER_IMPORTS = 'import docx, bs4, google.generativeai, PyPDF2, pdfplumber'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=1000)
+    return parser.parse_args()
+
+
+def import_time(statement, runs):
+    code = (f"import time; t = time.perf_counter(); {statement}; "
+            f"print(time.perf_counter() - t)")
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip().splitlines()
+        samples.append(float(output[-1]))
+    return statistics.median(samples)
+
+
+def legacy_construct():
+    """Per-request construction as the routes used to do it"""
+    from content_processor import ContentProcessor
+
+    processor = ContentProcessor()
+    if processor.gemini_api_key:
+        import google.generativeai as genai
+        genai.configure(api_key=processor.gemini_api_key)
+        processor._gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+    return processor
+
+
+def per_call(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    args = parse_args()
+
+    lazy = import_time('import content_processor', args.runs)
+    eager = import_time(f'{EAGER_IMPORTS}; import content_processor', args.runs)
+    print(f"\n📊 import content_processor (median of {args.runs} fresh interpreters)")
+    print(f"  eager parsers:    {eager * 1000:12,.0f} ms")
+    print(f"  lazy parsers:     {lazy * 1000:12,.0f} ms")
+
+    from content_processor import get_content_processor
+    import logging
+    logging.disable(logging.WARNING)
+    legacy = per_call(legacy_construct, args.requests)
+    shared = per_call(get_content_processor, args.requests)
+    print(f"\n📊 processor per request ({args.requests:,} requests, "
+          f"Gemini client {'included' if os.getenv('GEMINI_API_KEY') else 'skipped'})")
+    print(f"  new instance:     {legacy * 1e6:12,.1f} µs")
+    print(f"  shared instance:  {shared * 1e6:12,.3f} µs")
+
+    print(f"\n✅ import {eager / max(lazy, 1e-9):.1f}x faster, "
+          f"{(legacy - shared) * 1000:.2f} ms saved per content request")
+
+
+if __name__ == '__main__':
+    main()
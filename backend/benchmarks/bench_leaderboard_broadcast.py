@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-completion leaderboard emits vs coalesced rank deltas.
+
+Simulates a burst of quiz completions on a few popular topics. The baseline
+emits what update_leaderboard_entry used to: a full to_dict() entry to the
+topic room and to the admin room on every completion. The coalesced run
+queues each completion in leaderboard_broadcast and flushes once per
+interval of simulated time. Reports messages, payload bytes and the
+scheduler's messages-saved metric.
+
+Usage:
+    python benchmarks/bench_leaderboard_broadcast.py --rate 40 --seconds 30 --interval-ms 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--topics', type=int, default=3, help='Popular topics receiving the completions')
+    parser.add_argument('--existing', type=int, default=3000, help='Leaderboard entries per topic before the burst')
+    parser.add_argument('--rate', type=int, default=40, help='Completions per second')
+    parser.add_argument('--seconds', type=int, default=30, help='Simulated duration')
+    parser.add_argument('--interval-ms', type=int, default=1000, help='Coalescing interval')
+    return parser.parse_args()
+
+
+class CountingEmitter:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def __call__(self, event, data, to=None, **kwargs):
+        self.messages += 1
+        self.bytes += len(json.dumps(data, default=str))
+
+
+def seed(db, args, rng):
+    from models import User, QuizLeaderboard
+
+    db.session.execute(User.__table__.insert(), [{
+        'id': i, 'username': f'user{i}', 'email': f'user{i}@bench.local', 'password_hash': 'x',
+        'full_name': f'User {i}', 'skill_level': 'Intermediate', 'role': 'user', 'email_verified': True
+    } for i in range(1, args.users + 1)])
+
+    topics = [f'Topic {n}' for n in range(args.topics)]
+    rows = []
+    for topic in topics:
+        for _ in range(args.existing):
+            rows.append(new_entry(rng, args, topic, len(rows) + 1))
+    db.session.execute(QuizLeaderboard.__table__.insert(), rows)
+    db.session.commit()
+    return topics, len(rows) + 1
+
+
+def new_entry(rng, args, topic, entry_id):
+    correct = rng.randint(0, 10)
+    return {
+        'id': entry_id, 'user_id': rng.randint(1, args.users), 'quiz_session_id': entry_id, 'topic': topic,
+        'score': correct * rng.choice([1.0, 1.5, 2.0]), 'correct_count': correct, 'total_questions': 10,
+        'time_taken': rng.randint(60, 900), 'avg_difficulty_weight': 1.5, 'timestamp': datetime.now()
+    }
+
+
+def run(label, coalesced, args):
+    from flask import Flask
+    from models import db, QuizLeaderboard
+    import leaderboard_service
+    from leaderboard_broadcast import LeaderboardBroadcaster
+
+    rng = random.Random(42)
+    db_path = os.path.join(tempfile.mkdtemp(prefix='sq_broadcast_bench_'), 'bench.db')
+    app = Flask(f'bench_{label}')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    emitter = CountingEmitter()
+    broadcaster = LeaderboardBroadcaster(interval_ms=args.interval_ms)
+    # Flushed manually on simulated time instead of by the background task
+    broadcaster.socketio = emitter
+    broadcaster.task_started = True
+
+    with app.app_context():
+        db.create_all()
+        topics, next_id = seed(db, args, rng)
+        leaderboard_service.recalculate_ranks()
+
+        weights = [0.6] + [0.4 / max(1, len(topics) - 1)] * (len(topics) - 1)
+        completions = args.rate * args.seconds
+        per_interval = max(1, int(args.rate * args.interval_ms / 1000))
+
+        start = time.perf_counter()
+        for n in range(completions):
+            topic = rng.choices(topics, weights=weights[:len(topics)])[0]
+            db.session.execute(QuizLeaderboard.__table__.insert(), [new_entry(rng, args, topic, next_id)])
+            db.session.commit()
+
+            if coalesced:
+                broadcaster.ensure_snapshot(topic)
+            leaderboard_service.recalculate_ranks(topic=topic)
+
+            if coalesced:
+                broadcaster.queue_update(topic)
+                if (n + 1) % per_interval == 0:
+                    broadcaster.flush(emitter)
+            else:
+                entry = QuizLeaderboard.query.get(next_id)
+                emitter('leaderboard:user_update', {'topic': topic, 'entry': entry.to_dict(),
+                                                    'timestamp': datetime.now().isoformat()})
+                emitter('leaderboard:admin_update', {'topic': 'admin_global', 'entry': entry.to_dict(),
+                                                     'timestamp': datetime.now().isoformat()})
+            next_id += 1
+
+        if coalesced:
+            broadcaster.flush(emitter)
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+
+    print(f"\n📊 {label}")
+    print(f"  completions:      {completions:9,}")
+    print(f"  messages sent:    {emitter.messages:9,}  ({emitter.messages / args.seconds:,.1f}/s simulated)")
+    print(f"  payload bytes:    {emitter.bytes:9,}")
+    print(f"  wall time:        {elapsed:9.2f}s")
+    if coalesced:
+        metrics = broadcaster.get_metrics()
+        print(f"  messages saved:   {metrics['messages_saved']:9,}")
+        print(f"  changes sent:     {metrics['changes_sent']:9,}")
+    return emitter
+
+
+def main():
+    args = parse_args()
+    print(f"⚙️  {args.rate} completions/s for {args.seconds}s over {args.topics} topics, "
+          f"interval {args.interval_ms}ms")
+    baseline = run('per-completion emits', False, args)
+    coalesced = run('coalesced deltas', True, args)
+    print(f"\n✅ {baseline.messages / max(coalesced.messages, 1):.1f}x fewer messages, "
+          f"{baseline.bytes / max(coalesced.bytes, 1):.1f}x fewer bytes")
+
+
+if __name__ == '__main__':
+    main()
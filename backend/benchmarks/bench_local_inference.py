@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-prompt pipeline calls vs the micro-batching inference server.
+
+Simulates --clients concurrent quiz starts, each generating --prompts
+questions with the local fallback model. The baseline calls a
+text2text-generation pipeline once per prompt from every client thread
+(generate_with_local_model before local_inference); the server runs are
+one LocalInferenceServer per --backends entry, each capped at --threads
+inference threads.
+
+Usage:
+    python benchmarks/bench_local_inference.py --clients 8 --prompts 5 --backends int8,onnx
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+TOPICS = ['photosynthesis', 'the French Revolution', 'plate tectonics', 'quadratic equations',
+          'cell division', 'the water cycle', 'supply and demand', 'Newton\'s laws of motion']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.getenv('LOCAL_AI_MODEL', 't5-small'))
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--prompts', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=int, default=20)
+    parser.add_argument('--max-length', type=int, default=64)
+    parser.add_argument('--backends', default='torch,int8,onnx')
+    return parser.parse_args()
+
+
+def prompt_for(client, n):
+    topic = TOPICS[(client + n) % len(TOPICS)]
+    return f"generate question: Write a multiple choice question about {topic} for an intermediate student."
+
+
+def run_clients(args, generate):
+    """Every client generates its prompts back to back; returns (elapsed, per-prompt latencies)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index):
+        for n in range(args.prompts):
+            start = time.perf_counter()
+            generate(prompt_for(index, n))
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    latencies = sorted(latencies)
+    print(f"\n📊 {label}")
+    print(f"  prompts:          {len(latencies):12,}")
+    print(f"  total:            {elapsed * 1000:12,.0f} ms")
+    print(f"  throughput:       {len(latencies) / elapsed:12,.1f} prompts/s")
+    print(f"  p50 latency:      {statistics.median(latencies) * 1000:12,.0f} ms")
+    print(f"  p95 latency:      {latencies[int(len(latencies) * 0.95) - 1] * 1000:12,.0f} ms")
+
+
+def main():
+    args = parse_args()
+    import torch
+    from transformers import pipeline
+    import local_inference
+
+    print(f"⚙️  {args.model}: {args.clients} clients x {args.prompts} prompts, {args.threads} threads, "
+          f"batches of {args.batch_size} within {args.max_wait_ms}ms")
+
+    torch.set_num_threads(args.threads)
+    generator = pipeline('text2text-generation', model=args.model, device=-1)
+    generator(prompt_for(0, 0), max_length=args.max_length)  # warm-up
+    baseline, latencies = run_clients(args, lambda prompt: generator(
+        prompt, max_length=args.max_length, num_return_sequences=1))
+    report('pipeline, one prompt per call', baseline, latencies)
+
+    for backend in args.backends.split(','):
+        if backend == 'onnx' and not local_inference.onnx_available():
+            print("\n⏭️  onnx: optimum[onnxruntime] not installed")
+            continue
+        server = local_inference.LocalInferenceServer(
+            args.model, backend=backend, threads=args.threads,
+            batch_size=args.batch_size, max_wait_ms=args.max_wait_ms
+        )
+        server.generate(prompt_for(0, 0), max_length=args.max_length)  # warm-up
+        elapsed, latencies = run_clients(args, lambda prompt: server.generate(prompt, max_length=args.max_length))
+        report(f'inference server ({backend})', elapsed, latencies)
+        metrics = server.get_metrics()
+        print(f"  avg batch size:   {metrics['avg_batch_size']:12,.2f}")
+        print(f"\n✅ {backend}: {baseline / elapsed:.1f}x the pipeline throughput")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ORM cleanup vs chunked set-based DELETEs.
+
+Seeds --rooms stale multiplayer rooms (with --players participants each)
+and --tokens expired password reset tokens. The baseline deletes rooms the
+way cleanup_old_rooms used to (load every room, session.delete() each one,
+one commit); the maintenance run uses the scheduler's jobs. A writer thread
+inserts tokens during both runs and records its longest commit, i.e. how
+long cleanup blocked other writers.
+
+Usage:
+    python benchmarks/bench_maintenance_cleanup.py --rooms 20000 --tokens 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=20000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--tokens', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    return parser.parse_args()
+
+
+def make_app(label):
+    from flask import Flask
+    from models import db
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='sq_maintenance_bench_'), 'bench.db')
+    app = Flask(f'bench_{label}')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    return app
+
+
+def seed(db, args):
+    from models import User, MultiplayerRoom, MultiplayerParticipant, PasswordResetToken
+
+    old = datetime.utcnow() - timedelta(days=3)
+    db.session.execute(User.__table__.insert(), [{
+        'id': i, 'username': f'user{i}', 'email': f'user{i}@bench.local', 'password_hash': 'x',
+        'full_name': f'User {i}', 'skill_level': 'Intermediate', 'role': 'user', 'email_verified': True
+    } for i in range(1, args.players + 1)])
+    db.session.execute(MultiplayerRoom.__table__.insert(), [{
+        'id': r, 'room_code': f'C{r:06d}', 'name': 'Bench', 'host_user_id': 1, 'topic': 'Bench',
+        'difficulty': 'Medium', 'num_questions': 10, 'max_players': args.players,
+        'current_players': args.players, 'status': 'completed', 'current_question_index': 10,
+        'time_per_question': 30, 'created_at': old, 'completed_at': old
+    } for r in range(1, args.rooms + 1)])
+    db.session.execute(MultiplayerParticipant.__table__.insert(), [{
+        'room_id': r, 'user_id': u, 'score': 0, 'correct_answers': 0, 'answers_submitted': 0,
+        'is_ready': True, 'is_host': u == 1
+    } for r in range(1, args.rooms + 1) for u in range(1, args.players + 1)])
+    db.session.execute(PasswordResetToken.__table__.insert(), [{
+        'user_id': 1, 'token': f'expired-{n}', 'expires_at': old, 'created_at': old, 'used': False
+    } for n in range(args.tokens)])
+    db.session.commit()
+
+
+class Writer(threading.Thread):
+    """Inserts a fresh token every few ms and records the slowest commit"""
+
+    def __init__(self, app):
+        super().__init__(daemon=True)
+        self.app = app
+        self.stop = threading.Event()
+        self.max_wait = 0.0
+        self.writes = 0
+
+    def run(self):
+        from models import db, PasswordResetToken
+
+        with self.app.app_context():
+            expires = datetime.now() + timedelta(hours=1)
+            while not self.stop.is_set():
+                t0 = time.perf_counter()
+                db.session.execute(PasswordResetToken.__table__.insert(), [{
+                    'user_id': 1, 'token': f'live-{self.writes}', 'expires_at': expires,
+                    'created_at': datetime.now(), 'used': False
+                }])
+                db.session.commit()
+                self.max_wait = max(self.max_wait, time.perf_counter() - t0)
+                self.writes += 1
+                time.sleep(0.005)
+            db.session.remove()
+
+
+def timed(app, cleanup):
+    writer = Writer(app)
+    writer.start()
+    start = time.perf_counter()
+    rows = cleanup()
+    elapsed = time.perf_counter() - start
+    writer.stop.set()
+    writer.join()
+    return rows, elapsed, writer
+
+
+def run_baseline(args):
+    from models import db, MultiplayerRoom, MultiplayerParticipant, PasswordResetToken
+
+    app = make_app('baseline')
+    with app.app_context():
+        db.create_all()
+        seed(db, args)
+
+        def cleanup():
+            rooms = MultiplayerRoom.query.filter(MultiplayerRoom.status == 'completed').all()
+            for room in rooms:
+                MultiplayerParticipant.query.filter_by(room_id=room.id).delete()
+                db.session.delete(room)
+            tokens = db.session.query(PasswordResetToken).filter(
+                PasswordResetToken.expires_at < datetime.now()).delete()
+            db.session.commit()
+            return len(rooms) + tokens
+
+        result = timed(app, cleanup)
+        db.engine.dispose()
+    return result
+
+
+def run_maintenance(args):
+    from models import db
+    from maintenance_scheduler import MaintenanceScheduler, JOBS
+
+    app = make_app('maintenance')
+    scheduler = MaintenanceScheduler(window='', chunk_size=args.chunk_size, chunk_pause_ms=0, jobs={
+        name: JOBS[name] for name in ('multiplayer_rooms', 'password_reset_tokens')
+    })
+    with app.app_context():
+        db.create_all()
+        seed(db, args)
+
+        def cleanup():
+            results = scheduler.run_due(force=True)
+            return sum(metrics['last_rows'] for metrics in results.values())
+
+        result = timed(app, cleanup)
+        db.engine.dispose()
+    return result
+
+
+def report(label, rows, elapsed, writer):
+    print(f"\n📊 {label}")
+    print(f"  rows removed:     {rows:12,}")
+    print(f"  duration:         {elapsed * 1000:12,.0f} ms")
+    print(f"  writer commits:   {writer.writes:12,}")
+    print(f"  max writer wait:  {writer.max_wait * 1000:12,.1f} ms")
+
+
+def main():
+    args = parse_args()
+    print(f"⚙️  {args.rooms:,} stale rooms x {args.players} players, {args.tokens:,} expired tokens")
+
+    base_rows, base_time, base_writer = run_baseline(args)
+    rows, elapsed, writer = run_maintenance(args)
+
+    report('ORM cleanup (one transaction)', base_rows, base_time, base_writer)
+    report(f'maintenance jobs (chunks of {args.chunk_size:,})', rows, elapsed, writer)
+    print(f"\n✅ {base_time / max(elapsed, 1e-9):.1f}x faster, longest writer stall "
+          f"{base_writer.max_wait * 1000:.0f}ms -> {writer.max_wait * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
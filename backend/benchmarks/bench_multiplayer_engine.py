@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-answer DB commits vs the in-memory multiplayer engine.
+
+Plays --rooms games of --players players and --questions rounds. The
+baseline does what the answer handler used to: update the participant's
+score, commit, re-rank every participant and commit again, for every answer.
+The engine run grades the same answers in memory and writes rooms only at
+checkpoints and at game end. Rounds are opened directly instead of on the
+engine's timers. Reports answer throughput, DB commits and the size of the
+sealed question bundle vs the per-round reveal ticks.
+
+Usage:
+    python benchmarks/bench_multiplayer_engine.py --rooms 50 --players 8 --questions 10
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--checkpoint-rounds', type=int, default=5)
+    return parser.parse_args()
+
+
+class NullSocketIO:
+    """Counts emits; round timers are not started (rounds close when everyone answered)"""
+
+    def __init__(self):
+        self.emits = 0
+        self.bytes = {}
+
+    def emit(self, event, data, to=None, **kwargs):
+        self.emits += 1
+        self.bytes[event] = self.bytes.get(event, 0) + len(json.dumps(data, default=str))
+
+    def start_background_task(self, target, *args):
+        pass
+
+
+def make_app(label):
+    from flask import Flask
+    from models import db
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='sq_multiplayer_bench_'), 'bench.db')
+    app = Flask(f'bench_{label}')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+QUESTION = {'question_text': 'Which option is correct?', 'question_type': 'MCQ',
+            'options': ['A) First', 'B) Second', 'C) Third', 'D) Fourth'], 'correct_answer': 'A',
+            'explanation': 'The first option is correct.', 'difficulty_level': 'Intermediate'}
+
+
+def seed(db, args):
+    from models import User, MultiplayerRoom, MultiplayerParticipant
+
+    db.session.execute(User.__table__.insert(), [{
+        'id': i, 'username': f'user{i}', 'email': f'user{i}@bench.local', 'password_hash': 'x',
+        'full_name': f'User {i}', 'skill_level': 'Intermediate', 'role': 'user', 'email_verified': True
+    } for i in range(1, args.players + 1)])
+    db.session.execute(MultiplayerRoom.__table__.insert(), [{
+        'id': r, 'room_code': f'R{r:05d}', 'name': 'Bench', 'host_user_id': 1, 'topic': 'Bench',
+        'difficulty': 'Medium', 'num_questions': args.questions, 'max_players': args.players,
+        'current_players': args.players, 'status': 'in_progress', 'current_question_index': 0,
+        'time_per_question': 30, 'question_set': [QUESTION] * args.questions
+    } for r in range(1, args.rooms + 1)])
+    db.session.execute(MultiplayerParticipant.__table__.insert(), [{
+        'room_id': r, 'user_id': u, 'score': 0, 'correct_answers': 0, 'answers_submitted': 0,
+        'is_ready': True, 'is_host': u == 1
+    } for r in range(1, args.rooms + 1) for u in range(1, args.players + 1)])
+    db.session.commit()
+
+
+def count_commits(db):
+    from sqlalchemy import event
+
+    counter = {'n': 0}
+    event.listen(db.session, 'after_commit', lambda session: counter.__setitem__('n', counter['n'] + 1))
+    return counter
+
+
+def run_baseline(args, answers):
+    from models import db, MultiplayerParticipant
+
+    app = make_app('baseline')
+    with app.app_context():
+        db.create_all()
+        seed(db, args)
+        commits = count_commits(db)
+        start = time.perf_counter()
+        for room_id, user_id, _, is_correct in answers:
+            participant = MultiplayerParticipant.query.filter_by(room_id=room_id, user_id=user_id).first()
+            participant.score += 100 if is_correct else 0
+            participant.correct_answers += 1 if is_correct else 0
+            db.session.commit()
+            ranked = MultiplayerParticipant.query.filter_by(room_id=room_id).order_by(
+                MultiplayerParticipant.score.desc()).all()
+            for rank, p in enumerate(ranked, 1):
+                p.rank = rank
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    return elapsed, commits['n']
+
+
+def run_engine(args, answers):
+    from models import db, MultiplayerRoom
+    from multiplayer_engine import MultiplayerEngine
+
+    app = make_app('engine')
+    socketio = NullSocketIO()
+    engine = MultiplayerEngine(checkpoint_rounds=args.checkpoint_rounds)
+    engine.init_app(app, socketio)
+
+    with app.app_context():
+        db.create_all()
+        seed(db, args)
+        commits = count_commits(db)
+        start = time.perf_counter()
+        for room in MultiplayerRoom.query.all():
+            engine.start(room)
+        for room_id, user_id, question_index, is_correct in answers:
+            room_code = f'R{room_id:05d}'
+            if user_id == 1:
+                engine.open_round(room_code, question_index)
+            engine.submit_answer(room_code, user_id, question_index, 'A' if is_correct else 'B')
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    return elapsed, commits['n'], engine.get_metrics(), socketio
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(42)
+    # Round by round in every room, the host (user 1) answering first
+    answers = [(room_id, user_id, q, rng.random() < 0.6)
+               for q in range(args.questions)
+               for room_id in range(1, args.rooms + 1)
+               for user_id in range(1, args.players + 1)]
+    print(f"⚙️  {args.rooms} rooms x {args.players} players x {args.questions} questions = {len(answers):,} answers")
+
+    base_time, base_commits = run_baseline(args, answers)
+    engine_time, engine_commits, metrics, socketio = run_engine(args, answers)
+
+    print(f"\n📊 per-answer commits")
+    print(f"  answers/s:        {len(answers) / base_time:12,.0f}")
+    print(f"  DB commits:       {base_commits:12,}")
+    print(f"\n📊 in-memory engine (checkpoint every {args.checkpoint_rounds} rounds)")
+    print(f"  answers/s:        {len(answers) / engine_time:12,.0f}")
+    print(f"  DB commits:       {engine_commits:12,}")
+    print(f"  checkpoints:      {metrics['checkpoints']:12,}")
+    print(f"  games completed:  {metrics['games_completed']:12,}")
+    print(f"  messages emitted: {socketio.emits:12,}")
+    bundle_bytes = socketio.bytes.get('multiplayer:question_bundle', 0) / args.rooms
+    tick_bytes = socketio.bytes.get('multiplayer:round_reveal', 0) / (args.rooms * args.questions)
+    print(f"  bundle bytes:     {bundle_bytes:12,.0f}  per room, sent once")
+    print(f"  reveal tick:      {tick_bytes:12,.0f}  bytes per round")
+    print(f"\n✅ {base_time / max(engine_time, 1e-9):.1f}x faster, "
+          f"{base_commits / max(engine_commits, 1):.0f}x fewer commits")
+
+
+if __name__ == '__main__':
+    main()
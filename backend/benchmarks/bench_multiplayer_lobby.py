@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Load test: multiplayer lobby polling against the open-room registry.
+
+Seeds --rooms open rooms over --topics topics, then replays one minute of
+lobby traffic: --polls-per-minute listing requests (a share of them for all
+topics, the rest for one topic each) interleaved with --writes-per-minute
+room changes (joins, leaves and new rooms) that go through
+multiplayer_service and invalidate the cache. The baseline runs the old
+get_available_rooms (a table scan plus one host query per room) for
+--baseline-polls requests and is extrapolated to a minute.
+
+Usage:
+    python benchmarks/bench_multiplayer_lobby.py --rooms 5000 --polls-per-minute 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=20)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--polls-per-minute', type=int, default=50000)
+    parser.add_argument('--writes-per-minute', type=int, default=3000)
+    parser.add_argument('--all-topics-share', type=float, default=0.2, help='Share of polls without a topic')
+    parser.add_argument('--baseline-polls', type=int, default=200, help='Polls run against the old query')
+    return parser.parse_args()
+
+
+def make_app():
+    from flask import Flask
+    from models import db
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='sq_lobby_bench_'), 'bench.db')
+    app = Flask('bench_lobby')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(db, args, rng, topics):
+    from models import User, MultiplayerRoom, MultiplayerParticipant
+
+    db.session.execute(User.__table__.insert(), [{
+        'id': i, 'username': f'user{i}', 'email': f'user{i}@bench.local', 'password_hash': 'x',
+        'full_name': f'User {i}', 'skill_level': 'Intermediate', 'role': 'user', 'email_verified': True
+    } for i in range(1, args.users + 1)])
+
+    now = datetime.utcnow()
+    rooms = [{
+        'id': r, 'room_code': f'B{r:05d}', 'name': 'Bench', 'host_user_id': r, 'topic': rng.choice(topics),
+        'difficulty': 'Medium', 'num_questions': 10, 'max_players': 8, 'current_players': 1,
+        'status': 'waiting' if rng.random() < 0.8 else 'in_progress', 'current_question_index': 0,
+        'time_per_question': 30, 'is_public': True, 'created_at': now - timedelta(seconds=r)
+    } for r in range(1, args.rooms + 1)]
+    db.session.execute(MultiplayerRoom.__table__.insert(), rooms)
+    db.session.execute(MultiplayerParticipant.__table__.insert(), [{
+        'room_id': room['id'], 'user_id': room['host_user_id'], 'score': 0, 'correct_answers': 0,
+        'answers_submitted': 0, 'is_ready': True, 'is_host': True
+    } for room in rooms])
+    db.session.commit()
+
+
+def legacy_get_available_rooms(topic=None, status='waiting'):
+    """get_available_rooms before the lobby registry"""
+    from models import User, MultiplayerRoom
+
+    query = MultiplayerRoom.query.filter_by(status=status)
+    if topic:
+        query = query.filter_by(topic=topic)
+    rooms = query.filter(
+        MultiplayerRoom.current_players < MultiplayerRoom.max_players
+    ).order_by(MultiplayerRoom.created_at.desc()).all()
+
+    rooms_data = []
+    for room in rooms:
+        room_dict = room.to_dict()
+        host = User.query.get(room.host_user_id)
+        room_dict['host_username'] = host.username if host else "Unknown"
+        rooms_data.append(room_dict)
+    return rooms_data
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct))] * 1000
+
+
+def report(label, latencies, elapsed, polls):
+    latencies = sorted(latencies)
+    capacity = polls / elapsed * 60
+    print(f"\n📊 {label}")
+    print(f"  polls:            {polls:12,}")
+    print(f"  capacity:         {capacity:12,.0f} polls/min (single thread)")
+    print(f"  latency p50:      {statistics.median(latencies) * 1000:12.2f} ms")
+    print(f"  latency p95:      {percentile(latencies, 0.95):12.2f} ms")
+    print(f"  latency p99:      {percentile(latencies, 0.99):12.2f} ms")
+    return capacity
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(7)
+    topics = [f'Topic {n}' for n in range(args.topics)]
+
+    from models import db
+    import multiplayer_service
+    import multiplayer_lobby
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(db, args, rng, topics)
+        print(f"⚙️  {args.rooms:,} rooms over {args.topics} topics | {args.polls_per_minute:,} polls/min, "
+              f"{args.writes_per_minute:,} room changes/min")
+
+        def poll_topic():
+            return None if rng.random() < args.all_topics_share else rng.choice(topics)
+
+        # Baseline: old scan + N+1 host lookups
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.baseline_polls):
+            t0 = time.perf_counter()
+            json.dumps(legacy_get_available_rooms(poll_topic()))
+            latencies.append(time.perf_counter() - t0)
+            db.session.remove()
+        baseline = report('old query (scan + host lookup per room)', latencies,
+                          time.perf_counter() - start, args.baseline_polls)
+
+        # Registry: one minute of polls with room changes interleaved
+        write_every = max(1, args.polls_per_minute // max(1, args.writes_per_minute))
+        next_user = args.rooms + 1
+        writes = 0
+        latencies = []
+        start = time.perf_counter()
+        for n in range(args.polls_per_minute):
+            if n % write_every == 0:
+                action = rng.random()
+                if action < 0.6:
+                    code = f'B{rng.randint(1, args.rooms):05d}'
+                    multiplayer_service.join_room(code, next_user)
+                    next_user = next_user % args.users + 1
+                elif action < 0.9:
+                    code = f'B{rng.randint(1, args.rooms):05d}'
+                    multiplayer_service.leave_room(code, int(code[1:]))
+                else:
+                    multiplayer_service.create_room(rng.randint(1, args.users), rng.choice(topics), 'Medium')
+                writes += 1
+            t0 = time.perf_counter()
+            json.dumps(multiplayer_service.get_available_rooms(poll_topic()))
+            latencies.append(time.perf_counter() - t0)
+        cached = report(f'lobby registry ({writes:,} room changes interleaved)', latencies,
+                        time.perf_counter() - start, args.polls_per_minute)
+
+        metrics = multiplayer_lobby.get_metrics()
+        print(f"  listing hits:     {metrics['listing_hits']:12,}")
+        print(f"  listing builds:   {metrics['listing_builds']:12,}")
+        print(f"  registry reloads: {metrics['reloads']:12,}")
+        print(f"  version checks:   {metrics['version_checks']:12,}")
+
+    target = args.polls_per_minute
+    print(f"\n{'✅' if cached >= target else '❌'} registry sustains {cached / target:.1f}x the target "
+          f"({baseline / target:.2f}x before), {cached / max(baseline, 1e-9):.0f}x more polls per core")
+    if cached < target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
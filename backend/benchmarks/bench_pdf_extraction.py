@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serial pdfplumber extraction vs the page-parallel extractor.
+
+Writes a --pages page PDF (a heading, --lines lines of text and a ruled
+table per page) and extracts it three ways: the old serial pdfplumber loop
+(text + tables, page by page), pdf_extraction with tables over --workers
+processes, and the text-only fast path (pypdfium2 when installed, else
+PyPDF2) over the same workers. Also reports time to the first page, which
+is what a streaming consumer waits for.
+
+Usage:
+    python benchmarks/bench_pdf_extraction.py --pages 500 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--lines', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    return parser.parse_args()
+
+
+def page_stream(page_number, lines):
+    ops = ['BT /F1 16 Tf 72 760 Td (Chapter %d: Sample syllabus section) Tj ET' % page_number]
+    for line in range(lines):
+        y = 730 - line * 12
+        ops.append('BT /F1 10 Tf 72 %d Td (Line %d of page %d covers photosynthesis, cell division '
+                   'and the water cycle in detail.) Tj ET' % (y, line + 1, page_number))
+    # 3x4 ruled table at the bottom of the page
+    top, left, width, height = 230, 72, 120, 18
+    for row in range(4):
+        ops.append('%d %d m %d %d l S' % (left, top - row * height, left + 3 * width, top - row * height))
+    for col in range(4):
+        ops.append('%d %d m %d %d l S' % (left + col * width, top, left + col * width, top - 3 * height))
+    for row in range(3):
+        for col in range(3):
+            ops.append('BT /F1 9 Tf %d %d Td (R%dC%d p%d) Tj ET' % (
+                left + col * width + 4, top - row * height - 13, row + 1, col + 1, page_number))
+    return '\n'.join(ops).encode('latin-1')
+
+
+def write_pdf(path, pages, lines):
+    """Minimal PDF writer (catalog, page tree, one Helvetica font, one content stream per page)"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for n in range(1, pages + 1):
+        stream = page_stream(n, lines)
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_id = len(objects)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id)
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % i for i in page_ids), pages)
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+
+def legacy_extract(file_path):
+    """extract_text_from_pdf before pdf_extraction (serial pdfplumber)"""
+    import pdfplumber
+
+    text_content = []
+    with pdfplumber.open(file_path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            page_text = page.extract_text()
+            if page_text and page_text.strip():
+                text_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
+            for table_num, table in enumerate(page.extract_tables()):
+                table_text = f"\n--- Table {table_num + 1} on Page {page_num + 1} ---\n"
+                for row in table:
+                    if row:
+                        table_text += " | ".join(str(cell) if cell else "" for cell in row) + "\n"
+                text_content.append(table_text)
+    return '\n\n'.join(text_content)
+
+
+def timed(label, extract):
+    start = time.perf_counter()
+    first_page = None
+    chars = 0
+    pages = 0
+    for _, block in extract():
+        if first_page is None:
+            first_page = time.perf_counter() - start
+        chars += len(block)
+        pages += 1
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {label}")
+    print(f"  pages:            {pages:12,}")
+    print(f"  characters:       {chars:12,}")
+    print(f"  first page:       {first_page * 1000:12,.0f} ms")
+    print(f"  total:            {elapsed * 1000:12,.0f} ms")
+    return elapsed
+
+
+def main():
+    args = parse_args()
+    import pdf_extraction
+
+    path = os.path.join(tempfile.mkdtemp(prefix='sq_pdf_bench_'), 'syllabus.pdf')
+    write_pdf(path, args.pages, args.lines)
+    print(f"⚙️  {args.pages} pages ({os.path.getsize(path) / 1024:,.0f} KB), {args.workers} workers, "
+          f"fast path: {'pypdfium2' if pdf_extraction.pdfium_module() else 'PyPDF2'}")
+
+    # Warm the pool so worker start-up is not billed to the first run
+    pdf_extraction.get_executor().submit(int).result()
+
+    baseline = timed('serial pdfplumber (text + tables)',
+                     lambda: [(0, legacy_extract(path))])
+    parallel = timed(f'parallel pdfplumber (text + tables, {args.workers} workers)',
+                     lambda: pdf_extraction.iter_pdf_pages(path, True, args.workers))
+    fast = timed(f'parallel fast path (text only, {args.workers} workers)',
+                 lambda: pdf_extraction.iter_pdf_pages(path, False, args.workers))
+    pdf_extraction.shutdown()
+
+    print(f"\n✅ tables: {baseline / parallel:.1f}x faster, text only: {baseline / fast:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
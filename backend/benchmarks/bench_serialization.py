@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialization CPU per request for the leaderboard and history endpoints.
+
+Compares the previous path (nested dicts with isoformat() per datetime,
+encoded by Flask's default stdlib provider) against the __slots__ DTOs
+encoded by serialization.dumps (orjson when installed). Payloads are
+synthetic so the numbers isolate serialization from database time.
+
+Usage:
+    python benchmarks/bench_serialization.py --history-rows 2000 --leaderboard-rows 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import serialization
+from serialization import LeaderboardUserDTO, RecentQuizDTO
+
+HistoryRow = namedtuple('HistoryRow', [
+    'id', 'user_id', 'topic', 'skill_level', 'custom_topic', 'total_questions', 'completed_questions',
+    'correct_answers', 'score_percentage', 'total_time_seconds', 'time_limit_seconds', 'time_started',
+    'time_paused_at', 'total_paused_seconds', 'status', 'started_at', 'completed_at'
+])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history-rows', type=int, default=2000, help='Sessions in one history response')
+    parser.add_argument('--leaderboard-rows', type=int, default=50, help='Users in one leaderboard page')
+    parser.add_argument('--requests', type=int, default=200, help='Simulated requests per scenario')
+    return parser.parse_args()
+
+
+def make_history_rows(count, rng):
+    base = datetime.now() - timedelta(days=365)
+    rows = []
+    for i in range(count):
+        started = base + timedelta(minutes=i * 37)
+        rows.append(HistoryRow(
+            id=i + 1, user_id=1, topic=rng.choice(['Mathematics', 'Physics', 'History']),
+            skill_level='Intermediate', custom_topic=None, total_questions=10, completed_questions=10,
+            correct_answers=rng.randint(0, 10), score_percentage=rng.random() * 100,
+            total_time_seconds=rng.randint(60, 600), time_limit_seconds=None, time_started=None,
+            time_paused_at=None, total_paused_seconds=0, status='completed',
+            started_at=started, completed_at=started + timedelta(minutes=5)
+        ))
+    return rows
+
+
+def make_leaderboard_stats(count, rng):
+    base = datetime.now() - timedelta(days=30)
+    stats = []
+    for i in range(count):
+        recent = [(rng.randint(1, 10**6), rng.choice(['Mathematics', 'Physics']), rng.random() * 100,
+                   rng.randint(30, 600), base + timedelta(hours=rng.randint(0, 700))) for _ in range(5)]
+        stats.append((i + 1, f'user{i}', f'User {i}', f'user{i}@example.com', rng.randint(1, 200),
+                      rng.random() * 100, rng.randint(30, 600), recent))
+    return stats
+
+
+# ---- previous path: dicts + isoformat + Flask DefaultJSONProvider settings ----
+
+def legacy_dumps(obj):
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def legacy_history(rows):
+    payload = [{
+        'id': r.id, 'user_id': r.user_id, 'topic': r.topic, 'skill_level': r.skill_level,
+        'custom_topic': r.custom_topic, 'total_questions': r.total_questions,
+        'completed_questions': r.completed_questions, 'correct_answers': r.correct_answers,
+        'score_percentage': r.score_percentage, 'total_time_seconds': r.total_time_seconds,
+        'time_limit_seconds': r.time_limit_seconds, 'time_remaining_seconds': None,
+        'is_paused': r.time_paused_at is not None, 'status': r.status,
+        'started_at': r.started_at.isoformat(),
+        'completed_at': r.completed_at.isoformat() if r.completed_at else None,
+        'questions_count': 10
+    } for r in rows]
+    return legacy_dumps(payload)
+
+
+def legacy_leaderboard(stats):
+    payload = []
+    for rank, (uid, username, full_name, email, quizzes, avg, avg_time, recent) in enumerate(stats, start=1):
+        payload.append({
+            'user_id': uid, 'username': username, 'full_name': full_name, 'email': email,
+            'total_quizzes': quizzes, 'total_questions': quizzes * 10, 'total_correct': quizzes * 6,
+            'average_score': round(avg, 1), 'total_time': avg_time * quizzes, 'average_time': avg_time,
+            'best_score': 100.0, 'best_quiz_id': recent[0][0], 'best_quiz_time': recent[0][3],
+            'recent_quizzes': [{'quiz_id': q, 'topic': t, 'score': round(s, 1), 'time_taken': tt,
+                                'completed_at': ts.isoformat()} for q, t, s, tt, ts in recent],
+            'rank': rank
+        })
+    return legacy_dumps({'leaderboard': payload, 'total_users': len(payload)})
+
+
+# ---- new path: __slots__ DTOs + serialization.dumps ----
+
+def dto_history(rows):
+    from quiz_history_service import serialize_history_row
+    return serialization.dumps([serialize_history_row(r, 10) for r in rows])
+
+
+def dto_leaderboard(stats):
+    payload = []
+    for rank, (uid, username, full_name, email, quizzes, avg, avg_time, recent) in enumerate(stats, start=1):
+        payload.append(LeaderboardUserDTO(
+            user_id=uid, username=username, full_name=full_name, email=email,
+            total_quizzes=quizzes, total_questions=quizzes * 10, total_correct=quizzes * 6,
+            average_score=round(avg, 1), total_time=avg_time * quizzes, average_time=avg_time,
+            best_score=100.0, best_quiz_id=recent[0][0], best_quiz_time=recent[0][3],
+            recent_quizzes=[RecentQuizDTO(quiz_id=q, topic=t, score=round(s, 1), time_taken=tt, completed_at=ts)
+                            for q, t, s, tt, ts in recent],
+            rank=rank
+        ))
+    return serialization.dumps({'leaderboard': payload, 'total_users': len(payload)})
+
+
+def cpu_per_request(fn, data, requests):
+    """CPU seconds per call measured with process_time (excludes I/O waits)"""
+    fn(data)  # warm-up (imports, caches)
+    start = time.process_time()
+    for _ in range(requests):
+        body = fn(data)
+    return (time.process_time() - start) / requests, body
+
+
+def report(label, legacy_fn, new_fn, data, requests):
+    legacy_cpu, legacy_body = cpu_per_request(legacy_fn, data, requests)
+    new_cpu, new_body = cpu_per_request(new_fn, data, requests)
+
+    print(f"\n📊 {label}")
+    print(f"  {'previous (dicts + stdlib json)':<36} {legacy_cpu * 1000:9.3f} ms/request  {len(legacy_body):>10,} bytes")
+    print(f"  {'DTOs + ' + ('orjson' if serialization.ORJSON_AVAILABLE else 'stdlib json'):<36} "
+          f"{new_cpu * 1000:9.3f} ms/request  {len(new_body):>10,} bytes")
+    print(f"  speedup: {legacy_cpu / new_cpu:6.1f}x")
+
+    gzip_start = time.process_time()
+    gzipped = gzip.compress(new_body, compresslevel=serialization.GZIP_LEVEL)
+    gzip_cpu = time.process_time() - gzip_start
+    print(f"  gzip:    {len(gzipped):>10,} bytes  (+{gzip_cpu * 1000:.3f} ms)")
+    if serialization.BROTLI_AVAILABLE:
+        import brotli
+        br_start = time.process_time()
+        compressed = brotli.compress(new_body, quality=serialization.BROTLI_QUALITY)
+        br_cpu = time.process_time() - br_start
+        print(f"  brotli:  {len(compressed):>10,} bytes  (+{br_cpu * 1000:.3f} ms)")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(42)
+
+    print(f"⚙️  orjson: {serialization.ORJSON_AVAILABLE} | brotli: {serialization.BROTLI_AVAILABLE}")
+
+    history_rows = make_history_rows(args.history_rows, rng)
+    report(f"/api/quiz/history ({args.history_rows} sessions)", legacy_history, dto_history,
+           history_rows, args.requests)
+
+    leaderboard_stats = make_leaderboard_stats(args.leaderboard_rows, rng)
+    report(f"/api/leaderboard ({args.leaderboard_rows} users)", legacy_leaderboard, dto_leaderboard,
+           leaderboard_stats, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Socket.IO broadcast fan-out through a message queue.
+
+Starts the single Socket.IO worker the deployment supports (eventlet,
+socketio_config options; multiplayer is disabled with more than one worker),
+connects --clients websocket clients to it from several client processes,
+joins them all to one leaderboard room and publishes --broadcasts messages
+from a separate write-only emitter through the message queue, as a script or
+scheduler would. Every client must receive every broadcast.
+
+Without --message-queue a local ZeroMQ broker (socketio_broker.py) is
+started. 10k clients need a raised file descriptor limit (`ulimit -n 65536`).
+
+Usage:
+    python benchmarks/bench_socketio_fanout.py --clients 10000
+    python benchmarks/bench_socketio_fanout.py --message-queue redis://localhost:6379/0
+
+Requires: eventlet, python-socketio[asyncio_client] (aiohttp), pyzmq or redis.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ROOM_TOPIC = 'bench'
+EVENT = 'leaderboard:update'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=10000, help='Connected clients (total)')
+    parser.add_argument('--client-procs', type=int, default=10, help='Processes running the clients')
+    parser.add_argument('--broadcasts', type=int, default=20, help='Room broadcasts to publish')
+    parser.add_argument('--interval-ms', type=int, default=250, help='Delay between broadcasts')
+    parser.add_argument('--message-queue', default=None, help='Broker URL (default: local ZeroMQ broker)')
+    parser.add_argument('--port', type=int, default=5101, help='Socket.IO worker port')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    # Internal roles
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--client-proc', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--count', type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+# ==================== WORKER ====================
+
+def serve(args):
+    """The Socket.IO worker with the app's room handler"""
+    import socketio_config
+    socketio_config.monkey_patch()
+
+    from flask import Flask
+    from flask_socketio import SocketIO, emit, join_room
+
+    app = Flask(f'fanout_worker_{args.port}')
+    socketio = SocketIO(app, cors_allowed_origins='*', logger=False, engineio_logger=False,
+                        **socketio_config.get_socketio_options())
+
+    @socketio.on('join_leaderboard')
+    def handle_join_leaderboard(data):
+        join_room(f"leaderboard_{data.get('topic', 'global')}")
+        emit('joined_leaderboard', {'topic': data.get('topic', 'global')})
+
+    socketio.run(app, host='127.0.0.1', port=args.port, log_output=False)
+
+
+# ==================== CLIENTS ====================
+
+def run_clients(args):
+    """Connect --count clients to --port, report READY, then count broadcasts"""
+    import asyncio
+    import socketio
+
+    async def main():
+        received = []
+        latencies = []
+        joined = 0
+
+        async def start_client(index):
+            nonlocal joined
+            client = socketio.AsyncClient(reconnection=False)
+            counter = {'n': 0}
+            ready = asyncio.Event()
+
+            @client.on(EVENT)
+            async def on_update(data):
+                counter['n'] += 1
+                latencies.append(time.time() - data['sent_at'])
+
+            @client.on('joined_leaderboard')
+            async def on_joined(data):
+                ready.set()
+
+            await client.connect(f"http://127.0.0.1:{args.port}", transports=['websocket'])
+            await client.emit('join_leaderboard', {'topic': ROOM_TOPIC})
+            await asyncio.wait_for(ready.wait(), timeout=30)
+            joined += 1
+            received.append(counter)
+            return client
+
+        clients = []
+        for start in range(0, args.count, 200):
+            batch = await asyncio.gather(
+                *(start_client(i) for i in range(start, min(start + 200, args.count))),
+                return_exceptions=True
+            )
+            clients.extend(c for c in batch if not isinstance(c, Exception))
+
+        print(f"READY {joined}", flush=True)
+
+        deadline = time.time() + args.timeout
+        while time.time() < deadline and any(c['n'] < args.broadcasts for c in received):
+            await asyncio.sleep(0.2)
+
+        print("RESULT " + json.dumps({
+            'connected': joined,
+            'delivered': sum(c['n'] for c in received),
+            'complete_clients': sum(1 for c in received if c['n'] >= args.broadcasts),
+            'latencies': latencies[::max(1, len(latencies) // 2000)]
+        }), flush=True)
+
+        await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+    asyncio.run(main())
+
+
+# ==================== ORCHESTRATOR ====================
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+def spawn(extra_args, env):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *extra_args], env=env,
+                            stdout=subprocess.PIPE, text=True, cwd=BACKEND_DIR)
+
+
+def main():
+    args = parse_args()
+    if args.serve:
+        return serve(args)
+    if args.client_proc:
+        return run_clients(args)
+
+    processes = []
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE='eventlet')
+    message_queue = args.message_queue
+    if not message_queue:
+        pull_port, pub_port = args.port + 1000, args.port + 1001
+        broker = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'socketio_broker.py'),
+                                   '--pull-port', str(pull_port), '--pub-port', str(pub_port)])
+        processes.append(broker)
+        message_queue = f"zmq+tcp://127.0.0.1:{pull_port}+{pub_port}"
+    env['SOCKETIO_MESSAGE_QUEUE'] = message_queue
+
+    try:
+        processes.append(spawn(['--serve', '--port', str(args.port)], env))
+        if not wait_for_port(args.port):
+            print("❌ Worker did not start")
+            sys.exit(1)
+        print(f"⚙️  Worker on port {args.port} | queue: {message_queue}")
+
+        per_proc = [args.clients // args.client_procs + (1 if i < args.clients % args.client_procs else 0)
+                    for i in range(args.client_procs)]
+        client_procs = [spawn(['--client-proc', '--port', str(args.port), '--count', str(count),
+                               '--broadcasts', str(args.broadcasts), '--timeout', str(args.timeout)], env)
+                        for count in per_proc if count]
+        processes.extend(client_procs)
+
+        connect_start = time.perf_counter()
+        connected = 0
+        for proc in client_procs:
+            line = proc.stdout.readline()
+            while line and not line.startswith('READY'):
+                line = proc.stdout.readline()
+            connected += int(line.split()[1]) if line else 0
+        print(f"🔌 {connected:,}/{args.clients:,} clients connected and joined in "
+              f"{time.perf_counter() - connect_start:.1f}s")
+
+        # Write-only emitter: a separate process publishing through the queue, like a scheduler would
+        from flask_socketio import SocketIO
+        import socketio_config
+        emitter = SocketIO(message_queue=message_queue, channel=socketio_config.SOCKETIO_CHANNEL)
+        time.sleep(1)  # Let the emitter's subscription settle
+        publish_start = time.perf_counter()
+        for seq in range(args.broadcasts):
+            emitter.emit(EVENT, {'seq': seq, 'sent_at': time.time()}, to=f'leaderboard_{ROOM_TOPIC}')
+            time.sleep(args.interval_ms / 1000)
+
+        results = []
+        lock = threading.Lock()
+
+        def collect(proc):
+            for line in proc.stdout:
+                if line.startswith('RESULT '):
+                    with lock:
+                        results.append(json.loads(line[len('RESULT '):]))
+                    return
+
+        readers = [threading.Thread(target=collect, args=(proc,)) for proc in client_procs]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        elapsed = time.perf_counter() - publish_start
+
+        delivered = sum(r['delivered'] for r in results)
+        expected = connected * args.broadcasts
+        complete = sum(r['complete_clients'] for r in results)
+        latencies = sorted(l for r in results for l in r['latencies']) or [0]
+        print(f"\n📊 Fan-out: {args.broadcasts} broadcasts x {connected:,} clients")
+        print(f"  delivered:        {delivered:,}/{expected:,} ({delivered / max(expected, 1):.2%})")
+        print(f"  complete clients: {complete:,}/{connected:,}")
+        print(f"  throughput:       {delivered / elapsed:,.0f} msgs/s")
+        print(f"  latency p50:      {statistics.median(latencies) * 1000:9.1f} ms")
+        print(f"  latency p95:      {latencies[int(len(latencies) * 0.95) - 1] * 1000:9.1f} ms")
+        print(f"  latency max:      {latencies[-1] * 1000:9.1f} ms")
+        if delivered < expected:
+            sys.exit(1)
+    finally:
+        for proc in processes:
+            proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark: 200 simultaneous quiz takers against SQLite, default vs tuned profile.
+
+Each simulated taker (one thread, like a threading-mode request/SocketIO
+worker) starts a quiz, writes its questions, then submits every answer
+with its own commit while reading a leaderboard aggregate in between.
+Runs once with SQLAlchemy/SQLite defaults and once with the db_config
+profile (WAL, synchronous=NORMAL, busy_timeout, mmap, cache, temp_store,
+pool sizing) on fresh database files.
+
+Usage:
+    python benchmarks/bench_sqlite_concurrency.py --takers 200 --questions 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--takers', type=int, default=200, help='Concurrent quiz takers (threads)')
+    parser.add_argument('--questions', type=int, default=10, help='Questions per quiz')
+    parser.add_argument('--think-ms', type=int, default=20, help='Max think time between answers (ms)')
+    parser.add_argument('--workdir', default=None)
+    return parser.parse_args()
+
+
+def make_app(db, db_path, tuned):
+    from flask import Flask
+    import db_config
+
+    app = Flask(f"bench_{'tuned' if tuned else 'default'}")
+    uri = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if tuned:
+        db_config.configure_app(app, uri)
+    db.init_app(app)
+    if tuned:
+        db_config.init_engine(app, db)
+    return app
+
+
+def run_profile(label, tuned, args, workdir):
+    from models import db, User, QuizSession, Question
+    from sqlalchemy.exc import OperationalError
+
+    db_path = os.path.join(workdir, f'{label}.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    app = make_app(db, db_path, tuned)
+
+    with app.app_context():
+        db.create_all()
+        for i in range(args.takers):
+            db.session.add(User(  # type: ignore
+                username=f'taker{i}', email=f'taker{i}@bench.local', password_hash='x',  # type: ignore
+                full_name=f'Taker {i}'  # type: ignore
+            ))
+        db.session.commit()
+        user_ids = [u.id for u in User.query.all()]
+
+    latencies = []
+    errors = {'locked': 0, 'other': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.takers)
+
+    def record(elapsed=None, error=None):
+        with lock:
+            if elapsed is not None:
+                latencies.append(elapsed)
+            if error is not None:
+                errors['locked' if 'locked' in str(error) else 'other'] += 1
+
+    def taker(user_id):
+        rng = random.Random(user_id)
+        with app.app_context():
+            barrier.wait()
+            try:
+                start = time.perf_counter()
+                session = QuizSession(user_id=user_id, topic='Benchmark', skill_level='Intermediate',  # type: ignore
+                                      total_questions=args.questions)  # type: ignore
+                db.session.add(session)
+                db.session.flush()
+                for n in range(args.questions):
+                    db.session.add(Question(  # type: ignore
+                        quiz_session_id=session.id, question_text=f'Q{n}',  # type: ignore
+                        question_type='MCQ', correct_answer='A', difficulty_level='Medium'  # type: ignore
+                    ))
+                db.session.commit()
+                record(time.perf_counter() - start)
+                question_ids = [q.id for q in Question.query.filter_by(quiz_session_id=session.id).all()]
+                session_id = session.id
+            except OperationalError as e:
+                db.session.rollback()
+                record(error=e)
+                return
+
+            for question_id in question_ids:
+                time.sleep(rng.random() * args.think_ms / 1000)
+                try:
+                    start = time.perf_counter()
+                    question = Question.query.get(question_id)
+                    quiz_session = QuizSession.query.get(session_id)
+                    question.user_answer = 'A'
+                    question.is_correct = rng.random() < 0.7
+                    question.answered_at = datetime.now()
+                    quiz_session.completed_questions += 1
+                    quiz_session.correct_answers += 1 if question.is_correct else 0
+                    quiz_session.calculate_score()
+                    db.session.commit()
+                    # Leaderboard-style read between writes
+                    db.session.query(QuizSession.user_id, db.func.avg(QuizSession.score_percentage)).group_by(
+                        QuizSession.user_id).limit(10).all()
+                    record(time.perf_counter() - start)
+                except OperationalError as e:
+                    db.session.rollback()
+                    record(error=e)
+            db.session.remove()
+
+    threads = [threading.Thread(target=taker, args=(uid,)) for uid in user_ids]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    with app.app_context():
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        db.engine.dispose()
+
+    ops = len(latencies)
+    ordered = sorted(latencies) or [0]
+    print(f"\n📊 {label} (journal_mode={journal_mode})")
+    print(f"  wall time:        {wall:9.2f}s")
+    print(f"  successful ops:   {ops:9,}  ({ops / wall:,.0f} ops/s)")
+    print(f"  locked errors:    {errors['locked']:9,}")
+    print(f"  other errors:     {errors['other']:9,}")
+    print(f"  latency p50:      {statistics.median(ordered) * 1000:9.1f} ms")
+    print(f"  latency p95:      {ordered[int(len(ordered) * 0.95) - 1] * 1000:9.1f} ms")
+    print(f"  latency max:      {ordered[-1] * 1000:9.1f} ms")
+    return wall, ops, errors
+
+
+def main():
+    args = parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sq_sqlite_bench_')
+    print(f"⚙️  {args.takers} takers x {args.questions} answers | workdir: {workdir}")
+
+    run_profile('default', False, args, workdir)
+    run_profile('tuned', True, args, workdir)
+
+
+if __name__ == '__main__':
+    main()
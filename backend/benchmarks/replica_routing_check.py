@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Replica routing check: verify db_routing against two real databases.
+
+The primary and the replica are seeded with different topic rows, so every
+read shows which database answered. Checks that @read_only reads hit the
+replica, writes and unannotated reads hit the primary, and reads fall back
+to the primary for read-your-writes (also as seen by another worker),
+excess lag and an unhealthy replica, and that a streamed response body keeps
+its reads on the replica.
+
+Usage:
+    python benchmarks/replica_routing_check.py                      # two temp SQLite files
+    python benchmarks/replica_routing_check.py --primary-url postgresql://... --replica-url postgresql://...
+
+With --replica-url pointing at a streaming standby the seeding step is
+skipped for the replica (it is read-only); seed distinct data yourself or
+expect the 'replica' reads to match the primary.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Only rows in this category are created, read and removed
+CHECK_CATEGORY = 'replica-routing-check'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--primary-url', default=None)
+    parser.add_argument('--replica-url', default=None)
+    parser.add_argument('--standby', action='store_true', help='Replica is a read-only standby (do not seed it)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='sq_replica_check_')
+    primary_url = args.primary_url or f"sqlite:///{os.path.join(workdir, 'primary.db')}"
+    replica_url = args.replica_url or f"sqlite:///{os.path.join(workdir, 'replica.db')}"
+    write_log_url = f"sqlite:///{os.path.join(workdir, 'last_writes.db')}"
+    os.environ['READ_YOUR_WRITES_URL'] = write_log_url
+
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token, verify_jwt_in_request
+    from models import db, Topic
+    import db_config
+    import db_routing
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = primary_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'replica-routing-check'
+    JWTManager(app)
+    db_config.configure_app(app, primary_url)
+    db_routing.configure_app(app, replica_url)
+    db.init_app(app)
+    db_config.init_engine(app, db)
+    db_routing.init_app(app, db)
+
+    # Short windows so the check runs quickly
+    db_routing.STICKY_WINDOW_SECONDS = 1.0
+    db_routing.REPLICA_HEALTH_CHECK_SECONDS = 3600
+
+    @db_routing.read_only
+    def read_topics():
+        return sorted(t.name for t in Topic.query.filter_by(category=CHECK_CATEGORY).all())
+
+    def plain_topics():
+        return sorted(t.name for t in Topic.query.filter_by(category=CHECK_CATEGORY).all())
+
+    @db_routing.read_only
+    def stream_topics():
+        # Like a streamed response: the body runs after the view has returned
+        def body():
+            yield plain_topics()
+        return db_routing.read_only_stream(body())
+
+    failures = []
+
+    def check(label, actual, expected):
+        ok = actual == expected
+        print(f"{'✅' if ok else '❌'} {label}: {actual}")
+        if not ok:
+            failures.append(label)
+
+    with app.app_context():
+        db.create_all()
+        Topic.query.filter_by(category=CHECK_CATEGORY).delete()
+        db.session.add(Topic(name='from-primary', category=CHECK_CATEGORY))  # type: ignore
+        db.session.commit()
+
+        if not args.standby:
+            replica = db.engines[db_routing.REPLICA_BIND_KEY]
+            db.metadata.create_all(replica)
+            with replica.begin() as connection:
+                connection.execute(Topic.__table__.delete().where(Topic.__table__.c.category == CHECK_CATEGORY))
+                connection.execute(Topic.__table__.insert(), [{'name': 'from-replica', 'category': CHECK_CATEGORY}])
+
+        tokens = {uid: create_access_token(identity=str(uid)) for uid in (1, 2)}
+
+    def as_user(user_id):
+        context = app.test_request_context(headers={'Authorization': f'Bearer {tokens[user_id]}'})
+        context.push()
+        verify_jwt_in_request()
+        return context
+
+    print(f"🗄️  primary: {primary_url}\n🗄️  replica: {replica_url}\n")
+
+    with app.app_context():
+        check('unannotated read -> primary', plain_topics(), ['from-primary'])
+        check('@read_only read -> replica', read_topics(), ['from-replica'])
+        check('@read_only streamed body -> replica', next(stream_topics()), ['from-replica'])
+        db.session.remove()
+
+    context = as_user(1)
+    db.session.add(Topic(name='written-by-user-1', category=CHECK_CATEGORY))  # type: ignore
+    db.session.commit()
+    check('user 1 reads own write (sticky primary)', read_topics(), ['from-primary', 'written-by-user-1'])
+    db.session.remove()
+    context.pop()
+
+    other_worker = db_routing.ReplicaState(write_log_url)
+    check('another worker sees user 1 write (shared store)', other_worker.is_sticky('1'), True)
+
+    context = as_user(2)
+    check('user 2 unaffected -> replica', read_topics(), ['from-replica'])
+    db.session.remove()
+    context.pop()
+
+    time.sleep(db_routing.STICKY_WINDOW_SECONDS + 0.2)
+    context = as_user(1)
+    check('user 1 after window -> replica', read_topics(), ['from-replica'])
+
+    with db_routing.read_only_scope():
+        db.session.add(Topic(name='written-in-read-only', category=CHECK_CATEGORY))  # type: ignore
+        db.session.commit()
+    check('write inside read-only scope -> primary', plain_topics(),
+          ['from-primary', 'written-by-user-1', 'written-in-read-only'])
+    db.session.remove()
+    context.pop()
+
+    with app.app_context():
+        state = db_routing.replica_state
+        state.lag_seconds = db_routing.REPLICA_MAX_LAG_SECONDS + 30
+        check('replica lag above tolerance -> primary', read_topics()[:1], ['from-primary'])
+        db.session.remove()
+
+        state.lag_seconds = 0.0
+        state.mark_unhealthy('simulated outage')
+        check('unhealthy replica -> primary', read_topics()[:1], ['from-primary'])
+        db.session.remove()
+
+        print(f"\nℹ️  status: {db_routing.get_status()}")
+        Topic.query.filter_by(category=CHECK_CATEGORY).delete()
+        db.session.commit()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\n✅ Replica routing behaves as expected")
+
+
+if __name__ == '__main__':
+    main()
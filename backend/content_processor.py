@@ -1,18 +1,21 @@
 """
 Advanced Content Processing Module for Custom Topic Upload
 Supports multiple file formats and content extraction methods
+
+Routes share one processor per process (get_content_processor). The parsers
+(python-docx, BeautifulSoup, the PDF libraries) and the Gemini client are
+imported on first use, so importing this module stays cheap.
 """
 
+import asyncio
 import os
 import re
 import json
 import requests
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-import PyPDF2
-import pdfplumber
-import docx
-from bs4 import BeautifulSoup
 try:
     import magic
     MAGIC_AVAILABLE = True
@@ -20,11 +23,65 @@ except ImportError:
     MAGIC_AVAILABLE = False
     print("Warning: python-magic not available. File type detection will be limited.")
 import hashlib
-import google.generativeai as genai
+import io
 import logging
+import math
+import threading
+import ai_circuit_breaker
+import document_chunking
+import extraction_cache
+import gemini_rate_limiter
+import pdf_extraction
 
 logger = logging.getLogger(__name__)
 
+# Tables need pdfplumber; without them PDFs take the faster text-only path
+PDF_EXTRACT_TABLES = os.getenv('PDF_EXTRACT_TABLES', 'true').lower() == 'true'
+
+# Upload size limit (also Flask's MAX_CONTENT_LENGTH, see app.py)
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', '10')) * 1024 * 1024
+
+# Leading bytes of binary formats (checked on uploads before parsing)
+FILE_SIGNATURES = {
+    '.pdf': b'%PDF',
+    '.docx': b'PK\x03\x04'
+}
+SNIFF_BYTES = 2048
+
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+# Upper bound for one generation call; the effective timeout follows recent p95 latency (ai_circuit_breaker)
+GEMINI_TIMEOUT_SECONDS = 60
+
+# Longer content is generated from chunks (document_chunking.py), CHUNK_CONCURRENCY calls at a time
+MAX_SINGLE_CALL_CHARS = 8000
+CHUNK_CONCURRENCY = int(os.getenv('CHUNK_CONCURRENCY', '4'))
+# Extra questions requested per chunk (share of its count) to cover duplicates dropped in the reduce step
+CHUNK_EXTRA_QUESTIONS = 0.25
+
+def url_validators(headers) -> Dict[str, str]:
+    """ETag / Last-Modified of an HTTP response (used to revalidate cached URLs)"""
+    validators = {}
+    if headers.get('ETag'):
+        validators['etag'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        validators['last_modified'] = headers['Last-Modified']
+    return validators
+
+@contextmanager
+def open_text(source, encoding: str = 'utf-8'):
+    """Text stream over a path or a binary file object (the file object is rewound and left open)"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r', encoding=encoding, newline='') as file:
+            yield file
+        return
+    source = pdf_extraction.raw_stream(source)
+    source.seek(0)
+    wrapper = io.TextIOWrapper(source, encoding=encoding, newline='')
+    try:
+        yield wrapper
+    finally:
+        wrapper.detach()
+
 class ContentProcessor:
     """Advanced content processor for multiple file formats and sources"""
     
@@ -41,29 +98,45 @@ class ContentProcessor:
             'web': ['http://', 'https://']
         }
         
-        # Maximum file size (10MB)
-        self.max_file_size = 10 * 1024 * 1024
+        # Maximum file size (MAX_UPLOAD_MB, 10MB by default)
+        self.max_file_size = MAX_UPLOAD_BYTES
         
-        # Configure Google Gemini AI
+        # Google Gemini AI (client built on first use, see gemini_model)
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-            logger.info("✅ Google Gemini AI configured for PDF question generation")
-        else:
-            self.gemini_model = None
+        self._gemini_model = None
+        self._gemini_lock = threading.Lock()
+        if not self.gemini_api_key:
             logger.warning("⚠️ GEMINI_API_KEY not found. PDF question generation will be limited.")
         
         print("📁 Content Processor initialized with advanced file support")
     
+    @property
+    def gemini_model(self):
+        """Gemini model for question generation (None without GEMINI_API_KEY)"""
+        if self._gemini_model is None and self.gemini_api_key:
+            with self._gemini_lock:
+                if self._gemini_model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.gemini_api_key)
+                    self._gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                    logger.info("✅ Google Gemini AI configured for PDF question generation")
+        return self._gemini_model
+    
     def ensure_upload_directory(self):
         """Ensure upload directory exists"""
         if not os.path.exists(self.upload_dir):
             os.makedirs(self.upload_dir)
             print(f"📂 Created upload directory: {self.upload_dir}")
     
-    def validate_file(self, file_path: str, file_size: int) -> Dict[str, Any]:
-        """Validate uploaded file"""
+    def validate_file(self, file_path: str, file_size: int, stream=None) -> Dict[str, Any]:
+        """
+        Validate uploaded file
+        
+        Args:
+            file_path: Path (or original filename of an upload)
+            file_size: Size in bytes
+            stream: Binary upload stream; its leading bytes are sniffed instead of reading the file
+        """
         validation_result = {
             'is_valid': False,
             'file_type': None,
@@ -90,9 +163,22 @@ class ContentProcessor:
             return validation_result
         
         # Detect MIME type for security
+        head = None
+        if stream is not None:
+            stream.seek(0)
+            head = stream.read(SNIFF_BYTES)
+            stream.seek(0)
+            signature = FILE_SIGNATURES.get(file_ext)
+            if signature and signature not in head[:1024]:
+                validation_result['error_message'] = f"File content does not match its {file_ext} extension"
+                return validation_result
+        
         if MAGIC_AVAILABLE:
             try:
-                mime_type = magic.from_file(file_path, mime=True)
+                if head is not None:
+                    mime_type = magic.from_buffer(head, mime=True)
+                else:
+                    mime_type = magic.from_file(file_path, mime=True)
                 validation_result['file_info']['mime_type'] = mime_type
             except:
                 pass  # magic library might not be available
@@ -104,72 +190,43 @@ class ContentProcessor:
         
         return validation_result
     
-    def extract_text_from_txt(self, file_path: str) -> str:
-        """Extract text from plain text files"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            # Clean and normalize text
-            content = re.sub(r'\n\s*\n', '\n\n', content)  # Normalize line breaks
-            content = re.sub(r'\s+', ' ', content)  # Normalize spaces
-            
-            return content.strip()
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(file_path, 'r', encoding='latin-1') as file:
-                return file.read().strip()
+    def extract_text_from_txt(self, source) -> str:
+        """Extract text from plain text files (path or binary file object), line by line"""
+        for encoding in ('utf-8', 'latin-1'):
+            try:
+                words = []
+                with open_text(source, encoding) as file:
+                    for line in file:
+                        # Normalize line breaks and spaces
+                        words.extend(line.split())
+                return ' '.join(words)
+            except UnicodeDecodeError:
+                # Try with different encoding
+                continue
     
-    def extract_text_from_pdf(self, file_path: str, use_advanced: bool = True) -> str:
+    def extract_text_from_pdf(self, file_path, use_advanced: bool = True,
+                              include_tables: Optional[bool] = None) -> str:
         """
         Extract text from PDF files with advanced processing
         
         Args:
-            file_path: Path to PDF file
+            file_path: Path to PDF file or a binary file object
             use_advanced: Use pdfplumber for better text extraction
+            include_tables: Extract tables (default PDF_EXTRACT_TABLES); without
+                tables pages take the fast text-only path
         
         Returns:
             Extracted text content
         """
         try:
-            if use_advanced:
-                # Use pdfplumber for better text extraction with layout preservation
-                text_content = []
-                
-                with pdfplumber.open(file_path) as pdf:
-                    for page_num, page in enumerate(pdf.pages):
-                        # Extract text with layout
-                        page_text = page.extract_text()
-                        
-                        if page_text and page_text.strip():
-                            text_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
-                        
-                        # Extract tables if present
-                        tables = page.extract_tables()
-                        if tables:
-                            for table_num, table in enumerate(tables):
-                                table_text = f"\n--- Table {table_num + 1} on Page {page_num + 1} ---\n"
-                                for row in table:
-                                    if row:
-                                        # Filter out None values and join cells
-                                        row_text = " | ".join(str(cell) if cell else "" for cell in row)
-                                        table_text += row_text + "\n"
-                                text_content.append(table_text)
-                
-                content = '\n\n'.join(text_content)
-            else:
-                # Fallback to PyPDF2
-                text_content = []
-                
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    
-                    for page_num, page in enumerate(pdf_reader.pages):
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content.append(f"Page {page_num + 1}:\n{page_text}")
-                
-                content = '\n\n'.join(text_content)
+            if include_tables is None:
+                include_tables = PDF_EXTRACT_TABLES
+            
+            # Pages are extracted in parallel and come back in order (pdf_extraction.py)
+            content = '\n\n'.join(
+                block for _, block in pdf_extraction.iter_pdf_pages(file_path, use_advanced and include_tables)
+                if block
+            )
             
             # Clean extracted text
             content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
@@ -182,10 +239,14 @@ class ContentProcessor:
             logger.error(f"❌ PDF extraction failed: {str(e)}")
             raise Exception(f"PDF extraction failed: {str(e)}")
     
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX files"""
+    def extract_text_from_docx(self, source) -> str:
+        """Extract text from DOCX files (path or binary file object)"""
         try:
-            doc = docx.Document(file_path)
+            import docx
+            if not isinstance(source, (str, os.PathLike)):
+                source = pdf_extraction.raw_stream(source)
+                source.seek(0)
+            doc = docx.Document(source)
             text_content = []
             
             # Extract paragraphs
@@ -214,10 +275,10 @@ class ContentProcessor:
         except Exception as e:
             raise Exception(f"DOCX extraction failed: {str(e)}")
     
-    def extract_text_from_json(self, file_path: str) -> str:
-        """Extract and format text from JSON files"""
+    def extract_text_from_json(self, source) -> str:
+        """Extract and format text from JSON files (path or binary file object)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open_text(source) as file:
                 data = json.load(file)
             
             # Convert JSON to readable text format
@@ -246,13 +307,13 @@ class ContentProcessor:
         except Exception as e:
             raise Exception(f"JSON extraction failed: {str(e)}")
     
-    def extract_text_from_csv(self, file_path: str) -> str:
-        """Extract and format text from CSV files"""
+    def extract_text_from_csv(self, source) -> str:
+        """Extract and format text from CSV files (path or binary file object), row by row"""
         try:
             import csv
             text_content = []
             
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open_text(source) as file:
                 # Try to detect delimiter
                 sample = file.read(1024)
                 file.seek(0)
@@ -279,8 +340,8 @@ class ContentProcessor:
         except Exception as e:
             raise Exception(f"CSV extraction failed: {str(e)}")
     
-    def extract_content_from_url(self, url: str) -> str:
-        """Extract text content from web URLs"""
+    def extract_content_from_url(self, url: str) -> Tuple[str, Dict[str, str]]:
+        """Extract text content from web URLs, with the response's ETag/Last-Modified (url_validators)"""
         try:
             # Validate URL
             if not (url.startswith('http://') or url.startswith('https://')):
@@ -292,8 +353,10 @@ class ContentProcessor:
             }
             response = requests.get(url, headers=headers, timeout=10)
             response.raise_for_status()
+            validators = url_validators(response.headers)
             
             # Parse HTML content
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.content, 'html.parser')
             
             # Remove script and style elements
@@ -312,21 +375,101 @@ class ContentProcessor:
             if len(text) > 10000:
                 text = text[:10000] + "...\n[Content truncated for processing]"
             
-            return text
+            return text, validators
         
         except Exception as e:
             raise Exception(f"URL extraction failed: {str(e)}")
     
-    def process_content(self, source: str, source_type: str = "auto") -> Dict[str, Any]:
+    def url_unchanged(self, url: str, validators: Optional[Dict[str, str]]) -> bool:
+        """Revalidate a cached URL with a HEAD request against its ETag/Last-Modified"""
+        if not validators:
+            return False
+        try:
+            response = requests.head(url, headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            }, timeout=5, allow_redirects=True)
+            if not response.ok:
+                return False
+            current = url_validators(response.headers)
+        except requests.RequestException:
+            return False
+        # Compare the strongest validator both sides have
+        for name in ('etag', 'last_modified'):
+            if name in validators and name in current:
+                return validators[name] == current[name]
+        return False
+    
+    def process_content_cached(self, source, source_type: str, source_digest: Optional[str] = None,
+                               filename: Optional[str] = None) -> Dict[str, Any]:
+        """
+        process_content plus get_content_summary through the extraction cache
+        
+        Args:
+            source: File path, URL, direct text content, or an upload's binary stream
+            source_type: "file", "upload", "url" or "text"
+            source_digest: SHA-256 of the file's bytes (extraction_cache.hash_stream);
+                files without one are not cached
+            filename: Original filename of an upload
+        
+        Returns:
+            process_content result with 'summary' added and metadata['cache_hit']
+        """
+        key = None
+        if source_type in ("file", "upload") and source_digest:
+            key = self.file_cache_key(filename or source, source_digest)
+        elif source_type == "url":
+            key = extraction_cache.url_key(source)
+        elif source_type == "text":
+            key = extraction_cache.text_key(source.strip())
+        
+        cached = extraction_cache.get(key) if key else None
+        if cached and source_type == "url" and not self.url_unchanged(source, cached.get('validators')):
+            cached = None
+        if cached:
+            cached['metadata']['cache_hit'] = True
+            return {
+                'success': True,
+                'content': cached['content'],
+                'metadata': cached['metadata'],
+                'summary': cached['summary'],
+                'error': None
+            }
+        
+        processing_result = self.process_content(source, source_type, filename)
+        validators = processing_result.pop('validators', None)
+        if not processing_result['success']:
+            return processing_result
+        
+        processing_result['summary'] = self.get_content_summary(processing_result['content'])
+        processing_result['metadata']['cache_hit'] = False
+        
+        # URLs without ETag/Last-Modified cannot be revalidated, so they are not cached
+        if key and (source_type != "url" or validators):
+            extraction_cache.put(key, {
+                'content': processing_result['content'],
+                'metadata': processing_result['metadata'],
+                'summary': processing_result['summary'],
+                'validators': validators
+            })
+        return processing_result
+    
+    def file_cache_key(self, file_path: str, source_digest: str) -> str:
+        """Extraction cache key of a file's bytes (and the options that change its extraction)"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        return extraction_cache.file_key(source_digest, file_ext, f"tables={PDF_EXTRACT_TABLES}")
+    
+    def process_content(self, source, source_type: str = "auto", filename: Optional[str] = None) -> Dict[str, Any]:
         """
         Main method to process content from various sources
         
         Args:
-            source: File path, URL, or direct text content
-            source_type: "file", "url", "text", or "auto" for auto-detection
+            source: File path, URL, direct text content, or an upload's binary stream
+            source_type: "file", "upload", "url", "text", or "auto" for auto-detection
+            filename: Original filename of an upload (its extension selects the extractor)
         
         Returns:
-            Dictionary with extracted content and metadata
+            Dictionary with extracted content and metadata (URLs add 'validators',
+            the response's ETag/Last-Modified)
         """
         
         processing_result = {
@@ -353,10 +496,13 @@ class ContentProcessor:
                     source_type = "text"
             
             # Process based on source type
-            if source_type == "file":
-                # Validate file
-                file_size = os.path.getsize(source)
-                validation = self.validate_file(source, file_size)
+            if source_type in ("file", "upload"):
+                # Validate file (uploads are parsed from their stream, no copy on disk)
+                if source_type == "file":
+                    validation = self.validate_file(source, os.path.getsize(source))
+                else:
+                    source.seek(0, os.SEEK_END)
+                    validation = self.validate_file(filename or '', source.tell(), stream=source)
                 
                 if not validation['is_valid']:
                     processing_result['error'] = validation['error_message']
@@ -382,7 +528,7 @@ class ContentProcessor:
                 processing_result['metadata']['file_info'] = validation['file_info']
             
             elif source_type == "url":
-                content = self.extract_content_from_url(source)
+                content, processing_result['validators'] = self.extract_content_from_url(source)
                 processing_result['metadata']['source_url'] = source
             
             elif source_type == "text":
@@ -449,14 +595,216 @@ class ContentProcessor:
             question_types = ['Multiple Choice', 'True/False', 'Short Answer']
         
         try:
-            # Chunk content if too long (Gemini has token limits)
-            max_content_length = 8000
-            if len(content) > max_content_length:
-                logger.warning(f"Content too long ({len(content)} chars). Truncating to {max_content_length} chars.")
-                content = content[:max_content_length] + "\n\n[Content truncated for processing]"
-            
-            # Create detailed prompt for question generation
-            prompt = f"""You are an expert quiz creator. Generate {num_questions} high-quality quiz questions based on the following content.
+            if len(content) <= MAX_SINGLE_CALL_CHARS:
+                logger.info(f"🤖 Generating {num_questions} questions using Gemini AI...")
+                self._wait_for_rate_limit()
+                generated_questions = self._request_questions(content, topic, num_questions, difficulty, question_types)
+                chunk_metadata = {'chunks_total': 1, 'chunks_used': 1}
+            else:
+                generated_questions, chunk_metadata = self._generate_from_chunks(
+                    content, topic, num_questions, difficulty, question_types
+                )
+            
+            return self._generation_result(generated_questions, topic, difficulty, question_types, chunk_metadata)
+        
+        except Exception as e:
+            return self._generation_error(e)
+    
+    async def generate_questions_from_content_async(
+        self,
+        content: str,
+        topic: str,
+        num_questions: int = 10,
+        difficulty: str = 'Medium',
+        question_types: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        generate_questions_from_content with the Gemini calls awaited on the
+        async client (gemini_async.py); chunks are requested concurrently,
+        CHUNK_CONCURRENCY at a time.
+        """
+        import gemini_async
+        
+        if not self.gemini_api_key:
+            return {
+                'success': False,
+                'error': 'Gemini AI not configured. Please set GEMINI_API_KEY.',
+                'questions': []
+            }
+        
+        if question_types is None:
+            question_types = ['Multiple Choice', 'True/False', 'Short Answer']
+        
+        async def request(text, count):
+            await self._wait_for_rate_limit_async()
+            prompt = self._questions_prompt(text, topic, count, difficulty, question_types)
+            with ai_circuit_breaker.guard('content', GEMINI_TIMEOUT_SECONDS, (gemini_async.TimeoutException,)) as timeout:
+                response_text = await gemini_async.generate_text(GEMINI_MODEL_NAME, self.gemini_api_key, prompt, timeout)
+            return self._parse_questions(response_text, topic, difficulty)
+        
+        try:
+            if len(content) <= MAX_SINGLE_CALL_CHARS:
+                logger.info(f"🤖 Generating {num_questions} questions using Gemini AI (async)...")
+                generated_questions = await request(content, num_questions)
+                chunk_metadata = {'chunks_total': 1, 'chunks_used': 1}
+            else:
+                chunks, plan = self._chunk_plan(content, num_questions)
+                semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+                
+                async def generate(item):
+                    async with semaphore:
+                        return await request(item['chunk']['text'], self._chunk_request_count(item))
+                
+                results = await asyncio.gather(*(generate(item) for item in plan), return_exceptions=True)
+                generated_questions, chunk_metadata = self._reduce_chunks(chunks, plan, results, num_questions)
+            
+            return self._generation_result(generated_questions, topic, difficulty, question_types, chunk_metadata)
+        
+        except Exception as e:
+            return self._generation_error(e)
+    
+    def _generation_result(self, generated_questions, topic, difficulty, question_types, chunk_metadata) -> Dict[str, Any]:
+        logger.info(f"✅ Successfully generated {len(generated_questions)} questions from content")
+        
+        return {
+            'success': True,
+            'questions': generated_questions,
+            'total_generated': len(generated_questions),
+            'metadata': {
+                'topic': topic,
+                'difficulty': difficulty,
+                'question_types': question_types,
+                'generated_at': datetime.now().isoformat(),
+                'ai_model': 'Gemini-1.5-Flash',
+                **chunk_metadata
+            }
+        }
+    
+    def _generation_error(self, e: Exception) -> Dict[str, Any]:
+        if isinstance(e, json.JSONDecodeError):
+            logger.error(f"❌ Failed to parse Gemini response as JSON: {e}")
+            logger.error(f"Response: {e.doc[:500]}")
+            return {
+                'success': False,
+                'error': 'Failed to parse AI response. Please try again.',
+                'questions': [],
+                'raw_response': e.doc[:500]
+            }
+        
+        logger.error(f"❌ Question generation failed: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'questions': []
+        }
+    
+    def _chunk_plan(self, content: str, num_questions: int):
+        """Chunks of the content and the per-chunk question plan (document_chunking.py)"""
+        chunks = document_chunking.chunk_document(content)
+        ranked = document_chunking.rank_chunks(chunks, self.get_content_summary(content)['top_keywords'])
+        plan = document_chunking.plan_questions(ranked, num_questions)
+        logger.info(f"🤖 Generating {num_questions} questions from {len(plan)} of {len(chunks)} chunks "
+                    f"({len(content)} chars) using Gemini AI...")
+        return chunks, plan
+    
+    def _chunk_request_count(self, item: Dict) -> int:
+        # Ask for a few extra so deduplication can still fill the count
+        return item['count'] + math.ceil(item['count'] * CHUNK_EXTRA_QUESTIONS)
+    
+    def _reduce_chunks(self, chunks, plan, results, num_questions: int):
+        """Interleave and deduplicate per-chunk results (exceptions count as failed chunks)"""
+        per_chunk = []
+        failures = []
+        for item, result in zip(plan, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Chunk {item['chunk']['index']} generation failed: {result}")
+                failures.append(result)
+                per_chunk.append([])
+            else:
+                per_chunk.append(result)
+        
+        if failures and len(failures) == len(plan):
+            raise failures[0]
+        
+        questions = document_chunking.reduce_questions(per_chunk, num_questions)
+        return questions, {
+            'chunks_total': len(chunks),
+            'chunks_used': len(plan) - len(failures),
+            'chunk_failures': len(failures)
+        }
+    
+    def _generate_from_chunks(
+        self,
+        content: str,
+        topic: str,
+        num_questions: int,
+        difficulty: str,
+        question_types: List[str]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Map-reduce generation for long content (document_chunking.py): one
+        concurrent call per selected chunk, then interleave and deduplicate
+        """
+        chunks, plan = self._chunk_plan(content, num_questions)
+        
+        def generate(item):
+            self._wait_for_rate_limit()
+            return self._request_questions(item['chunk']['text'], topic, self._chunk_request_count(item),
+                                           difficulty, question_types)
+        
+        results = []
+        with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY) as executor:
+            futures = [executor.submit(generate, item) for item in plan]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+        
+        return self._reduce_chunks(chunks, plan, results, num_questions)
+    
+    def _wait_for_rate_limit(self):
+        """Block until the shared Gemini rate limiter (gemini_rate_limiter) admits a request"""
+        try:
+            gemini_rate_limiter.acquire()
+        except gemini_rate_limiter.RateLimitExceeded as e:
+            raise Exception(f"AI rate limit reached. Please try again in {math.ceil(e.retry_after)} seconds.")
+    
+    async def _wait_for_rate_limit_async(self):
+        """_wait_for_rate_limit without blocking the event loop"""
+        try:
+            await gemini_rate_limiter.acquire_async()
+        except gemini_rate_limiter.RateLimitExceeded as e:
+            raise Exception(f"AI rate limit reached. Please try again in {math.ceil(e.retry_after)} seconds.")
+    
+    def _request_questions(
+        self,
+        content: str,
+        topic: str,
+        num_questions: int,
+        difficulty: str,
+        question_types: List[str]
+    ) -> List[Dict[str, Any]]:
+        """One Gemini call: prompt with the content, parse the JSON question list"""
+        prompt = self._questions_prompt(content, topic, num_questions, difficulty, question_types)
+        
+        from google.api_core import exceptions as google_exceptions
+        
+        # Call Gemini AI (through the shared circuit breaker, with the adaptive timeout)
+        with ai_circuit_breaker.guard('content', GEMINI_TIMEOUT_SECONDS, (google_exceptions.DeadlineExceeded,)) as timeout:
+            response = self.gemini_model.generate_content(prompt, request_options={'timeout': timeout})
+        return self._parse_questions(response.text, topic, difficulty)
+    
+    def _questions_prompt(
+        self,
+        content: str,
+        topic: str,
+        num_questions: int,
+        difficulty: str,
+        question_types: List[str]
+    ) -> str:
+        # Create detailed prompt for question generation
+        return f"""You are an expert quiz creator. Generate {num_questions} high-quality quiz questions based on the following content.
 
 **Topic:** {topic}
 **Difficulty Level:** {difficulty}
@@ -492,89 +840,60 @@ class ContentProcessor:
 }}
 
 Generate ONLY valid JSON. Do not include any text before or after the JSON."""
-
-            logger.info(f"🤖 Generating {num_questions} questions using Gemini AI...")
-            
-            # Call Gemini AI
-            response = self.gemini_model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Extract JSON from response (sometimes Gemini adds markdown code blocks)
-            json_match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group(1)
-            
-            # Parse JSON response
-            questions_data = json.loads(response_text)
-            
-            # Validate and process questions
-            generated_questions = []
-            for q in questions_data.get('questions', []):
-                # Ensure all required fields are present
-                if 'question_text' in q and 'correct_answer' in q:
-                    question = {
-                        'question_text': q['question_text'],
-                        'question_type': q.get('question_type', 'Multiple Choice'),
-                        'correct_answer': q['correct_answer'],
-                        'explanation': q.get('explanation', 'No explanation provided.'),
-                        'difficulty': difficulty,
-                        'topic': topic,
-                        'options': q.get('options', []),
-                        'generated_by': 'Gemini AI',
-                        'source': 'PDF Content'
-                    }
-                    generated_questions.append(question)
-            
-            logger.info(f"✅ Successfully generated {len(generated_questions)} questions from content")
-            
-            return {
-                'success': True,
-                'questions': generated_questions,
-                'total_generated': len(generated_questions),
-                'metadata': {
-                    'topic': topic,
+    
+    def _parse_questions(self, response_text: str, topic: str, difficulty: str) -> List[Dict[str, Any]]:
+        """Question dicts from Gemini's JSON answer (raises json.JSONDecodeError)"""
+        response_text = response_text.strip()
+        
+        # Extract JSON from response (sometimes Gemini adds markdown code blocks)
+        json_match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', response_text, re.DOTALL)
+        if json_match:
+            response_text = json_match.group(1)
+        
+        # Parse JSON response
+        questions_data = json.loads(response_text)
+        
+        # Validate and process questions
+        generated_questions = []
+        for q in questions_data.get('questions', []):
+            # Ensure all required fields are present
+            if 'question_text' in q and 'correct_answer' in q:
+                question = {
+                    'question_text': q['question_text'],
+                    'question_type': q.get('question_type', 'Multiple Choice'),
+                    'correct_answer': q['correct_answer'],
+                    'explanation': q.get('explanation', 'No explanation provided.'),
                     'difficulty': difficulty,
-                    'question_types': question_types,
-                    'generated_at': datetime.now().isoformat(),
-                    'ai_model': 'Gemini-1.5-Flash'
+                    'topic': topic,
+                    'options': q.get('options', []),
+                    'generated_by': 'Gemini AI',
+                    'source': 'PDF Content'
                 }
-            }
+                generated_questions.append(question)
         
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to parse Gemini response as JSON: {e}")
-            logger.error(f"Response: {response_text[:500]}")
-            return {
-                'success': False,
-                'error': 'Failed to parse AI response. Please try again.',
-                'questions': [],
-                'raw_response': response_text[:500]
-            }
-        
-        except Exception as e:
-            logger.error(f"❌ Question generation failed: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'questions': []
-            }
+        return generated_questions
     
     def process_pdf_and_generate_questions(
         self,
-        pdf_path: str,
+        pdf_path,
         topic: str,
         num_questions: int = 10,
         difficulty: str = 'Medium',
-        question_types: List[str] = None
+        question_types: List[str] = None,
+        source_digest: Optional[str] = None,
+        filename: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Complete pipeline: Extract text from PDF and generate questions
         
         Args:
-            pdf_path: Path to PDF file
+            pdf_path: Path to PDF file or an upload's binary stream
             topic: Topic/subject
             num_questions: Number of questions to generate
             difficulty: Difficulty level
             question_types: Types of questions to generate
+            source_digest: SHA-256 of the PDF's bytes; reuses a cached extraction
+            filename: Original filename when pdf_path is a stream
         
         Returns:
             Dictionary with questions and metadata
@@ -588,17 +907,41 @@ Generate ONLY valid JSON. Do not include any text before or after the JSON."""
         }
         
         try:
-            # Step 1: Extract text from PDF
-            logger.info(f"📄 Extracting text from PDF: {pdf_path}")
-            content = self.extract_text_from_pdf(pdf_path, use_advanced=True)
+            # Step 1: Extract text from PDF (shared with /api/content/upload via the cache)
+            pdf_name = filename or pdf_path
+            key = self.file_cache_key(pdf_name, source_digest) if source_digest else None
+            cached = extraction_cache.get(key) if key else None
+            if cached:
+                logger.info(f"📄 Using cached extraction for PDF: {pdf_name}")
+                content, summary = cached['content'], cached['summary']
+            else:
+                logger.info(f"📄 Extracting text from PDF: {pdf_name}")
+                content = self.extract_text_from_pdf(pdf_path, use_advanced=True)
+                summary = None
             
             if not content or len(content.strip()) < 50:
                 result['error'] = 'Insufficient content extracted from PDF'
                 return result
             
             # Get content summary
-            summary = self.get_content_summary(content)
+            if summary is None:
+                summary = self.get_content_summary(content)
+                if key:
+                    extraction_cache.put(key, {
+                        'content': content,
+                        'metadata': {
+                            'source_type': 'file',
+                            'processed_at': datetime.now().isoformat(),
+                            'content_hash': hashlib.md5(content.encode()).hexdigest(),
+                            'word_count': len(content.split()),
+                            'character_count': len(content),
+                            'file_info': {'extension': '.pdf'}
+                        },
+                        'summary': summary,
+                        'validators': None
+                    })
             result['metadata']['content_summary'] = summary
+            result['metadata']['cache_hit'] = cached is not None
             
             # Step 2: Generate questions using AI
             logger.info(f"🤖 Generating {num_questions} questions from extracted content...")
@@ -614,7 +957,7 @@ Generate ONLY valid JSON. Do not include any text before or after the JSON."""
                 result['success'] = True
                 result['questions'] = questions_result['questions']
                 result['metadata'].update(questions_result['metadata'])
-                result['metadata']['pdf_path'] = pdf_path
+                result['metadata']['pdf_path'] = pdf_name
                 
                 logger.info(f"✅ Successfully generated {len(result['questions'])} questions from PDF")
             else:
@@ -632,28 +975,34 @@ Generate ONLY valid JSON. Do not include any text before or after the JSON."""
         words = content.split()
         sentences = re.split(r'[.!?]+', content)
         
-        # Extract key topics (simple keyword extraction)
-        word_freq = {}
-        for word in words:
-            word = re.sub(r'[^\w]', '', word.lower())
-            if len(word) > 3:  # Only words longer than 3 characters
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # Get top keywords
-        top_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
+        # Extract key topics (simple keyword extraction, shared with chunk ranking)
+        top_keywords = document_chunking.top_keywords(content)
         
         return {
             'word_count': len(words),
             'sentence_count': len([s for s in sentences if s.strip()]),
             'character_count': len(content),
-            'top_keywords': [kw[0] for kw in top_keywords],
+            'top_keywords': top_keywords,
             'estimated_reading_time': max(1, len(words) // 200),  # ~200 words per minute
             'content_preview': content[:200] + "..." if len(content) > 200 else content
         }
 
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_content_processor(upload_dir: str = "uploads") -> ContentProcessor:
+    """Process-wide ContentProcessor (created on first call; later upload_dir values are ignored)"""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ContentProcessor(upload_dir)
+    return _processor
+
 # Usage example and testing
 if __name__ == "__main__":
-    processor = ContentProcessor()
+    processor = get_content_processor()
     
     # Test with sample text
     sample_text = "This is a sample text for testing the content processor functionality."
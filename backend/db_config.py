@@ -0,0 +1,121 @@
+"""
+Database Engine Configuration - Storage tuning profile and pool settings
+Applies the SQLite production profile (WAL, synchronous=NORMAL, busy
+timeout, mmap, page cache, in-memory temp store) on every new connection,
+and sizes the SQLAlchemy connection pool for concurrent quiz takers.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# SQLite pragmas (applied per connection via the engine "connect" event)
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', str(64 * 1024)))
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+
+# Connection pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+SQLITE_TUNING_ENABLED = os.getenv('SQLITE_TUNING_ENABLED', 'true').lower() == 'true'
+
+
+def is_sqlite(database_uri):
+    return make_url(database_uri).get_backend_name() == 'sqlite'
+
+
+def _is_memory_sqlite(database_uri):
+    database = make_url(database_uri).database
+    return not database or database == ':memory:' or 'mode=memory' in database_uri
+
+
+def get_engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Args:
+        database_uri: SQLAlchemy database URL
+
+    Returns:
+        dict: Engine keyword arguments
+    """
+    if is_sqlite(database_uri):
+        if _is_memory_sqlite(database_uri):
+            # Single shared in-memory database - keep SQLAlchemy's defaults
+            return {}
+        return {
+            'connect_args': {
+                # Python-level lock wait (seconds); busy_timeout pragma covers the C level
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+                # Pooled connections are handed between SocketIO/request threads
+                'check_same_thread': False
+            },
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT
+        }
+
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Run the tuning pragmas on a freshly opened SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # Negative = KiB
+        cursor.execute(f"PRAGMA temp_store={SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+
+def register_engine_events(engine):
+    """Attach the SQLite connect-event pragmas to an engine (no-op for other dialects)"""
+    if engine.dialect.name != 'sqlite' or not SQLITE_TUNING_ENABLED:
+        return False
+    if _is_memory_sqlite(str(engine.url)):
+        return False
+    if not event.contains(engine, 'connect', _apply_sqlite_pragmas):
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+    return True
+
+
+def configure_app(app, database_uri):
+    """
+    Set engine options on the Flask config. Call before db.init_app(app).
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    options.update(get_engine_options(database_uri))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_engine(app, db):
+    """
+    Register connection events on the app's engine. Call after db.init_app(app).
+    """
+    with app.app_context():
+        tuned = register_engine_events(db.engine)
+
+    if tuned:
+        logger.info(f"✅ SQLite tuning: journal_mode={SQLITE_JOURNAL_MODE}, synchronous={SQLITE_SYNCHRONOUS}, "
+                    f"busy_timeout={SQLITE_BUSY_TIMEOUT_MS}ms, mmap={SQLITE_MMAP_SIZE // (1024 * 1024)}MB, "
+                    f"cache={SQLITE_CACHE_SIZE_KB // 1024}MB, temp_store={SQLITE_TEMP_STORE} | "
+                    f"pool={DB_POOL_SIZE}+{DB_MAX_OVERFLOW}")
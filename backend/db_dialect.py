@@ -0,0 +1,260 @@
+"""
+Database Dialect Helpers - Portable query builders for SQLite and PostgreSQL
+Hot paths build their SQL through these helpers instead of calling
+dialect-specific functions (date(), julianday(), DISTINCT ON, ...)
+directly, so the same code runs on SQLite and PostgreSQL.
+"""
+
+from models import db
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, and_, select, update, delete, inspect, text
+import csv
+import io
+import logging
+import sqlite3
+import time as time_module
+
+logger = logging.getLogger(__name__)
+
+
+def dialect_name():
+    """Active dialect name ('sqlite', 'postgresql', ...)"""
+    return db.engine.dialect.name
+
+
+def is_postgresql():
+    return dialect_name() == 'postgresql'
+
+
+def is_sqlite():
+    return dialect_name() == 'sqlite'
+
+
+# ==================== QUERY BUILDERS ====================
+
+def day_range(column, day):
+    """
+    Filter `column` to one calendar day.
+
+    Uses a half-open datetime range instead of date(column) so it is
+    portable and can use an index on the column.
+    """
+    start = datetime.combine(day, time.min)
+    return and_(column >= start, column < start + timedelta(days=1))
+
+
+def since_day(column, day):
+    """Filter `column` to `day` 00:00 and later (portable date(column) >= day)"""
+    return column >= datetime.combine(day, time.min)
+
+
+def count_distinct(column):
+    """COUNT(DISTINCT column) - replaces query.distinct(col).count(), which is DISTINCT ON in PostgreSQL"""
+    return func.count(func.distinct(column))
+
+
+def seconds_between(start_column, end_column):
+    """Elapsed seconds between two timestamp columns as a SQL expression"""
+    if is_postgresql():
+        return func.extract('epoch', end_column - start_column)
+    return (func.julianday(end_column) - func.julianday(start_column)) * 86400.0
+
+
+def random_order():
+    """ORDER BY expression for a random sample (ORDER BY random() LIMIT n, sampled in the database)"""
+    if dialect_name() == 'mysql':
+        return func.rand()
+    return func.random()
+
+
+def supports_window_update():
+    """Window functions + UPDATE ... FROM (SQLite >= 3.33, any PostgreSQL)"""
+    if is_postgresql():
+        return True
+    if is_sqlite():
+        return sqlite3.sqlite_version_info >= (3, 33, 0)
+    return False
+
+
+def rank_update(table, rank_column, order_by, filters=()):
+    """
+    Assign SQL RANK() over `order_by` to `rank_column` in one statement.
+
+    RANK() gives tied rows the same rank and skips the following ranks
+    (1, 2, 2, 4). Runs entirely in the database: no rows are loaded into
+    Python.
+
+    Returns:
+        int: Rows updated
+    """
+    ranked = select(
+        table.c.id.label('ranked_id'),
+        func.rank().over(order_by=order_by).label('new_rank')
+    ).where(*filters).subquery('ranked')
+
+    result = db.session.execute(
+        update(table)
+        .where(table.c.id == ranked.c.ranked_id)
+        .values({rank_column: ranked.c.new_rank})
+    )
+    return result.rowcount
+
+
+# ==================== SCHEMA HELPERS ====================
+
+def add_missing_columns(table_name, columns):
+    """
+    Add columns that are missing from an existing table (portable ALTER TABLE).
+
+    Args:
+        table_name: Table to alter
+        columns: dict of column name -> (SQLAlchemy type, SQL default or None)
+
+    Returns:
+        list: Names of the columns that were added
+    """
+    existing = {col['name'] for col in inspect(db.engine).get_columns(table_name)}
+    dialect = db.engine.dialect
+    added = []
+    for name, (column_type, default) in columns.items():
+        if name in existing:
+            continue
+        ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type.compile(dialect=dialect)}"
+        if default is not None:
+            ddl += f" NOT NULL DEFAULT {default}"
+        db.session.execute(text(ddl))
+        added.append(name)
+    db.session.commit()
+    return added
+
+
+def sync_id_sequence(table):
+    """Move a PostgreSQL serial sequence past MAX(id) after loading explicit ids"""
+    if not is_postgresql():
+        return
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+    ))
+
+
+def next_id(table):
+    """Next free primary key for explicit-id bulk loads"""
+    return (db.session.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+# ==================== BULK LOADING ====================
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def bulk_load(table, rows, chunk_size=10000):
+    """
+    Insert many rows as fast as the dialect allows.
+
+    PostgreSQL: COPY ... FROM STDIN (CSV) on the session's connection.
+    Others: executemany INSERT in chunks.
+
+    Args:
+        table: SQLAlchemy Table
+        rows: list of dicts (all with the same keys)
+        chunk_size: Rows per executemany batch (non-PostgreSQL)
+
+    Returns:
+        int: Rows loaded
+    """
+    if not rows:
+        return 0
+
+    columns = list(rows[0].keys())
+
+    if is_postgresql():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if row[c] is None else _copy_value(row[c]) for c in columns])
+        buffer.seek(0)
+
+        raw_connection = db.session.connection().connection
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+        return len(rows)
+
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+    return len(rows)
+
+
+def insert_from_select(table, columns, query):
+    """INSERT INTO table (columns) SELECT ... - set-based copy without Python round trips"""
+    result = db.session.execute(table.insert().from_select(columns, query))
+    return result.rowcount
+
+
+
+# ==================== CHUNKED DML ====================
+
+def _chunk_ids(table, criteria, chunk_size):
+    return [row[0] for row in db.session.execute(
+        select(table.c.id).where(criteria).order_by(table.c.id).limit(chunk_size)
+    )]
+
+
+def delete_in_chunks(table, criteria, chunk_size=1000, pause_seconds=0.0, children=()):
+    """
+    DELETE the rows matching `criteria` in primary-key chunks, committing
+    after each chunk so locks stay short and concurrent writers (and the
+    SQLite WAL) are not held up by one large transaction.
+
+    Args:
+        table: SQLAlchemy Table with an `id` primary key
+        criteria: WHERE clause selecting the rows to delete
+        chunk_size: Rows per DELETE statement
+        pause_seconds: Sleep between chunks (yields to request traffic)
+        children: (child table, foreign key column) pairs deleted first per chunk
+
+    Returns:
+        int: Rows deleted from `table`
+    """
+    deleted = 0
+    while True:
+        ids = _chunk_ids(table, criteria, chunk_size)
+        if not ids:
+            return deleted
+        for child_table, foreign_key in children:
+            db.session.execute(delete(child_table).where(foreign_key.in_(ids)))
+        db.session.execute(delete(table).where(table.c.id.in_(ids)))
+        db.session.commit()
+        deleted += len(ids)
+        if pause_seconds and len(ids) == chunk_size:
+            time_module.sleep(pause_seconds)
+
+
+def update_in_chunks(table, criteria, values, chunk_size=1000, pause_seconds=0.0):
+    """
+    UPDATE the rows matching `criteria` in primary-key chunks (see
+    delete_in_chunks). `values` must make rows stop matching `criteria`.
+
+    Returns:
+        int: Rows updated
+    """
+    updated = 0
+    while True:
+        ids = _chunk_ids(table, criteria, chunk_size)
+        if not ids:
+            return updated
+        db.session.execute(update(table).where(table.c.id.in_(ids)).values(**values))
+        db.session.commit()
+        updated += len(ids)
+        if pause_seconds and len(ids) == chunk_size:
+            time_module.sleep(pause_seconds)
@@ -0,0 +1,382 @@
+"""
+Read Replica Routing - Send read-only work to a replica database
+Routes and service functions marked @read_only run their SELECTs on the
+replica configured by DATABASE_REPLICA_URL. Flushes and INSERT/UPDATE/DELETE
+statements always go to the primary. Reads fall back to the primary while
+the replica is unreachable or lagging more than REPLICA_MAX_LAG_SECONDS,
+and for users who committed a write recently (read-your-writes).
+
+Last write times live in READ_YOUR_WRITES_URL (same forms as
+GEMINI_RATE_LIMIT_URL: redis://, sqlite:/// or memory; defaults to the rate
+limiter's store), so a write on one worker keeps the user's reads on the
+primary on every worker. While the store is unreachable, each worker only
+knows the writes it committed itself.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import db_config
+import gemini_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_KEY = 'replica'
+
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv('REPLICA_HEALTH_CHECK_SECONDS', '5'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+READ_YOUR_WRITES_URL = os.getenv('READ_YOUR_WRITES_URL') or gemini_rate_limiter.GEMINI_RATE_LIMIT_URL
+
+# A user's reads stay on the primary for at least as long as the replica may lag
+STICKY_WINDOW_SECONDS = max(READ_YOUR_WRITES_SECONDS, REPLICA_MAX_LAG_SECONDS)
+
+# Replication delay on a PostgreSQL standby (0 when fully replayed or not a standby)
+POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_WROTE_KEY = 'db_routing_wrote'
+KEY_PREFIX = 'smart-quizzer:last-write:'
+STORE_RETRY_SECONDS = 30
+_read_only = ContextVar('db_read_only', default=False)
+
+
+class MemoryWriteLog:
+    name = 'memory'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_writes = {}
+
+    def record(self, key, wrote_at):
+        with self.lock:
+            self.last_writes[key] = wrote_at
+            if len(self.last_writes) > 10000:
+                self.last_writes = {
+                    k: at for k, at in self.last_writes.items()
+                    if wrote_at - at < STICKY_WINDOW_SECONDS
+                }
+
+    def read(self, key):
+        return self.last_writes.get(key)
+
+
+class SQLiteWriteLog:
+    """Last write per user in a SQLite file, for the workers of one host"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS last_writes (key TEXT PRIMARY KEY, wrote_at REAL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def record(self, key, wrote_at):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO last_writes (key, wrote_at) VALUES (?, ?)", (key, wrote_at))
+        self.writes += 1
+        if self.writes % 1000 == 0:
+            connection.execute("DELETE FROM last_writes WHERE wrote_at < ?", (wrote_at - STICKY_WINDOW_SECONDS,))
+
+    def read(self, key):
+        row = self._connection().execute("SELECT wrote_at FROM last_writes WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+class RedisWriteLog:
+    """Last write per user as a key expiring with the sticky window"""
+
+    name = 'redis'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def record(self, key, wrote_at):
+        self.client.set(key, repr(wrote_at), ex=math.ceil(STICKY_WINDOW_SECONDS))
+
+    def read(self, key):
+        raw = self.client.get(key)
+        return float(raw) if raw else None
+
+
+def create_write_log(url):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisWriteLog(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteWriteLog(url[len('sqlite:///'):])
+    if url == 'memory':
+        return MemoryWriteLog()
+    raise ValueError(f"Unsupported READ_YOUR_WRITES_URL '{url}' (expected redis://, sqlite:/// or memory)")
+
+
+class ReplicaState:
+    """Cached replica health/lag (process-wide) and the shared per-user last write times"""
+
+    def __init__(self, write_log_url=READ_YOUR_WRITES_URL):
+        self.enabled = False
+        self.healthy = False
+        self.lag_seconds = None
+        self.last_error = None
+        self.checked_at = float('-inf')
+        self.probe_lock = threading.Lock()
+        self.write_log_url = write_log_url
+        self.write_log = None
+        self.write_log_error = None
+        self.write_log_retry_at = 0.0
+        self.fallback = MemoryWriteLog()
+
+    def probe(self, engine):
+        """Measure replica lag (at most once per REPLICA_HEALTH_CHECK_SECONDS, one thread at a time)"""
+        if time.monotonic() - self.checked_at < REPLICA_HEALTH_CHECK_SECONDS:
+            return
+        if not self.probe_lock.acquire(blocking=False):
+            return  # Another thread is probing - use the cached result
+        try:
+            self.checked_at = time.monotonic()
+            with engine.connect() as connection:
+                if engine.dialect.name == 'postgresql':
+                    lag = connection.execute(text(POSTGRES_LAG_SQL)).scalar()
+                else:
+                    # SQLite copies/other dialects expose no replication position
+                    connection.execute(text('SELECT 1'))
+                    lag = 0
+            self.lag_seconds = float(lag or 0)
+            if not self.healthy:
+                logger.info(f"✅ Read replica available (lag {self.lag_seconds:.1f}s)")
+            self.healthy = True
+            self.last_error = None
+        except Exception as e:
+            self.mark_unhealthy(e)
+        finally:
+            self.probe_lock.release()
+
+    def mark_unhealthy(self, error):
+        if self.healthy:
+            logger.warning(f"⚠️ Read replica unavailable, routing reads to primary: {error}")
+        self.healthy = False
+        self.last_error = str(error)
+        self.checked_at = time.monotonic()
+
+    def is_usable(self, engine):
+        self.probe(engine)
+        return self.healthy and self.lag_seconds is not None and self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+
+    def connect_write_log(self):
+        try:
+            self.write_log = create_write_log(self.write_log_url)
+            self.write_log_error = None
+        except Exception as e:
+            self._use_fallback(e)
+
+    def _use_fallback(self, error):
+        if self.write_log_error is None:
+            logger.warning(f"⚠️ Read-your-writes store unavailable ({error}) - "
+                           f"using per-worker last write times")
+        self.write_log = None
+        self.write_log_error = str(error)
+        self.write_log_retry_at = time.monotonic() + STORE_RETRY_SECONDS
+
+    def _call(self, method, *args):
+        if self.write_log is None and time.monotonic() >= self.write_log_retry_at:
+            self.connect_write_log()
+        if self.write_log is not None:
+            try:
+                return getattr(self.write_log, method)(*args)
+            except Exception as e:
+                self._use_fallback(e)
+        return getattr(self.fallback, method)(*args)
+
+    def record_write(self, user_id):
+        now = time.time()
+        self.fallback.record(KEY_PREFIX + str(user_id), now)
+        self._call('record', KEY_PREFIX + str(user_id), now)
+
+    def is_sticky(self, user_id):
+        if user_id is None:
+            return False
+        wrote_at = self._call('read', KEY_PREFIX + str(user_id))
+        return wrote_at is not None and time.time() - wrote_at < STICKY_WINDOW_SECONDS
+
+
+replica_state = ReplicaState()
+
+
+def _current_user_id():
+    """JWT identity of the current request, or None outside authenticated requests"""
+    if not has_request_context():
+        return None
+    try:
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def _is_sticky():
+    """Whether the current user wrote recently (looked up once per request)"""
+    if not has_request_context():
+        return False
+    if 'db_routing_sticky' not in g:
+        g.db_routing_sticky = replica_state.is_sticky(_current_user_id())
+    return g.db_routing_sticky
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that picks the replica engine for reads made
+    inside a read-only scope. Used as db's session class (see models.py).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info[_WROTE_KEY] = True
+        elif bind is None and _read_only.get() and replica_state.enabled:
+            replica = self._db.engines.get(REPLICA_BIND_KEY)
+            if replica is not None and not _is_sticky() and replica_state.is_usable(replica):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_writer(session):
+    if session.info.pop(_WROTE_KEY, False) and replica_state.enabled:
+        user_id = _current_user_id()
+        if user_id is not None:
+            replica_state.record_write(user_id)
+            g.db_routing_sticky = True
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+def _on_replica_error(context):
+    """Engine error hook: stop routing to a replica that drops connections or errors at the driver level"""
+    if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+        replica_state.mark_unhealthy(context.original_exception)
+
+
+# ==================== ANNOTATIONS ====================
+
+@contextmanager
+def read_only_scope():
+    """Run the enclosed reads on the replica (when usable)"""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def read_only_stream(iterable):
+    """
+    Iterate a streamed response body with its reads on the replica. The body
+    runs after the @read_only view has returned, outside its scope.
+    """
+    iterator = iter(iterable)
+    while True:
+        with read_only_scope():
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def read_only(f):
+    """Decorator for routes/service functions that only read. Place below @auth_required."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with read_only_scope():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+# ==================== SETUP ====================
+
+def configure_app(app, replica_url=None):
+    """
+    Register the replica engine as an SQLALCHEMY_BINDS entry. Call before db.init_app(app).
+
+    Args:
+        app: Flask app
+        replica_url: Replica database URL (defaults to DATABASE_REPLICA_URL)
+
+    Returns:
+        bool: True if a replica is configured
+    """
+    replica_url = replica_url if replica_url is not None else DATABASE_REPLICA_URL
+    if not replica_url:
+        return False
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND_KEY] = {'url': replica_url, **db_config.get_engine_options(replica_url)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    return True
+
+
+def init_app(app, db):
+    """Enable routing once the replica engine exists. Call after db.init_app(app)."""
+    with app.app_context():
+        replica = db.engines.get(REPLICA_BIND_KEY)
+        if replica is None:
+            replica_state.enabled = False
+            return False
+        db_config.register_engine_events(replica)
+        if not event.contains(replica, 'handle_error', _on_replica_error):
+            event.listen(replica, 'handle_error', _on_replica_error)
+
+    replica_state.connect_write_log()
+    replica_state.enabled = True
+    logger.info(f"✅ Read replica routing: {replica.url.render_as_string(hide_password=True)} "
+                f"(max lag {REPLICA_MAX_LAG_SECONDS:g}s, read-your-writes {STICKY_WINDOW_SECONDS:g}s "
+                f"in {replica_state.write_log.name if replica_state.write_log else 'memory (fallback)'})")
+    return True
+
+
+def get_status():
+    """Replica routing status for health checks"""
+    return {
+        'enabled': replica_state.enabled,
+        'healthy': replica_state.healthy,
+        'lag_seconds': replica_state.lag_seconds,
+        'max_lag_seconds': REPLICA_MAX_LAG_SECONDS,
+        'read_your_writes_seconds': STICKY_WINDOW_SECONDS,
+        'read_your_writes_store': replica_state.write_log.name if replica_state.write_log else 'memory (fallback)',
+        'read_your_writes_store_error': replica_state.write_log_error,
+        'last_error': replica_state.last_error
+    }
@@ -0,0 +1,192 @@
+"""
+Document Chunking - Token-aware overlapping chunks for long-document question generation
+Content is split on paragraph and sentence boundaries into chunks of at most
+CHUNK_MAX_TOKENS (estimated at ~4 characters per token, the ratio Gemini
+documents for English), each starting with the last CHUNK_OVERLAP_TOKENS of
+the previous chunk so facts spanning a boundary stay intact. Chunks are
+ranked by the density of the document's top keywords and the requested
+questions are spread over the best chunks (map); the per-chunk results are
+then interleaved and near-duplicates dropped (reduce).
+"""
+
+from typing import Dict, List
+import math
+import os
+import re
+
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '2000'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '150'))
+# Upper bound on generation calls per document (one per chunk)
+CHUNK_MAX_CALLS = int(os.getenv('CHUNK_MAX_CALLS', '8'))
+
+CHARS_PER_TOKEN = 4
+
+# Joins the units of a chunk (counted against the chunk's size)
+UNIT_SEPARATOR = '\n\n'
+
+# Question texts sharing this share of their words are treated as duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def top_keywords(content: str, limit: int = 10) -> List[str]:
+    """Most frequent words longer than 3 characters (simple keyword extraction)"""
+    word_freq = {}
+    for word in content.split():
+        word = re.sub(r'[^\w]', '', word.lower())
+        if len(word) > 3:
+            word_freq[word] = word_freq.get(word, 0) + 1
+    return [word for word, _ in sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:limit]]
+
+
+def _split_units(content: str, max_chars: int) -> List[str]:
+    """Paragraphs, with paragraphs longer than a chunk split into sentences (then hard-wrapped)"""
+    units = []
+    for paragraph in re.split(r'\n\s*\n', content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+            while len(sentence) > max_chars:
+                units.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                units.append(sentence)
+    return units
+
+
+def chunk_document(content: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Dict]:
+    """
+    Split content into overlapping chunks.
+
+    Returns:
+        list: {'index', 'text', 'tokens'} per chunk, in document order
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 2)
+    # A unit must fit after the carried tail and its separator
+    max_unit_chars = max(1, max_chars - overlap_chars - len(UNIT_SEPARATOR))
+
+    chunks = []
+    current = []
+    current_len = 0  # len(UNIT_SEPARATOR.join(current))
+    for unit in _split_units(content, max_unit_chars):
+        added = len(unit) + (len(UNIT_SEPARATOR) if current else 0)
+        if current and current_len + added > max_chars:
+            text = UNIT_SEPARATOR.join(current)
+            chunks.append(text)
+            # Carry the tail of the chunk into the next one
+            tail = text[-overlap_chars:] if overlap_chars else ''
+            current = [tail] if tail else []
+            current_len = len(tail)
+            added = len(unit) + (len(UNIT_SEPARATOR) if current else 0)
+        current.append(unit)
+        current_len += added
+    if current:
+        chunks.append(UNIT_SEPARATOR.join(current))
+
+    return [{'index': i, 'text': text, 'tokens': estimate_tokens(text)} for i, text in enumerate(chunks)]
+
+
+def rank_chunks(chunks: List[Dict], keywords: List[str]) -> List[Dict]:
+    """Chunks sorted by keyword hits per token (best first); adds 'score' to each chunk"""
+    keywords = set(keywords)
+    for chunk in chunks:
+        words = (re.sub(r'[^\w]', '', word.lower()) for word in chunk['text'].split())
+        hits = sum(1 for word in words if word in keywords)
+        chunk['score'] = hits / max(1, chunk['tokens'])
+    return sorted(chunks, key=lambda chunk: (-chunk['score'], chunk['index']))
+
+
+def plan_questions(ranked: List[Dict], num_questions: int, max_calls: int = CHUNK_MAX_CALLS) -> List[Dict]:
+    """
+    Spread num_questions over the best-ranked chunks (at most max_calls of
+    them), proportionally to their scores and at least one each.
+
+    Returns:
+        list: {'chunk', 'count'} in document order (empty when there is
+        nothing to ask or no chunk to ask it from)
+    """
+    if num_questions < 1 or not ranked:
+        return []
+
+    selected = ranked[:max(1, min(max_calls, num_questions, len(ranked)))]
+    total_score = sum(chunk['score'] for chunk in selected)
+    counts = {}
+    for chunk in selected:
+        share = chunk['score'] / total_score if total_score else 1 / len(selected)
+        counts[chunk['index']] = max(1, int(num_questions * share))
+
+    # Hand out what rounding left over (or take back the excess), best chunks first
+    assigned = sum(counts.values())
+    position = 0
+    while assigned != num_questions:
+        index = selected[position % len(selected)]['index']
+        if assigned < num_questions:
+            counts[index] += 1
+            assigned += 1
+        elif counts[index] > 1:
+            counts[index] -= 1
+            assigned -= 1
+        position += 1
+
+    return [{'chunk': chunk, 'count': counts[chunk['index']]}
+            for chunk in sorted(selected, key=lambda chunk: chunk['index'])]
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r'\w+', text.lower()))
+
+
+def is_duplicate(question_text: str, seen: List[set]) -> bool:
+    words = _words(question_text)
+    for other in seen:
+        union = words | other
+        if union and len(words & other) / len(union) >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def reduce_questions(per_chunk: List[List[Dict]], num_questions: int) -> List[Dict]:
+    """
+    Interleave per-chunk question lists (so every chunk is represented) and
+    drop near-duplicate question texts, keeping at most num_questions.
+    """
+    questions = []
+    seen = []
+    for round_index in range(max((len(batch) for batch in per_chunk), default=0)):
+        for batch in per_chunk:
+            if round_index >= len(batch) or len(questions) >= num_questions:
+                continue
+            question = batch[round_index]
+            if is_duplicate(question['question_text'], seen):
+                continue
+            seen.append(_words(question['question_text']))
+            questions.append(question)
+    return questions
+
+
+def segment_for_questions(content: str, num_questions: int) -> List[str]:
+    """
+    One context segment per question: chunks sized so the document splits
+    into about num_questions pieces, the most keyword-dense ones first when
+    there are more chunks than questions (kept in document order), cycled
+    when there are fewer.
+    """
+    max_tokens = max(64, estimate_tokens(content) // max(1, num_questions))
+    chunks = chunk_document(content, max_tokens, min(CHUNK_OVERLAP_TOKENS, max_tokens // 4))
+    if not chunks:
+        return [content] * num_questions
+
+    ranked = rank_chunks(chunks, top_keywords(content))
+    if len(ranked) >= num_questions:
+        selected = sorted(ranked[:num_questions], key=lambda chunk: chunk['index'])
+        return [chunk['text'] for chunk in selected]
+    return [ranked[i % len(ranked)]['text'] for i in range(num_questions)]
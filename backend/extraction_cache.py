@@ -0,0 +1,173 @@
+"""
+Extraction Cache - Content-addressed on-disk cache of extracted content
+Uploaded files are keyed by the SHA-256 of their raw bytes (hashed from the
+upload stream in chunks, see hash_stream), URLs by the URL and revalidated
+against its ETag/Last-Modified, pasted text by the hash of the text. Each
+entry holds the process_content result and the get_content_summary output
+as one JSON file under EXTRACTION_CACHE_DIR.
+
+The directory is bounded to EXTRACTION_CACHE_MAX_MB: a hit touches the
+file's mtime and a write evicts the least recently used files. Workers
+sharing the directory each keep their own size index (rebuilt from the
+directory on first use), so the bound is approximate across workers.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'true').lower() == 'true'
+EXTRACTION_CACHE_DIR = os.getenv(
+    'EXTRACTION_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'instance', 'extraction_cache')
+)
+EXTRACTION_CACHE_MAX_MB = int(os.getenv('EXTRACTION_CACHE_MAX_MB', '512'))
+
+# Bump when extraction output changes so old entries are not served
+CACHE_VERSION = 1
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def hash_stream(stream):
+    """
+    SHA-256 of a seekable upload stream, read in chunks and rewound.
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def file_key(digest, extension, options=''):
+    return f"v{CACHE_VERSION}:file:{digest}:{extension}:{options}"
+
+
+def url_key(url):
+    return f"v{CACHE_VERSION}:url:{url}"
+
+
+def text_key(text):
+    return f"v{CACHE_VERSION}:text:{hashlib.sha256(text.encode()).hexdigest()}"
+
+
+class ExtractionCache:
+    """Size-bounded LRU of JSON entries in one directory"""
+
+    def __init__(self, directory=EXTRACTION_CACHE_DIR, max_mb=EXTRACTION_CACHE_MAX_MB,
+                 enabled=EXTRACTION_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.index = None  # file name -> size, least recently used first
+        self.total_bytes = 0
+        self.metrics = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _load_index(self):
+        if self.index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self.index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.total_bytes = sum(self.index.values())
+
+    def get(self, key):
+        """Cached entry for `key` (None on a miss)"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.metrics['misses'] += 1
+            return None
+
+        with self.lock:
+            self._load_index()
+            name = os.path.basename(path)
+            if name in self.index:
+                self.index.move_to_end(name)
+            self.metrics['hits'] += 1
+        return entry
+
+    def put(self, key, entry):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        name = os.path.basename(path)
+        data = json.dumps(entry, default=str).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            self._load_index()
+            # Write to a temp file and rename so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self.total_bytes += len(data) - self.index.pop(name, 0)
+            self.index[name] = len(data)
+            self.metrics['writes'] += 1
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.index:
+            name, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # Evicted by another worker
+            self.metrics['evictions'] += 1
+
+    def get_metrics(self):
+        with self.lock:
+            self._load_index()
+            metrics = dict(self.metrics)
+            metrics['entries'] = len(self.index)
+            metrics['bytes'] = self.total_bytes
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = round(metrics['hits'] / lookups, 3) if lookups else None
+        metrics['max_bytes'] = self.max_bytes
+        metrics['enabled'] = self.enabled
+        return metrics
+
+
+cache = ExtractionCache()
+
+
+def get(key):
+    return cache.get(key)
+
+
+def put(key, entry):
+    cache.put(key, entry)
+
+
+def get_metrics():
+    return cache.get_metrics()
@@ -0,0 +1,81 @@
+"""
+Gemini Async - Shared async HTTP client for Gemini calls from the ASGI sidecar
+One httpx.AsyncClient (connection pool of GEMINI_ASYNC_MAX_CONNECTIONS) per
+event loop. A call in flight holds a socket, not a thread, so one process
+can wait on many Gemini responses at once. Only asgi_app.py and the *_async
+generation methods import this module; the Flask app never does.
+"""
+
+import asyncio
+import logging
+import os
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+GEMINI_ASYNC_MAX_CONNECTIONS = int(os.getenv('GEMINI_ASYNC_MAX_CONNECTIONS', '100'))
+GEMINI_ASYNC_TIMEOUT = float(os.getenv('GEMINI_ASYNC_TIMEOUT', '30'))
+
+# Re-exported so callers can catch transport errors without importing httpx
+TimeoutException = httpx.TimeoutException
+ConnectError = httpx.ConnectError
+HTTPError = httpx.HTTPError
+
+_client = None
+_client_loop = None
+
+
+def get_client():
+    """AsyncClient for the running event loop (created on first use)"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=GEMINI_ASYNC_TIMEOUT,
+            limits=httpx.Limits(max_connections=GEMINI_ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=GEMINI_ASYNC_MAX_CONNECTIONS)
+        )
+        _client_loop = loop
+        logger.info(f"✅ Async Gemini client ready ({GEMINI_ASYNC_MAX_CONNECTIONS} connections)")
+    return _client
+
+
+async def close():
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+async def run_blocking(runner, func, *args):
+    """Run a blocking call with `runner` (an async callable) or a worker thread"""
+    if runner is not None:
+        return await runner(func, *args)
+    return await asyncio.to_thread(func, *args)
+
+
+async def generate_text(model: str, api_key: str, prompt: str, timeout: float = GEMINI_ASYNC_TIMEOUT) -> str:
+    """
+    Text of one generateContent call with default generation settings
+    (what the google-generativeai GenerativeModel.generate_content call sends).
+
+    Raises:
+        httpx.HTTPError: transport errors and non-2xx responses
+        ValueError: a response without text (e.g. blocked by safety filters)
+    """
+    response = await get_client().post(
+        GEMINI_API_URL.format(model=model),
+        headers={'Content-Type': 'application/json', 'x-goog-api-key': api_key},
+        json={"contents": [{"parts": [{"text": prompt}]}]},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    result = response.json()
+    try:
+        return result['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError):
+        raise ValueError(f"Gemini returned no text (finish reason: "
+                         f"{(result.get('candidates') or [{}])[0].get('finishReason', 'unknown')})")
@@ -0,0 +1,437 @@
+"""
+Gemini Rate Limiter - Token bucket for the Gemini quota shared by every worker
+All Gemini calls (question_gen, content_processor) take a token from one
+bucket of GEMINI_REQUESTS_PER_MINUTE, holding at most GEMINI_RATE_LIMIT_BURST
+tokens. The bucket state lives in GEMINI_RATE_LIMIT_URL:
+
+    redis://host:6379/0          Redis (or any Redis-protocol server), for several hosts
+    sqlite:///path/to/file.db    SQLite file, for the workers of one host (default)
+    memory                       in-process only (one worker, tests)
+
+When the shared backend is unreachable the limiter falls back to an
+in-process bucket (same rate, per worker) and retries the backend after
+BACKEND_RETRY_SECONDS.
+
+Priorities: within a worker, waiting callers are served in priority order
+(INTERACTIVE before BACKGROUND, then first come first served). Across
+workers, BACKGROUND callers only take a token while more than
+GEMINI_BACKGROUND_RESERVE of the burst is left, so interactive quiz starts
+are not queued behind bulk work. Run background work inside
+`with priority(BACKGROUND):`.
+
+A caller waits at most GEMINI_RATE_LIMIT_MAX_WAIT seconds
+(GEMINI_BACKGROUND_MAX_WAIT for background work); when the estimated wait is
+longer, acquire() raises RateLimitExceeded with that estimate right away
+instead of sleeping. A 429 from Gemini drains the shared bucket for the
+delay Gemini asks for (penalize), so every worker backs off together.
+
+acquire_async() and penalize_async() run the shared bucket's I/O (the SQLite
+write lock, the Redis round trip) on a worker thread, so coroutines in the
+ASGI sidecar keep running while one of them waits on the bucket.
+"""
+
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))
+GEMINI_RATE_LIMIT_BURST = float(os.getenv('GEMINI_RATE_LIMIT_BURST', '10'))
+GEMINI_RATE_LIMIT_URL = os.getenv('GEMINI_RATE_LIMIT_URL') or (
+    'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'gemini_rate_limit.db')
+)
+GEMINI_RATE_LIMIT_MAX_WAIT = float(os.getenv('GEMINI_RATE_LIMIT_MAX_WAIT', '10'))
+GEMINI_BACKGROUND_MAX_WAIT = float(os.getenv('GEMINI_BACKGROUND_MAX_WAIT', '120'))
+# Share of the burst that only interactive callers may take
+GEMINI_BACKGROUND_RESERVE = float(os.getenv('GEMINI_BACKGROUND_RESERVE', '0.3'))
+
+BUCKET_KEY = 'smart-quizzer:gemini-bucket'
+BACKEND_RETRY_SECONDS = 30
+# Delay assumed for a 429 that does not say how long to wait
+DEFAULT_RETRY_DELAY = 5.0
+# Longest single sleep while queued, so waiters notice a freed slot quickly
+POLL_INTERVAL = 0.1
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+_priority = contextvars.ContextVar('gemini_rate_limit_priority', default=INTERACTIVE)
+
+
+class RateLimitExceeded(Exception):
+    """No Gemini slot within the caller's wait limit"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Gemini rate limit reached, estimated wait {retry_after:.1f}s")
+
+
+@contextmanager
+def priority(level):
+    """Run the block's Gemini calls at `level` (INTERACTIVE or BACKGROUND)"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def refill_and_take(tokens, updated, now, rate, capacity, floor, cost, penalty):
+    """
+    Token bucket step shared by the memory and SQLite backends (the Redis
+    script does the same).
+
+    Returns:
+        tuple: (tokens, wait) - wait is 0 when `cost` tokens were taken,
+        else the seconds until they can be
+    """
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if penalty > 0:
+        tokens = min(tokens, -penalty * rate)
+    if cost <= 0:
+        # Peek: time until one token can be taken
+        return tokens, max(0.0, (floor + 1 - tokens) / rate)
+    if tokens - cost >= floor:
+        return tokens - cost, 0.0
+    return tokens, (floor + cost - tokens) / rate
+
+
+class MemoryBucket:
+    name = 'memory'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = {}
+
+    def take(self, key, rate, capacity, floor, cost=1, penalty=0.0):
+        now = time.time()
+        with self.lock:
+            tokens, updated = self.state.get(key, (capacity, now))
+            tokens, wait = refill_and_take(tokens, updated, now, rate, capacity, floor, cost, penalty)
+            self.state[key] = (tokens, now)
+        return tokens, wait
+
+
+class SQLiteBucket:
+    """Bucket row in a SQLite file; BEGIN IMMEDIATE serializes the workers of one host"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS gemini_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, rate, capacity, floor, cost=1, penalty=0.0):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated FROM gemini_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = refill_and_take(tokens, updated, now, rate, capacity, floor, cost, penalty)
+            connection.execute("INSERT OR REPLACE INTO gemini_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                               (key, tokens, now))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return tokens, wait
+
+
+REDIS_TAKE_SCRIPT = """
+local rate, capacity, floor = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local cost, penalty = tonumber(ARGV[4]), tonumber(ARGV[5])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+if penalty > 0 then tokens = math.min(tokens, -penalty * rate) end
+local wait = 0
+if cost <= 0 then
+    wait = math.max(0, (floor + 1 - tokens) / rate)
+elseif tokens - cost >= floor then
+    tokens = tokens - cost
+else
+    wait = (floor + cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate + penalty) + 60)
+return {tostring(tokens), tostring(wait)}
+"""
+
+
+class RedisBucket:
+    """Bucket hash in Redis, updated by one Lua script (atomic, clocked by the server)"""
+
+    name = 'redis'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.script = self.client.register_script(REDIS_TAKE_SCRIPT)
+
+    def take(self, key, rate, capacity, floor, cost=1, penalty=0.0):
+        tokens, wait = self.script(keys=[key], args=[rate, capacity, floor, cost, penalty])
+        return float(tokens), float(wait)
+
+
+def create_backend(url):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucket(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBucket(url[len('sqlite:///'):])
+    if url == 'memory':
+        return MemoryBucket()
+    raise ValueError(f"Unsupported GEMINI_RATE_LIMIT_URL '{url}' (expected redis://, sqlite:/// or memory)")
+
+
+class GeminiRateLimiter:
+    """Shared token bucket plus the in-process priority queue in front of it"""
+
+    def __init__(self, url=GEMINI_RATE_LIMIT_URL, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+                 burst=GEMINI_RATE_LIMIT_BURST, background_reserve=GEMINI_BACKGROUND_RESERVE, key=BUCKET_KEY):
+        self.url = url
+        self.rate = requests_per_minute / 60
+        self.capacity = max(1.0, burst)
+        # Background callers must still be able to take a token from a full bucket
+        self.background_floor = min(self.capacity * background_reserve, self.capacity - 1)
+        self.key = key
+        self.fallback = MemoryBucket()
+        self.backend = None
+        self.backend_error = None
+        self.backend_retry_at = 0.0
+        self._connect()
+
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.head_wait = 0.0
+        self.metrics = {'acquired': 0, 'rejected': 0, 'penalties': 0, 'wait_seconds': 0.0}
+
+    def _connect(self):
+        try:
+            self.backend = create_backend(self.url)
+            self.backend_error = None
+            logger.info(f"✅ Gemini rate limiter: {self.backend.name} bucket, "
+                        f"{self.rate * 60:g}/min, burst {self.capacity:g}")
+        except Exception as e:
+            self._use_fallback(e)
+
+    def _use_fallback(self, error):
+        if self.backend_error is None:
+            logger.warning(f"⚠️ Gemini rate limiter backend unavailable ({error}) - "
+                           f"using a per-worker in-process bucket")
+        self.backend = None
+        self.backend_error = str(error)
+        self.backend_retry_at = time.monotonic() + BACKEND_RETRY_SECONDS
+
+    def _take(self, level, cost=1, penalty=0.0):
+        floor = self.background_floor if level >= BACKGROUND else 0.0
+        if self.backend is None and time.monotonic() >= self.backend_retry_at:
+            self._connect()
+        if self.backend is not None:
+            try:
+                return self.backend.take(self.key, self.rate, self.capacity, floor, cost, penalty)
+            except Exception as e:
+                self._use_fallback(e)
+        return self.fallback.take(self.key, self.rate, self.capacity, floor, cost, penalty)
+
+    def _enqueue(self, level):
+        ticket = (level, next(self.sequence))
+        with self.lock:
+            heapq.heappush(self.waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        with self.lock:
+            self.waiting.remove(ticket)
+            heapq.heapify(self.waiting)
+
+    def _ahead(self, ticket):
+        with self.lock:
+            return sum(1 for other in self.waiting if other < ticket)
+
+    def _poll_head(self, ticket):
+        self.head_wait = self._take(ticket[0])[1]
+        return self.head_wait
+
+    def _poll(self, ticket):
+        """0 when `ticket` got its token, else the estimated seconds still to wait"""
+        ahead = self._ahead(ticket)
+        if ahead == 0:
+            return self._poll_head(ticket)
+        # Callers ahead in this worker go first, one token each; only the head polls the bucket
+        return self.head_wait + ahead / self.rate
+
+    def _blocks(self):
+        """Whether _take does I/O (shared SQLite/Redis bucket, or a reconnect attempt)"""
+        return not isinstance(self.backend, MemoryBucket)
+
+    async def _poll_async(self, ticket):
+        """_poll() with the shared bucket's I/O (BEGIN IMMEDIATE, Redis round trip) on a worker thread"""
+        ahead = self._ahead(ticket)
+        if ahead:
+            return self.head_wait + ahead / self.rate
+        if self._blocks():
+            return await asyncio.to_thread(self._poll_head, ticket)
+        return self._poll_head(ticket)
+
+    def _finish(self, ticket, started, wait, max_wait):
+        """Record the outcome of one poll; raises when the wait would pass max_wait"""
+        waited = time.monotonic() - started
+        if wait == 0:
+            with self.lock:
+                self.metrics['acquired'] += 1
+                self.metrics['wait_seconds'] += waited
+            return True
+        if waited + wait > max_wait:
+            with self.lock:
+                self.metrics['rejected'] += 1
+            raise RateLimitExceeded(wait)
+        return False
+
+    def _wait_limit(self, level, max_wait):
+        if max_wait is not None:
+            return max_wait
+        return GEMINI_BACKGROUND_MAX_WAIT if level >= BACKGROUND else GEMINI_RATE_LIMIT_MAX_WAIT
+
+    def acquire(self, level=None, max_wait=None):
+        """
+        Take one token, waiting in priority order.
+
+        Raises:
+            RateLimitExceeded: the estimated wait is longer than max_wait
+        """
+        level = _priority.get() if level is None else level
+        max_wait = self._wait_limit(level, max_wait)
+        ticket = self._enqueue(level)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._poll(ticket)
+                if self._finish(ticket, started, wait, max_wait):
+                    return
+                time.sleep(min(wait, POLL_INTERVAL))
+        finally:
+            self._dequeue(ticket)
+
+    async def acquire_async(self, level=None, max_wait=None):
+        """acquire() sleeping on the event loop (bucket I/O runs on a worker thread)"""
+        level = _priority.get() if level is None else level
+        max_wait = self._wait_limit(level, max_wait)
+        ticket = self._enqueue(level)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = await self._poll_async(ticket)
+                if self._finish(ticket, started, wait, max_wait):
+                    return
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        finally:
+            self._dequeue(ticket)
+
+    def penalize(self, seconds):
+        """Empty the shared bucket for `seconds` (Gemini answered 429)"""
+        with self.lock:
+            self.metrics['penalties'] += 1
+        self._take(INTERACTIVE, cost=0, penalty=seconds)
+
+    async def penalize_async(self, seconds):
+        """penalize() without blocking the event loop"""
+        if self._blocks():
+            await asyncio.to_thread(self.penalize, seconds)
+        else:
+            self.penalize(seconds)
+
+    def get_status(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            waiting = list(self.waiting)
+        tokens, _ = self._take(INTERACTIVE, cost=0)
+        metrics['avg_wait_ms'] = round(metrics.pop('wait_seconds') / metrics['acquired'] * 1000, 1) \
+            if metrics['acquired'] else None
+        metrics.update({
+            'backend': self.backend.name if self.backend is not None else 'memory (fallback)',
+            'backend_error': self.backend_error,
+            'requests_per_minute': self.rate * 60,
+            'burst': self.capacity,
+            'tokens_available': round(tokens, 2),
+            'waiting_interactive': sum(1 for level, _ in waiting if level < BACKGROUND),
+            'waiting_background': sum(1 for level, _ in waiting if level >= BACKGROUND),
+        })
+        return metrics
+
+
+RETRY_DELAY_PATTERN = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+
+def retry_delay(headers, body):
+    """Seconds Gemini asked us to wait in a 429 (Retry-After or RetryInfo.retryDelay)"""
+    value = headers.get('Retry-After') if headers else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    match = RETRY_DELAY_PATTERN.search(body or '')
+    if match:
+        return float(match.group(1))
+    return DEFAULT_RETRY_DELAY
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = GeminiRateLimiter()
+    return _limiter
+
+
+def acquire(level=None, max_wait=None):
+    get_limiter().acquire(level, max_wait)
+
+
+async def acquire_async(level=None, max_wait=None):
+    await get_limiter().acquire_async(level, max_wait)
+
+
+def penalize(seconds):
+    get_limiter().penalize(seconds)
+
+
+async def penalize_async(seconds):
+    await get_limiter().penalize_async(seconds)
+
+
+def get_status():
+    return get_limiter().get_status()
@@ -0,0 +1,296 @@
+"""
+Leaderboard Broadcast Scheduler - Coalesced rank-delta WebSocket updates
+Quiz completions mark their topic room dirty instead of emitting right away.
+A background task flushes each dirty room at most once per
+LEADERBOARD_BROADCAST_INTERVAL_MS with one delta message that carries only
+the entries whose rank changed within the top LEADERBOARD_DELTA_TOP_N since
+the room's last broadcast. Entries new to that window include their display
+fields; entries pushed out of it have rank None. The admin room gets one
+combined message per flush.
+
+The ranks each topic last broadcast are stored in
+leaderboard_broadcast_snapshots, so every process (each worker, scripts)
+computes deltas against the same baseline. A flush swaps the snapshot with a
+compare-and-swap on its version and sends the new version with the delta, so
+clients can drop a delta older than one they already applied.
+"""
+
+from models import db, QuizLeaderboard, User, LeaderboardBroadcastSnapshot
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_BROADCAST_INTERVAL_MS = int(os.getenv('LEADERBOARD_BROADCAST_INTERVAL_MS', '1000'))
+# Ranks covered by deltas (an insert shifts every rank below it; clients only show the top)
+LEADERBOARD_DELTA_TOP_N = int(os.getenv('LEADERBOARD_DELTA_TOP_N', '100'))
+
+ADMIN_ROOM = 'leaderboard_admin_global'
+
+# Events each completion used to emit (topic room + admin room)
+EVENTS_PER_UPDATE = 2
+
+# Snapshot swaps tried per flush before the topic waits for the next one
+SNAPSHOT_ATTEMPTS = 3
+
+
+def topic_room(topic):
+    return f"leaderboard_{topic}"
+
+
+class LeaderboardBroadcaster:
+    """Coalescing scheduler (one flush task per process, snapshots shared in the database)"""
+
+    def __init__(self, interval_ms=LEADERBOARD_BROADCAST_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.app = None
+        self.socketio = None
+        self.lock = threading.Lock()
+        self.pending = {}  # topic -> completions since the last flush
+        self.known_topics = set()  # Topics with a shared snapshot row
+        self.task_started = False
+        self.metrics = {
+            'updates_queued': 0,
+            'messages_sent': 0,
+            'changes_sent': 0,
+            'flushes': 0,
+            'snapshot_conflicts': 0,
+            'last_flush_ms': 0.0
+        }
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    # ==================== PRODUCERS ====================
+
+    def ensure_snapshot(self, topic):
+        """
+        Record the topic's current ranks as the shared delta baseline if no
+        process has broadcast it yet. Call before recalculating ranks.
+        """
+        if topic in self.known_topics:
+            return
+        if db.session.get(LeaderboardBroadcastSnapshot, topic) is None:
+            try:
+                db.session.add(LeaderboardBroadcastSnapshot(
+                    topic=topic, ranks=_encode_ranks(self._current_ranks(topic)), version=0
+                ))
+                db.session.commit()
+            except IntegrityError:
+                # Another process recorded it first
+                db.session.rollback()
+        with self.lock:
+            self.known_topics.add(topic)
+
+    def queue_update(self, topic, emit_event=None):
+        """
+        Mark a topic room dirty after a leaderboard change.
+
+        Without an initialized scheduler (scripts) or with a zero interval,
+        the delta is flushed immediately through `emit_event`.
+        """
+        with self.lock:
+            self.pending[topic] = self.pending.get(topic, 0) + 1
+            self.metrics['updates_queued'] += 1
+            start_task = self.socketio is not None and self.interval > 0 and not self.task_started
+            if start_task:
+                self.task_started = True
+
+        if self.socketio is None or self.interval <= 0:
+            self.flush(emit_event or (self.socketio.emit if self.socketio else None))
+        elif start_task:
+            self.socketio.start_background_task(self._run)
+
+    # ==================== FLUSHING ====================
+
+    def _run(self):
+        logger.info(f"✅ Leaderboard broadcast scheduler started (interval {self.interval * 1000:.0f}ms)")
+        while True:
+            self.socketio.sleep(self.interval)
+            if not self.pending:
+                continue
+            try:
+                with self.app.app_context():
+                    self.flush(self.socketio.emit)
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"❌ Leaderboard broadcast flush failed: {e}")
+
+    def flush(self, emit_event):
+        """Send one delta per dirty topic room and one combined admin message"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending or emit_event is None:
+            return 0
+
+        start = time.perf_counter()
+        timestamp = datetime.now().isoformat()
+        admin_topics = {}
+        sent = 0
+
+        for topic, updates in pending.items():
+            delta = self._build_delta(topic)
+            if delta is None:
+                # Other processes kept winning the snapshot swap; retry on the next flush
+                with self.lock:
+                    self.pending[topic] = self.pending.get(topic, 0) + updates
+                continue
+            delta['updates'] = updates
+            admin_topics[topic] = delta
+            emit_event('leaderboard:user_update', {
+                'topic': topic,
+                **delta,
+                'timestamp': timestamp
+            }, to=topic_room(topic))
+            sent += 1
+
+        emit_event('leaderboard:admin_update', {
+            'topic': 'admin_global',
+            'topics': admin_topics,
+            'updates': sum(pending.values()),
+            'timestamp': timestamp
+        }, to=ADMIN_ROOM)
+        sent += 1
+
+        with self.lock:
+            self.metrics['messages_sent'] += sent
+            self.metrics['flushes'] += 1
+            self.metrics['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return sent
+
+    def _current_ranks(self, topic):
+        return dict(
+            db.session.query(QuizLeaderboard.id, QuizLeaderboard.rank)
+            .filter(QuizLeaderboard.topic == topic, QuizLeaderboard.rank <= LEADERBOARD_DELTA_TOP_N)
+            .all()
+        )
+
+    def _swap_snapshot(self, topic):
+        """
+        Replace the topic's shared snapshot with its current ranks.
+
+        Returns:
+            tuple: (previous ranks, current ranks, new version), or None when
+            other processes won SNAPSHOT_ATTEMPTS swaps in a row
+        """
+        snapshots = LeaderboardBroadcastSnapshot.__table__
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            row = db.session.execute(
+                select(snapshots.c.ranks, snapshots.c.version).where(snapshots.c.topic == topic)
+            ).first()
+            current = self._current_ranks(topic)
+            values = {'ranks': _encode_ranks(current), 'updated_at': datetime.utcnow()}
+
+            if row is None:
+                try:
+                    db.session.execute(insert(snapshots).values(topic=topic, version=1, **values))
+                    db.session.commit()
+                    return {}, current, 1
+                except IntegrityError:
+                    db.session.rollback()
+            else:
+                result = db.session.execute(update(snapshots).where(
+                    snapshots.c.topic == topic, snapshots.c.version == row.version
+                ).values(version=row.version + 1, **values))
+                db.session.commit()
+                if result.rowcount == 1:
+                    return _decode_ranks(row.ranks), current, row.version + 1
+
+            with self.lock:
+                self.metrics['snapshot_conflicts'] += 1
+        return None
+
+    def _build_delta(self, topic):
+        """Rank changes for one topic since its last broadcast (None if the snapshot swap lost)"""
+        swapped = self._swap_snapshot(topic)
+        if swapped is None:
+            return None
+        previous, current, version = swapped
+
+        changed = [(entry_id, rank, previous.get(entry_id)) for entry_id, rank in current.items()
+                   if previous.get(entry_id) != rank]
+        # Pushed out of the top N
+        changed.extend((entry_id, None, rank) for entry_id, rank in previous.items() if entry_id not in current)
+
+        # Entries new to the room, and removed ones so clients can find them by user/session
+        detail_ids = [entry_id for entry_id, rank, previous_rank in changed if previous_rank is None or rank is None]
+        details = self._entry_details(detail_ids) if detail_ids else {}
+
+        changes = []
+        for entry_id, rank, previous_rank in sorted(changed, key=lambda c: (c[1] is None, c[1] or 0)):
+            change = details.get(entry_id) or {'id': entry_id}
+            change['rank'] = rank
+            change['previous_rank'] = previous_rank
+            changes.append(change)
+
+        with self.lock:
+            self.metrics['changes_sent'] += len(changes)
+        return {'changes': changes, 'version': version}
+
+    def _entry_details(self, entry_ids):
+        """Display fields for entries entering or leaving the room (one joined query, no lazy loads)"""
+        rows = db.session.query(
+            QuizLeaderboard.id, QuizLeaderboard.user_id, QuizLeaderboard.quiz_session_id,
+            QuizLeaderboard.correct_count, QuizLeaderboard.total_questions, QuizLeaderboard.time_taken,
+            QuizLeaderboard.timestamp, User.username, User.full_name
+        ).join(User, User.id == QuizLeaderboard.user_id).filter(QuizLeaderboard.id.in_(entry_ids)).all()
+
+        return {
+            row.id: {
+                'id': row.id,
+                'user_id': row.user_id,
+                'username': row.username,
+                'full_name': row.full_name,
+                'quiz_session_id': row.quiz_session_id,
+                'correct_count': row.correct_count,
+                'total_questions': row.total_questions,
+                'accuracy': round(row.correct_count / row.total_questions * 100, 1) if row.total_questions else 0,
+                'time_taken': row.time_taken,
+                'timestamp': row.timestamp.isoformat() if row.timestamp else None
+            }
+            for row in rows
+        }
+
+    # ==================== METRICS ====================
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['pending_rooms'] = len(self.pending)
+        metrics['interval_ms'] = int(self.interval * 1000)
+        metrics['messages_without_coalescing'] = metrics['updates_queued'] * EVENTS_PER_UPDATE
+        metrics['messages_saved'] = max(0, metrics['messages_without_coalescing'] - metrics['messages_sent'])
+        return metrics
+
+
+def _encode_ranks(ranks):
+    return {str(entry_id): rank for entry_id, rank in ranks.items()}
+
+
+def _decode_ranks(ranks):
+    return {int(entry_id): rank for entry_id, rank in (ranks or {}).items()}
+
+
+broadcaster = LeaderboardBroadcaster()
+
+
+def init_app(app, socketio):
+    broadcaster.init_app(app, socketio)
+
+
+def ensure_snapshot(topic):
+    broadcaster.ensure_snapshot(topic)
+
+
+def queue_update(topic, emit_event=None):
+    broadcaster.queue_update(topic, emit_event)
+
+
+def get_metrics():
+    return broadcaster.get_metrics()
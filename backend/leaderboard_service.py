@@ -4,8 +4,11 @@ Ensures thread-safe operations and accurate ranking calculations
 """
 
 from models import db, QuizSession, Question, QuizLeaderboard, User
+from serialization import LeaderboardUserDTO, RecentQuizDTO
+import db_dialect
+import leaderboard_broadcast
 from datetime import datetime, timedelta
-from sqlalchemy import desc, asc, or_
+from sqlalchemy import desc, asc, or_, and_
 from sqlalchemy.orm import joinedload
 import logging
 
@@ -53,7 +56,8 @@ def update_leaderboard_entry(quiz_session_id, emit_event=None):
     
     Args:
         quiz_session_id: ID of the completed quiz session
-        emit_event: Optional WebSocket emit function for real-time updates
+        emit_event: Optional WebSocket emit function; when given, clients get a
+            coalesced rank-delta update (emitted directly if the scheduler is not running)
         
     Returns:
         QuizLeaderboard entry or None if failed
@@ -120,36 +124,20 @@ def update_leaderboard_entry(quiz_session_id, emit_event=None):
         
         db.session.commit()
         
+        # Baseline ranks for the coalesced delta broadcast (first update of the topic in this process)
+        if emit_event:
+            leaderboard_broadcast.ensure_snapshot(quiz_session.topic)
+        
         # Recalculate ranks for the same topic
         recalculate_ranks(topic=quiz_session.topic)
         
-        # Emit WebSocket event for real-time update
-        # - Use a user-specific event for topic rooms so the Results page can listen
-        # - Emit a separate admin event to the admin room so admin UI can remain isolated
+        # Real-time update: the topic room and the admin room receive one
+        # rank-delta message per broadcast interval (leaderboard_broadcast.py)
         if emit_event:
             try:
-                # Emit to topic-specific room (user leaderboard updates)
-                room_name = f"leaderboard_{quiz_session.topic}"
-                emit_event('leaderboard:user_update', {
-                    'topic': quiz_session.topic,
-                    'entry': leaderboard_entry.to_dict(),
-                    'timestamp': datetime.now().isoformat()
-                }, to=room_name)
-                logger.info(f"Emitted user leaderboard update event for topic: {quiz_session.topic}")
-
-                # Emit to admin global leaderboard room (admin-only)
-                emit_event('leaderboard:admin_update', {
-                    'topic': 'admin_global',
-                    'entry': leaderboard_entry.to_dict(),
-                    'user': quiz_session.user.username if quiz_session.user else 'Unknown',
-                    'quiz_topic': quiz_session.topic,
-                    'timestamp': datetime.now().isoformat()
-                }, to='leaderboard_admin_global')
-                logger.info(f"✅ Emitted admin global leaderboard update: {quiz_session.user.username} completed {quiz_session.topic}")
+                leaderboard_broadcast.queue_update(quiz_session.topic, emit_event)
             except Exception as e:
-                logger.error(f"Failed to emit WebSocket event: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
+                logger.error(f"Failed to queue leaderboard broadcast: {e}")
         
         return leaderboard_entry
         
@@ -172,6 +160,27 @@ def recalculate_ranks(topic=None, quiz_id=None):
         quiz_id: Optional quiz filter - recalculate only for specific quiz
     """
     try:
+        if db_dialect.supports_window_update():
+            # Single UPDATE with RANK() OVER (...) - same tie rules, no rows loaded into Python
+            table = QuizLeaderboard.__table__
+            filters = []
+            if topic:
+                filters.append(table.c.topic == topic)
+            if quiz_id:
+                filters.append(table.c.quiz_session_id == quiz_id)
+            
+            updated = db_dialect.rank_update(
+                table, 'rank',
+                order_by=[table.c.score.desc(), table.c.time_taken.asc()],
+                filters=filters
+            )
+            db.session.commit()
+            
+            logger.info(f"Recalculated ranks for {updated} entries (window function)" +
+                       (f" (topic: {topic})" if topic else "") +
+                       (f" (quiz_id: {quiz_id})" if quiz_id else ""))
+            return
+        
         # Build query
         query = QuizLeaderboard.query.join(QuizSession)
         
@@ -358,30 +367,29 @@ def get_user_leaderboard_stats(user_id):
         return None
 
 
-def cleanup_incomplete_sessions(hours=24):
+def cleanup_incomplete_sessions(hours=24, chunk_size=1000, pause_seconds=0.0):
     """
-    Clean up abandoned quiz sessions and their leaderboard entries.
+    Mark quiz sessions still 'active' after `hours` as abandoned.
     
     Args:
-        hours: Remove sessions older than this many hours that are still 'active'
+        hours: Abandon sessions older than this many hours that are still 'active'
+        chunk_size: Rows per UPDATE (one commit per chunk)
+        pause_seconds: Sleep between chunks
     """
     try:
         cutoff_time = datetime.now() - timedelta(hours=hours)
+        sessions = QuizSession.__table__
+        
+        abandoned_count = db_dialect.update_in_chunks(
+            sessions,
+            and_(sessions.c.status == 'active', sessions.c.started_at < cutoff_time),
+            {'status': 'abandoned'},
+            chunk_size,
+            pause_seconds
+        )
         
-        # Find abandoned sessions
-        abandoned_sessions = QuizSession.query.filter(
-            QuizSession.status == 'active',
-            QuizSession.started_at < cutoff_time
-        ).all()
-        
-        # Mark as abandoned
-        for session in abandoned_sessions:
-            session.status = 'abandoned'
-        
-        db.session.commit()
-        
-        logger.info(f"Cleaned up {len(abandoned_sessions)} abandoned sessions")
-        return len(abandoned_sessions)
+        logger.info(f"Cleaned up {abandoned_count} abandoned sessions")
+        return abandoned_count
         
     except Exception as e:
         db.session.rollback()
@@ -463,39 +471,39 @@ def get_aggregated_user_leaderboard(topic=None, limit=50, offset=0, search=None)
             # Recent quizzes (last 5)
             recent_entries = sorted(entries, key=lambda e: e.timestamp, reverse=True)[:5]
             recent_quizzes = [
-                {
-                    'quiz_id': e.quiz_session_id,
-                    'topic': e.topic,
-                    'score': round((e.correct_count / e.total_questions * 100), 1) if e.total_questions > 0 else 0,
-                    'time_taken': e.time_taken,
-                    'completed_at': e.timestamp.isoformat()
-                }
+                RecentQuizDTO(
+                    quiz_id=e.quiz_session_id,
+                    topic=e.topic,
+                    score=round((e.correct_count / e.total_questions * 100), 1) if e.total_questions > 0 else 0,
+                    time_taken=e.time_taken,
+                    completed_at=e.timestamp
+                )
                 for e in recent_entries
             ]
             
-            user_stats.append({
-                'user_id': user_id,
-                'username': user.username,
-                'full_name': user.full_name,
-                'email': user.email,
-                'total_quizzes': total_quizzes,
-                'total_questions': total_questions,
-                'total_correct': total_correct,
-                'average_score': round(average_score, 1),
-                'total_time': total_time,
-                'average_time': round(average_time, 1),
-                'best_score': round(best_score, 1),
-                'best_quiz_id': best_entry.quiz_session_id,
-                'best_quiz_time': best_entry.time_taken,
-                'recent_quizzes': recent_quizzes
-            })
+            user_stats.append(LeaderboardUserDTO(
+                user_id=user_id,
+                username=user.username,
+                full_name=user.full_name,
+                email=user.email,
+                total_quizzes=total_quizzes,
+                total_questions=total_questions,
+                total_correct=total_correct,
+                average_score=round(average_score, 1),
+                total_time=total_time,
+                average_time=round(average_time, 1),
+                best_score=round(best_score, 1),
+                best_quiz_id=best_entry.quiz_session_id,
+                best_quiz_time=best_entry.time_taken,
+                recent_quizzes=recent_quizzes
+            ))
         
         # Sort by average_score (desc), then average_time (asc)
-        user_stats.sort(key=lambda x: (-x['average_score'], x['average_time']))
+        user_stats.sort(key=lambda x: (-x.average_score, x.average_time))
         
         # Assign ranks
         for i, user_stat in enumerate(user_stats, start=1):
-            user_stat['rank'] = i
+            user_stat.rank = i
         
         # Apply pagination
         total_users = len(user_stats)
@@ -20,6 +20,7 @@ def create_learning_path(user_id, name, topics, difficulty_progression, estimate
             user_id=user_id,
             name=name,
             description=description or f"Custom learning path: {name}",
+            # Legacy JSON columns are NOT NULL in existing schemas; reads use the milestones
             topics=json.dumps(topics),
             difficulty_progression=json.dumps(difficulty_progression),
             estimated_duration_days=estimated_duration_days,
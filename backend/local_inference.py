@@ -0,0 +1,209 @@
+"""
+Local Inference - Micro-batched local text2text model for the offline fallback
+Without GEMINI_API_KEY questions are generated by a local seq2seq model
+(LOCAL_AI_MODEL, T5/BART). Concurrent requests submit prompts to one
+LocalInferenceServer per process; its worker thread takes the first waiting
+prompt, waits up to LOCAL_BATCH_MAX_WAIT_MS for more (at most
+LOCAL_BATCH_SIZE), pads them into one batch and runs a single generate()
+call, then hands each caller its own output.
+
+Backends (LOCAL_INFERENCE_BACKEND):
+- onnx: ONNX Runtime through optimum (the model is exported on first load)
+- int8: PyTorch with Linear layers dynamically quantized to int8
+- torch: plain fp32 PyTorch
+- auto (default): onnx when optimum and onnxruntime are installed, else int8
+
+Inference threads are capped at LOCAL_INFERENCE_THREADS (torch intra-op
+threads / ONNX Runtime intra-op threads) so a batch does not starve the web
+workers on the same node. Under eventlet/gevent the batching thread is a
+green thread, so a running batch holds the hub as the old inline pipeline
+call did.
+"""
+
+from concurrent.futures import Future
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INFERENCE_BACKEND = os.getenv('LOCAL_INFERENCE_BACKEND', 'auto').lower()
+LOCAL_INFERENCE_THREADS = int(os.getenv('LOCAL_INFERENCE_THREADS', str(min(4, os.cpu_count() or 1))))
+LOCAL_BATCH_SIZE = int(os.getenv('LOCAL_BATCH_SIZE', '8'))
+LOCAL_BATCH_MAX_WAIT_MS = int(os.getenv('LOCAL_BATCH_MAX_WAIT_MS', '20'))
+LOCAL_MAX_INPUT_TOKENS = int(os.getenv('LOCAL_MAX_INPUT_TOKENS', '512'))
+# How long a caller waits for its batch before giving up
+LOCAL_INFERENCE_TIMEOUT = int(os.getenv('LOCAL_INFERENCE_TIMEOUT', '120'))
+
+BACKENDS = ('onnx', 'int8', 'torch')
+
+
+def onnx_available():
+    return all(importlib.util.find_spec(name) is not None for name in ('optimum', 'onnxruntime'))
+
+
+def resolve_backend(backend=LOCAL_INFERENCE_BACKEND):
+    if backend == 'auto':
+        return 'onnx' if onnx_available() else 'int8'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LOCAL_INFERENCE_BACKEND '{backend}' (expected auto, {', '.join(BACKENDS)})")
+    return backend
+
+
+def load_model(model_name, backend, threads):
+    """
+    Tokenizer and seq2seq model for `backend`.
+
+    Returns:
+        tuple: (tokenizer, model) where model has a generate() method
+    """
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == 'onnx':
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            model_name, export=True, provider='CPUExecutionProvider', session_options=session_options
+        )
+        return tokenizer, model
+
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+
+    torch.set_num_threads(threads)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+class _Request:
+    __slots__ = ('prompt', 'max_length', 'future', 'enqueued_at')
+
+    def __init__(self, prompt, max_length):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class LocalInferenceServer:
+    """Dynamic batching front for one local seq2seq model"""
+
+    def __init__(self, model_name, backend=LOCAL_INFERENCE_BACKEND, threads=LOCAL_INFERENCE_THREADS,
+                 batch_size=LOCAL_BATCH_SIZE, max_wait_ms=LOCAL_BATCH_MAX_WAIT_MS, loader=load_model):
+        self.model_name = model_name
+        self.backend = resolve_backend(backend)
+        self.threads = threads
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.tokenizer, self.model = loader(model_name, self.backend, threads)
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.metrics = {'requests': 0, 'batches': 0, 'errors': 0, 'queue_wait_ms': 0.0, 'inference_ms': 0.0}
+
+        self.worker = threading.Thread(target=self._run, name='local-inference', daemon=True)
+        self.worker.start()
+        logger.info(f"✅ Local model '{model_name}' loaded ({self.backend}, {threads} threads, "
+                    f"batches of {self.batch_size} within {max_wait_ms}ms)")
+
+    def generate(self, prompt, max_length=256, timeout=LOCAL_INFERENCE_TIMEOUT):
+        """Generated text for one prompt (blocks until its batch has run)"""
+        request = _Request(prompt, max_length)
+        self.requests.put(request)
+        return request.future.result(timeout=timeout)
+
+    def _collect(self):
+        """First waiting request plus whatever arrives within the wait window"""
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                outputs = self._generate_batch([request.prompt for request in batch],
+                                               max(request.max_length for request in batch))
+            except Exception as e:
+                with self.lock:
+                    self.metrics['errors'] += 1
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            with self.lock:
+                self.metrics['requests'] += len(batch)
+                self.metrics['batches'] += 1
+                self.metrics['queue_wait_ms'] += sum(started - request.enqueued_at for request in batch) * 1000
+                self.metrics['inference_ms'] += (finished - started) * 1000
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+    def _generate_batch(self, prompts, max_length):
+        inputs = self.tokenizer(prompts, return_tensors='pt', padding=True, truncation=True,
+                                max_length=LOCAL_MAX_INPUT_TOKENS)
+        if self.backend == 'onnx':
+            output_ids = self.model.generate(**inputs, max_length=max_length)
+        else:
+            import torch
+            with torch.inference_mode():
+                output_ids = self.model.generate(**inputs, max_length=max_length)
+        return [text.strip() for text in self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        batches = metrics['batches']
+        metrics['avg_batch_size'] = round(metrics['requests'] / batches, 2) if batches else None
+        metrics['avg_queue_wait_ms'] = round(metrics['queue_wait_ms'] / metrics['requests'], 1) if metrics['requests'] else None
+        metrics['avg_batch_ms'] = round(metrics['inference_ms'] / batches, 1) if batches else None
+        metrics['queue_wait_ms'] = round(metrics['queue_wait_ms'], 1)
+        metrics['inference_ms'] = round(metrics['inference_ms'], 1)
+        metrics.update({
+            'model': self.model_name,
+            'backend': self.backend,
+            'threads': self.threads,
+            'batch_size': self.batch_size,
+            'max_wait_ms': int(self.max_wait * 1000),
+            'queued': self.requests.qsize(),
+        })
+        return metrics
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_server(model_name):
+    """Process-wide inference server for `model_name` (the model is loaded on the first call)"""
+    server = _servers.get(model_name)
+    if server is None:
+        with _servers_lock:
+            server = _servers.get(model_name)
+            if server is None:
+                server = _servers[model_name] = LocalInferenceServer(model_name)
+    return server
+
+
+def get_metrics():
+    return {name: server.get_metrics() for name, server in list(_servers.items())}
@@ -0,0 +1,263 @@
+"""
+Maintenance Scheduler - Off-peak cleanup jobs with database-lease leader election
+A background task in every worker wakes every MAINTENANCE_CHECK_INTERVAL_SECONDS
+and, inside the MAINTENANCE_WINDOW (server local time, e.g. "02:00-05:00"),
+runs each job that has not run for MAINTENANCE_INTERVAL_HOURS. A job runs on
+one worker only: the worker claims the job's row in maintenance_jobs with a
+conditional UPDATE (lease free or expired, job due) and runs it only if that
+UPDATE matched. The lease expires after MAINTENANCE_LOCK_TTL_SECONDS so a
+crashed worker does not block the job forever.
+
+Jobs delete (or update) rows as chunked set-based statements through
+db_dialect.delete_in_chunks / update_in_chunks, one commit per
+MAINTENANCE_CHUNK_SIZE rows with MAINTENANCE_CHUNK_PAUSE_MS between chunks.
+
+Run all jobs now (ignoring the window and interval):
+    python maintenance_scheduler.py
+"""
+
+from models import db, MaintenanceJob, PasswordResetToken, EmailVerificationToken
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, update
+from sqlalchemy.exc import IntegrityError
+import leaderboard_service
+import multiplayer_service
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.getenv('MAINTENANCE_ENABLED', 'true').lower() == 'true'
+MAINTENANCE_WINDOW = os.getenv('MAINTENANCE_WINDOW', '02:00-05:00')
+MAINTENANCE_CHECK_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_CHECK_INTERVAL_SECONDS', '300'))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', '20'))
+MAINTENANCE_CHUNK_SIZE = int(os.getenv('MAINTENANCE_CHUNK_SIZE', '1000'))
+MAINTENANCE_CHUNK_PAUSE_MS = int(os.getenv('MAINTENANCE_CHUNK_PAUSE_MS', '50'))
+MAINTENANCE_LOCK_TTL_SECONDS = int(os.getenv('MAINTENANCE_LOCK_TTL_SECONDS', '1800'))
+
+# Rooms and sessions older than this are cleaned up
+STALE_AFTER_HOURS = 24
+
+
+def _cleanup_rooms(chunk_size, pause_seconds):
+    return multiplayer_service.cleanup_old_rooms(STALE_AFTER_HOURS, chunk_size, pause_seconds)
+
+
+def _cleanup_sessions(chunk_size, pause_seconds):
+    return leaderboard_service.cleanup_incomplete_sessions(STALE_AFTER_HOURS, chunk_size, pause_seconds)
+
+
+# name -> callable(chunk_size, pause_seconds) returning rows removed/updated
+JOBS = {
+    'multiplayer_rooms': _cleanup_rooms,
+    'abandoned_sessions': _cleanup_sessions,
+    'password_reset_tokens': PasswordResetToken.cleanup_expired,
+    'email_verification_tokens': EmailVerificationToken.cleanup_expired
+}
+
+
+def parse_window(window):
+    """'HH:MM-HH:MM' -> (start, end) times, None for an empty window (run any time)"""
+    if not window:
+        return None
+    start, end = window.split('-')
+    return (datetime.strptime(start.strip(), '%H:%M').time(),
+            datetime.strptime(end.strip(), '%H:%M').time())
+
+
+def in_window(window, now):
+    if window is None:
+        return True
+    start, end = window
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    # Window wraps past midnight (e.g. 23:00-04:00)
+    return current >= start or current < end
+
+
+class MaintenanceScheduler:
+    """Per-process scheduling loop; the database lease picks one runner per job"""
+
+    def __init__(self, window=MAINTENANCE_WINDOW, interval_hours=MAINTENANCE_INTERVAL_HOURS,
+                 chunk_size=MAINTENANCE_CHUNK_SIZE, chunk_pause_ms=MAINTENANCE_CHUNK_PAUSE_MS,
+                 lock_ttl_seconds=MAINTENANCE_LOCK_TTL_SECONDS, jobs=None):
+        self.window = parse_window(window)
+        self.interval = timedelta(hours=interval_hours)
+        self.chunk_size = chunk_size
+        self.pause_seconds = chunk_pause_ms / 1000
+        self.lock_ttl = timedelta(seconds=lock_ttl_seconds)
+        self.jobs = jobs or JOBS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.app = None
+        self.socketio = None
+        self.task_started = False
+        self.lock = threading.Lock()
+        self.metrics = {name: {
+            'runs': 0,
+            'skipped': 0,
+            'failures': 0,
+            'rows': 0,
+            'last_rows': None,
+            'last_duration_ms': None,
+            'last_lock_wait_ms': None,
+            'last_run_at': None,
+            'last_error': None
+        } for name in self.jobs}
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        if MAINTENANCE_ENABLED and not self.task_started:
+            self.task_started = True
+            socketio.start_background_task(self._run)
+
+    def _run(self):
+        logger.info(f"✅ Maintenance scheduler started (window {MAINTENANCE_WINDOW or 'any time'}, "
+                    f"check every {MAINTENANCE_CHECK_INTERVAL_SECONDS}s)")
+        while True:
+            self.socketio.sleep(MAINTENANCE_CHECK_INTERVAL_SECONDS)
+            if not in_window(self.window, datetime.now()):
+                continue
+            try:
+                with self.app.app_context():
+                    self.run_due()
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"❌ Maintenance run failed: {e}")
+
+    # ==================== LEASES ====================
+
+    def _ensure_job_rows(self):
+        existing = {name for (name,) in db.session.query(MaintenanceJob.name)}
+        missing = [name for name in self.jobs if name not in existing]
+        if not missing:
+            return
+        try:
+            db.session.add_all(MaintenanceJob(name=name) for name in missing)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created them first
+            db.session.rollback()
+
+    def acquire(self, name, force=False):
+        """
+        Claim the job's lease. Returns the lock wait in ms, or None if another
+        worker holds the lease (or, unless `force`, the job is not due yet).
+        """
+        now = datetime.utcnow()
+        jobs = MaintenanceJob.__table__
+        criteria = and_(
+            jobs.c.name == name,
+            or_(jobs.c.lease_expires_at.is_(None), jobs.c.lease_expires_at < now, jobs.c.owner == self.owner)
+        )
+        if not force:
+            criteria = and_(criteria, or_(jobs.c.last_run_at.is_(None), jobs.c.last_run_at < now - self.interval))
+
+        started = time.perf_counter()
+        result = db.session.execute(
+            update(jobs).where(criteria).values(owner=self.owner, lease_expires_at=now + self.lock_ttl)
+        )
+        db.session.commit()
+        lock_wait_ms = (time.perf_counter() - started) * 1000
+        return lock_wait_ms if result.rowcount == 1 else None
+
+    def release(self, name, rows, duration_ms, error=None):
+        jobs = MaintenanceJob.__table__
+        db.session.execute(update(jobs).where(
+            and_(jobs.c.name == name, jobs.c.owner == self.owner)
+        ).values(
+            owner=None,
+            lease_expires_at=None,
+            last_run_at=datetime.utcnow(),
+            last_rows=rows,
+            last_duration_ms=duration_ms,
+            last_error=error
+        ))
+        db.session.commit()
+
+    # ==================== JOBS ====================
+
+    def run_job(self, name, force=False):
+        """Run one job if this worker wins its lease; returns its metrics"""
+        metrics = self.metrics[name]
+        lock_wait_ms = self.acquire(name, force)
+        if lock_wait_ms is None:
+            metrics['skipped'] += 1
+            return None
+
+        started = time.perf_counter()
+        rows, error = 0, None
+        try:
+            rows = self.jobs[name](self.chunk_size, self.pause_seconds)
+        except Exception as e:
+            db.session.rollback()
+            error = str(e)
+            logger.error(f"❌ Maintenance job {name} failed: {e}")
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.release(name, rows, duration_ms, error)
+
+        with self.lock:
+            metrics['runs'] += 1
+            metrics['rows'] += rows
+            metrics['failures'] += 1 if error else 0
+            metrics['last_rows'] = rows
+            metrics['last_duration_ms'] = round(duration_ms, 2)
+            metrics['last_lock_wait_ms'] = round(lock_wait_ms, 2)
+            metrics['last_run_at'] = datetime.utcnow().isoformat()
+            metrics['last_error'] = error
+        logger.info(f"🧹 Maintenance job {name}: {rows} rows in {duration_ms:.0f}ms "
+                    f"(lock wait {lock_wait_ms:.1f}ms)")
+        return dict(metrics)
+
+    def run_due(self, force=False):
+        """Run every job that is due (all jobs if `force`); returns {name: metrics or None if skipped}"""
+        self._ensure_job_rows()
+        return {name: self.run_job(name, force) for name in self.jobs}
+
+    # ==================== METRICS ====================
+
+    def get_metrics(self):
+        with self.lock:
+            jobs = {name: dict(metrics) for name, metrics in self.metrics.items()}
+        return {
+            'enabled': MAINTENANCE_ENABLED,
+            'window': MAINTENANCE_WINDOW or None,
+            'in_window': in_window(self.window, datetime.now()),
+            'owner': self.owner,
+            'jobs': jobs,
+            'leases': [job.to_dict() for job in MaintenanceJob.query.order_by(MaintenanceJob.name).all()]
+        }
+
+
+scheduler = MaintenanceScheduler()
+
+
+def init_app(app, socketio):
+    scheduler.init_app(app, socketio)
+
+
+def run_due(force=False):
+    return scheduler.run_due(force)
+
+
+def get_metrics():
+    return scheduler.get_metrics()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    print("=" * 60)
+    print("MAINTENANCE: run all cleanup jobs")
+    print("=" * 60)
+    with app.app_context():
+        for name, metrics in run_due(force=True).items():
+            if metrics is None:
+                print(f"⏭️  {name}: lease held by another worker")
+            else:
+                print(f"✅ {name}: {metrics['last_rows']} rows in {metrics['last_duration_ms']}ms "
+                      f"(lock wait {metrics['last_lock_wait_ms']}ms)")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Database migration script for the multiplayer game-state columns.
+
+- multiplayer_rooms.current_question_index          (last checkpointed round)
+- multiplayer_rooms.question_set                    (questions fixed at game start)
+- multiplayer_participants.is_host / answers_submitted / last_answer_time
+
+Existing rooms get is_host set for their host participant. Safe to re-run.
+
+Usage:
+    python migrate_multiplayer.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models import db, MultiplayerRoom, MultiplayerParticipant
+from sqlalchemy import update, exists, and_
+import db_dialect
+
+
+def add_multiplayer_columns():
+    """Add the game-state columns to the multiplayer tables if missing"""
+    added = db_dialect.add_missing_columns(
+        'multiplayer_rooms', {
+            'current_question_index': (db.Integer(), 0),
+            'question_set': (db.JSON(), None)
+        }
+    )
+    participant_columns = db_dialect.add_missing_columns('multiplayer_participants', {
+        'is_host': (db.Boolean(), db.false().compile(dialect=db.engine.dialect)),
+        'answers_submitted': (db.Integer(), 0),
+        'last_answer_time': (db.DateTime(), None)
+    })
+
+    if 'is_host' in participant_columns:
+        participants = MultiplayerParticipant.__table__
+        rooms = MultiplayerRoom.__table__
+        db.session.execute(
+            update(participants)
+            .where(exists().where(and_(
+                rooms.c.id == participants.c.room_id,
+                rooms.c.host_user_id == participants.c.user_id
+            )))
+            .values(is_host=True)
+        )
+        db.session.commit()
+
+    return added + participant_columns
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("MULTIPLAYER COLUMNS MIGRATION")
+    print("=" * 60)
+
+    from app import app
+
+    try:
+        with app.app_context():
+            added = add_multiplayer_columns()
+            print(f"✅ Added columns: {', '.join(added)}" if added else "✅ Multiplayer columns already present")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
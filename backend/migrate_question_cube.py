@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Database migration script to create and (re)build the question analytics cube.
+Run this script after upgrading, or whenever the cube needs a full rebuild.
+
+Usage:
+    python migrate_question_cube.py            # rebuild for every user
+    python migrate_question_cube.py --user 42  # rebuild a single user
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import app, db
+from models import UserQuestionStat
+from sqlalchemy import inspect
+import analytics_service
+
+def migrate_question_cube(user_id=None):
+    """Create the user_question_stats table and populate it from answered questions"""
+    
+    with app.app_context():
+        inspector = inspect(db.engine)
+        
+        if 'user_question_stats' not in inspector.get_table_names():
+            print("🧊 Creating user_question_stats table...")
+            UserQuestionStat.__table__.create(db.engine)  # type: ignore
+            print("✅ Table created")
+        else:
+            print("✓ user_question_stats table already exists")
+        
+        scope = f"user {user_id}" if user_id is not None else "all users"
+        print(f"\n📊 Building question analytics cube for {scope}...")
+        
+        start = time.perf_counter()
+        cells = analytics_service.build_question_cube(user_id=user_id)
+        elapsed = time.perf_counter() - start
+        
+        print(f"✅ Wrote {cells:,} cube cells in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the question analytics cube')
+    parser.add_argument('--user', type=int, default=None, help='Only rebuild this user')
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("QUESTION ANALYTICS CUBE MIGRATION")
+    print("=" * 60)
+    
+    try:
+        migrate_question_cube(args.user)
+        print("\n🎉 Migration completed successfully!")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
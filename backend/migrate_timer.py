@@ -50,11 +50,12 @@ def add_timer_columns():
         try:
             with db.engine.begin() as connection:
                 for col_name, col_type in columns_to_add.items():
-                    # SQLite specific SQL for adding nullable columns
+                    # Compile the column type for the active dialect (SQLite DATETIME, PostgreSQL TIMESTAMP)
+                    sql_type = (db.DateTime() if col_type == 'DATETIME' else db.Integer()).compile(dialect=db.engine.dialect)
                     if col_type == 'DATETIME':
-                        sql = f"ALTER TABLE quiz_sessions ADD COLUMN {col_name} DATETIME NULL"
+                        sql = f"ALTER TABLE quiz_sessions ADD COLUMN {col_name} {sql_type} NULL"
                     else:  # INTEGER
-                        sql = f"ALTER TABLE quiz_sessions ADD COLUMN {col_name} INTEGER DEFAULT 0"
+                        sql = f"ALTER TABLE quiz_sessions ADD COLUMN {col_name} {sql_type} DEFAULT 0"
                     
                     print(f"\n  Executing: {sql}")
                     connection.execute(text(sql))
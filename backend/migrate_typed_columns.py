@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Database migration script to move JSON-in-Text columns to typed storage.
+
+- questions.options                       -> question_options rows
+- performance_trends.difficulty_distribution -> easy/medium/hard_questions columns
+- learning_paths.topics/difficulty_progression -> learning_milestones (one per step)
+
+Rows are streamed in id-ordered chunks, each parsed once and committed per
+chunk, so memory stays flat on large databases and the script can be
+interrupted and re-run safely. quiz_sessions.session_data needs no data
+migration: the JSON column type reads the existing text as-is.
+
+Usage:
+    python migrate_typed_columns.py                  # migrate and clear legacy JSON
+    python migrate_typed_columns.py --keep-legacy    # keep questions.options JSON for rollback
+    python migrate_typed_columns.py --chunk-size 5000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from models import db, Question, QuestionOption, PerformanceTrend, LearningPath, LearningMilestone
+from sqlalchemy import select, exists, and_
+import db_dialect
+
+DEFAULT_CHUNK_SIZE = 2000
+
+TREND_COLUMNS = ('easy_questions', 'medium_questions', 'hard_questions')
+
+
+def add_trend_columns():
+    """Add the typed difficulty columns to performance_trends if missing"""
+    return db_dialect.add_missing_columns(
+        'performance_trends', {column: (db.Integer(), 0) for column in TREND_COLUMNS}
+    )
+
+
+def _unmigrated_options_filter():
+    questions = Question.__table__
+    options = QuestionOption.__table__
+    return and_(
+        questions.c.options.isnot(None),
+        ~exists().where(options.c.question_id == questions.c.id)
+    )
+
+
+def migrate_question_options(chunk_size=DEFAULT_CHUNK_SIZE, keep_legacy=False):
+    """
+    Copy questions.options JSON arrays into question_options rows.
+
+    Returns:
+        tuple: (questions migrated, rows skipped because of invalid JSON)
+    """
+    questions = Question.__table__
+    options = QuestionOption.__table__
+    migrated = skipped = 0
+    last_id = 0
+
+    while True:
+        chunk = db.session.execute(
+            select(questions.c.id, questions.c.options)
+            .where(and_(questions.c.id > last_id, _unmigrated_options_filter()))
+            .order_by(questions.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+
+        option_rows = []
+        migrated_ids = []
+        for question_id, raw in chunk:
+            try:
+                parsed = json.loads(raw)
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if isinstance(parsed, list):
+                option_rows.extend(
+                    {'question_id': question_id, 'position': i, 'text': str(option)}
+                    for i, option in enumerate(parsed)
+                )
+            migrated_ids.append(question_id)
+
+        if option_rows:
+            db.session.execute(options.insert(), option_rows)
+        if migrated_ids and not keep_legacy:
+            db.session.execute(
+                questions.update().where(questions.c.id.in_(migrated_ids)).values(options=None)
+            )
+        db.session.commit()
+
+        migrated += len(migrated_ids)
+        last_id = chunk[-1][0]
+        print(f"   ... {migrated:,} questions migrated", end='\r')
+
+    print()
+    return migrated, skipped
+
+
+def migrate_trend_distributions(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fold performance_trends.difficulty_distribution into the typed columns.
+
+    Legacy counts are added to the typed columns (which may already hold
+    counts recorded after the upgrade) and the JSON is cleared in the same
+    transaction, so re-running never double counts.
+    """
+    trends = PerformanceTrend.__table__
+    migrated = 0
+    last_id = 0
+
+    while True:
+        chunk = db.session.execute(
+            select(trends.c.id, trends.c.difficulty_distribution)
+            .where(and_(trends.c.id > last_id, trends.c.difficulty_distribution.isnot(None)))
+            .order_by(trends.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+
+        for trend_id, raw in chunk:
+            try:
+                distribution = json.loads(raw) or {}
+            except (TypeError, ValueError):
+                distribution = {}
+            db.session.execute(trends.update().where(trends.c.id == trend_id).values(
+                easy_questions=trends.c.easy_questions + int(distribution.get('easy', 0) or 0),
+                medium_questions=trends.c.medium_questions + int(distribution.get('medium', 0) or 0),
+                hard_questions=trends.c.hard_questions + int(distribution.get('hard', 0) or 0),
+                difficulty_distribution=None
+            ))
+
+        db.session.commit()
+        migrated += len(chunk)
+        last_id = chunk[-1][0]
+
+    return migrated
+
+
+def migrate_learning_path_milestones(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create milestones for learning paths that only have the JSON topic list"""
+    paths = LearningPath.__table__
+    milestones = LearningMilestone.__table__
+    migrated = 0
+    last_id = 0
+
+    while True:
+        chunk = db.session.execute(
+            select(paths.c.id, paths.c.topics, paths.c.difficulty_progression)
+            .where(and_(
+                paths.c.id > last_id,
+                ~exists().where(milestones.c.learning_path_id == paths.c.id)
+            ))
+            .order_by(paths.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+
+        rows = []
+        for path_id, raw_topics, raw_progression in chunk:
+            try:
+                topics = json.loads(raw_topics) if raw_topics else []
+                progression = json.loads(raw_progression) if raw_progression else []
+            except ValueError:
+                continue
+            for i, topic in enumerate(topics):
+                difficulty = progression[i] if i < len(progression) else 'Medium'
+                rows.append({
+                    'learning_path_id': path_id,
+                    'name': f"{topic} - {difficulty}",
+                    'description': f"Master {topic} at {difficulty} difficulty level",
+                    'order_index': i,
+                    'topic': topic,
+                    'difficulty': difficulty,
+                    'required_accuracy': 70.0,
+                    'is_completed': False
+                })
+            migrated += 1
+
+        if rows:
+            db.session.execute(milestones.insert(), rows)
+        db.session.commit()
+        last_id = chunk[-1][0]
+
+    return migrated
+
+
+def migrate_all(chunk_size=DEFAULT_CHUNK_SIZE, keep_legacy=False):
+    """Run every step (idempotent). Must be called inside an app context."""
+    db.create_all()  # question_options table
+
+    added = add_trend_columns()
+    if added:
+        print(f"✅ Added performance_trends columns: {', '.join(added)}")
+
+    print("📝 Migrating question options...")
+    options_migrated, options_skipped = migrate_question_options(chunk_size, keep_legacy)
+    print(f"✅ {options_migrated:,} questions migrated ({options_skipped} skipped: invalid JSON)")
+
+    print("📈 Migrating performance trend distributions...")
+    trends_migrated = migrate_trend_distributions(chunk_size)
+    print(f"✅ {trends_migrated:,} performance trends migrated")
+
+    print("🗺️  Migrating learning path topics to milestones...")
+    paths_migrated = migrate_learning_path_milestones(chunk_size)
+    print(f"✅ {paths_migrated:,} learning paths migrated")
+
+    return {
+        'questions': options_migrated,
+        'questions_skipped': options_skipped,
+        'performance_trends': trends_migrated,
+        'learning_paths': paths_migrated
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate JSON-in-Text columns to typed storage')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per streamed chunk')
+    parser.add_argument('--keep-legacy', action='store_true', help='Keep legacy questions.options JSON (for rollback)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("TYPED COLUMNS MIGRATION")
+    print("=" * 60)
+
+    from app import app
+
+    try:
+        with app.app_context():
+            start = time.perf_counter()
+            migrate_all(args.chunk_size, args.keep_legacy)
+            print(f"\n🎉 Migration completed in {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 from sqlalchemy import and_
+from db_routing import RoutingSession
 import bcrypt
 import json
 
@@ -16,7 +17,8 @@ except Exception as e:
     print(f"⚠️ Error loading advanced answer evaluator: {e}")
     print("Using basic evaluation instead.")
 
-db = SQLAlchemy()
+# RoutingSession sends @read_only reads to the replica (db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -47,15 +49,13 @@ class User(db.Model):
         """Check if provided password matches hash"""
         return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
     
-    def to_dict(self):
-        # Safely compute quiz count using database query
-        quiz_count = 0
-        try:
-            quiz_count = db.session.query(QuizSession).filter_by(user_id=self.id).count()  # type: ignore
-        except Exception:
-            quiz_count = 0
-
-        return {
+    def to_dict(self, quiz_count=None):
+        """
+        Serialize the user. quiz_count is opt-in: pass a value obtained from
+        QuizSession.count_by_user() (or an already-known count) to include it.
+        No queries are issued here.
+        """
+        data = {
             'id': self.id,
             'username': self.username,
             'email': self.email,
@@ -65,12 +65,18 @@ class User(db.Model):
             'role': self.role,
             'email_verified': self.email_verified,
             'avatar_url': self.avatar_url,
-            'created_at': self.created_at.isoformat(),
-            'quiz_count': quiz_count
+            'created_at': self.created_at.isoformat()
         }
+        if quiz_count is not None:
+            data['quiz_count'] = quiz_count
+        return data
 
 class QuizSession(db.Model):
     __tablename__ = 'quiz_sessions'
+    __table_args__ = (
+        # Keyset pagination for quiz history: WHERE user_id=? ORDER BY started_at DESC, id DESC
+        db.Index('ix_quiz_sessions_user_started', 'user_id', 'started_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -89,7 +95,7 @@ class QuizSession(db.Model):
     time_paused_at = db.Column(db.DateTime, nullable=True)  # When timer was last paused
     total_paused_seconds = db.Column(db.Integer, nullable=False, default=0)  # Cumulative pause time in seconds
     
-    session_data = db.Column(db.Text, nullable=True)  # JSON string for storing questions and answers
+    session_data = db.Column(db.JSON, nullable=True)  # Native JSON (stored as TEXT on SQLite, JSON on PostgreSQL)
     status = db.Column(db.String(20), nullable=False, default='active')  # active, completed, abandoned
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
@@ -97,15 +103,26 @@ class QuizSession(db.Model):
     # Relationships
     questions = db.relationship('Question', backref='quiz_session', lazy=True, cascade='all, delete-orphan')
     
+    @classmethod
+    def count_by_user(cls, user_ids):
+        """Quiz counts for many users with a single grouped query ({user_id: count})"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        rows = db.session.query(cls.user_id, db.func.count(cls.id)).filter(
+            cls.user_id.in_(user_ids)
+        ).group_by(cls.user_id).all()
+        counts = {user_id: 0 for user_id in user_ids}
+        counts.update(dict(rows))
+        return counts
+    
     def set_session_data(self, data):
-        """Store session data as JSON"""
-        self.session_data = json.dumps(data)
+        """Store session data (encoded by the JSON column type)"""
+        self.session_data = data
     
     def get_session_data(self):
-        """Retrieve session data from JSON"""
-        if self.session_data:
-            return json.loads(self.session_data)
-        return {}
+        """Retrieve session data"""
+        return self.session_data or {}
     
     def calculate_score(self):
         """Calculate and update score percentage with range validation"""
@@ -123,27 +140,34 @@ class QuizSession(db.Model):
         Returns time in seconds, or 0 if timer expired.
         Takes into account pauses.
         """
-        if not self.time_limit_seconds:
+        return QuizSession.compute_remaining_seconds(
+            self.time_limit_seconds, self.time_started, self.time_paused_at, self.total_paused_seconds
+        )
+    
+    @staticmethod
+    def compute_remaining_seconds(time_limit_seconds, time_started, time_paused_at, total_paused_seconds):
+        """Remaining-time calculation shared with column projections (no instance needed)"""
+        if not time_limit_seconds:
             return None  # No time limit
         
-        if not self.time_started:
-            return self.time_limit_seconds  # Timer hasn't started yet
+        if not time_started:
+            return time_limit_seconds  # Timer hasn't started yet
         
         # Calculate elapsed time
         now = datetime.now()
-        elapsed = (now - self.time_started).total_seconds()
+        elapsed = (now - time_started).total_seconds()
         
         # Subtract paused time
-        total_paused = self.total_paused_seconds
-        if self.time_paused_at:
+        total_paused = total_paused_seconds or 0
+        if time_paused_at:
             # Currently paused, add pause duration
-            total_paused += (now - self.time_paused_at).total_seconds()
+            total_paused += (now - time_paused_at).total_seconds()
         
         # Actual elapsed time = total elapsed - paused time
         actual_elapsed = elapsed - total_paused
         
         # Calculate remaining
-        remaining = max(0, self.time_limit_seconds - actual_elapsed)
+        remaining = max(0, time_limit_seconds - actual_elapsed)
         return int(remaining)
     
     def is_timer_expired(self):
@@ -202,10 +226,10 @@ class Question(db.Model):
     __tablename__ = 'questions'
     
     id = db.Column(db.Integer, primary_key=True)
-    quiz_session_id = db.Column(db.Integer, db.ForeignKey('quiz_sessions.id'), nullable=False)
+    quiz_session_id = db.Column(db.Integer, db.ForeignKey('quiz_sessions.id'), nullable=False, index=True)
     question_text = db.Column(db.Text, nullable=False)
     question_type = db.Column(db.String(20), nullable=False)  # MCQ, True/False, Short Answer
-    options = db.Column(db.Text, nullable=True)  # JSON string for MCQ options
+    options = db.Column(db.Text, nullable=True)  # Legacy JSON options - migrated into question_options
     correct_answer = db.Column(db.Text, nullable=False)
     user_answer = db.Column(db.Text, nullable=True)
     explanation = db.Column(db.Text, nullable=True)
@@ -217,6 +241,10 @@ class Question(db.Model):
     # evaluation_metadata = db.Column(db.Text, nullable=True)  # JSON string for evaluation details - temporarily disabled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relationships - options load in one batched SELECT per query (no JSON parsing)
+    option_rows = db.relationship('QuestionOption', backref='question', lazy='selectin',
+                                  order_by='QuestionOption.position', cascade='all, delete-orphan')
+    
     def __init__(self, **kwargs):
         super(Question, self).__init__(**kwargs)
         # Set difficulty weight based on difficulty level
@@ -236,12 +264,17 @@ class Question(db.Model):
         self.difficulty_weight = difficulty_weights.get(self.difficulty_level, 1.0)
     
     def set_options(self, options_list):
-        """Store options as JSON"""
+        """Store options as ordered question_options rows"""
         if options_list:
-            self.options = json.dumps(options_list)
+            self.option_rows = [
+                QuestionOption(position=i, text=option)  # type: ignore
+                for i, option in enumerate(options_list)
+            ]
     
     def get_options(self):
-        """Retrieve options from JSON"""
+        """Retrieve options (falls back to legacy JSON for rows not yet migrated)"""
+        if self.option_rows:
+            return [option.text for option in self.option_rows]
         if self.options:
             return json.loads(self.options)
         return []
@@ -346,6 +379,15 @@ class Question(db.Model):
             
         return result
 
+class QuestionOption(db.Model):
+    """Answer option for a question (normalized from the legacy JSON options column)"""
+    __tablename__ = 'question_options'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+
 class Topic(db.Model):
     __tablename__ = 'topics'
     
@@ -395,12 +437,13 @@ class PasswordResetToken(db.Model):
         self.used_at = datetime.now()
     
     @classmethod
-    def cleanup_expired(cls):
-        """Remove expired tokens from database"""
-        now = datetime.now()
-        expired_count = db.session.query(cls).filter(cls.expires_at < now).delete()  # type: ignore
-        db.session.commit()
-        return expired_count
+    def cleanup_expired(cls, chunk_size=1000, pause_seconds=0.0):
+        """Remove expired tokens from database (chunked DELETEs, see maintenance_scheduler.py)"""
+        import db_dialect
+        table = cls.__table__
+        return db_dialect.delete_in_chunks(
+            table, table.c.expires_at < datetime.now(), chunk_size, pause_seconds
+        )
     
     def to_dict(self):
         return {
@@ -441,12 +484,13 @@ class EmailVerificationToken(db.Model):
         self.used_at = datetime.now()
     
     @classmethod
-    def cleanup_expired(cls):
-        """Remove expired tokens from database"""
-        now = datetime.now()
-        expired_count = db.session.query(cls).filter(cls.expires_at < now).delete()  # type: ignore
-        db.session.commit()
-        return expired_count
+    def cleanup_expired(cls, chunk_size=1000, pause_seconds=0.0):
+        """Remove expired tokens from database (chunked DELETEs, see maintenance_scheduler.py)"""
+        import db_dialect
+        table = cls.__table__
+        return db_dialect.delete_in_chunks(
+            table, table.c.expires_at < datetime.now(), chunk_size, pause_seconds
+        )
     
     def to_dict(self):
         return {
@@ -613,6 +657,16 @@ class QuizLeaderboard(db.Model):
         }
 
 
+class LeaderboardBroadcastSnapshot(db.Model):
+    """Ranks of a topic's top N as last broadcast, shared by every process (leaderboard_broadcast.py)"""
+    __tablename__ = 'leaderboard_broadcast_snapshots'
+    
+    topic = db.Column(db.String(100), primary_key=True)
+    ranks = db.Column(db.JSON, nullable=False)  # {leaderboard entry id: rank}
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped by every broadcast (compare-and-swap)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class Badge(db.Model):
     """Achievement badges for gamification"""
     __tablename__ = 'badges'
@@ -687,7 +741,10 @@ class PerformanceTrend(db.Model):
     correct_answers = db.Column(db.Integer, default=0)
     accuracy_rate = db.Column(db.Float, default=0.0)  # Percentage
     avg_time_per_question = db.Column(db.Float, default=0.0)  # Seconds
-    difficulty_distribution = db.Column(db.Text, nullable=True)  # JSON: {easy: x, medium: y, hard: z}
+    difficulty_distribution = db.Column(db.Text, nullable=True)  # Legacy JSON - migrated into the *_questions columns
+    easy_questions = db.Column(db.Integer, nullable=False, default=0)
+    medium_questions = db.Column(db.Integer, nullable=False, default=0)
+    hard_questions = db.Column(db.Integer, nullable=False, default=0)
     
     # Streak tracking
     daily_streak = db.Column(db.Integer, default=0)
@@ -698,6 +755,19 @@ class PerformanceTrend(db.Model):
     # Relationships
     user = db.relationship('User', backref='performance_trends')
     
+    def get_difficulty_distribution(self):
+        """Difficulty counts from the typed columns (plus legacy JSON not yet migrated)"""
+        distribution = {
+            'easy': self.easy_questions or 0,
+            'medium': self.medium_questions or 0,
+            'hard': self.hard_questions or 0
+        }
+        if self.difficulty_distribution:
+            legacy = json.loads(self.difficulty_distribution)
+            for key in distribution:
+                distribution[key] += int(legacy.get(key, 0) or 0)
+        return distribution
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -709,12 +779,40 @@ class PerformanceTrend(db.Model):
             'correct_answers': self.correct_answers,
             'accuracy_rate': round(self.accuracy_rate, 2),
             'avg_time_per_question': round(self.avg_time_per_question, 2),
-            'difficulty_distribution': json.loads(self.difficulty_distribution) if self.difficulty_distribution else {},
+            'difficulty_distribution': self.get_difficulty_distribution(),
             'daily_streak': self.daily_streak,
             'created_at': self.created_at.isoformat()
         }
 
 
+class UserQuestionStat(db.Model):
+    """Per-user answered-question cube: counts by (question_type, difficulty, topic, day)"""
+    __tablename__ = 'user_question_stats'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'question_type', 'difficulty', 'topic', 'day', name='uq_user_question_stat_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    question_type = db.Column(db.String(20), nullable=False)  # Normalized: mcq, true_false, short_answer, other
+    difficulty = db.Column(db.String(10), nullable=False)  # Normalized: easy, medium, hard
+    topic = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'question_type': self.question_type,
+            'difficulty': self.difficulty,
+            'topic': self.topic,
+            'day': self.day.isoformat(),
+            'total': self.total,
+            'correct': self.correct
+        }
+
+
 class LearningPath(db.Model):
     """Personalized learning paths for users"""
     __tablename__ = 'learning_paths'
@@ -723,8 +821,8 @@ class LearningPath(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    topics = db.Column(db.Text, nullable=False)  # JSON array of topics
-    difficulty_progression = db.Column(db.Text, nullable=False)  # JSON: recommended difficulty path
+    topics = db.Column(db.Text, nullable=False)  # Legacy JSON array of topics (read from milestones)
+    difficulty_progression = db.Column(db.Text, nullable=False)  # Legacy JSON difficulty path (read from milestones)
     estimated_duration_days = db.Column(db.Integer, default=30)
     current_position = db.Column(db.Integer, default=0)  # Which step user is on
     status = db.Column(db.String(20), default='active')  # active, completed, paused
@@ -741,7 +839,8 @@ class LearningPath(db.Model):
     
     # Relationships
     user = db.relationship('User', backref='learning_paths')
-    milestones = db.relationship('LearningMilestone', backref='learning_path', lazy=True, cascade='all, delete-orphan')
+    milestones = db.relationship('LearningMilestone', backref='learning_path', lazy='selectin',
+                                 order_by='LearningMilestone.order_index', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -749,8 +848,9 @@ class LearningPath(db.Model):
             'user_id': self.user_id,
             'name': self.name,
             'description': self.description,
-            'topics': json.loads(self.topics) if self.topics else [],
-            'difficulty_progression': json.loads(self.difficulty_progression) if self.difficulty_progression else [],
+            # One milestone per step, in order - topic/difficulty are typed columns there
+            'topics': [milestone.topic for milestone in self.milestones],
+            'difficulty_progression': [milestone.difficulty for milestone in self.milestones],
             'estimated_duration_days': self.estimated_duration_days,
             'current_position': self.current_position,
             'status': self.status,
@@ -802,19 +902,21 @@ class MultiplayerRoom(db.Model):
     host_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     topic = db.Column(db.String(100), nullable=False)
     difficulty = db.Column(db.String(20), nullable=False)
-    num_questions = db.Column(db.Integer, default=10)
+    question_count = db.Column('num_questions', db.Integer, default=10)
     max_players = db.Column(db.Integer, default=10)
     current_players = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default='waiting')  # waiting, in_progress, completed
+    current_question_index = db.Column(db.Integer, nullable=False, default=0)  # Last checkpointed round
+    question_set = db.Column(db.JSON, nullable=True)  # Questions (with answers) fixed at game start
     
     # Game settings
-    time_per_question = db.Column(db.Integer, default=30)  # Seconds
+    time_limit_per_question = db.Column('time_per_question', db.Integer, default=30)  # Seconds
     is_public = db.Column(db.Boolean, default=True)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime, nullable=True)
-    completed_at = db.Column(db.DateTime, nullable=True)
+    ended_at = db.Column('completed_at', db.DateTime, nullable=True)
     
     # Relationships
     host = db.relationship('User', backref='hosted_rooms')
@@ -829,14 +931,16 @@ class MultiplayerRoom(db.Model):
             'host_username': self.host.username if self.host else 'Unknown',
             'topic': self.topic,
             'difficulty': self.difficulty,
-            'num_questions': self.num_questions,
+            'question_count': self.question_count,
             'max_players': self.max_players,
             'current_players': self.current_players,
             'status': self.status,
-            'time_per_question': self.time_per_question,
+            'current_question_index': self.current_question_index,
+            'time_limit_per_question': self.time_limit_per_question,
             'is_public': self.is_public,
             'created_at': self.created_at.isoformat(),
-            'started_at': self.started_at.isoformat() if self.started_at else None
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None
         }
 
 
@@ -849,9 +953,12 @@ class MultiplayerParticipant(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     score = db.Column(db.Integer, default=0)
     correct_answers = db.Column(db.Integer, default=0)
+    answers_submitted = db.Column(db.Integer, nullable=False, default=0)
     rank = db.Column(db.Integer, nullable=True)
     is_ready = db.Column(db.Boolean, default=False)
+    is_host = db.Column(db.Boolean, nullable=False, default=False)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_answer_time = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     user = db.relationship('User', backref='multiplayer_sessions')
@@ -863,9 +970,44 @@ class MultiplayerParticipant(db.Model):
             'user_id': self.user_id,
             'username': self.user.username if self.user else 'Unknown',
             'full_name': self.user.full_name if self.user else 'Unknown',
+            'is_host': self.is_host,
             'score': self.score,
             'correct_answers': self.correct_answers,
+            'answers_submitted': self.answers_submitted,
             'rank': self.rank,
             'is_ready': self.is_ready,
             'joined_at': self.joined_at.isoformat()
         }
+
+
+class MultiplayerLobbyVersion(db.Model):
+    """Change counter of the open rooms, shared by every process (multiplayer_lobby.py)"""
+    __tablename__ = 'multiplayer_lobby_version'
+
+    id = db.Column(db.Integer, primary_key=True)  # Single row (id 1)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped after every committed room change
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class MaintenanceJob(db.Model):
+    """Lease and last-run statistics of a scheduled maintenance job (maintenance_scheduler.py)"""
+    __tablename__ = 'maintenance_jobs'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(128), nullable=True)  # Worker holding the lease
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_rows = db.Column(db.Integer, nullable=True)
+    last_duration_ms = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_rows': self.last_rows,
+            'last_duration_ms': self.last_duration_ms,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,604 @@
+"""
+Multiplayer Engine - Server-authoritative game loop with in-memory room state
+Each in-progress room lives in the process that runs it: participants, scores,
+ranks and the current question index are held in memory, answers are graded
+on the server against the round's correct answer with server-measured
+response times, and each round closes on its timer or as soon as every
+player has answered. Players receive ranking deltas instead of full
+scoreboards. MultiplayerRoom/MultiplayerParticipant rows are written only
+every MULTIPLAYER_CHECKPOINT_ROUNDS rounds and when the game ends.
+
+The room's question set is fixed when the game starts. Players receive it
+up front as a sealed bundle, with each question (minus its answer)
+encrypted under its own AES-256-GCM key. The server then schedules the
+rounds itself and broadcasts only a small "reveal round k at T" tick that
+carries round k's key. T is in server time; clients convert it with the
+offset they measure via multiplayer:clock_sync. The round trip they report
+is used to credit answer times for network latency, up to the round grace
+period. Without the cryptography package, ticks carry the question instead.
+
+Rooms are not shared between processes, so multiplayer runs only in a
+single-worker deployment: with WEB_CONCURRENCY above 1 the engine neither
+starts nor reloads rooms (socketio_config.MULTIPLAYER_AVAILABLE). After a
+restart a room is reloaded from its last checkpoint.
+"""
+
+from models import db, MultiplayerParticipant, EVALUATOR_AVAILABLE
+from datetime import datetime
+import multiplayer_service
+import socketio_config
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    SEALING_AVAILABLE = True
+except ImportError:
+    SEALING_AVAILABLE = False
+
+if EVALUATOR_AVAILABLE:
+    from answer_evaluator_simple import answer_evaluator
+
+logger = logging.getLogger(__name__)
+
+# Rounds between DB checkpoints (the final state is always written at game end)
+MULTIPLAYER_CHECKPOINT_ROUNDS = int(os.getenv('MULTIPLAYER_CHECKPOINT_ROUNDS', '5'))
+MULTIPLAYER_BASE_POINTS = int(os.getenv('MULTIPLAYER_BASE_POINTS', '100'))
+# Extra points for a correct answer, scaled by the share of the round time left
+MULTIPLAYER_SPEED_BONUS = int(os.getenv('MULTIPLAYER_SPEED_BONUS', '50'))
+# Network allowance after the deadline before a round is closed
+MULTIPLAYER_ROUND_GRACE_SECONDS = float(os.getenv('MULTIPLAYER_ROUND_GRACE_SECONDS', '0.5'))
+# Round scheduling: delay before round 0, pause between rounds (answer reveal),
+# and how early a reveal tick is sent so every client can decrypt before T
+MULTIPLAYER_START_DELAY_SECONDS = float(os.getenv('MULTIPLAYER_START_DELAY_SECONDS', '3'))
+MULTIPLAYER_ROUND_GAP_SECONDS = float(os.getenv('MULTIPLAYER_ROUND_GAP_SECONDS', '5'))
+MULTIPLAYER_REVEAL_LEAD_SECONDS = int(os.getenv('MULTIPLAYER_REVEAL_LEAD_MS', '300')) / 1000
+
+# Fields of a question that never leave the server while its round is open
+HIDDEN_QUESTION_FIELDS = ('correct_answer', 'explanation')
+
+
+def room_channel(room_code):
+    return f"multiplayer_{room_code}"
+
+
+def public_question(question):
+    return {k: v for k, v in question.items() if k not in HIDDEN_QUESTION_FIELDS}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def seal_questions(room_code, questions):
+    """
+    Encrypt each question (without its answer) under its own key.
+
+    The round index is bound as associated data ("<room_code>:<index>"), so a
+    ciphertext cannot be replayed as another round.
+
+    Returns:
+        tuple: (bundle entries or None when sealing is unavailable, base64 keys by round)
+    """
+    if not SEALING_AVAILABLE:
+        return None, []
+    bundle, keys = [], []
+    for index, question in enumerate(questions):
+        key = AESGCM.generate_key(bit_length=256)
+        nonce = os.urandom(12)
+        plaintext = json.dumps(public_question(question)).encode('utf-8')
+        ciphertext = AESGCM(key).encrypt(nonce, plaintext, f"{room_code}:{index}".encode('utf-8'))
+        bundle.append({'question_index': index, 'nonce': _b64(nonce), 'ciphertext': _b64(ciphertext)})
+        keys.append(_b64(key))
+    return bundle, keys
+
+
+def grade_answer(question, user_answer):
+    """Question.check_answer rules, without touching a Question row"""
+    user_answer = str(user_answer or '').strip()
+    correct_answer = str(question.get('correct_answer', '')).strip()
+    question_type = question.get('question_type', 'MCQ')
+
+    if question_type in ['MCQ', 'multiple_choice']:
+        user_letter = user_answer[:1].upper()
+        correct_letter = correct_answer[:1].upper()
+        if user_letter in ['A', 'B', 'C', 'D']:
+            user_answer = user_letter
+        if correct_letter in ['A', 'B', 'C', 'D']:
+            correct_answer = correct_letter
+        return user_answer == correct_answer
+
+    if question_type in ['True/False', 'true_false']:
+        return user_answer.lower() == correct_answer.lower()
+
+    if not user_answer:
+        return False
+    if EVALUATOR_AVAILABLE:
+        return answer_evaluator.evaluate_answer(
+            question_text=question.get('question_text', ''),
+            user_answer=user_answer,
+            correct_answer=correct_answer,
+            question_type=question_type,
+            options=question.get('options') or []
+        )['is_correct']
+    return correct_answer.lower() in user_answer.lower()
+
+
+class PlayerState:
+    __slots__ = ('user_id', 'score', 'correct_answers', 'answers_submitted', 'rank', 'last_answer_time')
+
+    def __init__(self, user_id, score=0, correct_answers=0, answers_submitted=0, rank=None, last_answer_time=None):
+        self.user_id = user_id
+        self.score = score or 0
+        self.correct_answers = correct_answers or 0
+        self.answers_submitted = answers_submitted or 0
+        self.rank = rank
+        self.last_answer_time = last_answer_time
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'score': self.score,
+            'correct_answers': self.correct_answers,
+            'answers_submitted': self.answers_submitted,
+            'rank': self.rank
+        }
+
+
+class RoomState:
+    """Live state of one in-progress room"""
+
+    def __init__(self, room, participants):
+        self.room_id = room.id
+        self.room_code = room.room_code
+        self.host_user_id = room.host_user_id
+        self.questions = list(room.question_set or [])
+        self.question_count = len(self.questions)
+        self.time_limit = room.time_limit_per_question or 30
+        self.bundle, self.keys = seal_questions(room.room_code, self.questions)
+        # Index of the round in play (or last played); -1 before the first round
+        self.current_index = (room.current_question_index or 0) - 1
+        self.players = {
+            p.user_id: PlayerState(p.user_id, p.score, p.correct_answers, p.answers_submitted,
+                                   p.rank, p.last_answer_time)
+            for p in participants
+        }
+        self.question = None
+        self.round_open = False
+        self.round_started = 0.0  # Monotonic time of the reveal
+        self.reveal_at = 0.0  # Wall-clock time of the reveal (sent to clients)
+        self.answered = set()
+        self.rounds_since_checkpoint = 0
+        self.lock = threading.Lock()
+        self.rerank()
+
+    def rerank(self):
+        """Assign ranks by score; returns {user_id: (rank, previous rank)} for players that moved"""
+        ordered = sorted(self.players.values(), key=lambda p: (-p.score, p.user_id))
+        moved = {}
+        for rank, player in enumerate(ordered, 1):
+            if player.rank != rank:
+                moved[player.user_id] = (rank, player.rank)
+                player.rank = rank
+        return moved
+
+    def standings(self):
+        return sorted((p.to_dict() for p in self.players.values()), key=lambda p: p['rank'])
+
+
+class MultiplayerEngine:
+    """Per-process registry of in-progress rooms"""
+
+    def __init__(self, checkpoint_rounds=MULTIPLAYER_CHECKPOINT_ROUNDS):
+        self.checkpoint_rounds = max(1, checkpoint_rounds)
+        self.app = None
+        self.socketio = None
+        self.lock = threading.Lock()
+        self.rooms = {}  # room_code -> RoomState
+        self.connections = {}  # socket sid -> user_id
+        self.latency = {}  # user_id -> one-way latency credited to answers (seconds)
+        self.metrics = {
+            'answers_graded': 0,
+            'rounds_played': 0,
+            'checkpoints': 0,
+            'games_completed': 0
+        }
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    # ==================== CONNECTIONS ====================
+
+    def register_connection(self, sid, user_id):
+        with self.lock:
+            self.connections[sid] = user_id
+
+    def unregister_connection(self, sid):
+        with self.lock:
+            self.connections.pop(sid, None)
+
+    def user_for(self, sid):
+        return self.connections.get(sid)
+
+    def clock_sample(self, user_id, data):
+        """
+        Answer a clock-sync probe with the server time (ms). Clients take the
+        sample with the lowest round trip: offset = server_time - (sent + received) / 2,
+        and report that round trip (rtt_ms) with their next probe.
+        """
+        rtt_ms = data.get('rtt_ms')
+        if user_id is not None and isinstance(rtt_ms, (int, float)) and rtt_ms >= 0:
+            self.latency[user_id] = min(rtt_ms / 2000, MULTIPLAYER_ROUND_GRACE_SECONDS)
+        return {'client_time': data.get('client_time'), 'server_time': time.time() * 1000}
+
+    # ==================== ROOMS ====================
+
+    def start(self, room):
+        """Load a room that multiplayer_service.start_game has just moved to in_progress"""
+        if not socketio_config.MULTIPLAYER_AVAILABLE:
+            logger.error(f"❌ Room {room.room_code} not started: {socketio_config.MULTIPLAYER_UNAVAILABLE_MESSAGE}")
+            return None
+        participants = MultiplayerParticipant.query.filter_by(room_id=room.id).all()
+        state = RoomState(room, participants)
+        with self.lock:
+            self.rooms[room.room_code] = state
+        logger.info(f"🎮 Room {room.room_code} running in memory with {len(state.players)} players")
+        self._emit('multiplayer:question_bundle', self._bundle_payload(state), room.room_code)
+        self.schedule_round(room.room_code, 0, MULTIPLAYER_START_DELAY_SECONDS)
+        return state
+
+    def get_room(self, room_code):
+        """In-memory state, reloaded from the last checkpoint if this process has none"""
+        state = self.rooms.get(room_code)
+        if state is not None:
+            return state
+
+        if not socketio_config.MULTIPLAYER_AVAILABLE:
+            # Another worker may be running this room; reloading it here would start a second loop
+            return None
+        room = multiplayer_service.get_room_by_code(room_code)
+        if not room or room.status != 'in_progress':
+            return None
+        with self.lock:
+            reloaded = room_code not in self.rooms
+            if reloaded:
+                participants = MultiplayerParticipant.query.filter_by(room_id=room.id).all()
+                self.rooms[room_code] = RoomState(room, participants)
+                logger.info(f"♻️ Reloaded room {room_code} from checkpoint (round {room.current_question_index})")
+            state = self.rooms[room_code]
+        if reloaded:
+            # New keys were generated, so rejoining clients get a fresh bundle via sync_payloads
+            self.schedule_round(room_code, state.current_index + 1, MULTIPLAYER_START_DELAY_SECONDS)
+        return state
+
+    def sync_payloads(self, room_code):
+        """Events that bring a (re)joining client up to date: the bundle and the open round's tick"""
+        state = self.get_room(room_code)
+        if state is None:
+            return []
+        payloads = [('multiplayer:question_bundle', self._bundle_payload(state))]
+        with state.lock:
+            if state.round_open:
+                payloads.append(('multiplayer:round_reveal', self._reveal_payload(state)))
+        return payloads
+
+    def remove_player(self, room_code, user_id):
+        """Drop a player who left mid-game; the round closes if everyone left has answered"""
+        state = self.rooms.get(room_code)
+        if state is None:
+            return
+        with state.lock:
+            state.players.pop(user_id, None)
+            state.answered.discard(user_id)
+            state.rerank()
+            everyone_answered = state.round_open and state.answered >= set(state.players)
+            question_index = state.current_index
+        if not state.players:
+            with self.lock:
+                self.rooms.pop(room_code, None)
+        elif everyone_answered:
+            self.close_round(room_code, question_index)
+
+    def apply_live_state(self, room_details):
+        """Overlay in-memory scores on a room dict read from the last checkpoint"""
+        state = self.rooms.get(room_details.get('room_code'))
+        if state is None:
+            return room_details
+        with state.lock:
+            room_details['current_question_index'] = max(state.current_index, 0)
+            for participant in room_details.get('participants', []):
+                player = state.players.get(participant['user_id'])
+                if player is not None:
+                    participant.update(player.to_dict())
+        room_details.get('participants', []).sort(key=lambda p: p['rank'] or 0)
+        return room_details
+
+    # ==================== ROUNDS ====================
+
+    def schedule_round(self, room_code, question_index, delay):
+        self.socketio.start_background_task(self._run_round, room_code, question_index, delay)
+
+    def _run_round(self, room_code, question_index, delay):
+        lead = min(MULTIPLAYER_REVEAL_LEAD_SECONDS, delay)
+        self.socketio.sleep(delay - lead)
+        try:
+            with self.app.app_context():
+                self.open_round(room_code, question_index, lead)
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"❌ Failed to open round {question_index} in room {room_code}: {e}")
+
+    def open_round(self, room_code, question_index, lead=0.0):
+        """
+        Broadcast the reveal tick for a round that starts `lead` seconds from now.
+
+        Returns:
+            dict: The tick payload, or None if the round is not next in this room
+        """
+        state = self.rooms.get(room_code)
+        if state is None:
+            return None
+        if question_index >= state.question_count:
+            self.finish(room_code)
+            return None
+
+        with state.lock:
+            if state.round_open or question_index != state.current_index + 1:
+                return None
+            state.current_index = question_index
+            state.question = state.questions[question_index]
+            state.answered = set()
+            state.round_open = True
+            state.round_started = time.monotonic() + lead
+            state.reveal_at = time.time() + lead
+            payload = self._reveal_payload(state)
+
+        self._emit('multiplayer:round_reveal', payload, room_code)
+        self.socketio.start_background_task(
+            self._round_timer, room_code, question_index,
+            lead + state.time_limit + MULTIPLAYER_ROUND_GRACE_SECONDS
+        )
+        return payload
+
+    def _bundle_payload(self, state):
+        return {
+            'room_code': state.room_code,
+            'question_count': state.question_count,
+            'time_limit': state.time_limit,
+            'sealed': state.bundle is not None,
+            'cipher': 'AES-256-GCM' if state.bundle is not None else None,
+            'bundle': state.bundle or []
+        }
+
+    def _reveal_payload(self, state):
+        """Per-round tick: reveal and deadline in server epoch milliseconds plus the round's key"""
+        payload = {
+            'room_code': state.room_code,
+            'question_index': state.current_index,
+            'reveal_at': round(state.reveal_at * 1000),
+            'deadline_at': round((state.reveal_at + state.time_limit) * 1000),
+            'server_time': round(time.time() * 1000)
+        }
+        if state.keys:
+            payload['key'] = state.keys[state.current_index]
+        else:
+            payload['question'] = public_question(state.question)
+        return payload
+
+    def submit_answer(self, room_code, user_id, question_index, user_answer):
+        """
+        Grade an answer for the open round.
+
+        Returns:
+            tuple: (result dict or None, message)
+        """
+        state = self.get_room(room_code)
+        if state is None:
+            return None, "Room not found or game not in progress"
+
+        received = time.monotonic()
+        elapsed = max(0.0, received - state.round_started - self.latency.get(user_id, 0.0))
+        with state.lock:
+            player = state.players.get(user_id)
+            if player is None:
+                return None, "Not a participant in this room"
+            if not state.round_open or question_index != state.current_index:
+                return None, "Round is closed"
+            if received < state.round_started:
+                return None, "Round has not started"
+            if user_id in state.answered:
+                return None, "Answer already submitted"
+            if elapsed > state.time_limit + MULTIPLAYER_ROUND_GRACE_SECONDS:
+                return None, "Time is up"
+            state.answered.add(user_id)
+            question = state.question
+
+        # Grading can be slow (semantic evaluation), so it runs outside the room lock
+        is_correct = grade_answer(question, user_answer)
+        points = 0
+        if is_correct:
+            time_left = max(0.0, state.time_limit - elapsed) / state.time_limit
+            points = MULTIPLAYER_BASE_POINTS + round(MULTIPLAYER_SPEED_BONUS * time_left)
+
+        with state.lock:
+            player.score += points
+            player.correct_answers += 1 if is_correct else 0
+            player.answers_submitted += 1
+            player.last_answer_time = datetime.utcnow()
+            moved = state.rerank()
+            everyone_answered = state.answered >= set(state.players)
+            self.metrics['answers_graded'] += 1
+
+        changes = [{'user_id': uid, 'rank': rank, 'previous_rank': previous,
+                    'score': state.players[uid].score} for uid, (rank, previous) in moved.items()]
+        if user_id not in moved:
+            changes.append({'user_id': user_id, 'rank': player.rank, 'previous_rank': player.rank,
+                            'score': player.score})
+        self._emit('multiplayer:score_update', {
+            'room_code': room_code,
+            'question_index': question_index,
+            'changes': changes,
+            'answered': len(state.answered),
+            'timestamp': datetime.now().isoformat()
+        }, room_code)
+
+        if everyone_answered:
+            self.close_round(room_code, question_index)
+
+        return {
+            'question_index': question_index,
+            'is_correct': is_correct,
+            'points_earned': points,
+            'time_taken': round(elapsed, 3),
+            **player.to_dict()
+        }, "Answer submitted"
+
+    def _round_timer(self, room_code, question_index, duration):
+        self.socketio.sleep(duration)
+        try:
+            with self.app.app_context():
+                self.close_round(room_code, question_index)
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"❌ Failed to close round {question_index} in room {room_code}: {e}")
+
+    def close_round(self, room_code, question_index):
+        """Close a round once (timer or all answered); checkpoints or ends the game as due"""
+        state = self.rooms.get(room_code)
+        if state is None:
+            return False
+        with state.lock:
+            if not state.round_open or state.current_index != question_index:
+                return False
+            state.round_open = False
+            state.rounds_since_checkpoint += 1
+            question = state.question
+            last_round = question_index + 1 >= state.question_count
+            checkpoint_due = state.rounds_since_checkpoint >= self.checkpoint_rounds
+            self.metrics['rounds_played'] += 1
+
+        self._emit('multiplayer:round_ended', {
+            'room_code': room_code,
+            'question_index': question_index,
+            'correct_answer': question.get('correct_answer'),
+            'explanation': question.get('explanation'),
+            'standings': state.standings(),
+            'timestamp': datetime.now().isoformat()
+        }, room_code)
+
+        if last_round:
+            self.finish(room_code)
+            return True
+        if checkpoint_due:
+            self.checkpoint(state)
+        self.schedule_round(room_code, question_index + 1, MULTIPLAYER_ROUND_GAP_SECONDS)
+        return True
+
+    # ==================== PERSISTENCE ====================
+
+    def checkpoint(self, state, status=None):
+        with state.lock:
+            players = [p.to_dict() | {'last_answer_time': p.last_answer_time} for p in state.players.values()]
+            next_index = state.current_index + 1
+            state.rounds_since_checkpoint = 0
+        multiplayer_service.save_game_state(state.room_id, next_index, players, status=status)
+        self.metrics['checkpoints'] += 1
+
+    def finish(self, room_code):
+        """Persist final scores and ranks, drop the room from memory and broadcast results"""
+        state = self.rooms.get(room_code)
+        if state is None:
+            return None
+        with state.lock:
+            state.round_open = False
+        self.checkpoint(state, status='completed')
+        with self.lock:
+            self.rooms.pop(room_code, None)
+            self.metrics['games_completed'] += 1
+
+        results = multiplayer_service.get_game_results(room_code)
+        self._emit('multiplayer:game_ended', {
+            'room_code': room_code,
+            'results': results,
+            'timestamp': datetime.now().isoformat()
+        }, room_code)
+        logger.info(f"🏁 Game completed in room {room_code}")
+        return results
+
+    def end_game(self, room_code, user_id):
+        """Host ends the game early"""
+        state = self.get_room(room_code)
+        if state is None:
+            return None, "Room not found or game not in progress"
+        if user_id != state.host_user_id:
+            return None, "Only host can end the game"
+        return self.finish(room_code), "Game ended"
+
+    def _emit(self, event, data, room_code):
+        self.socketio.emit(event, data, to=room_channel(room_code))
+
+    # ==================== METRICS ====================
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['active_rooms'] = len(self.rooms)
+            metrics['identified_connections'] = len(self.connections)
+        metrics['checkpoint_rounds'] = self.checkpoint_rounds
+        return metrics
+
+
+engine = MultiplayerEngine()
+
+
+def init_app(app, socketio):
+    engine.init_app(app, socketio)
+
+
+def start(room):
+    return engine.start(room)
+
+
+def submit_answer(room_code, user_id, question_index, user_answer):
+    return engine.submit_answer(room_code, user_id, question_index, user_answer)
+
+
+def end_game(room_code, user_id):
+    return engine.end_game(room_code, user_id)
+
+
+def remove_player(room_code, user_id):
+    engine.remove_player(room_code, user_id)
+
+
+def apply_live_state(room_details):
+    return engine.apply_live_state(room_details)
+
+
+def register_connection(sid, user_id):
+    engine.register_connection(sid, user_id)
+
+
+def unregister_connection(sid):
+    engine.unregister_connection(sid)
+
+
+def user_for(sid):
+    return engine.user_for(sid)
+
+
+def clock_sample(user_id, data):
+    return engine.clock_sample(user_id, data)
+
+
+def sync_payloads(room_code):
+    return engine.sync_payloads(room_code)
+
+
+def get_metrics():
+    return engine.get_metrics()
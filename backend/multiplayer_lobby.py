@@ -0,0 +1,311 @@
+"""
+Multiplayer Lobby - In-memory room registry and cached lobby listings
+Open rooms (waiting or in progress) are held in a registry keyed by room
+code, so code generation, room lookups and lobby listings do not query the
+database. multiplayer_service refreshes a room's entry after every change it
+commits (create, join, leave, start, game end), which also drops the cached
+listings for that room's topic and schedules a push of the new waiting-room
+listing to clients subscribed to the topic. Pushes are coalesced to at most
+one per topic per MULTIPLAYER_LOBBY_PUSH_INTERVAL_MS.
+
+Each worker keeps its own registry, validated against a change counter in
+the database (MultiplayerLobbyVersion) that every refresh bumps after its
+commit. A worker reads the counter at most once per
+MULTIPLAYER_LOBBY_VERSION_CHECK_MS and reloads the registry when another
+process changed a room, so lookups, room codes and listings are never more
+than that interval behind the database. The registry is also reloaded every
+MULTIPLAYER_LOBBY_TTL_SECONDS regardless, for rows changed outside this module.
+"""
+
+from models import db, MultiplayerRoom, MultiplayerLobbyVersion
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MULTIPLAYER_LOBBY_TTL_SECONDS = float(os.getenv('MULTIPLAYER_LOBBY_TTL_SECONDS', '5'))
+MULTIPLAYER_LOBBY_PUSH_INTERVAL_MS = int(os.getenv('MULTIPLAYER_LOBBY_PUSH_INTERVAL_MS', '500'))
+MULTIPLAYER_LOBBY_VERSION_CHECK_MS = int(os.getenv('MULTIPLAYER_LOBBY_VERSION_CHECK_MS', '250'))
+
+OPEN_STATUSES = ('waiting', 'in_progress')
+
+# Subscription key for the listing across all topics
+ALL_TOPICS = '__all__'
+
+# Id of the single MultiplayerLobbyVersion row
+VERSION_ROW_ID = 1
+
+
+def lobby_channel(topic=None):
+    return f"multiplayer_lobby_{topic or ALL_TOPICS}"
+
+
+class LobbyRegistry:
+    """Per-process registry of open rooms with per-topic listing caches"""
+
+    def __init__(self, ttl_seconds=MULTIPLAYER_LOBBY_TTL_SECONDS, push_interval_ms=MULTIPLAYER_LOBBY_PUSH_INTERVAL_MS,
+                 version_check_ms=MULTIPLAYER_LOBBY_VERSION_CHECK_MS):
+        self.ttl = ttl_seconds
+        self.push_interval = push_interval_ms / 1000
+        self.version_check = version_check_ms / 1000
+        self.app = None
+        self.socketio = None
+        self.lock = threading.RLock()
+        self.rooms = {}  # room_code -> room dict (MultiplayerRoom.to_dict())
+        self.listings = {}  # (topic or None, status) -> list of room dicts
+        self.dirty_topics = set()
+        self.loaded_at = None
+        self.checked_at = None
+        self.version = None  # Shared version the registry reflects
+        self.task_started = False
+        self.metrics = {
+            'lookups': 0,
+            'lookup_misses': 0,
+            'listing_hits': 0,
+            'listing_builds': 0,
+            'reloads': 0,
+            'version_checks': 0,
+            'remote_changes': 0,
+            'invalidations': 0,
+            'pushes': 0
+        }
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    # ==================== REGISTRY ====================
+
+    def _is_fresh(self, now):
+        return (self.loaded_at is not None and now - self.loaded_at < self.ttl
+                and self.checked_at is not None and now - self.checked_at < self.version_check)
+
+    def _ensure_fresh(self):
+        if self._is_fresh(time.monotonic()):
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self._is_fresh(now):
+                return
+            # Read before loading, so changes committed during the load trigger another reload
+            version = self._read_version()
+            self.checked_at = now
+            self.metrics['version_checks'] += 1
+            remote_change = self.loaded_at is not None and now - self.loaded_at < self.ttl
+            if remote_change and version == self.version:
+                return
+
+            rooms = MultiplayerRoom.query.options(joinedload(MultiplayerRoom.host)).filter(
+                MultiplayerRoom.status.in_(OPEN_STATUSES)
+            ).all()
+            previous, self.rooms = self.rooms, {room.room_code: room.to_dict() for room in rooms}
+            self.listings = {}
+            self.version = version
+            self.loaded_at = now
+            self.metrics['reloads'] += 1
+
+            if remote_change:
+                # Push the topics another process changed to this worker's subscribers
+                self.metrics['remote_changes'] += 1
+                changed = {room['topic'] for code, room in previous.items() if self.rooms.get(code) != room}
+                changed.update(room['topic'] for code, room in self.rooms.items() if previous.get(code) != room)
+                for topic in changed:
+                    self._invalidate_topic(topic, True)
+
+    def _read_version(self):
+        versions = MultiplayerLobbyVersion.__table__
+        return db.session.execute(
+            select(versions.c.version).where(versions.c.id == VERSION_ROW_ID)
+        ).scalar() or 0
+
+    def _bump_version(self):
+        """Publish a committed room change to every process; returns the new shared version"""
+        versions = MultiplayerLobbyVersion.__table__
+        values = {'version': versions.c.version + 1, 'updated_at': datetime.utcnow()}
+        result = db.session.execute(update(versions).where(versions.c.id == VERSION_ROW_ID).values(**values))
+        if result.rowcount == 0:
+            try:
+                db.session.execute(insert(versions).values(id=VERSION_ROW_ID, version=1, updated_at=datetime.utcnow()))
+            except IntegrityError:
+                db.session.rollback()
+                db.session.execute(update(versions).where(versions.c.id == VERSION_ROW_ID).values(**values))
+        version = self._read_version()
+        db.session.commit()
+        return version
+
+    def _record_local_change(self, version):
+        """Keep the registry current when the bump was the only change since it was loaded"""
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+        else:
+            # Another process changed rooms too: check (and reload) on next use
+            self.checked_at = None
+
+    def expire(self):
+        """Reload the registry from the database on next use (after bulk deletes)"""
+        self._bump_version()
+        with self.lock:
+            self.loaded_at = None
+            self.dirty_topics.update(room['topic'] for room in self.rooms.values())
+
+    def get(self, room_code):
+        """Registry entry for an open room (None if unknown to this worker)"""
+        self._ensure_fresh()
+        self.metrics['lookups'] += 1
+        entry = self.rooms.get(room_code)
+        if entry is None:
+            self.metrics['lookup_misses'] += 1
+        return entry
+
+    def code_in_use(self, room_code):
+        self._ensure_fresh()
+        return room_code in self.rooms
+
+    def refresh(self, room, push=True):
+        """
+        Invalidation hook: record a room's committed state and drop its topic's listings.
+
+        push=False records a room read from the database (not a change), so the
+        shared version is left alone.
+        """
+        entry = room.to_dict() if room.status in OPEN_STATUSES else None
+        version = self._bump_version() if push else None
+        with self.lock:
+            if version is not None:
+                self._record_local_change(version)
+            previous = self.rooms.pop(room.room_code, None)
+            if entry is not None:
+                self.rooms[room.room_code] = entry
+            self._invalidate_topic(room.topic, push)
+            if previous is not None and previous['topic'] != room.topic:
+                self._invalidate_topic(previous['topic'], push)
+        return entry
+
+    def remove(self, room_code, topic):
+        """Invalidation hook for a deleted room"""
+        version = self._bump_version()
+        with self.lock:
+            self._record_local_change(version)
+            self.rooms.pop(room_code, None)
+            self._invalidate_topic(topic, True)
+
+    def _invalidate_topic(self, topic, push):
+        for key in [key for key in self.listings if key[0] in (topic, None)]:
+            del self.listings[key]
+        self.metrics['invalidations'] += 1
+        if push and self.socketio is not None:
+            self.dirty_topics.add(topic)
+            if not self.task_started:
+                self.task_started = True
+                self.socketio.start_background_task(self._run)
+
+    # ==================== LISTINGS ====================
+
+    def list_rooms(self, topic=None, status='waiting'):
+        """Rooms with free seats, newest first (cached until the topic changes)"""
+        self._ensure_fresh()
+        key = (topic or None, status)
+        listing = self.listings.get(key)
+        if listing is not None:
+            self.metrics['listing_hits'] += 1
+            return listing
+
+        with self.lock:
+            listing = sorted(
+                (room for room in self.rooms.values()
+                 if room['status'] == status
+                 and (topic is None or room['topic'] == topic)
+                 and room['current_players'] < room['max_players']),
+                key=lambda room: room['created_at'],
+                reverse=True
+            )
+            self.listings[key] = listing
+            self.metrics['listing_builds'] += 1
+        return listing
+
+    # ==================== PUSH ====================
+
+    def _run(self):
+        logger.info(f"✅ Lobby push scheduler started (interval {self.push_interval * 1000:.0f}ms)")
+        while True:
+            self.socketio.sleep(self.push_interval)
+            if not self.dirty_topics:
+                continue
+            try:
+                with self.app.app_context():
+                    self.flush(self.socketio.emit)
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"❌ Lobby push failed: {e}")
+
+    def flush(self, emit_event):
+        """Push the waiting-room listing of every changed topic (and the all-topics listing)"""
+        with self.lock:
+            topics, self.dirty_topics = self.dirty_topics, set()
+        if not topics:
+            return 0
+
+        timestamp = datetime.now().isoformat()
+        for topic in list(topics) + [None]:
+            rooms = self.list_rooms(topic)
+            emit_event('multiplayer:lobby_update', {
+                'topic': topic,
+                'rooms': rooms,
+                'total': len(rooms),
+                'timestamp': timestamp
+            }, to=lobby_channel(topic))
+        self.metrics['pushes'] += len(topics) + 1
+        return len(topics) + 1
+
+    # ==================== METRICS ====================
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['open_rooms'] = len(self.rooms)
+            metrics['cached_listings'] = len(self.listings)
+        metrics['ttl_seconds'] = self.ttl
+        metrics['version'] = self.version
+        metrics['version_check_ms'] = self.version_check * 1000
+        return metrics
+
+
+registry = LobbyRegistry()
+
+
+def init_app(app, socketio):
+    registry.init_app(app, socketio)
+
+
+def get(room_code):
+    return registry.get(room_code)
+
+
+def code_in_use(room_code):
+    return registry.code_in_use(room_code)
+
+
+def refresh(room, push=True):
+    return registry.refresh(room, push)
+
+
+def remove(room_code, topic):
+    registry.remove(room_code, topic)
+
+
+def expire():
+    registry.expire()
+
+
+def list_rooms(topic=None, status='waiting'):
+    return registry.list_rooms(topic, status)
+
+
+def get_metrics():
+    return registry.get_metrics()
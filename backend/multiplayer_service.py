@@ -4,68 +4,100 @@ Handles room creation, participant management, and live scoring
 """
 
 from models import db, User, MultiplayerRoom, MultiplayerParticipant, QuizSession, Question
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from datetime import datetime
+import multiplayer_lobby
+import db_dialect
 import random
 import string
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Room difficulty -> skill level used by stored questions and the generator
+ROOM_SKILL_LEVELS = {'Easy': 'Beginner', 'Medium': 'Intermediate', 'Hard': 'Advanced'}
+
+
+# Attempts at a fresh room code when the unique constraint rejects one
+ROOM_CODE_ATTEMPTS = 3
+
 
 def generate_room_code():
-    """Generate a unique 6-character room code"""
+    """Generate a 6-character room code not used by any open room"""
     while True:
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        # Check if code already exists
-        existing = MultiplayerRoom.query.filter_by(room_code=code).first()
-        if not existing:
+        # Open rooms are checked in memory; the unique constraint catches the rest
+        if not multiplayer_lobby.code_in_use(code):
             return code
 
 
+def get_room_by_code(room_code):
+    """Room row by code, resolved through the lobby registry for open rooms"""
+    entry = multiplayer_lobby.get(room_code)
+    if entry is not None:
+        return db.session.get(MultiplayerRoom, entry['id'])
+    
+    # Completed, or created on another worker since the registry was loaded
+    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    if room is not None and room.status in multiplayer_lobby.OPEN_STATUSES:
+        multiplayer_lobby.refresh(room, push=False)
+    return room
+
+
 def create_room(host_user_id, topic, difficulty, max_players=10, question_count=10, time_limit_per_question=30):
     """Create a new multiplayer room"""
-    try:
-        room_code = generate_room_code()
-        
-        room = MultiplayerRoom(
-            room_code=room_code,
-            host_user_id=host_user_id,
-            topic=topic,
-            difficulty=difficulty,
-            max_players=max_players,
-            question_count=question_count,
-            time_limit_per_question=time_limit_per_question,
-            status='waiting'
-        )
-        
-        db.session.add(room)
-        db.session.flush()
-        
-        # Add host as first participant
-        host_participant = MultiplayerParticipant(
-            room_id=room.id,
-            user_id=host_user_id,
-            is_ready=True,  # Host is ready by default
-            is_host=True
-        )
-        
-        db.session.add(host_participant)
-        room.current_players = 1
-        
-        db.session.commit()
-        
-        logger.info(f"🎮 Created multiplayer room {room_code} by user {host_user_id}")
-        return room
-        
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"❌ Failed to create multiplayer room: {e}")
-        return None
+    for attempt in range(ROOM_CODE_ATTEMPTS):
+        try:
+            room_code = generate_room_code()
+            
+            room = MultiplayerRoom(
+                room_code=room_code,
+                name=f"{topic} ({difficulty})",
+                host_user_id=host_user_id,
+                topic=topic,
+                difficulty=difficulty,
+                max_players=max_players,
+                question_count=question_count,
+                time_limit_per_question=time_limit_per_question,
+                status='waiting'
+            )
+            
+            db.session.add(room)
+            db.session.flush()
+            
+            # Add host as first participant
+            host_participant = MultiplayerParticipant(
+                room_id=room.id,
+                user_id=host_user_id,
+                is_ready=True,  # Host is ready by default
+                is_host=True
+            )
+            
+            db.session.add(host_participant)
+            room.current_players = 1
+            
+            db.session.commit()
+            multiplayer_lobby.refresh(room)
+            
+            logger.info(f"🎮 Created multiplayer room {room_code} by user {host_user_id}")
+            return room
+            
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"⚠️ Room code collision, retrying ({attempt + 1}/{ROOM_CODE_ATTEMPTS})")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"❌ Failed to create multiplayer room: {e}")
+            return None
+    
+    logger.error(f"❌ Failed to create multiplayer room: no free room code after {ROOM_CODE_ATTEMPTS} attempts")
+    return None
 
 
 def join_room(room_code, user_id):
     """Join an existing multiplayer room"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room:
         return None, "Room not found"
@@ -97,6 +129,7 @@ def join_room(room_code, user_id):
         room.current_players += 1
         
         db.session.commit()
+        multiplayer_lobby.refresh(room)
         
         logger.info(f"👤 User {user_id} joined room {room_code}")
         return room, "Joined successfully"
@@ -109,7 +142,7 @@ def join_room(room_code, user_id):
 
 def leave_room(room_code, user_id):
     """Leave a multiplayer room"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room:
         return False, "Room not found"
@@ -139,11 +172,16 @@ def leave_room(room_code, user_id):
                 logger.info(f"👑 User {new_host.user_id} is now host of room {room_code}")
         
         # If room is empty, delete it
-        if room.current_players == 0:
+        deleted = room.current_players == 0
+        if deleted:
             db.session.delete(room)
             logger.info(f"🗑️ Deleted empty room {room_code}")
         
         db.session.commit()
+        if deleted:
+            multiplayer_lobby.remove(room_code, room.topic)
+        else:
+            multiplayer_lobby.refresh(room)
         
         logger.info(f"👋 User {user_id} left room {room_code}")
         return True, "Left successfully"
@@ -156,7 +194,7 @@ def leave_room(room_code, user_id):
 
 def toggle_ready_status(room_code, user_id):
     """Toggle player's ready status"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room:
         return None
@@ -188,7 +226,7 @@ def check_all_ready(room_id):
 
 def start_game(room_code, host_user_id):
     """Start the multiplayer game (host only)"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room:
         return None, "Room not found"
@@ -210,12 +248,19 @@ def start_game(room_code, host_user_id):
     if not check_all_ready(room.id):
         return None, "Not all players are ready"
     
+    question_set = build_question_set(room)
+    if not question_set:
+        return None, "Could not prepare questions for this topic"
+    
     try:
+        room.question_set = question_set
+        room.question_count = len(question_set)
         room.status = 'in_progress'
         room.started_at = datetime.utcnow()
         room.current_question_index = 0
         
         db.session.commit()
+        multiplayer_lobby.refresh(room)
         
         logger.info(f"🎮 Started game in room {room_code}")
         return room, "Game started"
@@ -226,102 +271,118 @@ def start_game(room_code, host_user_id):
         return None, "Failed to start game"
 
 
-def submit_answer(room_code, user_id, question_index, user_answer, time_taken):
-    """Submit an answer in a multiplayer game"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
-    
-    if not room or room.status != 'in_progress':
-        return None, "Room not found or game not in progress"
-    
-    participant = MultiplayerParticipant.query.filter_by(
-        room_id=room.id,
-        user_id=user_id
-    ).first()
-    
-    if not participant:
-        return None, "Not a participant in this room"
-    
-    # Validate question index
-    if question_index != room.current_question_index:
-        return None, "Invalid question index"
-    
+def build_question_set(room):
+    """
+    Fix a room's questions before it starts: stored questions for its topic and
+    difficulty first (one random sample drawn in the database, deduplicated by
+    text), then generated questions for any shortfall.
+    """
+    skill_level = ROOM_SKILL_LEVELS.get(room.difficulty, room.difficulty)
+    
+    sample = Question.query.join(
+        QuizSession, Question.quiz_session_id == QuizSession.id
+    ).filter(
+        QuizSession.topic == room.topic,
+        Question.difficulty_level.in_([room.difficulty, skill_level])
+    ).order_by(db_dialect.random_order()).limit(room.question_count * 2).all()
+    
+    questions = []
+    seen_texts = set()
+    for question in sample:
+        if question.question_text in seen_texts:
+            continue
+        seen_texts.add(question.question_text)
+        questions.append({
+            'question_text': question.question_text,
+            'question_type': question.question_type,
+            'options': question.get_options(),
+            'correct_answer': question.correct_answer,
+            'explanation': question.explanation,
+            'difficulty_level': question.difficulty_level
+        })
+    random.shuffle(questions)
+    questions = questions[:room.question_count]
+    
+    missing = room.question_count - len(questions)
+    if missing > 0:
+        try:
+            from question_gen import question_generator
+            generated = question_generator.generate_quiz_questions(
+                topic=room.topic,
+                skill_level=skill_level,
+                num_questions=missing
+            )
+            questions.extend({
+                'question_text': q['question_text'],
+                'question_type': q['question_type'],
+                'options': q.get('options', []),
+                'correct_answer': q['correct_answer'],
+                'explanation': q.get('explanation'),
+                'difficulty_level': q.get('difficulty_level', skill_level)
+            } for q in generated[:missing])
+        except Exception as e:
+            logger.error(f"❌ Failed to generate questions for room {room.room_code}: {e}")
+    
+    logger.info(f"📚 Prepared {len(questions)} questions for room {room.room_code} "
+                f"({room.question_count - missing} from storage)")
+    return questions
+
+
+def save_game_state(room_id, next_question_index, players, status=None):
+    """
+    Checkpoint a running game from multiplayer_engine in one commit.
+
+    Args:
+        room_id: Room being checkpointed
+        next_question_index: First round not yet played
+        players: list of dicts with user_id, score, correct_answers,
+            answers_submitted, rank and last_answer_time
+        status: New room status ('completed' also stamps ended_at)
+    """
     try:
-        # Calculate points based on correctness and time
-        # Assuming we have a way to check correctness - this would need actual question data
-        # For now, we'll update score and increment answers
+        room = MultiplayerRoom.query.get(room_id)
+        if not room:
+            return None
+        
+        room.current_question_index = next_question_index
+        if status:
+            room.status = status
+            if status == 'completed':
+                room.ended_at = datetime.utcnow()
         
-        participant.answers_submitted += 1
-        participant.last_answer_time = datetime.utcnow()
+        players_by_user = {player['user_id']: player for player in players}
+        participant_ids = db.session.query(
+            MultiplayerParticipant.id, MultiplayerParticipant.user_id
+        ).filter_by(room_id=room_id).all()
         
-        # Update ranking based on score
-        update_rankings(room.id)
+        db.session.bulk_update_mappings(MultiplayerParticipant, [
+            {
+                'id': participant_id,
+                'score': players_by_user[user_id]['score'],
+                'correct_answers': players_by_user[user_id]['correct_answers'],
+                'answers_submitted': players_by_user[user_id]['answers_submitted'],
+                'rank': players_by_user[user_id]['rank'],
+                'last_answer_time': players_by_user[user_id]['last_answer_time']
+            }
+            for participant_id, user_id in participant_ids if user_id in players_by_user
+        ])
         
         db.session.commit()
+        if status:
+            multiplayer_lobby.refresh(room)
         
-        logger.info(f"✅ User {user_id} submitted answer for question {question_index} in room {room_code}")
-        return participant, "Answer submitted"
+        logger.info(f"💾 Checkpointed room {room.room_code} at question {next_question_index}")
+        return room
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"❌ Failed to submit answer: {e}")
-        return None, "Failed to submit answer"
-
-
-def update_participant_score(room_id, user_id, points_to_add, is_correct):
-    """Update participant's score"""
-    participant = MultiplayerParticipant.query.filter_by(
-        room_id=room_id,
-        user_id=user_id
-    ).first()
-    
-    if not participant:
-        return None
-    
-    participant.score += points_to_add
-    
-    if is_correct:
-        participant.correct_answers += 1
-    
-    db.session.commit()
-    
-    return participant
-
-
-def update_rankings(room_id):
-    """Update rankings for all participants in a room"""
-    participants = MultiplayerParticipant.query.filter_by(
-        room_id=room_id
-    ).order_by(MultiplayerParticipant.score.desc()).all()
-    
-    for rank, participant in enumerate(participants, 1):
-        participant.rank = rank
-    
-    db.session.commit()
-
-
-def next_question(room_code):
-    """Move to next question"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
-    
-    if not room or room.status != 'in_progress':
+        logger.error(f"❌ Failed to checkpoint room {room_id}: {e}")
         return None
-    
-    room.current_question_index += 1
-    
-    # Check if game is finished
-    if room.current_question_index >= room.question_count:
-        room.status = 'completed'
-        room.ended_at = datetime.utcnow()
-        logger.info(f"🏁 Game completed in room {room_code}")
-    
-    db.session.commit()
-    
-    return room
 
 
 def get_room_details(room_code, user_id=None):
     """Get detailed room information including participants"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room:
         return None
@@ -356,8 +417,11 @@ def get_room_details(room_code, user_id=None):
 
 
 def get_available_rooms(topic=None, status='waiting'):
-    """Get list of available rooms"""
-    query = MultiplayerRoom.query.filter_by(status=status)
+    """Get list of available rooms (open rooms come from the cached lobby listing)"""
+    if status in multiplayer_lobby.OPEN_STATUSES:
+        return multiplayer_lobby.list_rooms(topic, status)
+    
+    query = MultiplayerRoom.query.options(joinedload(MultiplayerRoom.host)).filter_by(status=status)
     
     if topic:
         query = query.filter_by(topic=topic)
@@ -366,20 +430,12 @@ def get_available_rooms(topic=None, status='waiting'):
         MultiplayerRoom.current_players < MultiplayerRoom.max_players
     ).order_by(MultiplayerRoom.created_at.desc()).all()
     
-    rooms_data = []
-    for room in rooms:
-        room_dict = room.to_dict()
-        # Get host info
-        host = User.query.get(room.host_user_id)
-        room_dict['host_username'] = host.username if host else "Unknown"
-        rooms_data.append(room_dict)
-    
-    return rooms_data
+    return [room.to_dict() for room in rooms]
 
 
 def get_game_results(room_code):
     """Get final results for a completed game"""
-    room = MultiplayerRoom.query.filter_by(room_code=room_code).first()
+    room = get_room_by_code(room_code)
     
     if not room or room.status != 'completed':
         return None
@@ -414,31 +470,34 @@ def get_game_results(room_code):
     }
 
 
-def cleanup_old_rooms(hours=24):
-    """Clean up old completed/abandoned rooms"""
+def cleanup_old_rooms(hours=24, chunk_size=1000, pause_seconds=0.0):
+    """Clean up old completed/abandoned rooms (chunked DELETEs, participants first)"""
     from datetime import timedelta
     
     cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+    rooms = MultiplayerRoom.__table__
+    participants = MultiplayerParticipant.__table__
     
-    old_rooms = MultiplayerRoom.query.filter(
+    count = db_dialect.delete_in_chunks(
+        rooms,
         db.or_(
             db.and_(
-                MultiplayerRoom.status == 'completed',
-                MultiplayerRoom.ended_at < cutoff_time
+                rooms.c.status == 'completed',
+                rooms.c.completed_at < cutoff_time
             ),
             db.and_(
-                MultiplayerRoom.status == 'waiting',
-                MultiplayerRoom.created_at < cutoff_time
+                rooms.c.status == 'waiting',
+                rooms.c.created_at < cutoff_time
             )
-        )
-    ).all()
-    
-    count = len(old_rooms)
-    
-    for room in old_rooms:
-        db.session.delete(room)
-    
-    db.session.commit()
+        ),
+        chunk_size,
+        pause_seconds,
+        children=[(participants, participants.c.room_id)]
+    )
+    
+    # Abandoned waiting rooms may still be listed in the lobby
+    if count:
+        multiplayer_lobby.expire()
     
     logger.info(f"🧹 Cleaned up {count} old multiplayer rooms")
     return count
@@ -0,0 +1,251 @@
+"""
+PDF Extraction - Page-parallel text extraction with a shared process pool
+The page range is split into PDF_PAGES_PER_TASK page slices that worker
+processes extract independently; iter_pdf_pages yields the pages in order
+as their slices finish, with at most two slices per worker in flight.
+PDFs shorter than PDF_PARALLEL_MIN_PAGES are extracted in-process.
+
+With tables, pages go through pdfplumber (layout-aware text plus
+extract_tables()). Without tables the fast path uses pypdfium2 when
+installed, otherwise PyPDF2.
+
+Sources are a path or a seekable binary file object (an upload stream).
+Worker processes need a path, so a file object is spilled to a temporary
+file only when the parallel path is taken.
+
+Workers are started by a forkserver where the platform supports it (spawn
+elsewhere): by the time the first large PDF arrives the web worker runs
+threads (schedulers, the SQLAlchemy pool, logging), and a child forked from
+it could deadlock on a lock held at fork time. The forkserver is a fresh,
+single-threaded interpreter that only preloads this module. Children of
+forkserver/spawn re-import the main script, so under `python app.py` (the
+development server, whose import builds the app) pages are extracted
+in-process; under gunicorn the main module is its console script. Under
+eventlet/gevent the pool is not used either: multiprocessing's pipes and
+threads do not mix with monkey patching.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import multiprocessing
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import socketio_config
+
+logger = logging.getLogger(__name__)
+
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '20'))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '40'))
+
+POOL_AVAILABLE = socketio_config.SOCKETIO_ASYNC_MODE not in socketio_config.COOPERATIVE_ASYNC_MODES
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# pypdfium2 module, False when not installed (None until first use)
+_pdfium = None
+
+
+def pdfium_module():
+    """pypdfium2 if installed, else None (the PDF libraries are imported on first use)"""
+    global _pdfium
+    if _pdfium is None:
+        try:
+            import pypdfium2
+            _pdfium = pypdfium2
+        except ImportError:
+            _pdfium = False
+    return _pdfium or None
+
+
+def _main_is_app_script():
+    """Started as `python app.py`: pool workers would re-run the app's import"""
+    main = sys.modules.get('__main__')
+    return (getattr(main, '__spec__', None) is None
+            and os.path.basename(getattr(main, '__file__', None) or '') == 'app.py')
+
+
+def pool_available():
+    return POOL_AVAILABLE and not _main_is_app_script()
+
+
+def get_executor():
+    """Shared worker pool, created on first use (forkserver, else spawn)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    # The server imports only the extraction code, not __main__
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=context)
+                logger.info(f"✅ PDF extraction pool started ({PDF_EXTRACT_WORKERS} "
+                            f"{context.get_start_method()} workers)")
+    return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def raw_stream(file):
+    """
+    The io object behind an upload stream. Werkzeug spools uploads into a
+    tempfile.SpooledTemporaryFile, which before Python 3.11 lacks the io
+    methods (readable, readinto, ...) TextIOWrapper and pypdfium2 need; its
+    buffer (a BytesIO, or the temporary file after rollover) has them.
+    """
+    if isinstance(file, tempfile.SpooledTemporaryFile):
+        return file._file
+    return file
+
+
+@contextmanager
+def _binary(source):
+    """Binary file object for a path or a file object (rewound, left open)"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            yield file
+    else:
+        source = raw_stream(source)
+        source.seek(0)
+        yield source
+
+
+@contextmanager
+def as_path(source, suffix='.pdf'):
+    """A filesystem path for `source`, spilling a file object to a temporary file"""
+    if isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            source.seek(0)
+            shutil.copyfileobj(source, file)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def count_pages(source):
+    pdfium = pdfium_module()
+    with _binary(source) as file:
+        if pdfium:
+            pdf = pdfium.PdfDocument(file)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+        import PyPDF2
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _format_table(table, table_num, page_number):
+    table_text = f"\n--- Table {table_num + 1} on Page {page_number} ---\n"
+    for row in table:
+        if row:
+            # Filter out None values and join cells
+            table_text += " | ".join(str(cell) if cell else "" for cell in row) + "\n"
+    return table_text
+
+
+def _page_block(page_number, page_text, table_blocks=()):
+    parts = []
+    if page_text and page_text.strip():
+        parts.append(f"=== Page {page_number} ===\n{page_text}")
+    parts.extend(table_blocks)
+    return '\n\n'.join(parts)
+
+
+def extract_page_range(source, start, end, include_tables=True):
+    """
+    Extract pages [start, end) (0-based). Runs in the worker processes
+    (with a path) or in-process.
+
+    Returns:
+        list: (page number, text block) per page; the block is '' for empty pages
+    """
+    with _binary(source) as file:
+        return _extract_pages(file, start, end, include_tables)
+
+
+def _extract_pages(file, start, end, include_tables):
+    pages = []
+    pdfium = pdfium_module()
+    if include_tables:
+        import pdfplumber
+        with pdfplumber.open(file, pages=list(range(start + 1, end + 1))) as pdf:
+            for page in pdf.pages:
+                page_number = page.page_number
+                tables = page.extract_tables()
+                pages.append((page_number, _page_block(page_number, page.extract_text(), [
+                    _format_table(table, table_num, page_number) for table_num, table in enumerate(tables)
+                ])))
+                page.close()
+    elif pdfium:
+        pdf = pdfium.PdfDocument(file)
+        try:
+            for index in range(start, end):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                pages.append((index + 1, _page_block(index + 1, textpage.get_text_range())))
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+    else:
+        import PyPDF2
+        reader = PyPDF2.PdfReader(file)
+        for index in range(start, end):
+            pages.append((index + 1, _page_block(index + 1, reader.pages[index].extract_text())))
+    return pages
+
+
+def iter_pdf_pages(source, include_tables=True, workers=PDF_EXTRACT_WORKERS):
+    """
+    Yield (page number, text block) for every page of a PDF, in page order.
+
+    Args:
+        source: Path to the PDF or a seekable binary file object
+        include_tables: Extract tables with pdfplumber (False uses the fast text-only path)
+        workers: Worker processes to spread the pages over (1 = in-process)
+    """
+    page_count = count_pages(source)
+    if not pool_available() or workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from extract_page_range(source, 0, page_count, include_tables)
+        return
+
+    with as_path(source) as file_path:
+        yield from _iter_parallel(file_path, page_count, include_tables, workers)
+
+
+def _iter_parallel(file_path, page_count, include_tables, workers):
+    executor = get_executor()
+    slices = deque((start, min(start + PDF_PAGES_PER_TASK, page_count))
+                   for start in range(0, page_count, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+    try:
+        while slices or in_flight:
+            while slices and len(in_flight) < workers * 2:
+                start, end = slices.popleft()
+                in_flight.append(executor.submit(extract_page_range, file_path, start, end, include_tables))
+            yield from in_flight.popleft().result()
+    finally:
+        # Generator closed early: drop the slices nobody will read
+        for future in in_flight:
+            future.cancel()
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import re
 import json
@@ -8,14 +9,11 @@ import math
 from collections import Counter, deque
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import importlib.util
+import threading
 
-# Optional local model support
-try:
-    from transformers import pipeline
-    import torch
-    TRANSFORMERS_AVAILABLE = True
-except Exception:
-    TRANSFORMERS_AVAILABLE = False
+# Optional local model support (transformers/torch are imported when the model is first loaded)
+TRANSFORMERS_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('transformers', 'torch'))
 
 # Safe print wrapper to avoid Unicode encode errors on some consoles (Windows)
 def _safe_print(*args, **kwargs):
@@ -34,6 +32,10 @@ def _safe_print(*args, **kwargs):
 print = _safe_print
 import time
 import hashlib
+import ai_circuit_breaker
+import document_chunking
+import gemini_rate_limiter
+import startup
 
 # Import error handling system
 from error_handler import (
@@ -863,25 +865,18 @@ class GeminiQuestionGenerator:
         # Get API key from environment variables
         self.api_key = os.getenv('GEMINI_API_KEY')
 
-        # If Gemini API key is not provided, attempt to use a local Hugging Face model
+        # If Gemini API key is not provided, use a local Hugging Face model (loaded on first use)
         self.use_local_model = False
-        self.local_generator = None
+        self._local_generator = None
+        self._local_model_lock = threading.Lock()
         self.local_model_name = os.getenv('LOCAL_AI_MODEL', 't5-small')
 
         if not self.api_key:
-            print("⚠️ GEMINI_API_KEY not set - attempting to initialize local Hugging Face model fallback")
             if TRANSFORMERS_AVAILABLE:
-                try:
-                    device = 0 if torch.cuda.is_available() else -1
-                    # Use text2text-generation pipeline (T5/BART compatible)
-                    self.local_generator = pipeline('text2text-generation', model=self.local_model_name, device=device)
-                    self.use_local_model = True
-                    print(f"✅ Local model '{self.local_model_name}' loaded for question generation (device={device})")
-                except Exception as e:
-                    print(f"⚠️ Failed to initialize local model '{self.local_model_name}': {e}")
-                    self.use_local_model = False
+                self.use_local_model = True
+                print(f"⚠️ GEMINI_API_KEY not set - local model '{self.local_model_name}' will be loaded on first use")
             else:
-                print("⚠️ transformers/torch not available - local model fallback disabled")
+                print("⚠️ GEMINI_API_KEY not set and transformers/torch not available - local model fallback disabled")
 
         # If Gemini API key exists, set base URL for Gemini
         if self.api_key:
@@ -889,20 +884,13 @@ class GeminiQuestionGenerator:
         else:
             self.base_url = None
         
-        # Service health monitoring
+        # Service health monitoring (this worker's view; the circuit breaker and the
+        # request rate are shared by every worker: ai_circuit_breaker, gemini_rate_limiter)
         self.service_health = {
-            'gemini_api': {'status': 'unknown', 'last_check': None, 'consecutive_failures': 0},
+            'gemini_api': {'status': 'unknown', 'last_check': None},
             'fallback_ready': True
         }
         
-        # Rate limiting and circuit breaker
-        self.rate_limiter = {
-            'requests_per_minute': 60,
-            'request_timestamps': deque(maxlen=60),
-            'circuit_breaker_threshold': 5,
-            'circuit_breaker_reset_time': 300  # 5 minutes
-        }
-        
         # Initialize difficulty classifier
         self.difficulty_classifier = DifficultyClassifier()
         
@@ -914,8 +902,8 @@ class GeminiQuestionGenerator:
         
         print("🤖 Gemini AI Question Generator initialized with robust error handling")
         
-        # Perform initial health check
-        self._check_service_health()
+        # Initial health check runs in the background so construction never waits on the network
+        startup.defer(self._check_service_health, 'gemini health check')
         
         # Topic-specific content for enhanced context
         self.topic_content = {
@@ -946,6 +934,23 @@ class GeminiQuestionGenerator:
             }
         }
     
+    @property
+    def local_generator(self):
+        """Batched local inference server, loaded on first use (None when unavailable)"""
+        if self._local_generator is None and self.use_local_model:
+            with self._local_model_lock:
+                if self._local_generator is None and self.use_local_model:
+                    try:
+                        # One micro-batching server per process, shared by concurrent requests
+                        import local_inference
+                        self._local_generator = local_inference.get_server(self.local_model_name)
+                        print(f"✅ Local model '{self.local_model_name}' loaded for question generation "
+                              f"({self._local_generator.backend})")
+                    except Exception as e:
+                        print(f"⚠️ Failed to initialize local model '{self.local_model_name}': {e}")
+                        self.use_local_model = False
+        return self._local_generator
+    
     def _register_fallback_strategies(self):
         """Register fallback strategies for different services"""
         self.fallback_manager.register_fallback(
@@ -972,18 +977,22 @@ class GeminiQuestionGenerator:
                 'x-goog-api-key': self.api_key
             }
             
+            # The health check spends quota too: take a background slot so quiz starts go first
+            gemini_rate_limiter.acquire(gemini_rate_limiter.BACKGROUND)
             response = requests.post(self.base_url, headers=headers, json=test_payload, timeout=10)
             
             if response.status_code == 200:
                 self.service_health['gemini_api'] = {
                     'status': 'healthy',
-                    'last_check': datetime.now(),
-                    'consecutive_failures': 0
+                    'last_check': datetime.now()
                 }
+                ai_circuit_breaker.get_breaker().record_success()
                 print("✅ Gemini API health check passed")
             else:
                 self._mark_service_unhealthy('gemini_api', f"HTTP {response.status_code}")
                 
+        except gemini_rate_limiter.RateLimitExceeded as e:
+            print(f"⏭️ Gemini health check skipped: {e}")
         except Exception as e:
             self._mark_service_unhealthy('gemini_api', str(e))
     
@@ -991,46 +1000,41 @@ class GeminiQuestionGenerator:
         """Mark a service as unhealthy"""
         self.service_health[service]['status'] = 'unhealthy'
         self.service_health[service]['last_check'] = datetime.now()
-        self.service_health[service]['consecutive_failures'] += 1
+        if service == 'gemini_api':
+            ai_circuit_breaker.get_breaker().record_failure(reason)
         print(f"⚠️ {service} marked as unhealthy: {reason}")
     
-    def _check_rate_limit(self) -> bool:
-        """Check if we're within rate limits"""
-        now = time.time()
-        
-        # Remove old timestamps
-        while (self.rate_limiter['request_timestamps'] and 
-               now - self.rate_limiter['request_timestamps'][0] > 60):
-            self.rate_limiter['request_timestamps'].popleft()
-        
-        # Check if we can make a request
-        if len(self.rate_limiter['request_timestamps']) >= self.rate_limiter['requests_per_minute']:
-            return False
-        
-        # Add current timestamp
-        self.rate_limiter['request_timestamps'].append(now)
-        return True
+    def _rate_limited_error(self, error: gemini_rate_limiter.RateLimitExceeded, retry: int) -> AIServiceError:
+        """No Gemini slot within the wait limit: fail now with the estimated wait"""
+        return AIServiceError(
+            message=f"Rate limit exceeded for Gemini API (estimated wait {error.retry_after:.0f}s)",
+            service_name='gemini',
+            error_code='RATE_LIMIT_EXCEEDED',
+            retry_count=retry,
+            details={'retry_after': math.ceil(error.retry_after)}
+        )
     
-    def _should_use_circuit_breaker(self, service: str) -> bool:
-        """Check if circuit breaker should be triggered"""
-        health = self.service_health.get(service, {})
-        consecutive_failures = health.get('consecutive_failures', 0)
-        last_check = health.get('last_check')
-        
-        # If too many consecutive failures
-        if consecutive_failures >= self.rate_limiter['circuit_breaker_threshold']:
-            # Check if enough time has passed to try again
-            if last_check:
-                time_since_failure = (datetime.now() - last_check).total_seconds()
-                if time_since_failure < self.rate_limiter['circuit_breaker_reset_time']:
-                    return True
-                else:
-                    # Reset circuit breaker
-                    self.service_health[service]['consecutive_failures'] = 0
-                    return False
-            return True
-        
-        return False
+    def _gemini_throttled(self, response_headers, response_text: str, retry: int) -> AIServiceError:
+        """Gemini answered 429: pause the shared bucket for the delay it asked for"""
+        delay = gemini_rate_limiter.retry_delay(response_headers, response_text)
+        gemini_rate_limiter.penalize(delay)
+        return self._throttled_error(delay, retry)
+    
+    async def _gemini_throttled_async(self, response_headers, response_text: str, retry: int) -> AIServiceError:
+        """_gemini_throttled without blocking the event loop on the shared bucket"""
+        delay = gemini_rate_limiter.retry_delay(response_headers, response_text)
+        await gemini_rate_limiter.penalize_async(delay)
+        return self._throttled_error(delay, retry)
+    
+    def _throttled_error(self, delay: float, retry: int) -> AIServiceError:
+        print(f"    ⏳ Rate limited by Gemini, pausing all workers for {delay:.0f}s")
+        return AIServiceError(
+            message="Gemini API quota exhausted (HTTP 429)",
+            service_name='gemini',
+            error_code='HTTP_429',
+            retry_count=retry + 1,
+            details={'retry_after': math.ceil(delay)}
+        )
     
     def _parse_batch_response(self, response: str, skill_level: str, topic: str, expected_count: int) -> List[Dict]:
         """Parse batch-generated questions from Gemini response - OPTIMIZED"""
@@ -1159,39 +1163,8 @@ Explanation: This question tests fundamental understanding of {topic}."""
             print(f"Error getting previous questions: {e}")
             return []
     
-    def generate_with_gemini(self, prompt: str, max_retries: int = 2, timeout: int = 15) -> str:
-        """Enhanced Gemini API call with comprehensive error handling and fallback - OPTIMIZED"""
-        # If no Gemini API key, use local generator if available
-        if not self.api_key:
-            if self.use_local_model and self.local_generator:
-                return self.generate_with_local_model(prompt)
-            else:
-                raise AIServiceError(
-                    message="No Gemini API key configured and no local model available",
-                    service_name='local_or_gemini',
-                    error_code='NO_AI_PROVIDER',
-                    retry_count=0
-                )
-        # Check circuit breaker
-        if self._should_use_circuit_breaker('gemini_api'):
-            failures = self.service_health['gemini_api'].get('consecutive_failures', 0)
-            raise AIServiceError(
-                message=f"Gemini API circuit breaker active ({failures} consecutive failures)",
-                service_name='gemini',
-                error_code='CIRCUIT_BREAKER_OPEN',
-                retry_count=0,
-                details={'consecutive_failures': failures}
-            )
-        
-        # Check rate limiting
-        if not self._check_rate_limit():
-            raise AIServiceError(
-                message="Rate limit exceeded for Gemini API",
-                service_name='gemini',
-                error_code='RATE_LIMIT_EXCEEDED',
-                retry_count=0
-            )
-        
+    def _gemini_preflight(self, prompt: str) -> bool:
+        """Prompt and circuit breaker checks before a Gemini call; True when the call is the half-open probe"""
         # Validate input
         if not prompt or len(prompt.strip()) < 10:
             raise ValidationError(
@@ -1201,6 +1174,20 @@ Explanation: This question tests fundamental understanding of {topic}."""
                 validation_rule="min_length=10"
             )
         
+        # Check circuit breaker (shared by all workers)
+        try:
+            return ai_circuit_breaker.get_breaker().before_call()
+        except ai_circuit_breaker.CircuitOpenError as e:
+            raise AIServiceError(
+                message=f"Gemini API circuit breaker active ({e.failures} consecutive failures)",
+                service_name='gemini',
+                error_code='CIRCUIT_BREAKER_OPEN',
+                retry_count=0,
+                details={'consecutive_failures': e.failures, 'retry_after': math.ceil(e.retry_after)}
+            )
+    
+    def _gemini_request(self, prompt: str):
+        """Headers and payload for a generateContent call"""
         headers = {
             'Content-Type': 'application/json',
             'x-goog-api-key': self.api_key
@@ -1226,85 +1213,235 @@ Explanation: This question tests fundamental understanding of {topic}."""
                 }
             ]
         }
+        return headers, payload
+    
+    def _gemini_content(self, result: Dict) -> str:
+        """Validated text of a generateContent response ('' when the call should be retried)"""
+        # Validate response structure
+        if 'candidates' not in result or len(result['candidates']) == 0:
+            print(f"    ⚠️ No candidates in Gemini response, retrying...")
+            return ''
+        
+        candidate = result['candidates'][0]
+        if 'content' not in candidate or 'parts' not in candidate['content']:
+            print(f"    ⚠️ Invalid response structure, retrying...")
+            return ''
+        
+        content = candidate['content']['parts'][0].get('text', '')
+        
+        # Validate content quality
+        if len(content.strip()) < 30:
+            print(f"    ⚠️ Response too short ({len(content)} chars), retrying...")
+            return ''
+        
+        if any(error_word in content.lower() for error_word in ['error', 'sorry', 'cannot', 'unable']):
+            print(f"    ⚠️ Response contains error indicators, retrying...")
+            return ''
+        
+        # Success - close the circuit breaker / reset its failure counter
+        ai_circuit_breaker.get_breaker().record_success()
+        self.service_health['gemini_api']['status'] = 'healthy'
+        self.service_health['gemini_api']['last_check'] = datetime.now()
+        
+        print(f"    ✅ Gemini AI responded successfully with {len(content)} characters")
+        return content.strip()
+    
+    def _gemini_http_error(self, status_code: int, text: str, retry: int, max_retries: int):
+        """Raise for a final 4xx/5xx answer; 429/503 and earlier attempts are retried"""
+        error_msg = f"HTTP {status_code}: {text}"
+        if retry == max_retries - 1:
+            raise AIServiceError(
+                message=error_msg,
+                service_name='gemini',
+                error_code=f"HTTP_{status_code}",
+                retry_count=retry + 1
+            )
+    
+    def _gemini_failed(self, last_error, max_retries: int):
+        """All retries failed - mark service as unhealthy and raise"""
+        self._mark_service_unhealthy('gemini_api', f"Failed after {max_retries} attempts")
+        
+        # Raise the last error or a generic one
+        if last_error:
+            raise last_error
+        raise AIServiceError(
+            message=f"Gemini AI failed after {max_retries} attempts with unknown error",
+            service_name='gemini',
+            error_code='UNKNOWN_FAILURE',
+            retry_count=max_retries
+        )
+    
+    def generate_with_gemini(self, prompt: str, max_retries: int = 2, timeout: int = 15,
+                             endpoint: str = 'generate') -> str:
+        """
+        Enhanced Gemini API call with comprehensive error handling and fallback - OPTIMIZED
+        
+        `timeout` is the upper bound; each attempt uses the adaptive timeout of
+        `endpoint` (ai_circuit_breaker), derived from its recent p95 latency.
+        """
+        # If no Gemini API key, use local generator if available
+        if not self.api_key:
+            if self.use_local_model and self.local_generator:
+                return self.generate_with_local_model(prompt)
+            else:
+                raise AIServiceError(
+                    message="No Gemini API key configured and no local model available",
+                    service_name='local_or_gemini',
+                    error_code='NO_AI_PROVIDER',
+                    retry_count=0
+                )
+        
+        probe = self._gemini_preflight(prompt)
+        headers, payload = self._gemini_request(prompt)
         
         last_error = None
         
         for retry in range(max_retries):
+            # One token per API call; waits in priority order or fails with the estimated wait
+            try:
+                gemini_rate_limiter.acquire()
+            except gemini_rate_limiter.RateLimitExceeded as e:
+                raise self._rate_limited_error(e, retry)
+            
+            attempt_timeout = ai_circuit_breaker.adaptive_timeout(endpoint, timeout, probe)
             try:
                 print(f"    🤖 Calling Gemini AI API (attempt {retry + 1}/{max_retries})...")
                 
+                started = time.perf_counter()
                 response = requests.post(
                     self.base_url, 
                     headers=headers, 
                     json=payload, 
-                    timeout=timeout
+                    timeout=attempt_timeout
                 )
                 
                 # Handle different HTTP status codes
                 if response.status_code == 429:
-                    wait_time = 2 ** retry  # Exponential backoff
-                    print(f"    ⏳ Rate limited, waiting {wait_time}s before retry...")
-                    time.sleep(wait_time)
+                    # The next attempt waits for the shared bucket (or fails with the estimate)
+                    last_error = self._gemini_throttled(response.headers, response.text, retry)
                     continue
                 elif response.status_code == 503:
                     print(f"    ⚠️ Service temporarily unavailable, retrying...")
                     time.sleep(1)
                     continue
                 elif response.status_code >= 400:
-                    error_msg = f"HTTP {response.status_code}: {response.text}"
-                    if retry == max_retries - 1:
-                        raise AIServiceError(
-                            message=error_msg,
-                            service_name='gemini',
-                            error_code=f"HTTP_{response.status_code}",
-                            retry_count=retry + 1
-                        )
+                    self._gemini_http_error(response.status_code, response.text, retry, max_retries)
                     continue
                 
                 response.raise_for_status()
+                ai_circuit_breaker.observe(endpoint, time.perf_counter() - started)
                 
-                result = response.json()
+                content = self._gemini_content(response.json())
+                if content:
+                    return content
+                continue
                 
-                # Validate response structure
-                if 'candidates' not in result or len(result['candidates']) == 0:
-                    print(f"    ⚠️ No candidates in Gemini response, retrying...")
-                    continue
+            except requests.exceptions.Timeout as e:
+                ai_circuit_breaker.observe_timeout(endpoint, time.perf_counter() - started)
+                last_error = AIServiceError(
+                    message=f"Gemini API timeout after {attempt_timeout}s",
+                    service_name='gemini',
+                    error_code='TIMEOUT',
+                    retry_count=retry + 1,
+                    details={'timeout': attempt_timeout}
+                )
+                print(f"    ⏰ Timeout error (attempt {retry + 1}): {e}")
                 
-                candidate = result['candidates'][0]
-                if 'content' not in candidate or 'parts' not in candidate['content']:
-                    print(f"    ⚠️ Invalid response structure, retrying...")
-                    continue
+            except requests.exceptions.ConnectionError as e:
+                last_error = AIServiceError(
+                    message="Failed to connect to Gemini API",
+                    service_name='gemini',
+                    error_code='CONNECTION_ERROR',
+                    retry_count=retry + 1,
+                    details={'original_error': str(e)}
+                )
+                print(f"    🔌 Connection error (attempt {retry + 1}): {e}")
                 
-                content = candidate['content']['parts'][0].get('text', '')
+            except requests.exceptions.RequestException as e:
+                last_error = AIServiceError(
+                    message=f"Gemini API request failed: {str(e)}",
+                    service_name='gemini',
+                    error_code='REQUEST_ERROR',
+                    retry_count=retry + 1,
+                    details={'original_error': str(e)}
+                )
+                print(f"    ❌ Request error (attempt {retry + 1}): {e}")
                 
-                # Validate content quality
-                if len(content.strip()) < 30:
-                    print(f"    ⚠️ Response too short ({len(content)} chars), retrying...")
-                    continue
+            except Exception as e:
+                last_error = AIServiceError(
+                    message=f"Unexpected error calling Gemini API: {str(e)}",
+                    service_name='gemini',
+                    error_code='UNEXPECTED_ERROR',
+                    retry_count=retry + 1,
+                    details={'original_error': str(e), 'error_type': type(e).__name__}
+                )
+                print(f"    💥 Unexpected error (attempt {retry + 1}): {e}")
+            
+            # Wait before retry (exponential backoff)
+            if retry < max_retries - 1:
+                wait_time = min(2 ** retry, 10)  # Cap at 10 seconds
+                print(f"    ⏳ Waiting {wait_time}s before retry...")
+                time.sleep(wait_time)
+        
+        self._gemini_failed(last_error, max_retries)
+
+    async def generate_with_gemini_async(self, prompt: str, max_retries: int = 2, timeout: int = 15,
+                                         run_blocking=None, endpoint: str = 'generate') -> str:
+        """generate_with_gemini over the shared async HTTP client (gemini_async.py)"""
+        import gemini_async
+        
+        if not self.api_key:
+            # The local model is CPU-bound: run it off the event loop
+            return await gemini_async.run_blocking(run_blocking, self.generate_with_gemini, prompt)
+        
+        probe = self._gemini_preflight(prompt)
+        headers, payload = self._gemini_request(prompt)
+        client = gemini_async.get_client()
+        
+        last_error = None
+        
+        for retry in range(max_retries):
+            try:
+                await gemini_rate_limiter.acquire_async()
+            except gemini_rate_limiter.RateLimitExceeded as e:
+                raise self._rate_limited_error(e, retry)
+            
+            attempt_timeout = ai_circuit_breaker.adaptive_timeout(endpoint, timeout, probe)
+            try:
+                print(f"    🤖 Calling Gemini AI API async (attempt {retry + 1}/{max_retries})...")
                 
-                if any(error_word in content.lower() for error_word in ['error', 'sorry', 'cannot', 'unable']):
-                    print(f"    ⚠️ Response contains error indicators, retrying...")
-                    continue
+                started = time.perf_counter()
+                response = await client.post(self.base_url, headers=headers, json=payload, timeout=attempt_timeout)
                 
-                # Success - reset failure counter
-                self.service_health['gemini_api']['consecutive_failures'] = 0
-                self.service_health['gemini_api']['status'] = 'healthy'
-                self.service_health['gemini_api']['last_check'] = datetime.now()
+                if response.status_code == 429:
+                    last_error = await self._gemini_throttled_async(response.headers, response.text, retry)
+                    continue
+                elif response.status_code == 503:
+                    print(f"    ⚠️ Service temporarily unavailable, retrying...")
+                    await asyncio.sleep(1)
+                    continue
+                elif response.status_code >= 400:
+                    self._gemini_http_error(response.status_code, response.text, retry, max_retries)
+                    continue
                 
-                print(f"    ✅ Gemini AI responded successfully with {len(content)} characters")
-                return content.strip()
+                ai_circuit_breaker.observe(endpoint, time.perf_counter() - started)
+                content = self._gemini_content(response.json())
+                if content:
+                    return content
+                continue
                 
-            except requests.exceptions.Timeout as e:
+            except gemini_async.TimeoutException as e:
+                ai_circuit_breaker.observe_timeout(endpoint, time.perf_counter() - started)
                 last_error = AIServiceError(
-                    message=f"Gemini API timeout after {timeout}s",
+                    message=f"Gemini API timeout after {attempt_timeout}s",
                     service_name='gemini',
                     error_code='TIMEOUT',
                     retry_count=retry + 1,
-                    details={'timeout': timeout}
+                    details={'timeout': attempt_timeout}
                 )
                 print(f"    ⏰ Timeout error (attempt {retry + 1}): {e}")
                 
-            except requests.exceptions.ConnectionError as e:
+            except gemini_async.ConnectError as e:
                 last_error = AIServiceError(
                     message="Failed to connect to Gemini API",
                     service_name='gemini',
@@ -1314,7 +1451,7 @@ Explanation: This question tests fundamental understanding of {topic}."""
                 )
                 print(f"    🔌 Connection error (attempt {retry + 1}): {e}")
                 
-            except requests.exceptions.RequestException as e:
+            except gemini_async.HTTPError as e:
                 last_error = AIServiceError(
                     message=f"Gemini API request failed: {str(e)}",
                     service_name='gemini',
@@ -1334,31 +1471,16 @@ Explanation: This question tests fundamental understanding of {topic}."""
                 )
                 print(f"    💥 Unexpected error (attempt {retry + 1}): {e}")
             
-            # Wait before retry (exponential backoff)
             if retry < max_retries - 1:
                 wait_time = min(2 ** retry, 10)  # Cap at 10 seconds
                 print(f"    ⏳ Waiting {wait_time}s before retry...")
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
         
-        # All retries failed - mark service as unhealthy
-        self._mark_service_unhealthy('gemini_api', f"Failed after {max_retries} attempts")
-        
-        # Raise the last error or a generic one
-        if last_error:
-            raise last_error
-        else:
-            raise AIServiceError(
-                message=f"Gemini AI failed after {max_retries} attempts with unknown error",
-                service_name='gemini',
-                error_code='UNKNOWN_FAILURE',
-                retry_count=max_retries
-            )
+        self._gemini_failed(last_error, max_retries)
 
-    def generate_batch_with_gemini(self, topic: str, skill_level: str, num_questions: int, context: str) -> str:
-        """Generate multiple questions in a single API call for faster performance - OPTIMIZED"""
-        print(f"  ⚡ Using BATCH generation for {num_questions} questions (faster mode)")
-        
-        batch_prompt = f"""You are an expert educational content creator. Generate {num_questions} DIFFERENT quiz questions about {topic} at {skill_level} level.
+    def create_batch_prompt(self, topic: str, skill_level: str, num_questions: int, context: str) -> str:
+        """Prompt asking for num_questions questions in one response"""
+        return f"""You are an expert educational content creator. Generate {num_questions} DIFFERENT quiz questions about {topic} at {skill_level} level.
 
 Context: {context}
 
@@ -1380,8 +1502,14 @@ Explanation: [Brief explanation]
 
 Generate all {num_questions} questions now:"""
 
+    def generate_batch_with_gemini(self, topic: str, skill_level: str, num_questions: int, context: str) -> str:
+        """Generate multiple questions in a single API call for faster performance - OPTIMIZED"""
+        print(f"  ⚡ Using BATCH generation for {num_questions} questions (faster mode)")
+        
+        batch_prompt = self.create_batch_prompt(topic, skill_level, num_questions, context)
+
         try:
-            response = self.generate_with_gemini(batch_prompt, max_retries=1, timeout=20)
+            response = self.generate_with_gemini(batch_prompt, max_retries=1, timeout=20, endpoint='batch')
             return response
         except Exception as e:
             print(f"  ⚠️ Batch generation failed: {e}, falling back to individual generation")
@@ -1403,11 +1531,8 @@ Generate all {num_questions} questions now:"""
             if len(prompt) < 10:
                 prompt = prompt + '\nGenerate a concise educational question.'
 
-            outputs = self.local_generator(prompt, max_length=max_length, num_return_sequences=1)
-            if isinstance(outputs, list) and len(outputs) > 0:
-                generated = outputs[0].get('generated_text') or outputs[0].get('text') or ''
-                return generated.strip()
-            return ''
+            # Batched with other requests' prompts by the inference server
+            return self.local_generator.generate(prompt, max_length=max_length)
         except Exception as e:
             print(f"⚠️ Local model generation failed: {e}")
             raise AIServiceError(
@@ -1710,46 +1835,8 @@ Explanation: [what makes a good answer and why this topic is important]
         if not content or len(content) < 100:
             return [content] * num_questions
         
-        # Split content into sentences and paragraphs
-        paragraphs = [p.strip() for p in content.split('\n') if p.strip()]
-        sentences = []
-        
-        for paragraph in paragraphs:
-            # Split by sentence endings
-            sent_endings = re.split(r'[.!?]+', paragraph)
-            sentences.extend([s.strip() for s in sent_endings if s.strip()])
-        
-        if len(sentences) < num_questions:
-            # If we don't have enough sentences, use paragraphs or repeat content
-            if len(paragraphs) >= num_questions:
-                return paragraphs[:num_questions]
-            else:
-                # Cycle through available content
-                segments = []
-                for i in range(num_questions):
-                    if paragraphs:
-                        segments.append(paragraphs[i % len(paragraphs)])
-                    else:
-                        segments.append(content)
-                return segments
-        
-        # Distribute sentences across questions
-        segment_size = max(1, len(sentences) // num_questions)
-        segments = []
-        
-        for i in range(num_questions):
-            start_idx = i * segment_size
-            end_idx = start_idx + segment_size + 1  # Add overlap for context
-            
-            if i == num_questions - 1:  # Last segment gets remaining sentences
-                segment_sentences = sentences[start_idx:]
-            else:
-                segment_sentences = sentences[start_idx:end_idx]
-            
-            segment = '. '.join(segment_sentences)
-            segments.append(segment if segment else content)
-        
-        return segments
+        # Overlapping chunks, the most keyword-dense first (document_chunking.py)
+        return document_chunking.segment_for_questions(content, num_questions)
 
     def _create_unique_fallback_question(self, question_type: str, difficulty: str, topic: str, question_number: int, context: str = None) -> Dict:
         """Create a unique fallback question when API fails, using custom content if available"""
@@ -1909,6 +1996,77 @@ Explanation: [what makes a good answer and why this topic is important]
                 'difficulty_level': difficulty
             }
     
+    def _complete_batch(self, batch_response: str, skill_level: str, topic: str, num_questions: int, context: str):
+        """Questions parsed from a batch response, topped up with fallbacks (None if too few parsed)"""
+        # Parse batch response into individual questions
+        questions = self._parse_batch_response(batch_response, skill_level, topic, num_questions)
+        
+        if len(questions) >= num_questions * 0.7:  # Accept if we got at least 70% of questions
+            print(f"✅ Batch generation successful! Generated {len(questions)} questions in one call")
+            
+            # Fill any missing questions with quick fallback
+            while len(questions) < num_questions:
+                question = self._create_unique_fallback_question(
+                    'MCQ', skill_level, topic, len(questions), context
+                )
+                questions.append(question)
+            
+            return questions[:num_questions]
+        
+        print(f"⚠️ Batch generation incomplete ({len(questions)}/{num_questions}), using individual generation")
+        return None
+    
+    def _individual_plan(self, context: str, num_questions: int, custom_topic: str = None):
+        """Question types, custom-content flag and content segments for individual generation"""
+        question_types = ['MCQ', 'True/False', 'MCQ', 'Fill-in-the-blank', 'MCQ']
+        
+        # Add randomization to ensure variety
+        random.shuffle(question_types)
+        
+        # For custom content, segment it to create varied questions
+        is_custom_content = bool(custom_topic and len(custom_topic.strip()) > 10)
+        content_segments = []
+        if is_custom_content:
+            content_segments = self._segment_custom_content(context, num_questions)
+            print(f"📝 Segmented custom content into {len(content_segments)} parts for question variety")
+        
+        return question_types, is_custom_content, content_segments
+    
+    def _individual_prompt(self, topic: str, skill_level: str, question_type: str, context: str,
+                           avoid: List[str], is_custom_content: bool, index: int, num_questions: int,
+                           attempt: int) -> str:
+        # Create enhanced prompt with uniqueness requirements
+        prompt = self.create_question_prompt(topic, skill_level, question_type, context, avoid)
+        
+        # Add segment-specific instruction for custom content
+        if is_custom_content:
+            prompt += f"\n\nFOCUS AREA: This question should focus specifically on the content segment provided above. Question {index+1} of {num_questions}."
+        
+        # Only add uniqueness instruction on second attempt
+        if attempt > 0:
+            prompt += f"\n\nIMPORTANT: Make this question completely different from previous questions."
+        
+        return prompt
+    
+    def _accept_question(self, gemini_response: str, question_type: str, skill_level: str, topic: str,
+                         avoid: List[str], is_custom_content: bool, index: int, attempt: int):
+        """Parsed question, or None when the response should be retried"""
+        # Skip strict validation for faster generation
+        if len(gemini_response) < 30:
+            print(f"    ⚠️ Response too short, retrying...")
+            return None
+        
+        # Parse response into structured format with difficulty classification
+        question = self.parse_gemini_response(gemini_response, question_type, skill_level, topic)
+        
+        # Relaxed uniqueness check for faster generation
+        if attempt == 0 or self._is_question_unique(question['question_text'], avoid, is_custom_content):
+            print(f"  ✅ Question {index+1} generated successfully")
+            return question
+        
+        print(f"    🔄 Question similar, retrying...")
+        return None
+    
     def generate_quiz_questions(self, topic: str, skill_level: str, num_questions: int = 5, custom_topic: str = None, user_id: int = None) -> List[Dict]:
         """Main method to generate unique quiz questions using Gemini AI - OPTIMIZED FOR SPEED"""
         print(f"🚀 Generating {num_questions} questions for {topic} at {skill_level} level (FAST MODE)...")
@@ -1923,22 +2081,9 @@ Explanation: [what makes a good answer and why this topic is important]
                 batch_response = self.generate_batch_with_gemini(topic, skill_level, num_questions, context)
                 
                 if batch_response:
-                    # Parse batch response into individual questions
-                    questions = self._parse_batch_response(batch_response, skill_level, topic, num_questions)
-                    
-                    if len(questions) >= num_questions * 0.7:  # Accept if we got at least 70% of questions
-                        print(f"✅ Batch generation successful! Generated {len(questions)} questions in one call")
-                        
-                        # Fill any missing questions with quick fallback
-                        while len(questions) < num_questions:
-                            question = self._create_unique_fallback_question(
-                                'MCQ', skill_level, topic, len(questions), context
-                            )
-                            questions.append(question)
-                        
-                        return questions[:num_questions]
-                    else:
-                        print(f"⚠️ Batch generation incomplete ({len(questions)}/{num_questions}), using individual generation")
+                    questions = self._complete_batch(batch_response, skill_level, topic, num_questions, context)
+                    if questions is not None:
+                        return questions
             except Exception as e:
                 print(f"⚠️ Batch generation failed: {e}, falling back to individual generation")
         
@@ -1952,18 +2097,7 @@ Explanation: [what makes a good answer and why this topic is important]
             print(f"📋 Found {len(previous_questions)} previous questions to avoid repeating")
         
         questions = []
-        question_types = ['MCQ', 'True/False', 'MCQ', 'Fill-in-the-blank', 'MCQ']
-        
-        # Add randomization to ensure variety
-        import random
-        random.shuffle(question_types)
-        
-        # For custom content, segment it to create varied questions
-        is_custom_content = custom_topic and len(custom_topic.strip()) > 10
-        content_segments = []
-        if is_custom_content:
-            content_segments = self._segment_custom_content(context, num_questions)
-            print(f"📝 Segmented custom content into {len(content_segments)} parts for question variety")
+        question_types, is_custom_content, content_segments = self._individual_plan(context, num_questions, custom_topic)
         
         for i in range(num_questions):
             question_type = question_types[i % len(question_types)]
@@ -1977,39 +2111,18 @@ Explanation: [what makes a good answer and why this topic is important]
             
             for attempt in range(max_attempts):
                 try:
-                    # Create enhanced prompt with uniqueness requirements
-                    prompt = self.create_question_prompt(
-                        topic, skill_level, question_type, current_context, 
-                        previous_questions + [q['question_text'] for q in questions]
-                    )
-                    
-                    # Add segment-specific instruction for custom content
-                    if is_custom_content:
-                        prompt += f"\n\nFOCUS AREA: This question should focus specifically on the content segment provided above. Question {i+1} of {num_questions}."
-                    
-                    # Only add uniqueness instruction on second attempt
-                    if attempt > 0:
-                        prompt += f"\n\nIMPORTANT: Make this question completely different from previous questions."
+                    avoid = previous_questions + [q['question_text'] for q in questions]
+                    prompt = self._individual_prompt(topic, skill_level, question_type, current_context,
+                                                     avoid, is_custom_content, i, num_questions, attempt)
                     
                     # Generate with Gemini AI
                     print(f"  🤖 Generating question {i+1}/{num_questions} ({question_type}) via Gemini AI...")
                     gemini_response = self.generate_with_gemini(prompt)
                     
-                    # Skip strict validation for faster generation
-                    if len(gemini_response) < 30:
-                        print(f"    ⚠️ Response too short, retrying...")
-                        continue
-                    
-                    # Parse response into structured format with difficulty classification
-                    question = self.parse_gemini_response(gemini_response, question_type, skill_level, topic)
-                    
-                    # Relaxed uniqueness check for faster generation
-                    if attempt == 0 or self._is_question_unique(question['question_text'], previous_questions + [q['question_text'] for q in questions], is_custom_content):
-                        print(f"  ✅ Question {i+1} generated successfully")
+                    question = self._accept_question(gemini_response, question_type, skill_level, topic,
+                                                     avoid, is_custom_content, i, attempt)
+                    if question is not None:
                         break
-                    else:
-                        print(f"    🔄 Question similar, retrying...")
-                        question = None
                         
                 except Exception as e:
                     print(f"  ❌ Error generating question {i+1} (attempt {attempt+1}): {e}")
@@ -2030,6 +2143,74 @@ Explanation: [what makes a good answer and why this topic is important]
         
         return questions
     
+    async def generate_quiz_questions_async(self, topic: str, skill_level: str, num_questions: int = 5,
+                                            custom_topic: str = None, user_id: int = None,
+                                            run_blocking=None) -> List[Dict]:
+        """
+        generate_quiz_questions with the Gemini calls awaited on the async client.
+        
+        run_blocking(func, *args) runs blocking work (the previous-questions
+        query, the local model) off the event loop; it defaults to a worker
+        thread without an app context.
+        """
+        import gemini_async
+        
+        print(f"🚀 Generating {num_questions} questions for {topic} at {skill_level} level (ASYNC)...")
+        context = self.get_context_for_topic(topic, skill_level, custom_topic)
+        
+        if num_questions >= 3:
+            try:
+                print(f"  ⚡ Using BATCH generation for {num_questions} questions (faster mode)")
+                batch_response = await self.generate_with_gemini_async(
+                    self.create_batch_prompt(topic, skill_level, num_questions, context),
+                    max_retries=1, timeout=20, run_blocking=run_blocking, endpoint='batch'
+                )
+                questions = self._complete_batch(batch_response, skill_level, topic, num_questions, context)
+                if questions is not None:
+                    return questions
+            except Exception as e:
+                print(f"⚠️ Batch generation failed: {e}, falling back to individual generation")
+        
+        print(f"📝 Using individual generation mode...")
+        previous_questions = []
+        if user_id:
+            previous_questions = await gemini_async.run_blocking(
+                run_blocking, self.get_previous_questions, user_id, topic, skill_level
+            )
+            print(f"📋 Found {len(previous_questions)} previous questions to avoid repeating")
+        
+        questions = []
+        question_types, is_custom_content, content_segments = self._individual_plan(context, num_questions, custom_topic)
+        
+        for i in range(num_questions):
+            question_type = question_types[i % len(question_types)]
+            current_context = content_segments[i] if content_segments else context
+            question = None
+            
+            for attempt in range(2):
+                try:
+                    avoid = previous_questions + [q['question_text'] for q in questions]
+                    prompt = self._individual_prompt(topic, skill_level, question_type, current_context,
+                                                     avoid, is_custom_content, i, num_questions, attempt)
+                    print(f"  🤖 Generating question {i+1}/{num_questions} ({question_type}) via Gemini AI...")
+                    gemini_response = await self.generate_with_gemini_async(prompt, run_blocking=run_blocking)
+                    question = self._accept_question(gemini_response, question_type, skill_level, topic,
+                                                     avoid, is_custom_content, i, attempt)
+                    if question is not None:
+                        break
+                except Exception as e:
+                    print(f"  ❌ Error generating question {i+1} (attempt {attempt+1}): {e}")
+                    question = None
+            
+            if question is None:
+                print(f"  🔄 Creating fallback question {i+1}")
+                question = self._create_unique_fallback_question(question_type, skill_level, topic, len(questions), current_context)
+            questions.append(question)
+        
+        print(f"🎉 Successfully generated {len(questions)} questions!")
+        self._add_variety_to_questions(questions, topic, skill_level)
+        return questions
+    
     def _add_variety_to_questions(self, questions: List[Dict], topic: str, skill_level: str):
         """Add variety and enhance questions"""
         difficulty_indicators = {
@@ -2049,11 +2230,8 @@ Explanation: [what makes a good answer and why this topic is important]
             # Enhance question numbering in explanations
             question['explanation'] += f" This tests {skill_level}-level understanding of {topic}."
     
-    def generate_adaptive_question(self, user_id: str, topic: str, question_type: str, 
-                                 num_questions: int = 1, previous_answer_correct: bool = None) -> List[Dict]:
-        """Generate questions with real-time adaptive difficulty adjustment"""
-        print(f"\n🎯 Generating adaptive questions for user {user_id}")
-        
+    def _adaptive_target(self, user_id: str, topic: str, question_type: str, previous_answer_correct: bool = None):
+        """Record the previous answer and pick the next difficulty: (recommendation, difficulty, skill level)"""
         # Initialize user profile if needed
         if user_id not in self.adaptive_engine.user_performance_history:
             # Map skill level from topic or default to intermediate
@@ -2075,17 +2253,57 @@ Explanation: [what makes a good answer and why this topic is important]
         print(f"🎯 Target difficulty for next question: {target_difficulty}")
         print(f"📊 User performance: {recommendation['user_performance']['accuracy']:.2f} accuracy")
         
+        # Use the target difficulty as skill_level parameter
+        skill_level_mapping = {
+            'easy': 'Beginner',
+            'medium': 'Intermediate', 
+            'hard': 'Advanced'
+        }
+        mapped_skill_level = skill_level_mapping.get(target_difficulty, 'Intermediate')
+        return recommendation, target_difficulty, mapped_skill_level
+    
+    def _adaptive_question(self, question_batch: List[Dict], recommendation: Dict, target_difficulty: str,
+                           question_type: str, mapped_skill_level: str, topic: str, index: int) -> Dict:
+        """First generated question with adaptive metadata, or a fallback question"""
+        if question_batch:
+            question = question_batch[0]
+            
+            # Enhance question with adaptive metadata
+            question.update({
+                'adaptive_difficulty': target_difficulty,
+                'user_performance_data': recommendation['user_performance'],
+                'adaptation_reason': recommendation.get('adaptation_reason', 'initial_generation'),
+                'question_sequence_number': recommendation['session_stats']['total_questions'] + 1,
+                'recommended_by_adaptive_engine': True,
+                'learning_insights': recommendation['learning_insights']
+            })
+            print(f"✅ Generated adaptive question {index+1} at {target_difficulty} difficulty")
+            return question
+        
+        print(f"⚠️ Failed to generate question {index+1}, using fallback")
+        # Create fallback question
+        fallback = self._create_unique_fallback_question(
+            question_type, mapped_skill_level, topic, index
+        )
+        fallback.update({
+            'adaptive_difficulty': target_difficulty,
+            'is_fallback': True,
+            'recommended_by_adaptive_engine': True
+        })
+        return fallback
+    
+    def generate_adaptive_question(self, user_id: str, topic: str, question_type: str, 
+                                 num_questions: int = 1, previous_answer_correct: bool = None) -> List[Dict]:
+        """Generate questions with real-time adaptive difficulty adjustment"""
+        print(f"\n🎯 Generating adaptive questions for user {user_id}")
+        
+        recommendation, target_difficulty, mapped_skill_level = self._adaptive_target(
+            user_id, topic, question_type, previous_answer_correct
+        )
+        
         # Generate questions at the recommended difficulty
         questions = []
         for i in range(num_questions):
-            # Use the target difficulty as skill_level parameter
-            skill_level_mapping = {
-                'easy': 'Beginner',
-                'medium': 'Intermediate', 
-                'hard': 'Advanced'
-            }
-            mapped_skill_level = skill_level_mapping.get(target_difficulty, 'Intermediate')
-            
             try:
                 # Generate question using existing method with adaptive difficulty
                 question_batch = self.generate_quiz_questions(
@@ -2094,34 +2312,9 @@ Explanation: [what makes a good answer and why this topic is important]
                     num_questions=1,
                     user_id=int(user_id) if user_id.isdigit() else None
                 )
-                
-                if question_batch:
-                    question = question_batch[0]
-                    
-                    # Enhance question with adaptive metadata
-                    question.update({
-                        'adaptive_difficulty': target_difficulty,
-                        'user_performance_data': recommendation['user_performance'],
-                        'adaptation_reason': recommendation.get('adaptation_reason', 'initial_generation'),
-                        'question_sequence_number': recommendation['session_stats']['total_questions'] + 1,
-                        'recommended_by_adaptive_engine': True,
-                        'learning_insights': recommendation['learning_insights']
-                    })
-                    
-                    questions.append(question)
-                    print(f"✅ Generated adaptive question {i+1}/{num_questions} at {target_difficulty} difficulty")
-                else:
-                    print(f"⚠️ Failed to generate question {i+1}, using fallback")
-                    # Create fallback question
-                    fallback = self._create_unique_fallback_question(
-                        question_type, mapped_skill_level, topic, i
-                    )
-                    fallback.update({
-                        'adaptive_difficulty': target_difficulty,
-                        'is_fallback': True,
-                        'recommended_by_adaptive_engine': True
-                    })
-                    questions.append(fallback)
+                questions.append(self._adaptive_question(
+                    question_batch, recommendation, target_difficulty, question_type, mapped_skill_level, topic, i
+                ))
                     
             except Exception as e:
                 print(f"❌ Error generating adaptive question {i+1}: {e}")
@@ -2130,6 +2323,35 @@ Explanation: [what makes a good answer and why this topic is important]
         print(f"🎯 Generated {len(questions)} adaptive questions for {user_id}")
         return questions
     
+    async def generate_adaptive_question_async(self, user_id: str, topic: str, question_type: str,
+                                               num_questions: int = 1, previous_answer_correct: bool = None,
+                                               run_blocking=None) -> List[Dict]:
+        """generate_adaptive_question over generate_quiz_questions_async"""
+        print(f"\n🎯 Generating adaptive questions for user {user_id} (ASYNC)")
+        
+        recommendation, target_difficulty, mapped_skill_level = self._adaptive_target(
+            user_id, topic, question_type, previous_answer_correct
+        )
+        
+        questions = []
+        for i in range(num_questions):
+            try:
+                question_batch = await self.generate_quiz_questions_async(
+                    topic=topic,
+                    skill_level=mapped_skill_level,
+                    num_questions=1,
+                    user_id=int(user_id) if user_id.isdigit() else None,
+                    run_blocking=run_blocking
+                )
+                questions.append(self._adaptive_question(
+                    question_batch, recommendation, target_difficulty, question_type, mapped_skill_level, topic, i
+                ))
+            except Exception as e:
+                print(f"❌ Error generating adaptive question {i+1}: {e}")
+                continue
+        
+        return questions
+    
     def record_user_answer_and_adapt(self, user_id: str, question_data: Dict, 
                                    user_answer: str, is_correct: bool, 
                                    response_time: float = 0) -> Dict[str, Any]:
@@ -2234,38 +2456,45 @@ Explanation: [what makes a good answer and why this topic is important]
     
     def get_service_health(self) -> Dict[str, Any]:
         """Get current service health status"""
+        breaker = ai_circuit_breaker.get_breaker().get_status()
         return {
-            'service_health': self.service_health,
+            'service_health': {
+                **self.service_health,
+                'gemini_api': {**self.service_health['gemini_api'],
+                               'consecutive_failures': breaker['consecutive_failures']}
+            },
             'error_stats': self.error_handler.get_error_stats(),
             'fallback_status': {
                 'fallback_manager_ready': self.fallback_manager is not None,
                 'registered_fallbacks': list(self.fallback_manager.fallback_strategies.keys()) if self.fallback_manager else []
             },
             'rate_limiting': {
-                'requests_in_last_minute': len(self.rate_limiter['request_timestamps']),
-                'rate_limit': self.rate_limiter['requests_per_minute'],
-                'circuit_breaker_active': self._should_use_circuit_breaker('gemini_api')
-            }
+                **gemini_rate_limiter.get_status(),
+                'circuit_breaker_active': breaker['state'] != ai_circuit_breaker.CLOSED
+            },
+            'circuit_breaker': ai_circuit_breaker.get_status(),
+            'local_model': self._local_generator.get_metrics() if self._local_generator else None
         }
     
     def reset_service_health(self, service: str = None):
         """Reset service health status (for administrative use)"""
         if service:
             if service in self.service_health:
-                self.service_health[service]['consecutive_failures'] = 0
                 self.service_health[service]['status'] = 'unknown'
+                if service == 'gemini_api':
+                    ai_circuit_breaker.get_breaker().reset()
                 print(f"🔄 Reset health status for {service}")
         else:
             for svc in self.service_health:
                 if isinstance(self.service_health[svc], dict):
-                    self.service_health[svc]['consecutive_failures'] = 0
                     self.service_health[svc]['status'] = 'unknown'
+            ai_circuit_breaker.get_breaker().reset()
             print("🔄 Reset health status for all services")
     
     def reset_gemini_circuit_breaker(self):
         """EMERGENCY RESET: Clear Gemini API circuit breaker and retry counter"""
         if 'gemini_api' in self.service_health:
-            self.service_health['gemini_api']['consecutive_failures'] = 0
+            ai_circuit_breaker.get_breaker().reset()  # Closes it in every worker
             self.service_health['gemini_api']['status'] = 'unknown'
             print("🚨 EMERGENCY RESET: Gemini API circuit breaker cleared!")
             print("   ⚠️ Make sure you've updated GEMINI_API_KEY in .env with a valid key")
@@ -2285,5 +2514,5 @@ Explanation: [what makes a good answer and why this topic is important]
             return True
         return False
 
-# Initialize the question generator
-question_generator = GeminiQuestionGenerator()
\ No newline at end of file
+# Initialize the question generator (constructed on first use, see startup.py)
+question_generator = startup.LazySingleton(GeminiQuestionGenerator, 'question generator')
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Quiz History Service - Keyset-paginated and streamed quiz history
+Selects only the columns the history views need (never session_data,
+never lazy-loaded relationships) so cost per page is constant.
+"""
+
+from models import db, QuizSession, Question
+from serialization import QuizHistoryDTO, dumps
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 500
+
+# Compact projection - everything QuizSession.to_dict exposes except the relationship
+HISTORY_COLUMNS = (
+    QuizSession.id,
+    QuizSession.user_id,
+    QuizSession.topic,
+    QuizSession.skill_level,
+    QuizSession.custom_topic,
+    QuizSession.total_questions,
+    QuizSession.completed_questions,
+    QuizSession.correct_answers,
+    QuizSession.score_percentage,
+    QuizSession.total_time_seconds,
+    QuizSession.time_limit_seconds,
+    QuizSession.time_started,
+    QuizSession.time_paused_at,
+    QuizSession.total_paused_seconds,
+    QuizSession.status,
+    QuizSession.started_at,
+    QuizSession.completed_at
+)
+
+
+def encode_cursor(started_at, session_id):
+    """Build an opaque-enough `<started_at>,<id>` cursor for the next page"""
+    return f"{started_at.isoformat()},{session_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Parse a `<started_at>,<id>` cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        started_at, session_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(started_at), int(session_id)
+    except (AttributeError, ValueError):
+        raise ValueError('Invalid cursor. Expected format: <started_at ISO timestamp>,<id>')
+
+
+def _history_query(user_id, after=None):
+    """Newest-first keyset query over the compact projection"""
+    query = db.session.query(*HISTORY_COLUMNS).filter(QuizSession.user_id == user_id)
+
+    if after is not None:
+        started_at, session_id = after
+        query = query.filter(db.or_(
+            QuizSession.started_at < started_at,
+            db.and_(QuizSession.started_at == started_at, QuizSession.id < session_id)
+        ))
+
+    return query.order_by(QuizSession.started_at.desc(), QuizSession.id.desc())
+
+
+def _question_counts(session_ids):
+    """Question counts for a batch of sessions with one grouped query"""
+    if not session_ids:
+        return {}
+    rows = db.session.query(
+        Question.quiz_session_id, db.func.count(Question.id)
+    ).filter(
+        Question.quiz_session_id.in_(session_ids)
+    ).group_by(Question.quiz_session_id).all()
+    return dict(rows)
+
+
+def serialize_history_row(row, questions_count=0):
+    """Shape a projected row like QuizSession.to_dict() (datetimes encoded by the JSON layer)"""
+    return QuizHistoryDTO(
+        id=row.id,
+        user_id=row.user_id,
+        topic=row.topic,
+        skill_level=row.skill_level,
+        custom_topic=row.custom_topic,
+        total_questions=row.total_questions,
+        completed_questions=row.completed_questions,
+        correct_answers=row.correct_answers,
+        score_percentage=row.score_percentage,
+        total_time_seconds=row.total_time_seconds,
+        time_limit_seconds=row.time_limit_seconds,
+        time_remaining_seconds=QuizSession.compute_remaining_seconds(
+            row.time_limit_seconds, row.time_started, row.time_paused_at, row.total_paused_seconds
+        ),
+        is_paused=row.time_paused_at is not None,
+        status=row.status,
+        started_at=row.started_at,
+        completed_at=row.completed_at,
+        questions_count=questions_count
+    )
+
+
+def _serialize_batch(rows):
+    counts = _question_counts([row.id for row in rows])
+    return [serialize_history_row(row, counts.get(row.id, 0)) for row in rows]
+
+
+def get_history_page(user_id, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of quiz history.
+
+    Args:
+        user_id: User ID
+        after: Decoded cursor tuple (started_at, id) or None for the first page
+        limit: Page size (clamped to 1..MAX_PAGE_SIZE)
+
+    Returns:
+        dict: sessions, next_cursor (None on the last page) and has_more
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = _history_query(user_id, after).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows[-1].started_at is not None:
+        next_cursor = encode_cursor(rows[-1].started_at, rows[-1].id)
+
+    return {
+        'sessions': _serialize_batch(rows),
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+
+
+def iter_history(user_id, after=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield every history entry, newest first, walking keyset batches.
+
+    Each batch is a short independent query, so no read transaction or
+    server-side cursor stays open while the client consumes the stream.
+    """
+    while True:
+        rows = _history_query(user_id, after).limit(batch_size).all()
+        if not rows:
+            return
+
+        for entry in _serialize_batch(rows):
+            yield entry
+
+        last = rows[-1]
+        if len(rows) < batch_size or last.started_at is None:
+            return
+        after = (last.started_at, last.id)
+
+
+def iter_history_ndjson(user_id, after=None):
+    """NDJSON lines (one session per line) for streaming exports"""
+    for entry in iter_history(user_id, after):
+        yield dumps(entry) + b'\n'
+
+
+def get_full_history(user_id):
+    """Complete history as a list (legacy response shape for /api/quiz/history)"""
+    return list(iter_history(user_id))
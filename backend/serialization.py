@@ -0,0 +1,229 @@
+"""
+Response Serialization - Fast JSON encoding, DTOs and compression
+Uses orjson when installed (native datetime/dataclass support) and falls
+back to the stdlib encoder with identical output formats. Large responses
+are gzip/brotli compressed when the client advertises support.
+"""
+
+from dataclasses import dataclass, field, asdict, is_dataclass
+from datetime import datetime, date
+from decimal import Decimal
+from typing import List, Optional
+import gzip
+import json
+import logging
+import os
+import sys
+
+from flask.json.provider import JSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# ==================== DTOs ====================
+
+# __slots__ DTOs on Python 3.10+ (plain dataclasses on 3.9)
+dto = dataclass(slots=True) if sys.version_info >= (3, 10) else dataclass
+
+@dto
+class QuizHistoryDTO:
+    """One quiz history row (same keys as QuizSession.to_dict)"""
+    id: int
+    user_id: int
+    topic: str
+    skill_level: str
+    custom_topic: Optional[str]
+    total_questions: int
+    completed_questions: int
+    correct_answers: int
+    score_percentage: float
+    total_time_seconds: int
+    time_limit_seconds: Optional[int]
+    time_remaining_seconds: Optional[int]
+    is_paused: bool
+    status: str
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    questions_count: int = 0
+
+
+@dto
+class RecentQuizDTO:
+    """Recent quiz summary inside a leaderboard row"""
+    quiz_id: int
+    topic: str
+    score: float
+    time_taken: int
+    completed_at: Optional[datetime]
+
+
+@dto
+class LeaderboardUserDTO:
+    """Aggregated leaderboard row for one user"""
+    user_id: int
+    username: str
+    full_name: str
+    email: str
+    total_quizzes: int
+    total_questions: int
+    total_correct: int
+    average_score: float
+    total_time: int
+    average_time: float
+    best_score: float
+    best_quiz_id: int
+    best_quiz_time: int
+    recent_quizzes: List[RecentQuizDTO] = field(default_factory=list)
+    rank: int = 0
+
+
+# ==================== ENCODING ====================
+
+def _default(obj):
+    """Types neither encoder handles natively (stdlib path also gets dates/DTOs)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):  # numpy scalars/arrays on the stdlib path
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """
+    Serialize to UTF-8 JSON bytes.
+
+    Datetimes are emitted as ISO 8601 (same as datetime.isoformat()) on
+    both the orjson and the stdlib path.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider so every jsonify() goes through dumps()"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+# ==================== COMPRESSION ====================
+
+def _negotiate_encoding(accept_encoding):
+    """Pick brotli or gzip from an Accept-Encoding header (None if neither)"""
+    offered = {}
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[token] = quality
+
+    if BROTLI_AVAILABLE and offered.get('br', 0) > 0:
+        return 'br'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a buffered JSON response in place when it is worth it.
+
+    Streamed responses (e.g. NDJSON exports), already-encoded bodies and
+    payloads under RESPONSE_COMPRESSION_MIN_BYTES are left untouched.
+    """
+    if not COMPRESSION_ENABLED:
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+    if not (200 <= response.status_code < 300):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Install the fast JSON provider and response compression on a Flask app"""
+    from flask import request
+
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+
+    logger.info(f"✅ JSON serialization: {'orjson' if ORJSON_AVAILABLE else 'stdlib json'}"
+                f" | compression: {'on' if COMPRESSION_ENABLED else 'off'}"
+                f"{' (br, gzip)' if BROTLI_AVAILABLE else ' (gzip)'}")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Local Socket.IO message broker (ZeroMQ forwarder).
+
+A stand-in for Redis when running several Socket.IO workers on one machine
+(development, load tests). Workers publish to the PULL port and receive
+from the PUB port:
+
+    python socketio_broker.py --pull-port 5555 --pub-port 5556
+    SOCKETIO_MESSAGE_QUEUE=zmq+tcp://127.0.0.1:5555+5556 SOCKETIO_ASYNC_MODE=eventlet python app.py
+
+Requires pyzmq (`pip install pyzmq`).
+"""
+
+import argparse
+import sys
+
+
+def run_broker(pull_port=5555, pub_port=5556, host='127.0.0.1'):
+    """Forward every message received on the PULL socket to all PUB subscribers (blocks)"""
+    import zmq
+
+    context = zmq.Context()
+    receiver = context.socket(zmq.PULL)
+    receiver.bind(f"tcp://{host}:{pull_port}")
+    publisher = context.socket(zmq.PUB)
+    publisher.bind(f"tcp://{host}:{pub_port}")
+
+    print(f"✅ Socket.IO broker listening: zmq+tcp://{host}:{pull_port}+{pub_port}", flush=True)
+    try:
+        while True:
+            publisher.send(receiver.recv())
+    finally:
+        receiver.close()
+        publisher.close()
+        context.term()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local ZeroMQ broker for Socket.IO message queue')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--pull-port', type=int, default=5555)
+    parser.add_argument('--pub-port', type=int, default=5556)
+    args = parser.parse_args()
+
+    try:
+        run_broker(args.pull_port, args.pub_port, args.host)
+    except ImportError:
+        print("❌ pyzmq is not installed: pip install pyzmq")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Broker stopped")
@@ -0,0 +1,96 @@
+"""
+Socket.IO Deployment Configuration - Async mode and message queue
+Multiplayer needs a single worker process: in-progress games live in the
+memory of the worker that runs them (multiplayer_engine.py), and any other
+worker that received an event for the room would reload it and run a second
+game loop. With WEB_CONCURRENCY (gunicorn's default --workers) above 1,
+multiplayer is refused (MULTIPLAYER_AVAILABLE), whatever the message queue
+setting. The default deployment runs one worker with threads;
+SOCKETIO_ASYNC_MODE=eventlet or gevent lets it hold thousands of connections
+with cooperative I/O.
+
+SOCKETIO_MESSAGE_QUEUE relays broadcasts (leaderboard_<topic>,
+multiplayer_<code>) from other processes - scripts, schedulers and, when
+WEB_CONCURRENCY is above 1, the other workers (see create_emitter) - to each
+worker's clients.
+
+Supported brokers (python-socketio client managers):
+    redis://host:6379/0                 Redis pub/sub (production)
+    zmq+tcp://127.0.0.1:5555+5556       Local stand-in: `python socketio_broker.py` (eventlet only)
+    amqp://..., kafka://...             RabbitMQ / Kafka (extra client packages)
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading').lower()
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'smart-quizzer-socketio')
+# Web worker processes (gunicorn reads the same variable as its --workers default)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+# In-memory multiplayer games can only have one owner process
+MULTIPLAYER_AVAILABLE = WEB_CONCURRENCY <= 1
+MULTIPLAYER_UNAVAILABLE_MESSAGE = 'Multiplayer requires a single Socket.IO worker (WEB_CONCURRENCY=1)'
+
+COOPERATIVE_ASYNC_MODES = ('eventlet', 'gevent')
+
+_patched = False
+
+
+def monkey_patch():
+    """
+    Patch the standard library for eventlet/gevent. Must run before any
+    other import (first lines of app.py); a no-op in threading mode.
+    """
+    global _patched
+    if _patched or SOCKETIO_ASYNC_MODE not in COOPERATIVE_ASYNC_MODES:
+        return False
+
+    if SOCKETIO_ASYNC_MODE == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    else:
+        from gevent import monkey
+        monkey.patch_all()
+    _patched = True
+    return True
+
+
+def get_socketio_options():
+    """
+    async_mode / message_queue / channel keyword arguments for SocketIO(app, ...).
+
+    Returns:
+        dict: SocketIO keyword arguments
+    """
+    options = {'async_mode': SOCKETIO_ASYNC_MODE}
+
+    if not MULTIPLAYER_AVAILABLE:
+        logger.warning(f"⚠️ WEB_CONCURRENCY={WEB_CONCURRENCY}: multiplayer is disabled "
+                       "(games run in one worker's memory - use WEB_CONCURRENCY=1)")
+
+    if SOCKETIO_MESSAGE_QUEUE:
+        options['message_queue'] = SOCKETIO_MESSAGE_QUEUE
+        options['channel'] = SOCKETIO_CHANNEL
+        if SOCKETIO_ASYNC_MODE not in COOPERATIVE_ASYNC_MODES:
+            logger.warning("⚠️ SOCKETIO_MESSAGE_QUEUE is set with the threading async mode - "
+                           "use SOCKETIO_ASYNC_MODE=eventlet or gevent")
+        logger.info(f"✅ Socket.IO message queue: {SOCKETIO_MESSAGE_QUEUE} "
+                    f"(channel={SOCKETIO_CHANNEL}, async_mode={SOCKETIO_ASYNC_MODE})")
+
+    return options
+
+
+def create_emitter(message_queue=None):
+    """
+    Write-only SocketIO instance for processes that are not Socket.IO
+    servers (scripts, schedulers): emits reach clients on every worker.
+    """
+    from flask_socketio import SocketIO
+
+    message_queue = message_queue or SOCKETIO_MESSAGE_QUEUE
+    if not message_queue:
+        raise ValueError("SOCKETIO_MESSAGE_QUEUE is not configured")
+    return SocketIO(message_queue=message_queue, channel=SOCKETIO_CHANNEL)
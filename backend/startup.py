@@ -0,0 +1,135 @@
+"""
+Startup - Cold-start control for web workers
+Importing app.py should only build the Flask app; everything expensive is
+moved off the import path:
+
+- Service singletons (the question generator) are LazySingleton proxies,
+  constructed on first attribute access instead of at import time.
+  lazy_import() goes one step further for app.py: the module defining the
+  singleton (question_gen, email_service and their imports) is only
+  imported on first use.
+- Slow checks (the Gemini health-check POST) run through defer(), on a
+  daemon thread, so they never block a worker from accepting requests.
+- warm_up() builds the registered singletons on a background thread once
+  app.py has finished importing (so it does not compete with the import for
+  the GIL), and the first request does not pay for them either.
+- With FAST_START=true create_app() skips initialize_database (create_all,
+  index/column checks, default users/topics/badges). Run it once before
+  the workers start:
+      python startup.py init-db
+
+Profile the import path with benchmarks/bench_cold_start.py.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FAST_START = os.getenv('FAST_START', 'false').lower() == 'true'
+DEFER_HEALTH_CHECKS = os.getenv('DEFER_HEALTH_CHECKS', 'true').lower() == 'true'
+STARTUP_WARM_UP = os.getenv('STARTUP_WARM_UP', 'true').lower() == 'true'
+
+_singletons = []
+
+
+class LazySingleton:
+    """Proxy that constructs its object on first attribute access"""
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+        self._instance = None
+        self._lock = threading.Lock()
+        _singletons.append(self)
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    logger.info(f"✅ {self._name} ready in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return self._instance
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazySingleton {self._name} ({state})>"
+
+
+def lazy_import(module_name, attr, name):
+    """LazySingleton for `module_name.attr`, importing the module on first use"""
+    def load():
+        value = getattr(importlib.import_module(module_name), attr)
+        return value.get() if isinstance(value, LazySingleton) else value
+    return LazySingleton(load, name)
+
+
+def defer(func, name):
+    """Run func on a daemon thread (inline with DEFER_HEALTH_CHECKS=false)"""
+    if not DEFER_HEALTH_CHECKS:
+        func()
+        return None
+
+    def run():
+        try:
+            func()
+        except Exception as e:
+            logger.warning(f"⚠️ Deferred {name} failed: {e}")
+
+    thread = threading.Thread(target=run, name=f'startup-{name}', daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up():
+    """Construct every registered singleton on a background thread"""
+    if not STARTUP_WARM_UP:
+        return None
+
+    def run():
+        for singleton in list(_singletons):
+            try:
+                singleton.get()
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up of {singleton._name} failed: {e}")
+
+    thread = threading.Thread(target=run, name='startup-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_status():
+    return {
+        'fast_start': FAST_START,
+        'deferred_health_checks': DEFER_HEALTH_CHECKS,
+        'singletons': {singleton._name: singleton.loaded for singleton in _singletons},
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:] != ['init-db']:
+        print("Usage: python startup.py init-db")
+        sys.exit(2)
+
+    # Build the app without initializing, then initialize exactly once here
+    os.environ['FAST_START'] = 'true'
+    from app import app, initialize_database
+
+    print("=" * 60)
+    print("STARTUP: initialize database")
+    print("=" * 60)
+    with app.app_context():
+        initialize_database()
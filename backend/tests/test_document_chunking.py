@@ -0,0 +1,59 @@
+"""
+Chunk sizes stay within max_tokens including the separators and the carried
+overlap, and plan_questions has nothing to plan for fewer than one question.
+
+Usage:
+    python -m pytest tests/test_document_chunking.py
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document_chunking
+
+
+def document(seed, paragraphs=60):
+    rng = random.Random(seed)
+    words = ['photosynthesis', 'chlorophyll', 'glucose', 'energy', 'light', 'cell', 'plant', 'water']
+    return '\n\n'.join(
+        ' '.join(f"{' '.join(rng.choices(words, k=rng.randint(3, 40)))}." for _ in range(rng.randint(1, 12)))
+        for _ in range(paragraphs)
+    )
+
+
+@pytest.mark.parametrize('max_tokens,overlap_tokens', [(64, 16), (200, 50), (500, 0), (2000, 150)])
+def test_chunks_fit_max_tokens(max_tokens, overlap_tokens):
+    content = document(max_tokens)
+    chunks = document_chunking.chunk_document(content, max_tokens, overlap_tokens)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk['text']) <= max_tokens * document_chunking.CHARS_PER_TOKEN
+        assert chunk['tokens'] <= max_tokens
+
+
+@pytest.mark.parametrize('num_questions', [0, -3])
+def test_plan_questions_without_questions(num_questions):
+    chunks = document_chunking.chunk_document(document(1), 200, 50)
+    ranked = document_chunking.rank_chunks(chunks, document_chunking.top_keywords(document(1)))
+
+    assert document_chunking.plan_questions(ranked, num_questions) == []
+
+
+def test_plan_questions_without_chunks():
+    assert document_chunking.plan_questions([], 5) == []
+
+
+def test_plan_questions_assigns_every_question():
+    chunks = document_chunking.chunk_document(document(2), 200, 50)
+    ranked = document_chunking.rank_chunks(chunks, document_chunking.top_keywords(document(2)))
+    plan = document_chunking.plan_questions(ranked, 13, max_calls=4)
+
+    assert len(plan) == 4
+    assert sum(item['count'] for item in plan) == 13
+    assert all(item['count'] >= 1 for item in plan)
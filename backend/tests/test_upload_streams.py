@@ -0,0 +1,75 @@
+"""
+Uploads arrive as Werkzeug's tempfile.SpooledTemporaryFile, which before
+Python 3.11 lacks the io methods TextIOWrapper, zipfile and pypdfium2 use.
+Each parser is fed a real spooled file, both in memory and rolled over to disk.
+
+Usage:
+    python -m pytest tests/test_upload_streams.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import content_processor
+import pdf_extraction
+
+# max_size 0 never rolls over; 1 rolls over to a temporary file on the first write
+SPOOL_SIZES = [pytest.param(0, id='in-memory'), pytest.param(1, id='rolled-over')]
+
+
+def spooled(data, max_size):
+    file = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+    file.write(data)
+    return file
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return content_processor.ContentProcessor(upload_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize('max_size', SPOOL_SIZES)
+def test_open_text_reads_spooled_upload(max_size):
+    file = spooled('naïve\nline two'.encode('utf-8'), max_size)
+    with content_processor.open_text(file) as text:
+        assert text.read() == 'naïve\nline two'
+    # The upload stays open for the next reader
+    assert not file.closed
+
+
+@pytest.mark.parametrize('max_size', SPOOL_SIZES)
+def test_csv_and_json_from_spooled_upload(processor, max_size):
+    assert 'Alice' in processor.extract_text_from_csv(spooled(b'name,score\nAlice,3\n', max_size))
+    assert 'photosynthesis' in processor.extract_text_from_json(spooled(b'{"topic": "photosynthesis"}', max_size))
+
+
+@pytest.mark.parametrize('max_size', SPOOL_SIZES)
+def test_docx_from_spooled_upload(processor, max_size):
+    docx = pytest.importorskip('docx')
+    document = docx.Document()
+    document.add_paragraph('Chloroplasts capture light energy.')
+    buffer = io.BytesIO()
+    document.save(buffer)
+    assert 'Chloroplasts' in processor.extract_text_from_docx(spooled(buffer.getvalue(), max_size))
+
+
+@pytest.mark.parametrize('max_size', SPOOL_SIZES)
+def test_pdf_pages_from_spooled_upload(max_size):
+    pdfium = pytest.importorskip('pypdfium2')
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(3):
+        pdf.new_page(200, 200)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    pdf.close()
+    file = spooled(buffer.getvalue(), max_size)
+
+    assert pdf_extraction.count_pages(file) == 3
+    pages = pdf_extraction.extract_page_range(file, 0, 3, include_tables=False)
+    assert [number for number, _ in pages] == [1, 2, 3]
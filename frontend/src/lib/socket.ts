@@ -3,12 +3,23 @@ import { io, Socket } from 'socket.io-client';
 // Use environment variable or fallback to localhost
 const SOCKET_URL = process.env.REACT_APP_API_URL?.replace('/api', '') || 'http://localhost:5000';
 
+export interface SealedQuestion {
+  question_index: number;
+  nonce: string;
+  ciphertext: string;
+}
+
+const fromBase64 = (value: string): Uint8Array =>
+  Uint8Array.from(atob(value), (c) => c.charCodeAt(0));
+
 class SocketService {
   private socket: Socket | null = null;
   private isConnected: boolean = false;
   private reconnectAttempts: number = 0;
   private maxReconnectAttempts: number = 5;
   private currentRoom: string | null = null;
+  private clockOffset: number = 0; // server time - local time (ms)
+  private bestRoundTrip: number | null = null;
 
   constructor() {
     this.initialize();
@@ -185,6 +196,88 @@ class SocketService {
     this.socket.off('leaderboard:admin_update');
   }
 
+  /**
+   * Subscribe to multiplayer lobby listings (pushed whenever rooms change)
+   * @param topic - Topic to follow; omit for rooms across all topics
+   * @param callback - Receives { topic, rooms, total, timestamp }
+   */
+  public subscribeLobby(topic: string | null, callback: (data: any) => void): void {
+    if (!this.socket) {
+      console.warn('⚠️  Cannot subscribe to lobby - socket not initialized');
+      return;
+    }
+
+    this.socket.off('multiplayer:lobby_update');
+    this.socket.on('multiplayer:lobby_update', (data) => {
+      if ((data.topic ?? null) === topic) {
+        callback(data);
+      }
+    });
+    this.socket.emit('multiplayer:subscribe_lobby', { topic });
+  }
+
+  /**
+   * Stop receiving multiplayer lobby listings
+   */
+  public unsubscribeLobby(topic: string | null): void {
+    if (!this.socket) return;
+    this.socket.emit('multiplayer:unsubscribe_lobby', { topic });
+    this.socket.off('multiplayer:lobby_update');
+  }
+
+  /**
+   * Estimate the server clock offset from several probes (lowest round trip wins).
+   * The best round trip is reported with each probe so the server can credit
+   * answer times for network latency.
+   */
+  public async syncClock(samples: number = 5): Promise<number> {
+    if (!this.socket) {
+      return this.clockOffset;
+    }
+
+    for (let i = 0; i < samples; i++) {
+      const sentAt = Date.now();
+      const reply: { server_time: number } = await this.socket
+        .timeout(5000)
+        .emitWithAck('multiplayer:clock_sync', { client_time: sentAt, rtt_ms: this.bestRoundTrip });
+      const receivedAt = Date.now();
+      const roundTrip = receivedAt - sentAt;
+
+      if (this.bestRoundTrip === null || roundTrip <= this.bestRoundTrip) {
+        this.bestRoundTrip = roundTrip;
+        this.clockOffset = reply.server_time - (sentAt + receivedAt) / 2;
+      }
+    }
+
+    console.log(`⏱️ Clock offset ${this.clockOffset.toFixed(0)}ms (round trip ${this.bestRoundTrip}ms)`);
+    return this.clockOffset;
+  }
+
+  /**
+   * Convert a server timestamp (reveal_at / deadline_at) to local Date.now() time
+   */
+  public toLocalTime(serverTime: number): number {
+    return serverTime - this.clockOffset;
+  }
+
+  /**
+   * Decrypt one round of a sealed multiplayer question bundle with the key
+   * from its reveal tick (AES-256-GCM, "<room_code>:<index>" as associated data)
+   */
+  public async openSealedQuestion(roomCode: string, sealed: SealedQuestion, key: string): Promise<any> {
+    const cryptoKey = await crypto.subtle.importKey('raw', fromBase64(key), 'AES-GCM', false, ['decrypt']);
+    const plaintext = await crypto.subtle.decrypt(
+      {
+        name: 'AES-GCM',
+        iv: fromBase64(sealed.nonce),
+        additionalData: new TextEncoder().encode(`${roomCode}:${sealed.question_index}`)
+      },
+      cryptoKey,
+      fromBase64(sealed.ciphertext)
+    );
+    return JSON.parse(new TextDecoder().decode(plaintext));
+  }
+
   /**
    * Check if socket is connected
    */
@@ -176,16 +176,35 @@ const Results: React.FC = () => {
       // Join the topic-specific room
       socketService.joinLeaderboardRoom(topic);
       
+      // Version of the last delta applied (deltas are numbered consecutively per topic)
+      let lastVersion: number | null = null;
+      
       // Set up listener with proper reference for cleanup
       const handleLeaderboardUpdate = (updateData: any) => {
         if (!isMounted) return;
         
         console.log('🔔 Real-time leaderboard update received:', updateData);
         
-        if (updateData.topic === topic && updateData.entry) {
-          // Merge the update into the current leaderboard instead of re-fetching everything
-          mergeLeaderboardUpdate(updateData.entry);
+        if (updateData.topic !== topic) return;
+
+        // A missed or out-of-order delta (or the first one, with no version to compare): re-fetch
+        const version = updateData.version;
+        if (typeof version !== 'number' || lastVersion === null || version !== lastVersion + 1) {
+          console.log(`🔄 Leaderboard delta v${version} after v${lastVersion}, re-fetching`);
+          lastVersion = typeof version === 'number' ? version : null;
+          fetchLeaderboard(topic, isMounted);
+          return;
         }
+        lastVersion = version;
+
+        // Coalesced rank delta: drop entries pushed out of the top N, merge new ones (ranks are recomputed locally)
+        const changes = updateData.changes || [];
+        changes
+          .filter((change: any) => change.rank == null)
+          .forEach((change: any) => removeLeaderboardEntry(change));
+        changes
+          .filter((change: any) => change.user_id && change.rank != null && change.previous_rank == null)
+          .forEach((change: any) => mergeLeaderboardUpdate(change));
       };
       
       socketService.onLeaderboardUpdate(handleLeaderboardUpdate);
@@ -197,6 +216,16 @@ const Results: React.FC = () => {
       };
     };
 
+    const removeLeaderboardEntry = (removed: any) => {
+      // Entry pushed out of the top N: matched by quiz session, or by user when the session is unknown
+      if (!removed || (!removed.quiz_session_id && !removed.user_id)) return;
+      setLeaderboard(prevLeaderboard => prevLeaderboard.filter(entry =>
+        removed.quiz_session_id
+          ? entry.quiz_session_id !== removed.quiz_session_id
+          : entry.user_id !== removed.user_id
+      ));
+    };
+
     const mergeLeaderboardUpdate = (newEntry: any) => {
       /**
        * Merge a single leaderboard entry into the current leaderboard state.
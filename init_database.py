@@ -8,7 +8,6 @@ import sys
 import os
 from datetime import datetime, timedelta
 import random
-import json
 
 # Add backend directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
@@ -19,7 +18,9 @@ load_dotenv()
 
 try:
     from app import app, db
-    from models import User, Topic, QuizSession, Question, FlaggedQuestion, QuestionFeedback, QuizLeaderboard
+    from models import User, Topic, QuizSession, Question, QuestionOption, FlaggedQuestion, QuestionFeedback, QuizLeaderboard
+    import db_dialect
+    import leaderboard_service
 except ImportError as e:
     print('\n' + '='*80)
     print('❌ ERROR: Could not import required modules')
@@ -104,6 +105,13 @@ def create_quiz_history(users, topics):
     ]
     
     question_types = ['MCQ', 'True/False', 'Short Answer']
+    difficulty_weights = {'Easy': 1.0, 'Medium': 1.5, 'Hard': 2.0}
+    
+    # Rows are collected and bulk loaded (COPY on PostgreSQL, executemany elsewhere)
+    # with explicit ids, so questions can reference sessions without a flush per quiz
+    session_rows, question_rows, option_rows = [], [], []
+    next_session_id = db_dialect.next_id(QuizSession.__table__)
+    next_question_id = db_dialect.next_id(Question.__table__)
     
     total_quizzes_created = 0
     total_questions_created = 0
@@ -154,21 +162,24 @@ def create_quiz_history(users, topics):
             score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
             
             # Create quiz session
-            quiz_session = QuizSession(
-                user_id=user.id,# type: ignore
-                topic=topic_name,# type: ignore
-                custom_topic=None,# type: ignore
-                skill_level=difficulty,# type: ignore
-                total_questions=total_questions,# type: ignore
-                completed_questions=total_questions,# type: ignore
-                correct_answers=correct_answers,# type: ignore
-                score_percentage=round(score_percentage, 1),# type: ignore
-                status='completed',# type: ignore
-                started_at=started_at,# type: ignore
-                completed_at=completed_at# type: ignore
-            )
-            db.session.add(quiz_session)
-            db.session.flush()  # Get quiz_session.id
+            session_id = next_session_id
+            next_session_id += 1
+            session_rows.append({
+                'id': session_id,
+                'user_id': user.id,
+                'topic': topic_name,
+                'custom_topic': None,
+                'skill_level': difficulty,
+                'total_questions': total_questions,
+                'completed_questions': total_questions,
+                'correct_answers': correct_answers,
+                'score_percentage': round(score_percentage, 1),
+                'total_time_seconds': 0,
+                'total_paused_seconds': 0,
+                'status': 'completed',
+                'started_at': started_at,
+                'completed_at': completed_at
+            })
             
             # Create questions for this quiz
             for q_num in range(total_questions):
@@ -205,24 +216,36 @@ def create_quiz_history(users, topics):
                 else:
                     q_difficulty = random.choice(['Medium', 'Hard', 'Hard', 'Expert'])
                 
-                question = Question(
-                    quiz_session_id=quiz_session.id,
-                    question_text=f'{topic_name} question {q_num + 1} ({q_difficulty})',
-                    question_type=q_type,
-                    options=json.dumps(options) if options else None,
-                    correct_answer=correct_answer,
-                    user_answer=user_answer,
-                    is_correct=is_correct,
-                    explanation=f'Explanation for {topic_name} question {q_num + 1}',
-                    difficulty_level=q_difficulty,
-                    answered_at=answered_at,
-                    time_taken=time_taken
+                question_id = next_question_id
+                next_question_id += 1
+                question_rows.append({
+                    'id': question_id,
+                    'quiz_session_id': session_id,
+                    'question_text': f'{topic_name} question {q_num + 1} ({q_difficulty})',
+                    'question_type': q_type,
+                    'correct_answer': correct_answer,
+                    'user_answer': user_answer,
+                    'is_correct': is_correct,
+                    'explanation': f'Explanation for {topic_name} question {q_num + 1}',
+                    'difficulty_level': q_difficulty,
+                    'difficulty_weight': difficulty_weights.get(q_difficulty, 1.0),
+                    'answered_at': answered_at,
+                    'time_taken': time_taken,
+                    'created_at': datetime.utcnow()
+                })
+                option_rows.extend(
+                    {'question_id': question_id, 'position': position, 'text': option}
+                    for position, option in enumerate(options)
                 )
-                db.session.add(question)
                 total_questions_created += 1
             
             total_quizzes_created += 1
     
+    db_dialect.bulk_load(QuizSession.__table__, session_rows)
+    db_dialect.bulk_load(Question.__table__, question_rows)
+    db_dialect.bulk_load(QuestionOption.__table__, option_rows)
+    db_dialect.sync_id_sequence(QuizSession.__table__)
+    db_dialect.sync_id_sequence(Question.__table__)
     db.session.commit()
     print(f'   ✅ Created {total_quizzes_created} quiz sessions')
     print(f'   ✅ Created {total_questions_created} questions')
@@ -399,52 +422,37 @@ def populate_leaderboard():
     QuizLeaderboard.query.delete()
     db.session.commit()
     
-    # Get all completed quiz sessions
-    completed_sessions = QuizSession.query.filter_by(status='completed').all()
+    # Set-based copy: one INSERT ... SELECT over the completed sessions
+    sessions = QuizSession.__table__
+    time_taken = db.cast(
+        db_dialect.seconds_between(sessions.c.started_at, sessions.c.completed_at), db.Integer
+    )
+    completed_sessions = db.select(
+        sessions.c.user_id,
+        sessions.c.id,
+        sessions.c.topic,
+        sessions.c.score_percentage,
+        sessions.c.correct_answers,
+        sessions.c.total_questions,
+        db.func.coalesce(time_taken, 0),
+        db.literal(1.0),
+        db.func.coalesce(sessions.c.completed_at, sessions.c.started_at)
+    ).where(sessions.c.status == 'completed')
+    
+    leaderboard = QuizLeaderboard.__table__
+    leaderboard_count = db_dialect.insert_from_select(leaderboard, [
+        leaderboard.c.user_id, leaderboard.c.quiz_session_id, leaderboard.c.topic, leaderboard.c.score,
+        leaderboard.c.correct_count, leaderboard.c.total_questions, leaderboard.c.time_taken,
+        leaderboard.c.avg_difficulty_weight, leaderboard.c.timestamp
+    ], completed_sessions)
+    db.session.commit()
     
-    if not completed_sessions:
+    if not leaderboard_count:
         print('   ⚠️  No completed quiz sessions found')
         return 0
     
-    leaderboard_count = 0
-    
-    for session in completed_sessions:
-        # Calculate time taken in seconds
-        time_taken_seconds = 0
-        if session.completed_at and session.started_at:
-            time_delta = session.completed_at - session.started_at
-            time_taken_seconds = int(time_delta.total_seconds())
-        
-        # Calculate accuracy
-        accuracy = (session.correct_answers / session.total_questions * 100) if session.total_questions > 0 else 0
-        
-        # Create leaderboard entry
-        leaderboard_entry = QuizLeaderboard(
-            user_id=session.user_id,# type: ignore
-            quiz_session_id=session.id,# type: ignore
-            topic=session.topic,# type: ignore
-            score=session.score_percentage,# type: ignore
-            correct_count=session.correct_answers,# type: ignore
-            total_questions=session.total_questions,# type: ignore
-            time_taken=time_taken_seconds,# type: ignore
-            avg_difficulty_weight=1.0,  # type: ignore
-            timestamp=session.completed_at if session.completed_at else session.started_at # type: ignore
-        )
-        db.session.add(leaderboard_entry)
-        leaderboard_count += 1
-    
-    db.session.commit()
-    
-    # Calculate and assign ranks
-    all_entries = QuizLeaderboard.query.order_by(
-        QuizLeaderboard.score.desc(),# type: ignore
-        QuizLeaderboard.time_taken.asc()# type: ignore
-    ).all()
-    
-    for idx, entry in enumerate(all_entries, start=1):
-        entry.rank = idx
-    
-    db.session.commit()
+    # Calculate and assign ranks (RANK() window function where supported)
+    leaderboard_service.recalculate_ranks()
     
     print(f'   ✅ Created {leaderboard_count} leaderboard entries')
     print(f'   🏅 Ranks assigned (1-{leaderboard_count})')